@@ -0,0 +1,28 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks of the App Engine SDK libraries that need no runtime services.
+
+Run them from the appengine-compat directory, e.g.:
+
+    export PYTHONPATH=exported_appengine_sdk
+    python -m benchmarks.serialization_benchmark
+
+and their tests with:
+
+    python -m unittest discover -t . -s benchmarks -p '*_test.py'
+
+Benchmarks of the runtime itself, which talk to a local service bridge, are in
+vmruntime.loadtest.
+"""
@@ -0,0 +1,171 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from benchmarks import crc32c_benchmark
+from benchmarks import key_benchmark
+from benchmarks import records_benchmark
+from benchmarks import serialization_benchmark
+from benchmarks import urlsafe_benchmark
+from google.appengine.api import datastore_types
+from google.appengine.api.files import crc32c
+from google.appengine.ext import ndb
+from google.appengine.ext.mapreduce import records
+from mock import patch
+
+
+class Crc32cBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        names = [name for name, _ in crc32c_benchmark.implementations()]
+        self.assertEqual(['table', 'slicing-by-8'], names[:2])
+        self.assertEqual('selected', names[-1])
+        for size in (0, 1000):
+            results = crc32c_benchmark.run(size, repeat=2,
+                                           bytes_per_measurement=10000)
+            self.assertEqual(names, [name for name, _ in results])
+            for _, rate in results:
+                self.assertGreaterEqual(rate, 0)
+
+    def test_run_skips_table_for_large_sizes(self):
+        results = crc32c_benchmark.run(1000, repeat=1, max_table_size=100)
+        self.assertNotIn('table', [name for name, _ in results])
+
+    def test_run_checks_checksums(self):
+        # The last byte of every string would be ignored.
+        def crc_update(crc, data):
+            return original(crc, data[:-1])
+
+        original = crc32c._crc_update_slicing_by_8
+        with patch.object(crc32c, '_crc_update_slicing_by_8', crc_update):
+            with self.assertRaises(AssertionError):
+                crc32c_benchmark.run(100, repeat=1)
+
+
+class KeyBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = key_benchmark.run(num_keys=200, repeat=2)
+        self.assertEqual(
+            [(1, 'hash'), (1, 'eq'), (1, 'set'), (1, 'str'), (1, 'decode'),
+             (1, 'decode100'), (3, 'hash'), (3, 'eq'), (3, 'set'),
+             (3, 'str'), (3, 'decode'), (3, 'decode100')],
+            [result[:2] for result in results])
+        for _, _, microseconds in results:
+            self.assertGreater(microseconds, 0)
+
+    def test_run_checks_hashing(self):
+        # Equal keys would no longer be merged in a set.
+        with patch.object(datastore_types.Key, '__hash__', object.__hash__):
+            with self.assertRaises(AssertionError):
+                key_benchmark.run(num_keys=20, repeat=1)
+
+    def test_make_keys(self):
+        keys = key_benchmark.make_keys(20, depth=3)
+        self.assertEqual(20, len(set(keys)))
+        self.assertEqual(['Parent0', 'Parent1', 'Child'],
+                         [key.kind() for key in [keys[0].parent().parent(),
+                                                 keys[0].parent(), keys[0]]])
+
+
+class RecordsBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        for record_size in (100, 100000):
+            results = records_benchmark.run(record_size, megabytes=1,
+                                            repeat=2)
+            self.assertEqual(
+                ['RecordsReader', 'mmap', 'mmap_nocrc', 'mmap_buffers'],
+                [name for name, _ in results])
+            for _, rate in results:
+                self.assertGreater(rate, 0)
+
+    def test_run_checks_records(self):
+        # Every record read through the mapping would lose its first byte.
+        def read(self):
+            return str(original_read_buffer(self))[1:]
+
+        original_read_buffer = records.MmapRecordsReader.read_buffer
+        with patch.object(records.MmapRecordsReader, 'read', read):
+            with self.assertRaises(AssertionError):
+                records_benchmark.run(100, megabytes=1, repeat=1)
+
+    def test_make_records(self):
+        data = records_benchmark.make_records(1000, megabytes=1)
+        self.assertEqual(1048, len(data))
+        self.assertEqual(set([1000]), set(len(record) for record in data))
+        self.assertEqual(1, len(records_benchmark.make_records(10 ** 7, 1)))
+
+
+class SerializationBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = serialization_benchmark.run(num_entities=20, repeat=2)
+        self.assertEqual(
+            [name for name, _, _ in serialization_benchmark.MODELS],
+            [name for name, _, _ in results])
+        for _, encode_us, decode_us in results:
+            self.assertGreater(encode_us, 0)
+            self.assertGreater(decode_us, 0)
+
+    def test_run_checks_round_trip(self):
+        def from_pb_without_name(cls, pb):
+            entity = original_from_pb.__func__(cls, pb)
+            entity.name = None
+            return entity
+
+        original_from_pb = serialization_benchmark.Flat._from_pb
+        with patch.object(serialization_benchmark.Flat, '_from_pb',
+                          classmethod(from_pb_without_name)):
+            with self.assertRaises(AssertionError):
+                serialization_benchmark.run(num_entities=2, repeat=1)
+
+    def test_entities_are_complete(self):
+        for _, model_class, make in serialization_benchmark.MODELS:
+            entity = make(0)
+            self.assertIsInstance(entity.key, ndb.Key)
+            for name, prop in model_class._properties.iteritems():
+                self.assertIsNotNone(prop._get_value(entity), name)
+
+
+class UrlsafeBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = urlsafe_benchmark.run(num_keys=200, repeat=2)
+        self.assertEqual(
+            ['keys', 'urlsafe', 'urlsafe_multi', 'decode', 'decode_multi',
+             'decode100', 'decode100_multi'],
+            [name for name, _ in results])
+        for _, microseconds in results:
+            self.assertGreater(microseconds, 0)
+
+    def test_run_checks_decoding(self):
+        # Every key would decode to the first one.
+        def from_urlsafe_multi(cls, urlsafes):
+            return [ndb.Key(urlsafe=urlsafes[0])] * len(urlsafes)
+
+        with patch.object(ndb.Key, 'from_urlsafe_multi',
+                          classmethod(from_urlsafe_multi)):
+            with self.assertRaises(AssertionError):
+                urlsafe_benchmark.run(num_keys=20, repeat=1)
+
+    def test_make_pairs(self):
+        pairs = urlsafe_benchmark.make_pairs(20)
+        self.assertEqual(20, len(set(pairs)))
+        self.assertEqual(10, len(set(parent for parent, _ in pairs)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the CRC-32C implementations the files API can use.
+
+Records files and Cloud Storage uploads checksum every byte with
+google.appengine.api.files.crc32c, which picks a native extension when one
+is installed and the pure python slicing-by-8 algorithm otherwise. This
+benchmark times each implementation that is available against the byte at a
+time table lookup the module used before, and against crc32c.crc(), which
+uses the implementation that was selected.
+
+Example:
+
+    python -m benchmarks.crc32c_benchmark --sizes 100 1000000
+"""
+
+import argparse
+import array
+import os
+import sys
+import timeit
+
+from google.appengine.api.files import crc32c
+
+# Small strings are checksummed many times per measurement, about this many
+# bytes in total, so that the timer's resolution does not matter.
+_BYTES_PER_MEASUREMENT = 1024 * 1024
+
+
+def _table_crc_update(crc, data):
+    crc ^= crc32c._MASK
+    for b in array.array('B', data):
+        crc = (crc32c.CRC_TABLE[(crc ^ b) & 0xff] ^ (crc >> 8)) & crc32c._MASK
+    return crc ^ crc32c._MASK
+
+
+def implementations():
+    """Returns a list of (name, crc_update function) tuples to time."""
+    result = [
+        ('table', _table_crc_update),
+        ('slicing-by-8', crc32c._crc_update_slicing_by_8),
+    ]
+    try:
+        import crcmod.crcmod
+        import crcmod.predefined
+    except ImportError:
+        pass
+    else:
+        if crcmod.crcmod._usingExtension:
+            crcmod_crc = crcmod.predefined.mkPredefinedCrcFun('crc-32c')
+            result.append(('crcmod', lambda crc, data: crcmod_crc(data, crc)))
+    try:
+        import crc32c as crc32c_ext
+    except ImportError:
+        pass
+    else:
+        name = 'crc32c-sse4.2' if crc32c_ext.hardware_based else 'crc32c'
+        result.append((name, lambda crc, data: crc32c_ext.crc32c(data, crc)))
+    result.append(('selected', crc32c.crc_update))
+    return result
+
+
+def run(size, repeat, max_table_size=1000000,
+        bytes_per_measurement=_BYTES_PER_MEASUREMENT):
+    """Times checksumming a string with each implementation.
+
+    Args:
+        size: The length of the string to checksum.
+        repeat: How many times to time each implementation; the best time is
+            used.
+        max_table_size: The largest size to time the slow table lookup with.
+        bytes_per_measurement: About how many bytes to checksum in each
+            measurement, by checksumming the string repeatedly.
+
+    Returns:
+        A list of (implementation, megabytes per second) tuples.
+
+    Raises:
+        AssertionError: An implementation computed a different checksum.
+    """
+    data = os.urandom(size)
+    expected = _table_crc_update(crc32c.CRC_INIT, data)
+    number = max(1, bytes_per_measurement // max(size, 1))
+    results = []
+    for name, crc_update in implementations():
+        if name == 'table' and size > max_table_size:
+            continue
+        assert crc_update(crc32c.CRC_INIT, data) == expected, name
+        seconds = min(timeit.repeat(lambda: crc_update(crc32c.CRC_INIT, data),
+                                    number=number, repeat=repeat))
+        results.append((name, size * number / seconds / (1024 * 1024)))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the CRC-32C implementations.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 10000, 1000000],
+                        help='the string lengths to time checksumming with')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print 'selected implementation: %s' % crc32c.IMPLEMENTATION
+    print '%-10s %-14s %10s' % ('size', 'crc', 'MB/s')
+    for size in args.sizes:
+        for name, rate in run(size, args.repeat):
+            print '%-10d %-14s %10.1f' % (size, name, rate)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,114 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the cost of common operations on datastore_types.Key.
+
+ext.db and the datastore API use Key instances as dictionary keys and set
+members, compare them and convert them to and from their string encoding.
+This benchmark times hashing, equality, str() and Key(encoded) for keys with
+one and three path elements. Key(encoded) is timed both for distinct strings
+and for strings repeated among a hundred keys, as when the same keys arrive in
+request after request.
+
+Example:
+
+    python -m benchmarks.key_benchmark --keys=10000
+"""
+
+import argparse
+import sys
+import timeit
+
+from google.appengine.api import datastore_types
+
+APP_ID = 'dev~benchmark'
+
+
+def make_keys(num_keys, depth):
+    """Returns keys whose paths have depth elements."""
+    keys = []
+    for index in xrange(num_keys):
+        path = []
+        for level in xrange(depth - 1):
+            path += ['Parent%d' % level, 'parent %d' % (index % 10)]
+        path += ['Child', index + 1]
+        keys.append(datastore_types.Key.from_path(*path, _app=APP_ID))
+    return keys
+
+
+def _hash_all(keys):
+    for key in keys:
+        hash(key)
+
+
+def _compare_all(keys, others):
+    for key, other in zip(keys, others):
+        assert key == other
+
+
+def run(num_keys, repeat):
+    """Times hashing, comparing and encoding keys.
+
+    Args:
+        num_keys: The number of keys to time each operation with.
+        repeat: How many times to time each operation; the best time is used.
+
+    Returns:
+        A list of (depth, operation, microseconds per key) tuples.
+
+    Raises:
+        AssertionError: A key did not survive an encoding round trip.
+    """
+    results = []
+    for depth in (1, 3):
+        keys = make_keys(num_keys, depth)
+        others = make_keys(num_keys, depth)
+        encoded = [str(key) for key in keys]
+        repeated = [encoded[index % 100] for index in xrange(num_keys)]
+        assert [datastore_types.Key(e) for e in encoded] == keys
+        assert [datastore_types.Key(e) for e in repeated] == [
+            keys[index % 100] for index in xrange(num_keys)]
+        assert len(set(keys) | set(others)) == num_keys
+
+        cases = (
+            ('hash', lambda: _hash_all(keys)),
+            ('eq', lambda: _compare_all(keys, others)),
+            ('set', lambda: set(keys)),
+            ('str', lambda: [str(key) for key in keys]),
+            ('decode', lambda: [datastore_types.Key(e) for e in encoded]),
+            ('decode100',
+             lambda: [datastore_types.Key(e) for e in repeated]),
+        )
+        for name, function in cases:
+            seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+            results.append((depth, name, seconds * 1e6 / num_keys))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark datastore_types.Key operations.')
+    parser.add_argument('--keys', type=int, default=10000,
+                        help='the number of keys to time each operation with')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print '%-6s %-10s %12s' % ('depth', 'op', 'us per key')
+    for depth, name, microseconds in run(args.keys, args.repeat):
+        print '%-6d %-10s %12.2f' % (depth, name, microseconds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,136 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures reading mapreduce records files from local disk.
+
+Mapreduce shuffles through records files, which RecordsReader reads block by
+block through a file object. This benchmark times that against
+MmapRecordsReader, which maps the file, both with checksums verified per
+record and without them, and against iterating over buffers instead of
+strings. A file of records of one size is written for each record size.
+
+Example:
+
+    python -m benchmarks.records_benchmark --megabytes 64 --sizes 100 1000000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from google.appengine.ext.mapreduce import records
+
+
+def make_records(record_size, megabytes):
+    count = max(1, megabytes * 1024 * 1024 // record_size)
+    return [os.urandom(record_size) for _ in xrange(count)]
+
+
+def write_file(path, data):
+    with open(path, 'wb') as f:
+        writer = records.RecordsWriter(f)
+        for record in data:
+            writer.write(record)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return list(records.RecordsReader(f))
+
+
+def _read_mmap(path, verify_checksums=True):
+    reader = records.MmapRecordsReader(path, verify_checksums)
+    try:
+        return list(reader)
+    finally:
+        reader.close()
+
+
+def _read_buffers(path):
+    reader = records.MmapRecordsReader(path)
+    try:
+        # Buffers are only valid while the file is mapped.
+        return sum(len(record) for record in reader.iter_buffers())
+    finally:
+        reader.close()
+
+
+def run(record_size, megabytes, repeat, directory=None):
+    """Times reading a records file with each reader.
+
+    Args:
+        record_size: The size of each record in bytes.
+        megabytes: The approximate amount of record data to read.
+        repeat: How many times to time each reader; the best time is used.
+        directory: The directory to write the file to; a temporary directory
+            by default.
+
+    Returns:
+        A list of (reader, megabytes per second) tuples.
+
+    Raises:
+        AssertionError: A reader returned different records.
+    """
+    data = make_records(record_size, megabytes)
+    tmpdir = tempfile.mkdtemp(dir=directory)
+    try:
+        path = os.path.join(tmpdir, 'records')
+        write_file(path, data)
+        assert _read(path) == data
+        assert _read_mmap(path) == data
+        assert _read_mmap(path, verify_checksums=False) == data
+        total = sum(len(record) for record in data)
+        assert _read_buffers(path) == total
+
+        cases = (
+            ('RecordsReader', lambda: _read(path)),
+            ('mmap', lambda: _read_mmap(path)),
+            ('mmap_nocrc', lambda: _read_mmap(path, verify_checksums=False)),
+            ('mmap_buffers', lambda: _read_buffers(path)),
+        )
+        results = []
+        for name, function in cases:
+            seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+            results.append((name, total / seconds / (1024 * 1024)))
+        return results
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark reading mapreduce records files.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 10000, 1000000],
+                        help='the record sizes in bytes to time reading with')
+    parser.add_argument('--megabytes', type=int, default=16,
+                        help='the amount of record data in each file')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    parser.add_argument('--dir', default=None,
+                        help='the directory to write the files to')
+    args = parser.parse_args(argv[1:])
+    print '%-10s %-14s %10s' % ('size', 'reader', 'MB/s')
+    for record_size in args.sizes:
+        for name, rate in run(record_size, args.megabytes, args.repeat,
+                              args.dir):
+            print '%-10d %-14s %10.1f' % (record_size, name, rate)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
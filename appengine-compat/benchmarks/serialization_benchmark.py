@@ -0,0 +1,160 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures how fast ndb converts entities to and from protocol buffers.
+
+Every put and every memcache write-back converts entities with
+Model._to_pb, and every get and query result is converted back with
+Model._from_pb. This benchmark times both for flat models, models with
+repeated properties and models made of structured properties.
+
+Example:
+
+    python -m benchmarks.serialization_benchmark --entities=2000
+"""
+
+import argparse
+import datetime
+import sys
+import timeit
+
+from google.appengine.datastore import entity_pb
+from google.appengine.ext import ndb
+
+APP_ID = 'dev~benchmark'
+
+
+class Flat(ndb.Model):
+    name = ndb.StringProperty()
+    email = ndb.StringProperty()
+    city = ndb.StringProperty()
+    age = ndb.IntegerProperty()
+    visits = ndb.IntegerProperty()
+    score = ndb.FloatProperty()
+    active = ndb.BooleanProperty()
+    created = ndb.DateTimeProperty()
+    bio = ndb.TextProperty()
+    owner = ndb.KeyProperty()
+
+
+class Repeated(ndb.Model):
+    tags = ndb.StringProperty(repeated=True)
+    counts = ndb.IntegerProperty(repeated=True)
+    title = ndb.StringProperty()
+
+
+class Address(ndb.Model):
+    street = ndb.StringProperty()
+    city = ndb.StringProperty()
+    zip_code = ndb.StringProperty()
+    primary = ndb.BooleanProperty()
+
+
+class Contact(ndb.Model):
+    name = ndb.StringProperty()
+    address = ndb.StructuredProperty(Address)
+
+
+class Structured(ndb.Model):
+    contact = ndb.StructuredProperty(Contact)
+    addresses = ndb.StructuredProperty(Address, repeated=True)
+    note = ndb.TextProperty()
+
+
+def make_flat(index):
+    return Flat(key=ndb.Key(Flat, index + 1, app=APP_ID),
+                name='name %d' % index, email='user%d@example.com' % index,
+                city='city', age=index % 100, visits=index * 7,
+                score=index / 3.0, active=bool(index % 2),
+                created=datetime.datetime(2015, 1, 1, 12, 30),
+                bio='bio ' * 20,
+                owner=ndb.Key('Owner', index + 1, app=APP_ID))
+
+
+def make_repeated(index):
+    return Repeated(key=ndb.Key(Repeated, index + 1, app=APP_ID),
+                    tags=['tag%d' % i for i in range(20)],
+                    counts=range(index, index + 20), title='title')
+
+
+def make_address(index):
+    return Address(street='%d Main St' % index, city='city',
+                   zip_code='%05d' % index, primary=index == 0)
+
+
+def make_structured(index):
+    return Structured(
+        key=ndb.Key(Structured, index + 1, app=APP_ID),
+        contact=Contact(name='contact %d' % index,
+                        address=make_address(index)),
+        addresses=[make_address(i) for i in range(5)], note='note')
+
+
+MODELS = (
+    ('flat', Flat, make_flat),
+    ('repeated', Repeated, make_repeated),
+    ('structured', Structured, make_structured),
+)
+
+
+def run(num_entities, repeat):
+    """Times converting entities of each model to and from protocol buffers.
+
+    Args:
+        num_entities: The number of entities of each model to convert.
+        repeat: How many times to time each conversion; the best time is used.
+
+    Returns:
+        A list of (model name, encode microseconds, decode microseconds)
+        tuples, with the times per entity.
+
+    Raises:
+        AssertionError: An entity changed when converted back and forth.
+    """
+    results = []
+    for name, model_class, make in MODELS:
+        entities = [make(index) for index in xrange(num_entities)]
+        encoded = [entity._to_pb().Encode() for entity in entities]
+        decoded = [model_class._from_pb(entity_pb.EntityProto(data))
+                   for data in encoded]
+        assert decoded == entities, 'round trip changed %s entities' % name
+
+        encode_seconds = min(timeit.repeat(
+            lambda: [entity._to_pb() for entity in entities],
+            number=1, repeat=repeat))
+        pbs = [entity_pb.EntityProto(data) for data in encoded]
+        decode_seconds = min(timeit.repeat(
+            lambda: [model_class._from_pb(pb) for pb in pbs],
+            number=1, repeat=repeat))
+        results.append((name, encode_seconds * 1e6 / num_entities,
+                        decode_seconds * 1e6 / num_entities))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ndb entity serialization.')
+    parser.add_argument('--entities', type=int, default=1000,
+                        help='the number of entities of each model')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print '%-12s %12s %12s' % ('model', 'to_pb us', 'from_pb us')
+    for name, encode_us, decode_us in run(args.entities, args.repeat):
+        print '%-12s %12.1f %12.1f' % (name, encode_us, decode_us)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
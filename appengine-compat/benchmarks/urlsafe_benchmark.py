@@ -0,0 +1,110 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures converting ndb keys to and from their url-safe strings.
+
+APIs that return or accept many keys convert each one with key.urlsafe() or
+ndb.Key(urlsafe=...), which build a Reference protocol buffer for every key.
+This benchmark times those against Key.urlsafe_multi() and
+Key.from_urlsafe_multi(), for keys with two path elements. The keys encoded
+are created for each measurement, as keys made from ids have no Reference
+yet; 'keys' is the time taken to create them. Decoding is timed both for
+distinct strings and for strings repeated among a hundred keys, as when the
+same keys arrive in request after request.
+
+Example:
+
+    python -m benchmarks.urlsafe_benchmark --keys 1000 100000
+"""
+
+import argparse
+import sys
+import timeit
+
+from google.appengine.ext import ndb
+from google.appengine.ext.ndb import key as key_module
+
+APP_ID = 'dev~benchmark'
+
+
+def make_pairs(num_keys):
+    return [(('Parent', 'parent %d' % (index % 10)), ('Child', index + 1))
+            for index in xrange(num_keys)]
+
+
+def _from_urlsafe_multi_uncached(urlsafes):
+    key_module._decoded_keys = key_module._KeyCache(
+        key_module._MAX_DECODED_KEYS)
+    return ndb.Key.from_urlsafe_multi(urlsafes)
+
+
+def run(num_keys, repeat):
+    """Times encoding and decoding keys one by one and in bulk.
+
+    Args:
+        num_keys: The number of keys to time each operation with.
+        repeat: How many times to time each operation; the best time is used.
+
+    Returns:
+        A list of (operation, microseconds per key) tuples.
+
+    Raises:
+        AssertionError: The bulk and single conversions differ.
+    """
+    pairs = make_pairs(num_keys)
+
+    def make_keys():
+        return [ndb.Key(pairs=key_pairs, app=APP_ID) for key_pairs in pairs]
+
+    keys = make_keys()
+    urlsafes = [key.urlsafe() for key in keys]
+    repeated = [urlsafes[index % 100] for index in xrange(num_keys)]
+    assert ndb.Key.urlsafe_multi(make_keys()) == urlsafes
+    assert _from_urlsafe_multi_uncached(urlsafes) == keys
+    assert ndb.Key.from_urlsafe_multi(repeated) == [
+        keys[index % 100] for index in xrange(num_keys)]
+
+    cases = (
+        ('keys', make_keys),
+        ('urlsafe', lambda: [key.urlsafe() for key in make_keys()]),
+        ('urlsafe_multi', lambda: ndb.Key.urlsafe_multi(make_keys())),
+        ('decode', lambda: [ndb.Key(urlsafe=u) for u in urlsafes]),
+        ('decode_multi', lambda: _from_urlsafe_multi_uncached(urlsafes)),
+        ('decode100', lambda: [ndb.Key(urlsafe=u) for u in repeated]),
+        ('decode100_multi', lambda: ndb.Key.from_urlsafe_multi(repeated)),
+    )
+    results = []
+    for name, function in cases:
+        seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+        results.append((name, seconds * 1e6 / num_keys))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ndb url-safe key conversions.')
+    parser.add_argument('--keys', type=int, nargs='+', default=[1000, 100000],
+                        help='the numbers of keys to time each operation with')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print '%-8s %-16s %12s' % ('keys', 'op', 'us per key')
+    for num_keys in args.keys:
+        for name, microseconds in run(num_keys, args.repeat):
+            print '%-8d %-16s %12.2f' % (num_keys, name, microseconds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
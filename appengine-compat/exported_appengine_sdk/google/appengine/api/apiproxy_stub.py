@@ -67,6 +67,11 @@ class APIProxyStub(object):
 
   THREADSAFE = False
 
+
+
+
+  READ_ONLY_METHODS = frozenset()
+
   def __init__(self, service_name, max_request_size=MAX_REQUEST_SIZE,
                request_data=None):
     """Constructor.
@@ -145,6 +145,21 @@ class BlobStorage(object):
     """
     raise NotImplementedError('Storage class must override DeleteBlob method.')
 
+  def CopyBlob(self, source_blob_key, blob_key):
+    """Store the contents of an existing blob under another blob-key.
+
+    Storage classes may override this method to copy blobs more efficiently.
+
+    Args:
+      source_blob_key: Blob-key of existing blob to copy.
+      blob_key: Blob-key to store the copy under.
+    """
+    source = self.OpenBlob(source_blob_key)
+    try:
+      self.StoreBlob(blob_key, source)
+    finally:
+      source.close()
+
 
 class BlobstoreServiceStub(apiproxy_stub.APIProxyStub):
   """Datastore backed Blobstore service stub.
@@ -175,6 +190,9 @@ class BlobstoreServiceStub(apiproxy_stub.APIProxyStub):
 
   THREADSAFE = False
 
+  READ_ONLY_METHODS = frozenset(['CreateEncodedGoogleStorageKey',
+                                 'DecodeBlobKey', 'FetchData'])
+
   def __init__(self,
                blob_storage,
                time_function=time.time,
@@ -34,14 +34,34 @@ writes blobs directly to a file system.
 
 
 
+import collections
 import errno
+import hashlib
+import logging
 import os
+import shutil
+import tempfile
+import time
 
 from google.appengine.api import blobstore
 from google.appengine.api.blobstore import blobstore_stub
 
 
-__all__ = ['FileBlobStorage']
+__all__ = ['FileBlobStorage', 'ScrubResult']
+
+
+_CONTENT_DIRECTORY = '.content'
+
+
+_TEMP_SUFFIX = '.tmp'
+
+
+_BLOCK_SIZE = 1 << 20
+
+
+ScrubResult = collections.namedtuple(
+    'ScrubResult', ['files_checked', 'files_removed', 'bytes_removed',
+                    'corrupt_files'])
 
 
 
@@ -50,7 +70,19 @@ _local_open = __builtin__.open
 
 
 class FileBlobStorage(blobstore_stub.BlobStorage):
-  """The storage mechanism that stores blob data on a local disk."""
+  """The storage mechanism that stores blob data on a local disk.
+
+  Blob contents are stored once per distinct content, in a content-addressed
+  store sharded by SHA-1 digest::
+
+      <storage-dir>/.content/ab/cd/abcd...
+
+  and each blob file is a hard link to its content, so storing or copying the
+  same content several times only uses the space once. Content that is no
+  longer linked to by any blob is removed by `Scrub`. On platforms or file
+  systems without hard links, blob contents are stored in the blob files
+  directly.
+  """
 
   def __init__(self, storage_directory, app_id):
     """Constructor.
@@ -61,6 +93,8 @@ class FileBlobStorage(blobstore_stub.BlobStorage):
     """
     self._storage_directory = storage_directory
     self._app_id = app_id
+    self._content_directory = os.path.join(storage_directory,
+                                           _CONTENT_DIRECTORY)
 
   @classmethod
   def _BlobKey(cls, blob_key):
@@ -115,6 +149,59 @@ class FileBlobStorage(blobstore_stub.BlobStorage):
     blob_key = self._BlobKey(blob_key)
     return os.path.join(self._DirectoryForBlob(blob_key), str(blob_key)[1:])
 
+  def _FileForContent(self, digest):
+    """Calculates the file name in which to store content with a given digest.
+
+    Args:
+      digest: The hexadecimal SHA-1 digest of the content.
+
+    Returns:
+      A string that contains the complete path of the content file.
+    """
+    return os.path.join(self._content_directory, digest[:2], digest[2:4],
+                        digest)
+
+  @staticmethod
+  def _MakeDirectories(directory):
+    try:
+      os.makedirs(directory)
+    except OSError, e:
+      if e.errno != errno.EEXIST:
+        raise
+
+  @staticmethod
+  def _RemoveFile(path):
+    try:
+      os.remove(path)
+    except OSError, e:
+      if e.errno != errno.ENOENT:
+        raise
+
+  def _LinkBlob(self, content_file, blob_key):
+    """Makes a blob's file a hard link to a content file.
+
+    Args:
+      content_file: The path of the content file.
+      blob_key: The blob key of the blob.
+
+    Returns:
+      True if the link was created, False if the file system does not support
+      hard links.
+    """
+    if not hasattr(os, 'link'):
+      return False
+    blob_key = self._BlobKey(blob_key)
+    self._MakeDirectories(self._DirectoryForBlob(blob_key))
+    blob_file = self._FileForBlob(blob_key)
+    self._RemoveFile(blob_file)
+    try:
+      os.link(content_file, blob_file)
+    except OSError, e:
+      if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+        return False
+      raise
+    return True
+
   def StoreBlob(self, blob_key, blob_stream):
     """Stores a blob stream .
 
@@ -124,22 +211,78 @@ class FileBlobStorage(blobstore_stub.BlobStorage):
           content.
     """
     blob_key = self._BlobKey(blob_key)
-    blob_directory = self._DirectoryForBlob(blob_key)
-    if not os.path.exists(blob_directory):
-      os.makedirs(blob_directory)
-    blob_file = self._FileForBlob(blob_key)
-    output = _local_open(blob_file, 'wb')
+    self._MakeDirectories(self._content_directory)
+    fd, temp_file = tempfile.mkstemp(dir=self._content_directory,
+                                     suffix=_TEMP_SUFFIX)
+    try:
+      digest = hashlib.sha1()
+      with os.fdopen(fd, 'wb') as output:
+
+
+        while True:
+          block = blob_stream.read(_BLOCK_SIZE)
+          if not block:
+            break
+          digest.update(block)
+          output.write(block)
+
+      if not hasattr(os, 'link'):
+        self._MoveToBlobFile(temp_file, blob_key)
+        return
+
+      content_file = self._FileForContent(digest.hexdigest())
+      try:
+
+
+        os.utime(content_file, None)
+        linked = self._LinkBlob(content_file, blob_key)
+      except OSError, e:
+        if e.errno != errno.ENOENT:
+          raise
+        self._RenameToContentFile(temp_file, content_file)
+        linked = self._LinkBlob(content_file, blob_key)
+      if not linked:
+        if os.path.exists(temp_file):
+          self._MoveToBlobFile(temp_file, blob_key)
+        else:
+          self._RemoveFile(self._FileForBlob(blob_key))
+          shutil.copyfile(content_file, self._FileForBlob(blob_key))
+    finally:
+      self._RemoveFile(temp_file)
 
+  def _RenameToContentFile(self, path, content_file):
+    """Moves a file to become a content file, creating its directory."""
+    directory = os.path.dirname(content_file)
+    self._MakeDirectories(directory)
     try:
+      os.rename(path, content_file)
+    except OSError, e:
+      if e.errno != errno.ENOENT:
+        raise
+      # Scrub may have removed the directory while it was empty.
+      self._MakeDirectories(directory)
+      os.rename(path, content_file)
+
+  def _MoveToBlobFile(self, path, blob_key):
+    """Moves a file to become the file of a blob, replacing any existing one."""
+    self._MakeDirectories(self._DirectoryForBlob(blob_key))
+    blob_file = self._FileForBlob(blob_key)
+    self._RemoveFile(blob_file)
+    os.rename(path, blob_file)
 
+  def CopyBlob(self, source_blob_key, blob_key):
+    """Stores the contents of an existing blob under another blob key.
 
-      while True:
-        block = blob_stream.read(1 << 20)
-        if not block:
-          break
-        output.write(block)
-    finally:
-      output.close()
+    Args:
+      source_blob_key: The blob key of the existing blob to copy.
+      blob_key: The blob key to store the copy under.
+    """
+    source_file = self._FileForBlob(source_blob_key)
+    if (os.path.abspath(source_file) ==
+        os.path.abspath(self._FileForBlob(blob_key))):
+      return
+    if not self._LinkBlob(source_file, blob_key):
+      super(FileBlobStorage, self).CopyBlob(source_blob_key, blob_key)
 
   def OpenBlob(self, blob_key):
     """Opens a blob file for streaming.
@@ -160,8 +303,66 @@ class FileBlobStorage(blobstore_stub.BlobStorage):
     Args:
       blob_key: The blob key of an existing blob that you want to delete.
     """
+    self._RemoveFile(self._FileForBlob(blob_key))
+
+  def Scrub(self, verify=False, min_age_seconds=60):
+    """Removes unreferenced content and optionally checks the rest.
+
+    Content files that no blob file links to any more, and temporary files
+    left behind by interrupted writes, are deleted, and so are the content
+    directories that this leaves empty. This is safe to run in a
+    background thread while blobs are being stored: files modified less than
+    min_age_seconds ago are left alone since they may be about to be linked.
+
+    Args:
+      verify: If True then the contents of every remaining content file are
+          checked against its digest. Corrupt files are reported but not
+          removed since blobs still link to them.
+      min_age_seconds: Files modified more recently than this are kept.
+
+    Returns:
+      A ScrubResult.
+    """
+    files_checked = files_removed = bytes_removed = 0
+    corrupt_files = []
+    cutoff = time.time() - min_age_seconds
+    for directory, _, filenames in os.walk(self._content_directory,
+                                           topdown=False):
+      for filename in filenames:
+        path = os.path.join(directory, filename)
+        try:
+          st = os.stat(path)
+        except OSError, e:
+          if e.errno == errno.ENOENT:
+            continue
+          raise
+        files_checked += 1
+        if st.st_mtime < cutoff and (
+            filename.endswith(_TEMP_SUFFIX) or st.st_nlink <= 1):
+          self._RemoveFile(path)
+          files_removed += 1
+          bytes_removed += st.st_size
+        elif verify and not filename.endswith(_TEMP_SUFFIX):
+          digest = hashlib.sha1()
+          with _local_open(path, 'rb') as content:
+            while True:
+              block = content.read(_BLOCK_SIZE)
+              if not block:
+                break
+              digest.update(block)
+          if digest.hexdigest() != filename:
+            logging.error('Blob content %r does not match its digest', path)
+            corrupt_files.append(path)
+      if directory != self._content_directory:
+        self._RemoveEmptyDirectory(directory)
+    return ScrubResult(files_checked, files_removed, bytes_removed,
+                       corrupt_files)
+
+  @staticmethod
+  def _RemoveEmptyDirectory(directory):
+    """Removes a directory if it is empty."""
     try:
-      os.remove(self._FileForBlob(blob_key))
+      os.rmdir(directory)
     except OSError, e:
-      if e.errno != errno.ENOENT:
-        raise e
+      if e.errno not in (errno.ENOENT, errno.ENOTEMPTY, errno.EEXIST):
+        raise
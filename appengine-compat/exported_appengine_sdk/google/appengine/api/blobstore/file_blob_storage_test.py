@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.api.blobstore.file_blob_storage."""
+
+import errno
+import hashlib
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import mock
+
+from google.appengine.api.blobstore import file_blob_storage
+
+
+class FileBlobStorageTest(unittest.TestCase):
+  """Tests for the content-addressed FileBlobStorage."""
+
+  def setUp(self):
+    self.storage_directory = tempfile.mkdtemp()
+    self.storage = file_blob_storage.FileBlobStorage(self.storage_directory,
+                                                     'myapp')
+    self.content_directory = os.path.join(self.storage_directory, '.content')
+
+  def tearDown(self):
+    shutil.rmtree(self.storage_directory)
+
+  def Store(self, blob_key, content):
+    self.storage.StoreBlob(blob_key, StringIO.StringIO(content))
+
+  def Read(self, blob_key):
+    with self.storage.OpenBlob(blob_key) as blob:
+      return blob.read()
+
+  def Inode(self, blob_key):
+    return os.stat(self.storage._FileForBlob(blob_key)).st_ino
+
+  def ContentFiles(self):
+    return sorted(filename for _, _, filenames in
+                  os.walk(self.content_directory) for filename in filenames)
+
+  def Scrub(self, **kwargs):
+    return self.storage.Scrub(min_age_seconds=-1, **kwargs)
+
+  def testStoreAndOpen(self):
+    self.Store('blob1', 'content')
+    self.assertEqual('content', self.Read('blob1'))
+    self.assertEqual([hashlib.sha1('content').hexdigest()],
+                     self.ContentFiles())
+
+  def testLargeBlob(self):
+    content = os.urandom(3 * file_blob_storage._BLOCK_SIZE + 5)
+    self.Store('blob1', content)
+    self.assertEqual(content, self.Read('blob1'))
+
+  def testIdenticalContentStoredOnce(self):
+    self.Store('blob1', 'content')
+    self.Store('blob2', 'content')
+    self.Store('blob3', 'other')
+    self.assertEqual(self.Inode('blob1'), self.Inode('blob2'))
+    self.assertNotEqual(self.Inode('blob1'), self.Inode('blob3'))
+    self.assertEqual(2, len(self.ContentFiles()))
+
+  def testOverwrite(self):
+    self.Store('blob1', 'old')
+    self.Store('blob2', 'old')
+    self.Store('blob1', 'new')
+    self.assertEqual('new', self.Read('blob1'))
+    self.assertEqual('old', self.Read('blob2'))
+    self.storage.DeleteBlob('blob2')
+    result = self.Scrub()
+    self.assertEqual((2, 1, 3, []), result)
+    self.assertEqual([hashlib.sha1('new').hexdigest()], self.ContentFiles())
+
+  def testCopyBlob(self):
+    self.Store('blob1', 'content')
+    self.storage.CopyBlob('blob1', 'blob2')
+    self.assertEqual('content', self.Read('blob2'))
+    self.assertEqual(self.Inode('blob1'), self.Inode('blob2'))
+    self.storage.CopyBlob('blob1', 'blob1')
+    self.assertEqual('content', self.Read('blob1'))
+    self.assertEqual(1, len(self.ContentFiles()))
+
+  def testDeleteSharedContent(self):
+    self.Store('blob1', 'content')
+    self.Store('blob2', 'content')
+    self.storage.DeleteBlob('blob1')
+    self.assertEqual(0, self.Scrub().files_removed)
+    self.assertEqual('content', self.Read('blob2'))
+    self.storage.DeleteBlob('blob2')
+    self.storage.DeleteBlob('unknown')
+    self.assertEqual(1, self.Scrub().files_removed)
+    self.assertEqual([], self.ContentFiles())
+    # The emptied shard directories are removed too.
+    self.assertEqual([], os.listdir(self.content_directory))
+
+  def testLinkFails(self):
+    with mock.patch.object(os, 'link',
+                           side_effect=OSError(errno.EXDEV, 'cross-device')):
+      self.Store('blob1', 'content')
+      self.Store('blob2', 'content')
+      self.storage.CopyBlob('blob1', 'blob3')
+    for blob_key in ('blob1', 'blob2', 'blob3'):
+      self.assertEqual('content', self.Read(blob_key))
+      self.assertEqual(
+          1, os.stat(self.storage._FileForBlob(blob_key)).st_nlink)
+    self.assertEqual((1, 1, 7, []), self.Scrub())
+    self.assertEqual('content', self.Read('blob2'))
+
+  def testLinkFailsWithOtherError(self):
+    with mock.patch.object(os, 'link',
+                           side_effect=OSError(errno.EACCES, 'denied')):
+      self.assertRaises(OSError, self.Store, 'blob1', 'content')
+    self.assertRaises(IOError, self.Read, 'blob1')
+    self.assertEqual(1, self.Scrub().files_removed)
+
+  def testNoHardLinks(self):
+    with mock.patch.object(file_blob_storage, 'os', wraps=os) as mock_os:
+      del mock_os.link
+      self.Store('blob1', 'content')
+      self.storage.CopyBlob('blob1', 'blob2')
+    self.assertEqual('content', self.Read('blob1'))
+    self.assertEqual('content', self.Read('blob2'))
+    self.assertEqual([], self.ContentFiles())
+
+  def testScrubKeepsRecentFiles(self):
+    self.Store('blob1', 'content')
+    self.storage.DeleteBlob('blob1')
+    self.assertEqual(0, self.storage.Scrub().files_removed)
+    self.assertEqual(1, self.Scrub().files_removed)
+
+  def testScrubRemovesTemporaryFiles(self):
+    self.Store('blob1', 'content')
+    with open(os.path.join(self.content_directory, 'x.tmp'), 'w') as f:
+      f.write('partial')
+    self.assertEqual((2, 1, 7, []), self.Scrub())
+    self.assertEqual('content', self.Read('blob1'))
+
+  def testScrubVerify(self):
+    self.Store('blob1', 'content')
+    self.Store('blob2', 'other')
+    self.assertEqual([], self.Scrub(verify=True).corrupt_files)
+    with open(self.storage._FileForBlob('blob2'), 'r+b') as f:
+      f.write('OTHER')
+    content_file = self.storage._FileForContent(
+        hashlib.sha1('other').hexdigest())
+    self.assertEqual([content_file], self.Scrub(verify=True).corrupt_files)
+    # Corrupt content is reported, not removed.
+    self.assertEqual([], self.Scrub().corrupt_files)
+    self.assertEqual('OTHER', self.Read('blob2'))
+
+  def testStoreAfterScrubRemovedDirectory(self):
+    self.Store('blob1', 'content')
+    self.storage.DeleteBlob('blob1')
+    self.Scrub()
+    rename = os.rename
+    # Recent files are kept, but empty directories are not.
+    scrub = self.storage.Scrub
+
+    def RenameAfterScrub(source, destination):
+      # Scrub runs between creating the directory and the rename.
+      if destination.startswith(self.content_directory):
+        os.rename = rename
+        scrub()
+      rename(source, destination)
+
+    with mock.patch.object(os, 'rename', side_effect=RenameAfterScrub):
+      self.Store('blob1', 'content')
+    self.assertEqual('content', self.Read('blob1'))
+
+
+if __name__ == '__main__':
+  unittest.main()
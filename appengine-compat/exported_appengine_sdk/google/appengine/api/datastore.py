@@ -1144,19 +1144,10 @@ class Entity(dict):
         assert last_path.name()
 
 
-    unindexed_properties = [unicode(p.name(), 'utf-8')
-                            for p in pb.raw_property_list()]
-
-
-    if pb.key().has_name_space():
-      namespace = pb.key().name_space()
-    else:
-      namespace = ''
-    e = Entity(unicode(last_path.type(), 'utf-8'),
-               unindexed_properties=unindexed_properties,
-               _app=pb.key().app(), namespace=namespace)
-    ref = e.__key._Key__reference
-    ref.CopyFrom(pb.key())
+    e = Entity.__new__(Entity)
+    e.__key = Key._FromPb(pb.key())
+    e.__unindexed_properties = frozenset(
+        unicode(p.name(), 'utf-8') for p in pb.raw_property_list())
 
 
 
@@ -1191,14 +1182,7 @@ class Entity(dict):
 
 
     for name, value in temporary_values.iteritems():
-      decoded_name = unicode(name, 'utf-8')
-
-
-
-
-      datastore_types.ValidateReadProperty(decoded_name, value)
-
-      dict.__setitem__(e, decoded_name, value)
+      dict.__setitem__(e, unicode(name, 'utf-8'), value)
 
     return e
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.api.datastore."""
+
+import copy
+import cPickle
+import datetime
+import os
+import pickle
+import unittest
+
+import mock
+
+from google.appengine.api import datastore
+from google.appengine.api import datastore_errors
+from google.appengine.api import datastore_types
+from google.appengine.datastore import entity_pb
+
+APP_ID = 'datastore-test-app'
+
+
+class EntityFromPbTest(unittest.TestCase):
+  """Tests for Entity._FromPb, which does not go through Entity.__init__."""
+
+  def MakeEntity(self, **kwds):
+    """Returns an entity made through the constructor, and its protobuf."""
+    parent = datastore_types.Key.from_path('Parent', 'p', _app=APP_ID,
+                                           namespace=kwds.get('namespace'))
+    entity = datastore.Entity('Kind', parent=parent, _app=APP_ID, id=42,
+                              unindexed_properties=['text', 'blob'], **kwds)
+    entity['name'] = u'n\xe4me'
+    entity['count'] = 7
+    entity['tags'] = [u'a', u'b', u'c']
+    entity['when'] = datetime.datetime(2015, 1, 2, 3, 4, 5)
+    entity['text'] = datastore_types.Text(u'long text')
+    entity['blob'] = datastore_types.Blob('\x00\xff')
+    entity['ref'] = datastore_types.Key.from_path('Other', 1, _app=APP_ID)
+    entity['empty'] = []
+    return entity, entity.ToPb()
+
+  def CheckSame(self, expected, actual):
+    self.assertEqual(expected.key(), actual.key())
+    self.assertEqual(dict(expected), dict(actual))
+    self.assertEqual(set(expected.unindexed_properties()),
+                     set(actual.unindexed_properties()))
+    self.assertEqual(expected.is_projection(), actual.is_projection())
+    self.assertEqual(expected.ToPb(), actual.ToPb())
+
+  def testSameAsConstructor(self):
+    entity, pb = self.MakeEntity()
+    loaded = datastore.Entity._FromPb(pb)
+    self.CheckSame(entity, loaded)
+    self.assertEqual(APP_ID, loaded.app())
+    self.assertEqual('Kind', loaded.kind())
+    self.assertEqual('', loaded.namespace())
+    self.assertTrue(loaded.is_saved())
+    self.assertFalse(loaded.is_projection())
+    # The property names are unicode, as those set through the constructor.
+    for name in loaded:
+      self.assertIsInstance(name, unicode)
+    self.assertEqual(entity.parent(), loaded.parent())
+
+  def testNamespace(self):
+    entity, pb = self.MakeEntity(namespace='ns')
+    loaded = datastore.Entity._FromPb(pb)
+    self.CheckSame(entity, loaded)
+    self.assertEqual('ns', loaded.namespace())
+    self.assertEqual('ns', loaded.key().namespace())
+
+  def testUnindexedProperties(self):
+    _, pb = self.MakeEntity()
+    loaded = datastore.Entity._FromPb(pb)
+    self.assertEqual(frozenset([u'text', u'blob']),
+                     loaded.unindexed_properties())
+    for name in loaded.unindexed_properties():
+      self.assertIsInstance(name, unicode)
+    self.assertEqual(set(['text', 'blob']),
+                     set(p.name() for p in loaded.ToPb().raw_property_list()))
+
+  def testProjection(self):
+    _, pb = self.MakeEntity()
+    for prop in pb.property_list():
+      if prop.name() == 'count':
+        prop.set_meaning(entity_pb.Property.INDEX_VALUE)
+    loaded = datastore.Entity._FromPb(pb)
+    self.assertTrue(loaded.is_projection())
+    # Only the entity the meaning was found on is a projection.
+    _, pb = self.MakeEntity()
+    self.assertFalse(datastore.Entity._FromPb(pb).is_projection())
+    self.assertFalse(datastore.Entity.__dict__['_Entity__projection'])
+
+  def testKeyDoesNotSharePb(self):
+    _, pb = self.MakeEntity()
+    loaded = datastore.Entity._FromPb(pb)
+    key = loaded.key()
+    pb.mutable_key().mutable_path().mutable_element(1).set_id(99)
+    pb.mutable_key().set_app('other-app')
+    self.assertEqual(42, loaded.key().id())
+    self.assertEqual(APP_ID, loaded.key().app())
+    self.assertEqual(key, loaded.key())
+
+  def testPickle(self):
+    entity, pb = self.MakeEntity(namespace='ns')
+    loaded = datastore.Entity._FromPb(pb)
+    for dumps, loads in ((pickle.dumps, pickle.loads),
+                         (cPickle.dumps, cPickle.loads)):
+      for protocol in (0, 1, 2):
+        unpickled = loads(dumps(loaded, protocol))
+        self.CheckSame(entity, unpickled)
+        self.assertEqual('ns', unpickled.namespace())
+
+  def testDeepCopy(self):
+    entity, pb = self.MakeEntity()
+    loaded = datastore.Entity._FromPb(pb)
+    copied = copy.deepcopy(loaded)
+    self.CheckSame(entity, copied)
+    copied['tags'].append(u'd')
+    self.assertEqual([u'a', u'b', u'c'], loaded['tags'])
+
+  def testMissingKey(self):
+    with mock.patch.dict(os.environ, {'APPLICATION_ID': APP_ID}):
+      pb = entity_pb.EntityProto()
+      pb.mutable_entity_group()
+      self.assertRaises(AssertionError, datastore.Entity._FromPb, pb)
+      pb = entity_pb.EntityProto()
+      pb.mutable_entity_group()
+      loaded = datastore.Entity._FromPb(pb, require_valid_key=False,
+                                        default_kind='Default')
+    self.assertEqual('Default', loaded.kind())
+    self.assertEqual(APP_ID, loaded.app())
+    self.assertFalse(loaded.is_saved())
+
+  def testFromPbString(self):
+    entity, pb = self.MakeEntity()
+    self.CheckSame(entity, datastore.Entity.FromPb(pb.Encode()))
+
+  def testCorruptProperty(self):
+    _, pb = self.MakeEntity()
+    prop = pb.add_property()
+    prop.set_name('count')
+    prop.set_multiple(False)
+    prop.mutable_value().set_int64value(8)
+    self.assertRaises(datastore_errors.Error, datastore.Entity._FromPb, pb)
+
+
+if __name__ == '__main__':
+  unittest.main()
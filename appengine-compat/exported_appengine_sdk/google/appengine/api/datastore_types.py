@@ -95,6 +95,12 @@ _MAX_RAW_PROPERTY_BYTES = 1048487
 
 
 
+_MAX_INTERNED_KEYS = 1000
+_interned_keys = {}
+
+
+
+
 
 
 
@@ -333,9 +339,11 @@ class Key(object):
   datastore with Get().
 
   Key implements __hash__, and key instances are immutable, so Keys may be
-  used in sets and as dictionary keys.
+  used in sets and as dictionary keys. Complete keys cache their hash and
+  path, and keys decoded from recently seen strings share the decoded
+  reference instead of parsing it again.
   """
-  __reference = None
+  __slots__ = ('__reference', '__path', '__hash', '_str')
 
   def __init__(self, encoded=None):
     """Constructor. Creates a Key from a string.
@@ -345,6 +353,8 @@ class Key(object):
       encoded: str
     """
     self._str = None
+    self.__path = None
+    self.__hash = None
     if encoded is not None:
       if not isinstance(encoded, basestring):
         try:
@@ -367,11 +377,19 @@ class Key(object):
 
 
         self._str = str(encoded)
+        interned = _interned_keys.get(self._str)
+        if interned is not None:
+          self.__reference = interned.__reference
+          self.__path = interned.__path
+          self.__hash = interned.__hash
+          self._str = interned._str
+          return
         encoded_pb = base64.urlsafe_b64decode(self._str)
         self.__reference = entity_pb.Reference(encoded_pb)
         assert self.__reference.IsInitialized()
 
 
+        padded = self._str
         self._str = self._str.rstrip('=')
 
       except (AssertionError, TypeError), e:
@@ -387,10 +405,34 @@ class Key(object):
           raise datastore_errors.BadKeyError('Invalid string key %s.' % encoded)
         else:
           raise
+      self.__Intern(padded)
     else:
 
       self.__reference = entity_pb.Reference()
 
+  def __Intern(self, encoded):
+    """Adds this key to the table of keys decoded from strings.
+
+    Keys sharing a reference must never modify it, so only complete keys,
+    which are never completed in place by a put, are added.
+
+    Args:
+      encoded: the padded string this key was decoded from.
+    """
+    if _MAX_INTERNED_KEYS and self.has_id_or_name():
+      if len(_interned_keys) >= _MAX_INTERNED_KEYS:
+        _interned_keys.clear()
+      _interned_keys[encoded] = self
+
+  def __getstate__(self):
+    return {'_Key__reference': self.__reference, '_str': self._str}
+
+  def __setstate__(self, state):
+    self.__reference = state['_Key__reference']
+    self._str = state.get('_str')
+    self.__path = None
+    self.__hash = None
+
   def to_path(self, _default_id=None, _decode=True, _fail=True):
     """Construct the "path" of this key as a list.
 
@@ -756,19 +798,10 @@ class Key(object):
     """
     if not isinstance(other, Key):
       return -2
+    if self is other:
+      return 0
 
-    self_args = [self.__reference.app(), self.__reference.name_space()]
-    self_args += self.to_path(_default_id=0, _decode=False)
-
-    other_args = [other.__reference.app(), other.__reference.name_space()]
-    other_args += other.to_path(_default_id=0, _decode=False)
-
-    for self_component, other_component in zip(self_args, other_args):
-      comparison = cmp(self_component, other_component)
-      if comparison != 0:
-        return comparison
-
-    return cmp(len(self_args), len(other_args))
+    return cmp(self.__GetPath(), other.__GetPath())
 
   def __hash__(self):
     """Returns an integer hash of this key.
@@ -779,9 +812,36 @@ class Key(object):
     Returns:
       int
     """
-    args = self.to_path(_default_id=0, _fail=False)
-    args.append(self.__reference.app())
-    return hash(type(args)) ^ hash(tuple(args))
+    if self.__hash is not None:
+      return self.__hash
+    result = hash(self.__GetPath())
+    if self.__path is not None:
+      self.__hash = result
+    return result
+
+  def __GetPath(self):
+    """Returns the app, namespace and path of this key as a tuple.
+
+    Names and kinds are left encoded, and incomplete path elements have an id
+    of 0. The tuple is cached for complete keys; incomplete keys are not
+    cached, as a put completes them in place.
+    """
+    if self.__path is not None:
+      return self.__path
+    ref = self.__reference
+    path = [ref.app(), ref.name_space()]
+    for path_element in ref.path().element_list():
+      path.append(path_element.type())
+      if path_element.has_name():
+        path.append(path_element.name())
+      elif path_element.has_id():
+        path.append(path_element.id())
+      else:
+        path.append(0)
+    path = tuple(path)
+    if self.has_id_or_name():
+      self.__path = path
+    return path
 
 
 class _OverflowDateTime(long):
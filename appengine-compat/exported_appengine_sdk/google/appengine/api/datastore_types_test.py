@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.api.datastore_types.Key."""
+
+import base64
+import copy
+import cPickle
+import pickle
+import unittest
+
+import mock
+
+from google.appengine.api import datastore
+from google.appengine.api import datastore_types
+from google.appengine.ext import testbed
+
+Key = datastore_types.Key
+
+APP_ID = 'app'
+
+# str() of the key the pickles below were made from.
+OLD_ENCODED = 'agNhcHByGAsSBlBhcmVudCIBcAwLEgVDaGlsZBgqDKIBAm5z'
+
+# Key.from_path('Parent', 'p', 'Child', 42, _app='app', namespace='ns'),
+# pickled with protocols 0 to 2 by the Key class from before it declared
+# __slots__, after str() had been called on it.
+OLD_PICKLES = [
+    'ccopy_reg\n_reconstructor\np0\n(cgoogle.appengine.api.datastore_types\n'
+    'Key\np1\nc__builtin__\nobject\np2\nNtp3\nRp4\n(dp5\nS\'_Key__reference\''
+    '\np6\n(igoogle.appengine.datastore.entity_pb\nReference\np7\n'
+    'S\'j\\x03appr\\x18\\x0b\\x12\\x06Parent"\\x01p\\x0c\\x0b\\x12\\x05Child'
+    '\\x18*\\x0c\\xa2\\x01\\x02ns\'\np9\nbsS\'_str\'\np10\n'
+    'S\'agNhcHByGAsSBlBhcmVudCIBcAwLEgVDaGlsZBgqDKIBAm5z\'\np11\nsb.',
+    'ccopy_reg\n_reconstructor\nq\x00(cgoogle.appengine.api.datastore_types\n'
+    'Key\nq\x01c__builtin__\nobject\nq\x02Ntq\x03Rq\x04}q\x05(U\x0f'
+    '_Key__referenceq\x06(cgoogle.appengine.datastore.entity_pb\nReference\n'
+    'q\x07oq\x08U$j\x03appr\x18\x0b\x12\x06Parent"\x01p\x0c\x0b\x12\x05Child'
+    '\x18*\x0c\xa2\x01\x02nsq\nbU\x04_strq\x0bU0'
+    'agNhcHByGAsSBlBhcmVudCIBcAwLEgVDaGlsZBgqDKIBAm5zq\x0cub.',
+    '\x80\x02cgoogle.appengine.api.datastore_types\nKey\nq\x00)\x81q\x01}q'
+    '\x02(U\x0f_Key__referenceq\x03(cgoogle.appengine.datastore.entity_pb\n'
+    'Reference\nq\x04oq\x05U$j\x03appr\x18\x0b\x12\x06Parent"\x01p\x0c\x0b'
+    '\x12\x05Child\x18*\x0c\xa2\x01\x02nsq\x07bU\x04_strq\x08U0'
+    'agNhcHByGAsSBlBhcmVudCIBcAwLEgVDaGlsZBgqDKIBAm5zq\tub.',
+]
+
+# Key.from_path('Kind', 'n', _app='app'), pickled with protocol 2 by the old
+# Key class before str() was called on it.
+OLD_PICKLE_WITHOUT_STR = (
+    '\x80\x02cgoogle.appengine.api.datastore_types\nKey\nq\x00)\x81q\x01}q'
+    '\x02(U\x0f_Key__referenceq\x03(cgoogle.appengine.datastore.entity_pb\n'
+    'Reference\nq\x04oq\x05U\x12j\x03appr\x0b\x0b\x12\x04Kind"\x01n\x0cq\x07'
+    'bU\x04_strq\x08Nub.')
+
+
+class KeyTestBase(unittest.TestCase):
+
+  def setUp(self):
+    self.interned_patch = mock.patch.dict(datastore_types._interned_keys,
+                                          clear=True)
+    self.interned_patch.start()
+
+  def tearDown(self):
+    self.interned_patch.stop()
+
+
+class KeyPickleTest(KeyTestBase):
+  """Tests that pickles of keys stay compatible across runtimes."""
+
+  def testOldPickles(self):
+    expected = Key.from_path('Parent', 'p', 'Child', 42, _app=APP_ID,
+                             namespace='ns')
+    for protocol, data in enumerate(OLD_PICKLES):
+      for loads in (pickle.loads, cPickle.loads):
+        key = loads(data)
+        self.assertEqual(expected, key, protocol)
+        self.assertEqual(hash(expected), hash(key), protocol)
+        self.assertEqual(OLD_ENCODED, str(key))
+        self.assertEqual(['Parent', 'p', 'Child', 42], key.to_path())
+        self.assertEqual('ns', key.namespace())
+
+  def testOldPickleWithoutStr(self):
+    key = pickle.loads(OLD_PICKLE_WITHOUT_STR)
+    expected = Key.from_path('Kind', 'n', _app=APP_ID)
+    self.assertEqual(expected, key)
+    self.assertEqual(str(expected), str(key))
+    self.assertEqual(hash(expected), hash(key))
+
+  def testRoundTrip(self):
+    key = Key.from_path('Parent', 'p', 'Child', 42, _app=APP_ID)
+    hash(key)
+    for protocol in (0, 1, 2):
+      for dumps, loads in ((pickle.dumps, pickle.loads),
+                           (cPickle.dumps, cPickle.loads)):
+        loaded = loads(dumps(key, protocol))
+        self.assertEqual(key, loaded)
+        self.assertEqual(hash(key), hash(loaded))
+        self.assertEqual(str(key), str(loaded))
+
+  def testState(self):
+    # Older runtimes restore a key by updating its __dict__ with the state.
+    key = Key(OLD_ENCODED)
+    state = key.__getstate__()
+    self.assertEqual(set(['_Key__reference', '_str']), set(state))
+    self.assertEqual(OLD_ENCODED, state['_str'])
+
+  def testDeepCopy(self):
+    key = Key.from_path('Kind', 1, _app=APP_ID)
+    copied = copy.deepcopy(key)
+    self.assertEqual(key, copied)
+    self.assertIsNot(key._Key__reference, copied._Key__reference)
+
+  def testSlots(self):
+    key = Key.from_path('Kind', 1, _app=APP_ID)
+    self.assertFalse(hasattr(key, '__dict__'))
+    self.assertRaises(AttributeError, setattr, key, 'extra', 1)
+
+
+class KeyHashTest(KeyTestBase):
+  """Tests for the cached hash and path of keys."""
+
+  def testEqualKeys(self):
+    a = Key.from_path('Parent', 'p', 'Child', 42, _app=APP_ID)
+    b = Key.from_path('Parent', 'p', 'Child', 42, _app=APP_ID)
+    self.assertEqual(a, b)
+    self.assertEqual(hash(a), hash(b))
+    self.assertEqual(a, Key(str(b)))
+    self.assertEqual(1, len(set([a, b, Key(str(a))])))
+    self.assertEqual(0, cmp(a, a))
+
+  def testDifferentKeys(self):
+    base = Key.from_path('Kind', 1, _app=APP_ID)
+    others = [
+        Key.from_path('Kind', 2, _app=APP_ID),
+        Key.from_path('Kind', '1', _app=APP_ID),
+        Key.from_path('Other', 1, _app=APP_ID),
+        Key.from_path('Kind', 1, _app='other'),
+        Key.from_path('Kind', 1, _app=APP_ID, namespace='ns'),
+        Key.from_path('Parent', 1, 'Kind', 1, _app=APP_ID),
+    ]
+    for other in others:
+      self.assertNotEqual(base, other)
+    self.assertEqual(len(others) + 1, len(set(others + [base])))
+
+  def testOrdering(self):
+    keys = [Key.from_path('Kind', 2, _app=APP_ID),
+            Key.from_path('Kind', 1, _app=APP_ID),
+            Key.from_path('Kind', 1, 'Child', 'a', _app=APP_ID),
+            Key.from_path('A', 'b', _app=APP_ID)]
+    self.assertEqual([keys[3], keys[1], keys[2], keys[0]], sorted(keys))
+
+  def testIncompleteKeyCompletedInPlace(self):
+    tb = testbed.Testbed()
+    tb.activate()
+    tb.setup_env(app_id=APP_ID, overwrite=True)
+    tb.init_datastore_v3_stub()
+    try:
+      entity = datastore.Entity('Kind')
+      key = entity.key()
+      incomplete_hash = hash(key)
+      self.assertEqual(incomplete_hash, hash(entity.key()))
+      self.assertEqual(Key.from_path('Kind', 0, _app=APP_ID), key)
+
+      datastore.Put(entity)
+      # The key object was completed by the put, not replaced.
+      self.assertIs(key, entity.key())
+      self.assertTrue(key.has_id_or_name())
+      complete = Key.from_path('Kind', key.id(), _app=APP_ID)
+      self.assertEqual(complete, key)
+      self.assertEqual(hash(complete), hash(key))
+      self.assertIn(key, set([complete]))
+      self.assertEqual(entity, datastore.Get(complete))
+    finally:
+      tb.deactivate()
+
+
+class KeyInternTest(KeyTestBase):
+  """Tests for the table of keys decoded from strings."""
+
+  def testSharedReference(self):
+    encoded = str(Key.from_path('Parent', 'p', 'Child', 42, _app=APP_ID))
+    a = Key(encoded)
+    b = Key(encoded)
+    self.assertIsNot(a, b)
+    self.assertIs(a._Key__reference, b._Key__reference)
+    self.assertEqual(a, b)
+    self.assertEqual(hash(a), hash(b))
+    self.assertEqual(encoded, str(b))
+    # Padding does not create a separate entry.
+    c = Key(encoded + '=' * (-len(encoded) % 4))
+    self.assertIs(a._Key__reference, c._Key__reference)
+    self.assertEqual(1, len(datastore_types._interned_keys))
+
+  def testIncompleteKeysAreNotInterned(self):
+    # str() refuses incomplete keys, but Key() still decodes them.
+    encoded = base64.urlsafe_b64encode(
+        Key.from_path('Kind', 0, _app=APP_ID)._ToPb().Encode())
+    a = Key(encoded)
+    b = Key(encoded)
+    self.assertIsNot(a._Key__reference, b._Key__reference)
+    self.assertEqual({}, datastore_types._interned_keys)
+
+  def testTableIsBounded(self):
+    with mock.patch.object(datastore_types, '_MAX_INTERNED_KEYS', 3):
+      for i in xrange(1, 8):
+        Key(str(Key.from_path('Kind', i, _app=APP_ID)))
+        self.assertLessEqual(len(datastore_types._interned_keys), 3)
+
+  def testDisabled(self):
+    encoded = str(Key.from_path('Kind', 1, _app=APP_ID))
+    with mock.patch.object(datastore_types, '_MAX_INTERNED_KEYS', 0):
+      a = Key(encoded)
+      b = Key(encoded)
+    self.assertIsNot(a._Key__reference, b._Key__reference)
+    self.assertEqual(a, b)
+    self.assertEqual(hash(a), hash(b))
+    self.assertEqual({}, datastore_types._interned_keys)
+
+  def testInvalidString(self):
+    self.assertRaises(datastore_types.datastore_errors.BadKeyError, Key, 'a')
+    self.assertRaises(datastore_types.datastore_errors.BadArgumentError,
+                      Key, 42)
+    self.assertEqual({}, datastore_types._interned_keys)
+
+
+if __name__ == '__main__':
+  unittest.main()
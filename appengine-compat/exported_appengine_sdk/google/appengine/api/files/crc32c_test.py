@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.api.files.crc32c."""
+
+import array
+import imp
+import os
+import random
+import sys
+import types
+import unittest
+
+import mock
+
+from google.appengine.api.files import crc32c
+
+_LENGTHS = range(41) + [63, 64, 65, 1000, crc32c._CHUNK_SIZE - 1,
+                        crc32c._CHUNK_SIZE, 2 * crc32c._CHUNK_SIZE + 3]
+
+
+def _ReferenceCrcUpdate(crc, data):
+  """The byte at a time table-driven implementation the module started as."""
+  crc ^= crc32c._MASK
+  for b in array.array('B', data):
+    crc = (crc32c.CRC_TABLE[(crc ^ b) & 0xff] ^ (crc >> 8)) & crc32c._MASK
+  return crc ^ crc32c._MASK
+
+
+def _LoadCrc32cExtension():
+  """Returns the crc32c extension module, or None if it is not installed.
+
+  When the tests are run from this directory, crc32c.py hides the extension.
+  """
+  here = os.path.dirname(os.path.abspath(crc32c.__file__))
+  path = [p for p in sys.path if os.path.abspath(p or os.curdir) != here]
+  try:
+    f, pathname, description = imp.find_module('crc32c', path)
+  except ImportError:
+    return None
+  saved = sys.modules.pop('crc32c', None)
+  try:
+    return imp.load_module('crc32c', f, pathname, description)
+  except ImportError:
+    return None
+  finally:
+    if f:
+      f.close()
+    if saved is not None:
+      sys.modules['crc32c'] = saved
+    else:
+      sys.modules.pop('crc32c', None)
+
+
+def _HasCrcmodExtension():
+  try:
+    import crcmod.crcmod
+  except ImportError:
+    return False
+  return crcmod.crcmod._usingExtension
+
+
+class Crc32cTest(unittest.TestCase):
+  """Tests each CRC-32C implementation against the reference one."""
+
+  @classmethod
+  def setUpClass(cls):
+    rand = random.Random(7)
+    cls.inputs = [''.join(chr(rand.randrange(256)) for _ in xrange(length))
+                  for length in _LENGTHS]
+    cls.extension = _LoadCrc32cExtension()
+
+  def Select(self, crc32c_module=None, crcmod_available=True):
+    modules = {'crc32c': crc32c_module}
+    if not crcmod_available:
+      modules.update(dict.fromkeys(
+          ['crcmod', 'crcmod.crcmod', 'crcmod.predefined']))
+    with mock.patch.dict(sys.modules, modules):
+      return crc32c._select_implementation()
+
+  def CheckImplementation(self, expected_name, implementation):
+    name, crc_update = implementation
+    self.assertEqual(expected_name, name)
+    with mock.patch.object(crc32c, '_crc_update', crc_update):
+      for data in self.inputs:
+        for initial in (crc32c.CRC_INIT, 0x12345678L, 0xffffffffL):
+          expected = _ReferenceCrcUpdate(initial, data)
+          self.assertEqual(expected, crc32c.crc_update(initial, data),
+                           (name, len(data), initial))
+        expected = crc32c.crc_finalize(_ReferenceCrcUpdate(0, data))
+        for value in (data, buffer(data), bytearray(data),
+                      array.array('B', data), [ord(c) for c in data]):
+          result = crc32c.crc(value)
+          self.assertEqual(expected, result, (name, type(value), len(data)))
+          self.assertIsInstance(result, long)
+        self.assertIsInstance(crc32c.crc_update(crc32c.CRC_INIT, data), long)
+
+        # Checksums can be computed piece by piece.
+        split = len(data) // 3
+        crc = crc32c.crc_update(crc32c.CRC_INIT, data[:split])
+        crc = crc32c.crc_update(crc, buffer(data, split))
+        self.assertEqual(expected, crc32c.crc_finalize(crc))
+
+  def testKnownValues(self):
+    # From rfc3720 section B.4.
+    self.assertEqual(0x8a9136aaL, crc32c.crc('\x00' * 32))
+    self.assertEqual(0x62a8ab43L, crc32c.crc('\xff' * 32))
+    self.assertEqual(0x46dd794eL, crc32c.crc(''.join(map(chr, range(32)))))
+    self.assertEqual(0xe3069283L, crc32c.crc('123456789'))
+
+  def testSlicingBy8(self):
+    self.CheckImplementation(
+        'slicing-by-8', self.Select(crcmod_available=False))
+
+  def testCrcmod(self):
+    if not _HasCrcmodExtension():
+      self.skipTest('crcmod C extension not installed')
+    self.CheckImplementation('crcmod', self.Select())
+
+  def testCrc32cHardware(self):
+    if self.extension is None or not self.extension.hardware_based:
+      self.skipTest('crc32c extension with SSE4.2 not available')
+    self.CheckImplementation('crc32c-sse4.2', self.Select(self.extension))
+
+  def testCrc32cSoftware(self):
+    if self.extension is None:
+      self.skipTest('crc32c extension not installed')
+    software = types.ModuleType('crc32c')
+    software.crc32c = self.extension.crc32c
+    software.hardware_based = False
+    # crcmod is preferred to a crc32c extension without SSE4.2.
+    if _HasCrcmodExtension():
+      self.assertEqual('crcmod', self.Select(software)[0])
+    self.CheckImplementation(
+        'crc32c', self.Select(software, crcmod_available=False))
+
+  def testSlicingTables(self):
+    self.assertEqual(list(crc32c.CRC_TABLE), list(crc32c._SLICING_TABLES[0]))
+    for table in crc32c._SLICING_TABLES:
+      self.assertEqual(256, len(table))
+      self.assertTrue(all(type(v) is int for v in table))
+
+
+if __name__ == '__main__':
+  unittest.main()
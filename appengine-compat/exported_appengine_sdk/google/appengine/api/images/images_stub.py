@@ -27,8 +27,12 @@
 
 import datetime
 import logging
+import math
+import multiprocessing
 import re
 import StringIO
+import sys
+import threading
 import time
 
 
@@ -106,6 +110,135 @@ _EXIF_TAGS = {
     41987: 'WhiteBalance'}
 
 
+def _DefaultBatchWorkers():
+  """Returns the default number of threads used by BatchTransform."""
+  try:
+    return multiprocessing.cpu_count()
+  except NotImplementedError:
+    return 1
+
+
+class _GeometryPipeline(object):
+  """Applies consecutive crops, flips and resizes of an image in one pass.
+
+  Crops and flips are not applied as they are requested. Instead they are
+  accumulated as a box in the coordinates of the source image and a pair of
+  flips, so any number of them cost a single crop and a single transpose. A
+  resize crops and resamples the source image once and the flips are then
+  applied to the resized image, which is usually much smaller. JPEG images
+  that are shrunk are decoded at a reduced scale, so the full-size image is
+  never held in memory. That is the only cap on memory: images in other
+  formats are decoded in full, and at most one cropped copy of them is made.
+
+  Flipping an image commutes with resampling it, so the result is the same as
+  applying each transform in turn.
+  """
+
+  def __init__(self, image):
+    """Constructor.
+
+    Args:
+      image: PIL.Image.Image to transform.
+    """
+    self._Reset(image)
+
+  def _Reset(self, image):
+    self._image = image
+    self._box = (0, 0) + image.size
+    self._flip_x = False
+    self._flip_y = False
+
+  @property
+  def size(self):
+    """The (width, height) of the image, as transformed so far."""
+    left, top, right, bottom = self._box
+    return right - left, bottom - top
+
+  def FlipHorizontal(self):
+    self._flip_x = not self._flip_x
+
+  def FlipVertical(self):
+    self._flip_y = not self._flip_y
+
+  def Crop(self, box):
+    """Crops the image.
+
+    Args:
+      box: tuple (left, top, right, bottom) of ints, the region to keep in the
+        coordinates of the image as transformed so far.
+    """
+    left, top, right, bottom = box
+    if right < left or bottom < top:
+      self._Reset(self.Flush().crop(box))
+      return
+    width, height = self.size
+    if self._flip_x:
+      left, right = width - right, width - left
+    if self._flip_y:
+      top, bottom = height - bottom, height - top
+    x, y = self._box[:2]
+    self._box = (x + left, y + top, x + right, y + bottom)
+
+  def _Draft(self, size):
+    """Configures a JPEG image to be decoded at the smallest useful scale.
+
+    Args:
+      size: tuple (width, height) that the image will be resized to.
+    """
+    image = self._image
+    if image.format != JPEG or len(getattr(image, 'tile', ())) != 1:
+      return
+    full_width, full_height = image.size
+    width, height = self.size
+    if not width or not height:
+      return
+    scale = max(float(size[0]) / width, float(size[1]) / height)
+    if scale >= 1:
+      return
+    image.draft(image.mode, (int(math.ceil(full_width * scale)),
+                             int(math.ceil(full_height * scale))))
+    draft_width, draft_height = image.size
+    if (draft_width, draft_height) != (full_width, full_height):
+      x_scale = float(draft_width) / full_width
+      y_scale = float(draft_height) / full_height
+      left, top, right, bottom = self._box
+      self._box = (int(round(left * x_scale)), int(round(top * y_scale)),
+                   int(round(right * x_scale)), int(round(bottom * y_scale)))
+
+  def Resize(self, size):
+    """Resamples the image.
+
+    Args:
+      size: tuple (width, height) of ints, the new size of the image.
+    """
+    self._Draft(size)
+    image = self._image
+    if self._box != (0, 0) + image.size:
+      image = image.crop(self._box)
+    new_image = image.resize(size, Image.ANTIALIAS)
+    self._image = new_image
+    self._box = (0, 0) + new_image.size
+    self.Flush()
+
+  def Flush(self):
+    """Applies the pending transforms.
+
+    Returns:
+      PIL.Image.Image with every transform performed on it.
+    """
+    image = self._image
+    if self._box != (0, 0) + image.size:
+      image = image.crop(self._box)
+    if self._flip_x and self._flip_y:
+      image = image.transpose(Image.ROTATE_180)
+    elif self._flip_x:
+      image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    elif self._flip_y:
+      image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    self._Reset(image)
+    return image
+
+
 def _ArgbToRgbaTuple(argb):
   """Convert from a single ARGB value to a tuple containing RGBA.
 
@@ -154,6 +287,8 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
 
   THREADSAFE = False
 
+  READ_ONLY_METHODS = frozenset(['Composite', 'Histogram', 'Transform'])
+
   def __init__(self, service_name='images', host_prefix=''):
     """Preloads PIL to load all modules in the unhardened environment.
 
@@ -219,6 +354,8 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
       y_offset = int(options.y_offset() + y_anchor * (height - source.size[1]))
       if source.mode == RGBA:
         canvas.paste(source, (x_offset, y_offset), source)
+      elif options.opacity() == 1:
+        canvas.paste(source, (x_offset, y_offset))
       else:
         alpha = options.opacity() * 255
         mask = Image.new('L', source.size, alpha)
@@ -303,6 +440,56 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
     response.mutable_image().set_content(response_value)
     response.set_source_metadata(source_metadata)
 
+  def BatchTransform(self, requests, max_workers=None):
+    """Performs several ImagesService::Transform requests concurrently.
+
+    PIL releases the global interpreter lock while it decodes, resamples and
+    encodes images, so the requests are spread over a pool of threads.
+
+    Args:
+      requests: list of ImagesTransformRequest, the images to transform.
+      max_workers: int, the maximum number of threads to use. Defaults to the
+        number of CPUs.
+
+    Returns:
+      list of ImagesTransformResponse, in the same order as requests.
+
+    Raises:
+      ApplicationError: A request failed. Every request is processed before the
+        error of the first failed request (in the order of requests) is
+        re-raised.
+    """
+    responses = [images_service_pb.ImagesTransformResponse()
+                 for _ in requests]
+    errors = [None] * len(requests)
+    pending = range(len(requests) - 1, -1, -1)
+    lock = threading.Lock()
+
+    def Work():
+      while True:
+        with lock:
+          if not pending:
+            return
+          index = pending.pop()
+        try:
+          self._Dynamic_Transform(requests[index], responses[index])
+        except Exception:
+          errors[index] = sys.exc_info()
+
+    num_workers = min(max_workers or _DefaultBatchWorkers(), len(requests))
+    workers = [threading.Thread(target=Work) for _ in xrange(num_workers - 1)]
+    for worker in workers:
+      worker.daemon = True
+      worker.start()
+    Work()
+    for worker in workers:
+      worker.join()
+
+    for error in errors:
+      if error:
+        raise error[0], error[1], error[2]
+    return responses
+
   def _Dynamic_GetUrlBase(self, request, response):
     self._blob_stub.GetUrlBase(request, response)
 
@@ -522,6 +709,27 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
     Returns:
       PIL.Image.Image with transforms performed on it.
 
+    Raises:
+      ApplicationError: The resize data given was bad.
+    """
+    new_size, crop_box = self._CalculateResize(image.size, transform)
+    new_image = image.resize(new_size, Image.ANTIALIAS)
+    if crop_box:
+      new_image = new_image.crop(crop_box)
+    return new_image
+
+  def _CalculateResize(self, size, transform):
+    """Calculate how to perform a resize transform.
+
+    Args:
+      size: tuple (width, height), the current dimensions of the image.
+      transform: images_service_pb.Transform to use when resizing.
+
+    Returns:
+      tuple (new_size, crop_box) where new_size is the (width, height) to
+      resample the image to and crop_box is the (left, top, right, bottom) box
+      to crop the resampled image to, or None.
+
     Raises:
       ApplicationError: The resize data given was bad.
     """
@@ -543,20 +751,20 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
     crop_to_fit = transform.crop_to_fit()
     allow_stretch = transform.allow_stretch()
 
-    current_width, current_height = image.size
+    current_width, current_height = size
     new_width, new_height = self._CalculateNewDimensions(
         current_width, current_height, width, height, crop_to_fit,
         allow_stretch)
-    new_image = image.resize((new_width, new_height), Image.ANTIALIAS)
+    crop_box = None
     if crop_to_fit and (new_width > width or new_height > height):
 
       left = int((new_width - width) * transform.crop_offset_x())
       top = int((new_height - height) * transform.crop_offset_y())
       right = left + width
       bottom = top + height
-      new_image = new_image.crop((left, top, right, bottom))
+      crop_box = (left, top, right, bottom)
 
-    return new_image
+    return (new_width, new_height), crop_box
 
   def _Rotate(self, image, transform):
     """Use PIL to rotate the given image with the given transform.
@@ -591,6 +799,21 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
     Returns:
       PIL.Image.Image with transforms performed on it.
 
+    Raises:
+      BadRequestError if the crop data given is bad.
+    """
+    return image.crop(self._CalculateCropBox(image.size, transform))
+
+  def _CalculateCropBox(self, size, transform):
+    """Calculate the region of an image kept by a crop transform.
+
+    Args:
+      size: tuple (width, height), the current dimensions of the image.
+      transform: images_service_pb.Transform to use when cropping.
+
+    Returns:
+      tuple (left, top, right, bottom) of ints, the region to keep.
+
     Raises:
       BadRequestError if the crop data given is bad.
     """
@@ -616,14 +839,12 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
       self._ValidateCropArg(bottom_y)
 
 
-    width, height = image.size
-
-    box = (int(round(left_x * width)),
-           int(round(top_y * height)),
-           int(round(right_x * width)),
-           int(round(bottom_y * height)))
+    width, height = size
 
-    return image.crop(box)
+    return (int(round(left_x * width)),
+            int(round(top_y * height)),
+            int(round(right_x * width)),
+            int(round(bottom_y * height)))
 
   @staticmethod
   def _GetExifFromImage(image):
@@ -749,7 +970,7 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
     Raises:
       ApplicationError: More than one of the same type of transform was present.
     """
-    new_image = image
+    pipeline = _GeometryPipeline(image)
     if len(transforms) > images.MAX_TRANSFORMS_PER_REQUEST:
       raise apiproxy_errors.ApplicationError(
           images_service_pb.ImagesServiceError.BAD_TRANSFORM_DATA)
@@ -764,7 +985,7 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
       else:
         orientation = exif[_EXIF_ORIENTATION_TAG]
 
-      width, height = new_image.size
+      width, height = image.size
       if height > width:
         orientation = 1
 
@@ -783,31 +1004,42 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
                transform.has_crop_bottom_y()) and
           not transform.has_horizontal_flip() and
           not transform.has_vertical_flip()):
-        new_image = self._CorrectOrientation(new_image, orientation)
+        pipeline = _GeometryPipeline(
+            self._CorrectOrientation(pipeline.Flush(), orientation))
         correct_orientation = False
 
       if transform.has_width() or transform.has_height():
 
-        new_image = self._Resize(new_image, transform)
+        new_size, crop_box = self._CalculateResize(pipeline.size, transform)
+        pipeline.Resize(new_size)
+        if crop_box:
+          pipeline.Crop(crop_box)
 
       elif transform.has_rotate():
 
-        new_image = self._Rotate(new_image, transform)
+        degrees = transform.rotate()
+        if degrees >= 0 and degrees % 180 == 0:
+          if degrees % 360:
+            pipeline.FlipHorizontal()
+            pipeline.FlipVertical()
+        else:
+          pipeline = _GeometryPipeline(
+              self._Rotate(pipeline.Flush(), transform))
 
       elif transform.has_horizontal_flip():
 
-        new_image = new_image.transpose(Image.FLIP_LEFT_RIGHT)
+        pipeline.FlipHorizontal()
 
       elif transform.has_vertical_flip():
 
-        new_image = new_image.transpose(Image.FLIP_TOP_BOTTOM)
+        pipeline.FlipVertical()
 
       elif (transform.has_crop_left_x() or
             transform.has_crop_top_y() or
             transform.has_crop_right_x() or
             transform.has_crop_bottom_y()):
 
-        new_image = self._Crop(new_image, transform)
+        pipeline.Crop(self._CalculateCropBox(pipeline.size, transform))
 
       elif transform.has_autolevels():
 
@@ -820,10 +1052,11 @@ class ImagesServiceStub(apiproxy_stub.APIProxyStub):
       if correct_orientation:
 
 
-        new_image = self._CorrectOrientation(new_image, orientation)
+        pipeline = _GeometryPipeline(
+            self._CorrectOrientation(pipeline.Flush(), orientation))
         correct_orientation = False
 
 
 
 
-    return new_image
+    return pipeline.Flush()
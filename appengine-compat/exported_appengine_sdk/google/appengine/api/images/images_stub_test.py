@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.api.images.images_stub."""
+
+import random
+import StringIO
+import threading
+import unittest
+
+import mock
+
+from google.appengine.api.images import images_service_pb
+from google.appengine.api.images import images_stub
+from google.appengine.runtime import apiproxy_errors
+
+Image = images_stub.Image
+
+
+def _RandomImage(rand, width, height):
+  return Image.frombytes(
+      'RGB', (width, height),
+      ''.join(chr(rand.randrange(256)) for _ in xrange(width * height * 3)))
+
+
+def _Encode(image, image_format):
+  data = StringIO.StringIO()
+  image.save(data, image_format)
+  return data.getvalue()
+
+
+def _RandomTransform(rand):
+  """Returns a random resize, rotate, flip or crop transform."""
+  transform = images_service_pb.Transform()
+  kind = rand.choice(['resize', 'rotate', 'flip', 'crop'])
+  if kind == 'resize':
+    crop_to_fit = rand.random() < 0.3
+    if crop_to_fit or rand.random() < 0.5:
+      transform.set_width(rand.randint(8, 60))
+    if crop_to_fit or not transform.has_width() or rand.random() < 0.5:
+      transform.set_height(rand.randint(8, 60))
+    if crop_to_fit:
+      transform.set_crop_to_fit(True)
+      transform.set_crop_offset_x(rand.choice([0.0, 0.25, 0.5, 1.0]))
+      transform.set_crop_offset_y(rand.choice([0.0, 0.5, 0.75, 1.0]))
+  elif kind == 'rotate':
+    transform.set_rotate(rand.choice([0, 90, 180, 270, 360, 540]))
+  elif kind == 'flip':
+    if rand.random() < 0.5:
+      transform.set_horizontal_flip(True)
+    else:
+      transform.set_vertical_flip(True)
+  else:
+    left = rand.choice([0.0, 0.1, 0.25, 0.3])
+    top = rand.choice([0.0, 0.2, 0.33])
+    transform.set_crop_left_x(left)
+    transform.set_crop_top_y(top)
+    transform.set_crop_right_x(left + rand.choice([0.5, 0.6, 0.7]))
+    transform.set_crop_bottom_y(top + rand.choice([0.5, 0.66]))
+  return transform
+
+
+class ProcessTransformsTest(unittest.TestCase):
+  """Tests that fused transforms match applying them one by one."""
+
+  def setUp(self):
+    self.stub = images_stub.ImagesServiceStub()
+
+  def StepByStep(self, image, transforms):
+    """Applies each transform in turn, as _ProcessTransforms used to."""
+    for transform in transforms:
+      if transform.has_width() or transform.has_height():
+        image = self.stub._Resize(image, transform)
+      elif transform.has_rotate():
+        image = self.stub._Rotate(image, transform)
+      elif transform.has_horizontal_flip():
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+      elif transform.has_vertical_flip():
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+      else:
+        image = self.stub._Crop(image, transform)
+    return image
+
+  def Outcome(self, function, *args):
+    try:
+      image = function(*args)
+    except Exception, e:
+      return type(e)
+    return image.size, image.tobytes()
+
+  def testRandomChains(self):
+    rand = random.Random(35)
+    for _ in xrange(300):
+      image = _RandomImage(rand, rand.randint(16, 64), rand.randint(16, 64))
+      transforms = [_RandomTransform(rand)
+                    for _ in xrange(rand.randint(1, 4))]
+      self.assertEqual(
+          self.Outcome(self.StepByStep, image, transforms),
+          self.Outcome(self.stub._ProcessTransforms, image, transforms, False),
+          transforms)
+
+  def testCropThenFlips(self):
+    image = _RandomImage(random.Random(1), 40, 30)
+    crop = images_service_pb.Transform()
+    crop.set_crop_left_x(0.25)
+    crop.set_crop_right_x(0.5)
+    crop.set_crop_bottom_y(0.5)
+    flip = images_service_pb.Transform()
+    flip.set_horizontal_flip(True)
+    transforms = [flip, crop, flip, crop]
+    self.assertEqual(
+        self.StepByStep(image, transforms).tobytes(),
+        self.stub._ProcessTransforms(image, transforms, False).tobytes())
+
+  def testJpegDraft(self):
+    image = _RandomImage(random.Random(2), 400, 300)
+    data = _Encode(image, 'JPEG')
+    resize = images_service_pb.Transform()
+    resize.set_width(50)
+    expected = self.StepByStep(Image.open(StringIO.StringIO(data)), [resize])
+    source = Image.open(StringIO.StringIO(data))
+    with mock.patch.object(source, 'draft', wraps=source.draft) as draft:
+      result = self.stub._ProcessTransforms(source, [resize], False)
+    # The JPEG is decoded at a reduced scale that is still large enough.
+    draft.assert_called_once_with('RGB', (50, 38))
+    self.assertEqual((100, 75), source.size)
+    self.assertEqual(expected.size, result.size)
+
+  def testTooManyTransforms(self):
+    flip = images_service_pb.Transform()
+    flip.set_vertical_flip(True)
+    image = _RandomImage(random.Random(3), 4, 4)
+    with self.assertRaises(apiproxy_errors.ApplicationError) as cm:
+      self.stub._ProcessTransforms(
+          image, [flip] * (images_stub.images.MAX_TRANSFORMS_PER_REQUEST + 1),
+          False)
+    self.assertEqual(images_service_pb.ImagesServiceError.BAD_TRANSFORM_DATA,
+                     cm.exception.application_error)
+
+
+class BatchTransformTest(unittest.TestCase):
+  """Tests for ImagesServiceStub.BatchTransform."""
+
+  def setUp(self):
+    self.stub = images_stub.ImagesServiceStub()
+    rand = random.Random(4)
+    self.requests = []
+    for width in xrange(10, 30):
+      request = images_service_pb.ImagesTransformRequest()
+      request.mutable_image().set_content(
+          _Encode(_RandomImage(rand, width, 10), 'PNG'))
+      request.add_transform().set_vertical_flip(True)
+      request.mutable_output().set_mime_type(
+          images_service_pb.OutputSettings.PNG)
+      self.requests.append(request)
+
+  def Transform(self, request):
+    response = images_service_pb.ImagesTransformResponse()
+    self.stub._Dynamic_Transform(request, response)
+    return response
+
+  def testOrder(self):
+    responses = self.stub.BatchTransform(self.requests, max_workers=4)
+    self.assertEqual([self.Transform(request) for request in self.requests],
+                     responses)
+    self.assertEqual(
+        [(width, 10) for width in xrange(10, 30)],
+        [Image.open(StringIO.StringIO(response.image().content())).size
+         for response in responses])
+
+  def testEmpty(self):
+    self.assertEqual([], self.stub.BatchTransform([]))
+
+  def testFirstErrorRaisedAfterAllRequests(self):
+    self.requests[5].mutable_image().set_content('not an image')
+    self.requests[12].mutable_image().set_content('')
+    transformed = []
+    lock = threading.Lock()
+    transform = self.stub._Dynamic_Transform
+
+    def Record(request, response):
+      with lock:
+        transformed.append(request)
+      transform(request, response)
+
+    with mock.patch.object(self.stub, '_Dynamic_Transform', Record):
+      with self.assertRaises(apiproxy_errors.ApplicationError) as cm:
+        self.stub.BatchTransform(self.requests, max_workers=4)
+    self.assertEqual(images_service_pb.ImagesServiceError.BAD_IMAGE_DATA,
+                     cm.exception.application_error)
+    self.assertEqual(len(self.requests), len(transformed))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -678,6 +678,8 @@ class SearchServiceStub(apiproxy_stub.APIProxyStub):
 
   THREADSAFE = False
 
+  READ_ONLY_METHODS = frozenset(['ListDocuments', 'Search'])
+
   def __init__(self, service_name='search', index_file=None):
     """Constructor.
 
@@ -56,7 +56,7 @@ __all__ = [
     'InvalidLeaseTimeError', 'InvalidMaxTasksError', 'InvalidDeadlineError',
     'InvalidQueueModeError', 'TransactionalRequestTooLargeError',
     'TaskLeaseExpiredError', 'QueuePausedError', 'InvalidEtaError',
-    'InvalidTagError',
+    'InvalidTagError', 'BulkOperationError',
 
     'MAX_QUEUE_NAME_LENGTH', 'MAX_TASK_NAME_LENGTH', 'MAX_TASK_SIZE_BYTES',
     'MAX_PULL_TASK_SIZE_BYTES', 'MAX_PUSH_TASK_SIZE_BYTES',
@@ -72,6 +72,7 @@ __all__ = [
 import calendar
 import cgi
 import datetime
+import itertools
 import logging
 import math
 import os
@@ -205,6 +206,21 @@ class TransactionalRequestTooLargeError(TaskTooLargeError):
   """The total size of this transaction (including tasks) was too large."""
 
 
+class BulkOperationError(Error):
+  """One or more tasks of a bulk operation failed.
+
+  Attributes:
+    tasks: The list of all tasks that were part of the operation.
+    errors: A list of (task, exception) pairs, one for each failed task.
+  """
+
+  def __init__(self, tasks, errors):
+    Error.__init__(self, '%d of %d tasks failed; first error: %r' %
+                   (len(errors), len(tasks), errors[0][1]))
+    self.tasks = tasks
+    self.errors = errors
+
+
 class TaskLeaseExpiredError(Error):
   """The task lease could not be renewed because it had already expired."""
 
@@ -254,6 +270,8 @@ MAX_TAG_LENGTH = 500
 
 MAX_LEASE_SECONDS = 3600 * 24 * 7
 
+_DEFAULT_MAX_BULK_RPCS_IN_FLIGHT = 10
+
 
 DEFAULT_APP_VERSION = _DefaultAppVersionSingleton()
 _UNKNOWN_APP_VERSION = _UnknownAppVersionSingleton()
@@ -1716,24 +1734,10 @@ class Queue(object):
       except apiproxy_errors.ApplicationError, e:
         raise _TranslateError(e.application_error, e.error_detail)
 
-      assert rpc.response.result_size() == len(tasks), (
-          'expected %d results from delete(), got %d' % (
-              len(tasks), rpc.response.result_size()))
-
-      IGNORED_STATES = [
-          taskqueue_service_pb.TaskQueueServiceError.UNKNOWN_TASK,
-          taskqueue_service_pb.TaskQueueServiceError.TOMBSTONED_TASK]
-
       exception = None
-      for task, result in zip(tasks, rpc.response.result_list()):
-        if result == taskqueue_service_pb.TaskQueueServiceError.OK:
-
-          task._Task__deleted = True
-        elif result in IGNORED_STATES:
-
-          task._Task__deleted = False
-        elif exception is None:
-          exception = _TranslateError(result)
+      for error in self.__ProcessDeleteResponse(tasks, rpc.response):
+        if error is not None and exception is None:
+          exception = error
 
       if exception is not None:
         raise exception
@@ -1768,6 +1772,76 @@ class Queue(object):
                           ResultHook,
                           rpc)
 
+  @staticmethod
+  def __ProcessDeleteResponse(tasks, response):
+    """Marks deleted tasks and returns the error for each task.
+
+    Args:
+      tasks: The list of tasks that were sent in the Delete request.
+      response: The TaskQueueDeleteResponse for the request.
+
+    Returns:
+      A list with one entry per task; the entry is None if the task was
+      deleted or did not exist, and the translated exception otherwise.
+    """
+    assert response.result_size() == len(tasks), (
+        'expected %d results from delete(), got %d' % (
+            len(tasks), response.result_size()))
+
+    IGNORED_STATES = [
+        taskqueue_service_pb.TaskQueueServiceError.UNKNOWN_TASK,
+        taskqueue_service_pb.TaskQueueServiceError.TOMBSTONED_TASK]
+
+    errors = []
+    for task, result in zip(tasks, response.result_list()):
+      if result == taskqueue_service_pb.TaskQueueServiceError.OK:
+
+        task._Task__deleted = True
+        errors.append(None)
+      elif result in IGNORED_STATES:
+
+        task._Task__deleted = False
+        errors.append(None)
+      else:
+        errors.append(_TranslateError(result))
+    return errors
+
+  def delete_tasks_bulk(self, tasks,
+                        max_in_flight=_DEFAULT_MAX_BULK_RPCS_IN_FLIGHT,
+                        deadline=10):
+    """Deletes any number of tasks from this queue.
+
+    The tasks are split into batches of at most `MAX_TASKS_PER_LEASE` tasks,
+    and up to `max_in_flight` Delete calls are issued concurrently. Unlike
+    `delete_tasks()`, a failed batch does not stop the remaining batches from
+    being sent; the errors of all tasks are collected and reported together
+    once every batch has completed.
+
+    Args:
+      tasks: An iterable of task instances that will be deleted from the
+          queue. Generators are consumed lazily, one batch at a time.
+      max_in_flight: The maximum number of Delete calls that are outstanding
+          at any time.
+      deadline: The maximum number of seconds to wait for each Delete call.
+
+    Returns:
+      The list of tasks that were supplied to this method. Check the
+      `task.was_deleted` property to see which tasks were deleted.
+
+    Raises:
+      BadTaskStateError: If the tasks to be deleted do not have task names or
+          have already been deleted.
+      DuplicateTaskNameError: If a task is repeated within a batch.
+      BulkOperationError: If any of the tasks could not be deleted.
+    """
+    _ValidateDeadline(deadline)
+    return self.__RunBulk(tasks,
+                          MAX_TASKS_PER_LEASE,
+                          max_in_flight,
+                          deadline,
+                          self.delete_tasks_async,
+                          self.__ProcessDeleteResponse)
+
   @staticmethod
   def _ValidateLeaseSeconds(lease_seconds):
 
@@ -2139,24 +2213,13 @@ class Queue(object):
       except apiproxy_errors.ApplicationError, e:
         raise _TranslateError(e.application_error, e.error_detail)
 
-      assert rpc.response.taskresult_size() == len(tasks), (
-          'expected %d results from BulkAdd(), got %d' % (
-              len(tasks), rpc.response.taskresult_size()))
-
       exception = None
-      for task, task_result in zip(tasks, rpc.response.taskresult_list()):
-        if (task_result.result() ==
-            taskqueue_service_pb.TaskQueueServiceError.OK):
-          if task_result.has_chosen_task_name():
-            task._Task__name = task_result.chosen_task_name()
-          task._Task__queue_name = self.__name
-          task._Task__enqueued = True
-        elif (task_result.result() ==
-              taskqueue_service_pb.TaskQueueServiceError.SKIPPED):
-          pass
-        elif (exception is None or isinstance(exception, TaskAlreadyExistsError)
-              or isinstance(exception, TombstonedTaskError)):
-          exception = _TranslateError(task_result.result())
+      for error in self.__ProcessBulkAddResponse(tasks, rpc.response):
+        if error is None:
+          continue
+        if (exception is None or isinstance(exception, TaskAlreadyExistsError)
+            or isinstance(exception, TombstonedTaskError)):
+          exception = error
 
       if exception is not None:
         raise exception
@@ -2200,6 +2263,201 @@ class Queue(object):
                           ResultHook,
                           rpc)
 
+  def __ProcessBulkAddResponse(self, tasks, response):
+    """Marks enqueued tasks and returns the error for each task.
+
+    Args:
+      tasks: The list of tasks that were sent in the BulkAdd request.
+      response: The TaskQueueBulkAddResponse for the request.
+
+    Returns:
+      A list with one entry per task; the entry is None if the task was
+      enqueued or skipped, and the translated exception otherwise.
+    """
+    assert response.taskresult_size() == len(tasks), (
+        'expected %d results from BulkAdd(), got %d' % (
+            len(tasks), response.taskresult_size()))
+
+    errors = []
+    for task, task_result in zip(tasks, response.taskresult_list()):
+      if (task_result.result() ==
+          taskqueue_service_pb.TaskQueueServiceError.OK):
+        if task_result.has_chosen_task_name():
+          task._Task__name = task_result.chosen_task_name()
+        task._Task__queue_name = self.__name
+        task._Task__enqueued = True
+        errors.append(None)
+      elif (task_result.result() ==
+            taskqueue_service_pb.TaskQueueServiceError.SKIPPED):
+        errors.append(None)
+      else:
+        errors.append(_TranslateError(task_result.result()))
+    return errors
+
+  def add_bulk(self, tasks,
+               max_in_flight=_DEFAULT_MAX_BULK_RPCS_IN_FLIGHT,
+               deadline=10):
+    """Adds any number of tasks into this queue.
+
+    The tasks are split into batches of at most `MAX_TASKS_PER_ADD` tasks,
+    and up to `max_in_flight` BulkAdd calls are issued concurrently. Unlike
+    `add()`, a failed batch does not stop the remaining batches from being
+    sent; the errors of all tasks are collected and reported together once
+    every batch has completed. Bulk adds are never transactional.
+
+    Args:
+      tasks: An iterable of task instances that will be added to the queue.
+          Generators are consumed lazily, one batch at a time.
+      max_in_flight: The maximum number of BulkAdd calls that are outstanding
+          at any time.
+      deadline: The maximum number of seconds to wait for each BulkAdd call.
+
+    Returns:
+      The list of tasks that were supplied to this method. Successfully
+      queued tasks will have a valid queue name and task name after the
+      call; check the `Task.was_enqueued` property to see which tasks were
+      added.
+
+    Raises:
+      BadTaskStateError: If a task has already been added to a queue.
+      DuplicateTaskNameError: If a task name is repeated within a batch.
+      InvalidTaskError: If both push and pull tasks exist in a batch.
+      BulkOperationError: If any of the tasks could not be added. Its
+          `errors` include `TaskAlreadyExistsError` and `TombstonedTaskError`
+          for named tasks that were added in the past.
+    """
+    _ValidateDeadline(deadline)
+    return self.__RunBulk(tasks,
+                          MAX_TASKS_PER_ADD,
+                          max_in_flight,
+                          deadline,
+                          self.add_async,
+                          self.__ProcessBulkAddResponse)
+
+  def __RunBulk(self, tasks, batch_size, max_in_flight, deadline,
+                start_batch, process_response):
+    """Runs a batched operation over tasks with several calls in flight.
+
+    Args:
+      tasks: An iterable of task instances.
+      batch_size: The maximum number of tasks sent in a single call.
+      max_in_flight: The maximum number of calls that are outstanding at any
+          time.
+      deadline: The maximum number of seconds to wait for each call.
+      start_batch: A function taking a list of tasks and a UserRPC that
+          starts the call for that batch.
+      process_response: A function taking a list of tasks and the response
+          of their call, returning the error (or None) for each task.
+
+    Returns:
+      The list of all tasks.
+
+    Raises:
+      BulkOperationError: If any of the tasks failed.
+    """
+    if not isinstance(max_in_flight, (int, long)):
+      raise TypeError('max_in_flight must be an integer')
+    if max_in_flight <= 0:
+      raise ValueError('max_in_flight must be positive')
+
+    all_tasks = []
+    errors = []
+    in_flight = {}
+
+    def FinishOne():
+      rpc = None
+      while rpc not in in_flight:
+        rpc = apiproxy_stub_map.UserRPC.wait_any(in_flight.keys())
+      batch = in_flight.pop(rpc)
+      try:
+        rpc.check_success()
+      except apiproxy_errors.ApplicationError, e:
+        batch_errors = [_TranslateError(e.application_error, e.error_detail)]
+        batch_errors *= len(batch)
+      except apiproxy_errors.Error, e:
+        batch_errors = [e] * len(batch)
+      else:
+        batch_errors = process_response(batch, rpc.response)
+      for task, error in zip(batch, batch_errors):
+        if error is not None:
+          errors.append((task, error))
+
+    task_iter = iter(tasks)
+    while True:
+      batch = list(itertools.islice(task_iter, batch_size))
+      if not batch:
+        break
+      all_tasks.extend(batch)
+      if len(in_flight) >= max_in_flight:
+        FinishOne()
+      rpc = create_rpc(deadline)
+      start_batch(batch, rpc=rpc)
+      in_flight[rpc] = batch
+
+    while in_flight:
+      FinishOne()
+
+    if errors:
+      raise BulkOperationError(all_tasks, errors)
+    return all_tasks
+
+  def iter_leased_tasks(self, lease_seconds,
+                        max_tasks=MAX_TASKS_PER_LEASE,
+                        deadline=10):
+    """Leases batches of tasks until the queue is drained.
+
+    Each batch is yielded to the caller for processing. When the next batch
+    is requested, the tasks of the previous batch are deleted while the next
+    lease call is in flight, so a consumer loop costs one round trip per
+    batch instead of two::
+
+      for tasks in queue.iter_leased_tasks(60):
+        for task in tasks:
+          process(task)
+
+    Tasks that should not be deleted, for example because processing them
+    failed, can be removed from the yielded list before asking for the next
+    batch; their leases will then expire normally. Leaving the loop early
+    leaves the current batch leased and undeleted.
+
+    Args:
+      lease_seconds: Number of seconds to lease each batch of tasks.
+      max_tasks: The maximum number of tasks to lease per batch, up to 1000
+          tasks.
+      deadline: The maximum number of seconds to wait for each call.
+
+    Yields:
+      Non-empty lists of tasks leased from the queue.
+
+    Raises:
+      InvalidLeaseTimeError: If `lease_seconds` is not a valid float or
+          integer number or is outside the valid range.
+      InvalidMaxTasksError: If `max_tasks` is not a valid integer or is
+          outside the valid range.
+      InvalidQueueModeError: If invoked on a queue that is not in pull mode.
+      Error-subclass on application errors.
+    """
+    _ValidateDeadline(deadline)
+    lease_seconds = self._ValidateLeaseSeconds(lease_seconds)
+    self._ValidateMaxTasks(max_tasks)
+
+    lease_rpc = self.lease_tasks_async(lease_seconds, max_tasks,
+                                       create_rpc(deadline))
+    delete_rpc = None
+    while True:
+      tasks = lease_rpc.get_result()
+      if delete_rpc is not None:
+        delete_rpc.get_result()
+        delete_rpc = None
+      if not tasks:
+        return
+      yield tasks
+      lease_rpc = self.lease_tasks_async(lease_seconds, max_tasks,
+                                         create_rpc(deadline))
+      to_delete = [task for task in tasks if not task.was_deleted]
+      if to_delete:
+        delete_rpc = self.delete_tasks_async(to_delete, create_rpc(deadline))
+
   def __FillTaskQueueRetryParameters(self,
                                      retry_options,
                                      retry_retry_parameters):
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for the bulk operations of google.appengine.api.taskqueue."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from google.appengine.api.taskqueue import taskqueue
+from google.appengine.ext import testbed
+
+QUEUE_YAML = """
+queue:
+- name: pull
+  mode: pull
+"""
+
+
+class BulkTestBase(unittest.TestCase):
+  """Sets up a taskqueue stub with a push and a pull queue."""
+
+  def setUp(self):
+    self.root_path = tempfile.mkdtemp()
+    with open(os.path.join(self.root_path, 'queue.yaml'), 'w') as f:
+      f.write(QUEUE_YAML)
+    self.testbed = testbed.Testbed()
+    self.testbed.activate()
+    self.testbed.init_taskqueue_stub(root_path=self.root_path)
+    self.stub = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+    self.push_queue = taskqueue.Queue()
+    self.pull_queue = taskqueue.Queue('pull')
+
+  def tearDown(self):
+    self.testbed.deactivate()
+    shutil.rmtree(self.root_path)
+
+  def StoredNames(self, queue_name):
+    return set(task['name'] for task in self.stub.GetTasks(queue_name))
+
+  def PullTasks(self, count, prefix='task'):
+    return (taskqueue.Task(payload='payload %d' % index, method='PULL',
+                           name='%s-%d' % (prefix, index))
+            for index in xrange(count))
+
+
+class AddBulkTest(BulkTestBase):
+  """Tests for Queue.add_bulk()."""
+
+  def testGeneratorLargerThanBatch(self):
+    consumed = []
+
+    def Tasks():
+      for index in xrange(250):
+        consumed.append(index)
+        yield taskqueue.Task(url='/work', name='task-%d' % index)
+
+    add_async = self.push_queue.add_async
+    consumed_at_call = []
+
+    def RecordingAddAsync(tasks, **kwds):
+      consumed_at_call.append((len(consumed), len(tasks)))
+      return add_async(tasks, **kwds)
+
+    with mock.patch.object(self.push_queue, 'add_async', RecordingAddAsync):
+      tasks = self.push_queue.add_bulk(Tasks(), max_in_flight=2)
+    # The generator is consumed one batch at a time.
+    self.assertEqual([(100, 100), (200, 100), (250, 50)], consumed_at_call)
+    self.assertEqual(250, len(tasks))
+    self.assertTrue(all(task.was_enqueued for task in tasks))
+    self.assertEqual(set('task-%d' % index for index in xrange(250)),
+                     self.StoredNames('default'))
+
+  def testUnnamedTasks(self):
+    tasks = self.pull_queue.add_bulk(
+        taskqueue.Task(payload='x', method='PULL') for _ in xrange(150))
+    self.assertEqual(150, len(set(task.name for task in tasks)))
+    self.assertEqual(150, len(self.StoredNames('pull')))
+
+  def testErrorsAcrossBatches(self):
+    # Names that already exist in the first and last batches.
+    self.pull_queue.add([taskqueue.Task(payload='x', method='PULL', name=name)
+                         for name in ('task-5', 'task-205')])
+    tasks = list(self.PullTasks(250))
+    with self.assertRaises(taskqueue.BulkOperationError) as cm:
+      self.pull_queue.add_bulk(iter(tasks), max_in_flight=1)
+    error = cm.exception
+    self.assertEqual(tasks, error.tasks)
+    self.assertEqual([tasks[5], tasks[205]], [task for task, _ in error.errors])
+    for _, exception in error.errors:
+      self.assertIsInstance(exception, taskqueue.TaskAlreadyExistsError)
+    # Every other task was added, including those after the failed batches.
+    self.assertEqual(248, sum(task.was_enqueued for task in tasks))
+    self.assertEqual(set('task-%d' % index for index in xrange(250)),
+                     self.StoredNames('pull'))
+
+  def testUnknownQueue(self):
+    tasks = list(self.PullTasks(150))
+    with self.assertRaises(taskqueue.BulkOperationError) as cm:
+      taskqueue.Queue('missing').add_bulk(tasks)
+    # Errors are collected as the batches complete, in any order.
+    self.assertItemsEqual(tasks, [task for task, _ in cm.exception.errors])
+    for _, exception in cm.exception.errors:
+      self.assertIsInstance(exception, taskqueue.UnknownQueueError)
+
+  def testEmpty(self):
+    self.assertEqual([], self.push_queue.add_bulk(iter([])))
+
+  def testInvalidArguments(self):
+    self.assertRaises(ValueError, self.push_queue.add_bulk, [],
+                      max_in_flight=0)
+    self.assertRaises(TypeError, self.push_queue.add_bulk, [],
+                      max_in_flight='1')
+    self.assertRaises(taskqueue.InvalidDeadlineError,
+                      self.push_queue.add_bulk, [], deadline=-1)
+
+
+class DeleteTasksBulkTest(BulkTestBase):
+  """Tests for Queue.delete_tasks_bulk()."""
+
+  def testGeneratorLargerThanBatch(self):
+    count = 2 * taskqueue.MAX_TASKS_PER_LEASE + 10
+    tasks = self.pull_queue.add_bulk(self.PullTasks(count))
+    deleted = self.pull_queue.delete_tasks_bulk(
+        (task for task in tasks), max_in_flight=2)
+    self.assertEqual(tasks, deleted)
+    self.assertTrue(all(task.was_deleted for task in tasks))
+    self.assertEqual(set(), self.StoredNames('pull'))
+
+  def testUnknownTasksAreIgnored(self):
+    self.pull_queue.add_bulk(self.PullTasks(10))
+    tasks = list(self.PullTasks(20))
+    self.pull_queue.delete_tasks_bulk(tasks)
+    self.assertEqual([True] * 10 + [False] * 10,
+                     [task.was_deleted for task in tasks])
+
+  def testErrorsAcrossBatches(self):
+    tasks = list(self.PullTasks(taskqueue.MAX_TASKS_PER_LEASE + 5))
+    with self.assertRaises(taskqueue.BulkOperationError) as cm:
+      taskqueue.Queue('missing').delete_tasks_bulk(iter(tasks),
+                                                   max_in_flight=1)
+    # Each batch was sent, and the errors of both are collected.
+    self.assertEqual(tasks, cm.exception.tasks)
+    self.assertEqual(tasks, [task for task, _ in cm.exception.errors])
+    for _, exception in cm.exception.errors:
+      self.assertIsInstance(exception, taskqueue.UnknownQueueError)
+
+  def testUnnamedTask(self):
+    self.assertRaises(taskqueue.BadTaskStateError,
+                      self.pull_queue.delete_tasks_bulk,
+                      [taskqueue.Task(payload='x', method='PULL')])
+
+
+class IterLeasedTasksTest(BulkTestBase):
+  """Tests for Queue.iter_leased_tasks()."""
+
+  def testLeasesUntilEmpty(self):
+    self.pull_queue.add_bulk(self.PullTasks(250))
+    batches = list(self.pull_queue.iter_leased_tasks(60, max_tasks=100))
+    self.assertEqual([100, 100, 50], [len(tasks) for tasks in batches])
+    names = [task.name for tasks in batches for task in tasks]
+    self.assertEqual(set('task-%d' % index for index in xrange(250)),
+                     set(names))
+    self.assertEqual(250, len(names))
+    self.assertEqual(set(), self.StoredNames('pull'))
+
+  def testEmptyQueue(self):
+    self.assertEqual([], list(self.pull_queue.iter_leased_tasks(60)))
+
+  def testKeptTasksAreNotDeleted(self):
+    self.pull_queue.add_bulk(self.PullTasks(30))
+    kept = []
+    for tasks in self.pull_queue.iter_leased_tasks(60, max_tasks=10):
+      kept.append(tasks.pop())
+    # Their leases have not expired, so they are not leased again either.
+    self.assertEqual(3, len(kept))
+    self.assertEqual(set(task.name for task in kept),
+                     self.StoredNames('pull'))
+
+  def testLeavingEarly(self):
+    self.pull_queue.add_bulk(self.PullTasks(30))
+    for tasks in self.pull_queue.iter_leased_tasks(60, max_tasks=10):
+      break
+    self.assertEqual(30, len(self.StoredNames('pull')))
+
+  def testInvalidArguments(self):
+    for args in ((-1,), (60, 0), (60, taskqueue.MAX_TASKS_PER_LEASE + 1)):
+      leased = self.pull_queue.iter_leased_tasks(*args)
+      self.assertRaises((taskqueue.InvalidLeaseTimeError,
+                         taskqueue.InvalidMaxTasksError), next, leased)
+
+  def testPushQueue(self):
+    self.push_queue.add(taskqueue.Task(url='/work'))
+    leased = self.push_queue.iter_leased_tasks(60)
+    self.assertRaises(taskqueue.InvalidQueueModeError, next, leased)
+
+
+if __name__ == '__main__':
+  unittest.main()
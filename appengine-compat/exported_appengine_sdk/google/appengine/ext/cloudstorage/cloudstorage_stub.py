@@ -36,6 +36,9 @@ from google.appengine.ext.cloudstorage import common
 _GCS_DEFAULT_CONTENT_TYPE = 'application/octet-stream'
 
 
+_MAX_COMPOSE_COMPONENTS = 32
+
+
 
 
 
@@ -100,6 +103,52 @@ class _AE_GCSPartialFile_(db.Model):
   partial_content = db.TextProperty(required=True)
 
 
+class _ConcatenatedBlobReader(object):
+  """A file-like object that reads several blobs back to back.
+
+  It lets the content of a composed object be streamed into blob storage
+  one block at a time instead of being joined in memory. The md5 digest and
+  size of all content read so far are tracked along the way.
+  """
+
+  def __init__(self, blob_storage, blobkeys):
+    """Initialize.
+
+    Args:
+      blob_storage: the BlobStorage instance holding the blobs.
+      blobkeys: blobkeys of the blobs to read, in order.
+    """
+    self._blob_storage = blob_storage
+    self._blobkeys = list(reversed(blobkeys))
+    self._current = None
+    self.md5 = hashlib.md5()
+    self.size = 0
+
+  def read(self, size=-1):
+    """Read at most size bytes. Read all remaining content if size < 0."""
+    if size < 0:
+      size = None
+    chunks = []
+    while size is None or size > 0:
+      if self._current is None:
+        if not self._blobkeys:
+          break
+        self._current = self._blob_storage.OpenBlob(self._blobkeys.pop())
+      if size is None:
+        data = self._current.read()
+      else:
+        data = self._current.read(size)
+        size -= len(data)
+      if not data or size is None:
+        self._current.close()
+        self._current = None
+      chunks.append(data)
+    data = ''.join(chunks)
+    self.md5.update(data)
+    self.size += len(data)
+    return data
+
+
 class CloudStorageStub(object):
   """Google Cloud Storage stub implementation.
 
@@ -189,7 +238,10 @@ class CloudStorageStub(object):
         blobkey = gcs_file.key().name()
         self.blob_storage.DeleteBlob(blobkey)
       else:
-        db.delete(_AE_GCSPartialFile_.all().ancestor(gcs_file))
+        partials = _AE_GCSPartialFile_.all().ancestor(gcs_file).fetch(None)
+        for partial in partials:
+          self.blob_storage.DeleteBlob(partial.partial_content)
+        db.delete(partials)
       gcs_file.delete()
 
   @db.non_transactional
@@ -333,8 +385,61 @@ class CloudStorageStub(object):
 
     if src_blobkey != token:
 
-      local_file = self.blob_storage.OpenBlob(src_blobkey)
-      self.blob_storage.StoreBlob(token, local_file)
+      self.blob_storage.CopyBlob(src_blobkey, token)
+
+  @db.non_transactional
+  def put_compose(self, dst, sources, options):
+    """Compose objects into a new object with a PUT.
+
+    This implements the compose XML API, used by parallel composite uploads.
+    Source content is streamed into the new object.
+
+    Args:
+      dst: /bucket/filename of the composite object. It may also be one of
+        the sources.
+      sources: a list of /bucket/filename to concatenate, in order. These
+        files must exist.
+      options: a dict containing all user specified request headers.
+        e.g. {'content-type': 'foo', 'x-goog-meta-bar': 'bar'}.
+
+    Returns:
+      _AE_GCSFileInfo entity for the composite object.
+
+    Raises:
+      ValueError: if something is invalid. The exception.args is a tuple of
+      (msg, http status code).
+    """
+    common.validate_file_path(dst)
+    if not sources or len(sources) > _MAX_COMPOSE_COMPONENTS:
+      raise ValueError('Compose requires 1 to %d source objects, got %d.' %
+                       (_MAX_COMPOSE_COMPONENTS, len(sources)),
+                       httplib.BAD_REQUEST)
+
+    ns = namespace_manager.get_namespace()
+    try:
+      namespace_manager.set_namespace('')
+      src_blobkeys = []
+      for src in sources:
+        common.validate_file_path(src)
+        src_blobkey = self._filename_to_blobkey(src)
+        source = _AE_GCSFileInfo_.get_by_key_name(src_blobkey)
+        if not source or not source.finalized:
+          raise ValueError('Source object %s does not exist.' % src,
+                           httplib.NOT_FOUND)
+        src_blobkeys.append(src_blobkey)
+
+      token = self._filename_to_blobkey(dst)
+      gcs_file = _AE_GCSFileInfo_.get_by_key_name(token)
+      if gcs_file and not gcs_file.finalized:
+        self._cleanup_old_file(gcs_file)
+      content = self._store_concatenation(token, src_blobkeys)
+      gcs_file = _AE_GCSFileInfo_(key_name=token,
+                                  filename=dst,
+                                  finalized=False)
+      gcs_file.options = options
+      return self._finalize_file(gcs_file, content, None)
+    finally:
+      namespace_manager.set_namespace(ns)
 
   @db.non_transactional
   def _end_creation(self, token, _upload_filename):
@@ -349,7 +454,7 @@ class CloudStorageStub(object):
     Raises:
       ValueError: if token is invalid. Or file is corrupted during upload.
 
-    Save file content to blobstore. Save blobinfo and _AE_GCSFileInfo.
+    Stream partial contents into blobstore. Save blobinfo and _AE_GCSFileInfo.
     """
     gcs_file = _AE_GCSFileInfo_.get_by_key_name(token)
     if not gcs_file:
@@ -357,17 +462,100 @@ class CloudStorageStub(object):
     if gcs_file.finalized:
       return gcs_file
 
-    error_msg, content = self._get_content(gcs_file)
+    partials = list(_AE_GCSPartialFile_.all(namespace='').ancestor(gcs_file).
+                    order('__key__'))
+    error_msg = self._check_partials(partials)
     if error_msg:
+      self._delete_partials(gcs_file, partials, error_msg)
       raise ValueError(error_msg)
 
-    gcs_file.etag = hashlib.md5(content).hexdigest()
+    content = self._store_concatenation(
+        token, [partial.partial_content for partial in partials])
+    self._delete_partials(gcs_file, partials, error_msg)
+    return self._finalize_file(gcs_file, content, _upload_filename)
+
+  def _check_partials(self, partials):
+    """Check that partial contents cover the file without gaps or overlaps.
+
+    Args:
+      partials: _AE_GCSPartialFile_ entities of a file, ordered by start.
+
+    Returns:
+      An error message if the file is corrupted, '' otherwise.
+    """
+    previous_end = 0
+    for partial in partials:
+      start = int(partial.key().name())
+      if start < previous_end:
+        return 'File is corrupted due to overlapping chunks.'
+      elif start > previous_end:
+        return 'File is corrupted due to missing chunks.'
+      previous_end = partial.end
+    return ''
+
+  @db.transactional(propagation=db.INDEPENDENT)
+  def _delete_partials(self, gcs_file, partials, error_msg):
+    """Delete the partial contents of the gcs_file.
+
+    Args:
+      gcs_file: an instance of _AE_GCSFileInfo_.
+      partials: _AE_GCSPartialFile_ entities of gcs_file.
+      error_msg: set if the file is corrupted during upload, in which case
+        gcs_file is deleted as well.
+    """
+    for partial in partials:
+      self.blob_storage.DeleteBlob(partial.partial_content)
+    db.delete(partials)
+    if error_msg:
+      gcs_file.delete()
+
+  def _store_concatenation(self, token, blobkeys):
+    """Store the concatenation of blobs as the blob for token.
+
+    Args:
+      token: blobkey to store the content under.
+      blobkeys: blobkeys of the blobs to concatenate, in order. token may be
+        one of them.
+
+    Returns:
+      The _ConcatenatedBlobReader the content was read through.
+    """
+    content = _ConcatenatedBlobReader(self.blob_storage, blobkeys)
+    if token not in blobkeys:
+      self.blob_storage.StoreBlob(token, content)
+      return content
+
+
+
+    tmp_blobkey = '%s-compose' % token
+    self.blob_storage.StoreBlob(tmp_blobkey, content)
+    try:
+      self.blob_storage.CopyBlob(tmp_blobkey, token)
+    finally:
+      self.blob_storage.DeleteBlob(tmp_blobkey)
+    return content
+
+  def _finalize_file(self, gcs_file, content, _upload_filename):
+    """Save blobinfo and finalized _AE_GCSFileInfo for stored content.
+
+    Args:
+      gcs_file: an instance of _AE_GCSFileInfo_.
+      content: the _ConcatenatedBlobReader the file content was stored
+        through.
+      _upload_filename: the upload filename from user, if any.
+
+    Returns:
+      gcs_file.
+    """
+    gcs_file.etag = content.md5.hexdigest()
     gcs_file.creation = datetime.datetime.utcnow()
-    gcs_file.size = len(content)
+    gcs_file.size = content.size
 
 
 
-    blob_info = datastore.Entity('__BlobInfo__', name=str(token), namespace='')
+    blob_info = datastore.Entity('__BlobInfo__',
+                                 name=str(gcs_file.key().name()),
+                                 namespace='')
     blob_info['content_type'] = gcs_file.content_type
     blob_info['creation'] = gcs_file.creation
     blob_info['filename'] = _upload_filename
@@ -375,46 +563,12 @@ class CloudStorageStub(object):
     blob_info['size'] = gcs_file.size
     datastore.Put(blob_info)
 
-    self.blob_storage.StoreBlob(token, StringIO.StringIO(content))
-
     gcs_file.finalized = True
 
     gcs_file.next_offset = -1
     gcs_file.put()
     return gcs_file
 
-  @db.transactional(propagation=db.INDEPENDENT)
-  def _get_content(self, gcs_file):
-    """Aggregate all partial content of the gcs_file.
-
-    Args:
-      gcs_file: an instance of _AE_GCSFileInfo_.
-
-    Returns:
-      (error_msg, content) tuple. error_msg is set if the file is
-      corrupted during upload. Otherwise content is set to the
-      aggregation of all partial contents.
-    """
-    content = ''
-    previous_end = 0
-    error_msg = ''
-    for partial in (_AE_GCSPartialFile_.all(namespace='').ancestor(gcs_file).
-                    order('__key__')):
-      start = int(partial.key().name())
-      if not error_msg:
-        if start < previous_end:
-          error_msg = 'File is corrupted due to missing chunks.'
-        elif start > previous_end:
-          error_msg = 'File is corrupted due to overlapping chunks'
-        previous_end = partial.end
-        content += self.blob_storage.OpenBlob(partial.partial_content).read()
-        self.blob_storage.DeleteBlob(partial.partial_content)
-      partial.delete()
-    if error_msg:
-      gcs_file.delete()
-      content = ''
-    return error_msg, content
-
   @db.non_transactional
   def get_bucket(self,
                  bucketpath,
@@ -554,11 +708,14 @@ class CloudStorageStub(object):
     if not gcsfileinfo or not gcsfileinfo.finalized:
       raise ValueError('File does not exist.')
     local_file = self.blob_storage.OpenBlob(blobkey)
-    local_file.seek(start)
-    if end:
-      return local_file.read(end - start + 1)
-    else:
-      return local_file.read()
+    try:
+      local_file.seek(start)
+      if end is not None:
+        return local_file.read(end - start + 1)
+      else:
+        return local_file.read()
+    finally:
+      local_file.close()
 
   @db.non_transactional
   def head_object(self, filename):
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.ext.cloudstorage.cloudstorage_stub."""
+
+import hashlib
+import httplib
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from google.appengine.api import datastore
+from google.appengine.api.blobstore import dict_blob_storage
+from google.appengine.api.blobstore import file_blob_storage
+from google.appengine.ext import testbed
+from google.appengine.ext.cloudstorage import cloudstorage_stub
+
+# Uploaded content spans several blocks of blob storage.
+_CONTENT_SIZE = 2 * (1 << 20) + 12345
+
+
+def _Chunks(content, sizes):
+  """Splits content into chunks of the given sizes and the rest."""
+  chunks = []
+  for size in sizes:
+    chunks.append(content[:size])
+    content = content[size:]
+  return chunks + [content]
+
+
+class ConcatenatedBlobReaderTest(unittest.TestCase):
+  """Tests reading blobs back to back."""
+
+  def setUp(self):
+    self.storage = dict_blob_storage.DictBlobStorage()
+    blobs = ['abc', '', 'defghij', 'k', '', 'lmnopqrstuvwxyz']
+    self.content = ''.join(blobs)
+    self.blobkeys = []
+    for index, blob in enumerate(blobs):
+      self.storage.CreateBlob('blob%d' % index, blob)
+      self.blobkeys.append('blob%d' % index)
+
+  def Reader(self):
+    return cloudstorage_stub._ConcatenatedBlobReader(self.storage,
+                                                     self.blobkeys)
+
+  def testReadAll(self):
+    reader = self.Reader()
+    self.assertEqual(self.content, reader.read())
+    self.assertEqual('', reader.read())
+    self.assertEqual(len(self.content), reader.size)
+    self.assertEqual(hashlib.md5(self.content).hexdigest(),
+                     reader.md5.hexdigest())
+
+  def testReadAcrossBlobs(self):
+    for size in (1, 2, 3, 4, 8, 100):
+      reader = self.Reader()
+      chunks = []
+      while True:
+        chunk = reader.read(size)
+        if not chunk:
+          break
+        chunks.append(chunk)
+      self.assertEqual(self.content, ''.join(chunks), size)
+      # Only the last read returns less than was asked for.
+      self.assertEqual([size] * (len(chunks) - 1),
+                       [len(chunk) for chunk in chunks[:-1]])
+      self.assertEqual(len(self.content), reader.size)
+      self.assertEqual(hashlib.md5(self.content).hexdigest(),
+                       reader.md5.hexdigest())
+
+  def testReadRestAfterPartialRead(self):
+    reader = self.Reader()
+    self.assertEqual('abcd', reader.read(4))
+    self.assertEqual(self.content[4:], reader.read(-1))
+
+  def testNoBlobs(self):
+    reader = cloudstorage_stub._ConcatenatedBlobReader(self.storage, [])
+    self.assertEqual('', reader.read(10))
+    self.assertEqual(0, reader.size)
+
+
+class CloudStorageStubTest(unittest.TestCase):
+  """Tests uploads, reads and compose with blobs kept in memory."""
+
+  def setUp(self):
+    self.testbed = testbed.Testbed()
+    self.testbed.activate()
+    self.testbed.init_datastore_v3_stub()
+    self.storage = self.MakeStorage()
+    self.stub = cloudstorage_stub.CloudStorageStub(self.storage)
+
+  def tearDown(self):
+    self.testbed.deactivate()
+
+  def MakeStorage(self):
+    return dict_blob_storage.DictBlobStorage()
+
+  def BlobExists(self, blobkey):
+    try:
+      self.storage.OpenBlob(blobkey).close()
+    except (KeyError, IOError):
+      return False
+    return True
+
+  def StartUpload(self, filename, chunks, options=None):
+    """Uploads chunks without finalizing the file.
+
+    Returns:
+      (token, blobkeys of the chunks) tuple.
+    """
+    token = self.stub.post_start_creation(filename, options or {})
+    blobkeys = []
+    offset = 0
+    for chunk in chunks:
+      end = offset + len(chunk) - 1
+      self.stub.put_continue_creation(token, chunk, (offset, end))
+      blobkeys.append('%s-%d-%d' % (token, offset, end))
+      offset += len(chunk)
+    self.assertEqual(offset - 1, self.stub.put_empty(token))
+    return token, blobkeys
+
+  def Upload(self, filename, content, sizes=(), options=None):
+    chunks = _Chunks(content, sizes)
+    token, _ = self.StartUpload(filename, chunks, options)
+    return self.stub.put_continue_creation(token, None, None,
+                                           length=len(content))
+
+  def Partials(self):
+    return cloudstorage_stub._AE_GCSPartialFile_.all(namespace='').fetch(None)
+
+  def testChunkedUpload(self):
+    content = os.urandom(_CONTENT_SIZE)
+    chunks = _Chunks(content, [1, 1 << 20, 256 * 1024 - 1, 7])
+    token, blobkeys = self.StartUpload('/bucket/file', chunks,
+                                       {'content-type': 'text/plain'})
+    self.assertIsNone(self.stub.head_object('/bucket/file'))
+    info = self.stub.put_continue_creation(token, None, None,
+                                           length=len(content))
+    self.assertTrue(info.finalized)
+    self.assertEqual(content, self.stub.get_object('/bucket/file'))
+
+    md5 = hashlib.md5(content).hexdigest()
+    stat = self.stub.head_object('/bucket/file')
+    self.assertEqual((len(content), md5, 'text/plain'),
+                     (stat.st_size, stat.etag, stat.content_type))
+    blob_info = datastore.Get(datastore.Key.from_path(
+        '__BlobInfo__', token, namespace=''))
+    self.assertEqual((len(content), md5),
+                     (blob_info['size'], blob_info['md5_hash']))
+    # The chunks are removed once they are joined.
+    self.assertEqual([], self.Partials())
+    self.assertEqual([], filter(self.BlobExists, blobkeys))
+    # Later requests for the upload don't change the file.
+    self.assertRaises(ValueError, self.stub.put_continue_creation, token,
+                      'more', (len(content), len(content) + 3))
+    self.assertEqual(content, self.stub.get_object('/bucket/file'))
+
+  def testResentChunks(self):
+    content = os.urandom(1000)
+    token = self.stub.post_start_creation('/bucket/file', {})
+    self.stub.put_continue_creation(token, content[:400], (0, 399))
+    # A chunk that was already stored is ignored, and the part of a chunk
+    # that was already stored is skipped.
+    self.stub.put_continue_creation(token, content[100:300], (100, 299))
+    self.stub.put_continue_creation(token, content[300:700], (300, 699))
+    self.stub.put_continue_creation(token, content[700:], (700, 999),
+                                    length=1000)
+    self.assertEqual(content, self.stub.get_object('/bucket/file'))
+
+  def testChunkAfterGap(self):
+    token = self.stub.post_start_creation('/bucket/file', {})
+    self.stub.put_continue_creation(token, 'a' * 10, (0, 9))
+    with self.assertRaises(ValueError) as cm:
+      self.stub.put_continue_creation(token, 'b' * 10, (11, 20))
+    self.assertEqual(httplib.REQUESTED_RANGE_NOT_SATISFIABLE,
+                     cm.exception.args[1])
+    with self.assertRaises(ValueError) as cm:
+      self.stub.put_continue_creation(token, None, None, length=21)
+    self.assertEqual(httplib.REQUESTED_RANGE_NOT_SATISFIABLE,
+                     cm.exception.args[1])
+    self.assertEqual(9, self.stub.put_empty(token))
+
+  def AddPartial(self, token, start, content):
+    """Stores a chunk directly, as a lost or repeated request could."""
+    gcs_file = cloudstorage_stub._AE_GCSFileInfo_.get_by_key_name(token)
+    end = start + len(content)
+    blobkey = '%s-%d-%d' % (token, start, end - 1)
+    self.storage.StoreBlob(blobkey, StringIO.StringIO(content))
+    cloudstorage_stub._AE_GCSPartialFile_(
+        parent=gcs_file, key_name='%020d' % start, partial_content=blobkey,
+        end=end).put()
+    gcs_file.next_offset = max(gcs_file.next_offset, end)
+    gcs_file.put()
+    return blobkey
+
+  def CheckCorruptedUpload(self, partials, message):
+    token = self.stub.post_start_creation('/bucket/file', {})
+    blobkeys = [self.AddPartial(token, start, content)
+                for start, content in partials]
+    end = max(start + len(content) for start, content in partials)
+    with self.assertRaises(ValueError) as cm:
+      self.stub.put_continue_creation(token, None, None, length=end)
+    self.assertEqual(message, cm.exception.args[0])
+    # The upload is discarded.
+    self.assertEqual([], self.Partials())
+    self.assertEqual([], filter(self.BlobExists, blobkeys))
+    self.assertRaises(ValueError, self.stub.put_empty, token)
+    self.assertIsNone(self.stub.head_object('/bucket/file'))
+
+  def testMissingChunk(self):
+    self.CheckCorruptedUpload(
+        [(0, 'a' * 10), (20, 'c' * 10), (30, 'd' * 10)],
+        'File is corrupted due to missing chunks.')
+
+  def testMissingFirstChunk(self):
+    self.CheckCorruptedUpload(
+        [(10, 'b' * 10)], 'File is corrupted due to missing chunks.')
+
+  def testOverlappingChunks(self):
+    self.CheckCorruptedUpload(
+        [(0, 'a' * 10), (5, 'b' * 10)],
+        'File is corrupted due to overlapping chunks.')
+
+  def testRangedReads(self):
+    content = os.urandom(_CONTENT_SIZE)
+    sizes = [1000, 1 << 20, 999]
+    self.Upload('/bucket/file', content, sizes)
+    boundaries = [0, 1000, 1000 + (1 << 20), 2000 + (1 << 20),
+                  _CONTENT_SIZE - 1]
+    for boundary in boundaries:
+      for start in (boundary - 1, boundary, boundary + 1):
+        start = max(start, 0)
+        for length in (1, 2, 3000, 1 << 20):
+          end = start + length - 1
+          self.assertEqual(content[start:end + 1],
+                           self.stub.get_object('/bucket/file', start, end),
+                           (start, end))
+        self.assertEqual(content[start:],
+                         self.stub.get_object('/bucket/file', start))
+
+  def testGetMissingObject(self):
+    self.assertRaises(ValueError, self.stub.get_object, '/bucket/missing')
+    self.StartUpload('/bucket/file', ['abc'])
+    self.assertRaises(ValueError, self.stub.get_object, '/bucket/file')
+
+  def testCompose(self):
+    parts = [os.urandom(size) for size in (1000, 1 << 20, 0, 4321)]
+    for index, part in enumerate(parts):
+      self.Upload('/bucket/part%d' % index, part, [len(part) // 2])
+    sources = ['/bucket/part%d' % index for index in (0, 1, 2, 3, 0)]
+    content = ''.join(parts) + parts[0]
+
+    info = self.stub.put_compose('/bucket/composed', sources,
+                                 {'content-type': 'text/plain'})
+    self.assertTrue(info.finalized)
+    self.assertEqual(content, self.stub.get_object('/bucket/composed'))
+    stat = self.stub.head_object('/bucket/composed')
+    self.assertEqual(
+        (len(content), hashlib.md5(content).hexdigest(), 'text/plain'),
+        (stat.st_size, stat.etag, stat.content_type))
+    # The sources are left alone.
+    for index, part in enumerate(parts):
+      self.assertEqual(part, self.stub.get_object('/bucket/part%d' % index))
+
+  def testComposeIntoSource(self):
+    first = os.urandom(3000)
+    second = os.urandom(5000)
+    self.Upload('/bucket/first', first)
+    self.Upload('/bucket/second', second)
+    token = self.stub._filename_to_blobkey('/bucket/first')
+
+    self.stub.put_compose('/bucket/first', ['/bucket/second', '/bucket/first',
+                                            '/bucket/first'], {})
+    content = second + first + first
+    self.assertEqual(content, self.stub.get_object('/bucket/first'))
+    self.assertEqual(len(content),
+                     self.stub.head_object('/bucket/first').st_size)
+    self.assertFalse(self.BlobExists('%s-compose' % token))
+
+    self.stub.put_compose('/bucket/first', ['/bucket/first'], {})
+    self.assertEqual(content, self.stub.get_object('/bucket/first'))
+
+  def testComposeReplacesObjects(self):
+    self.Upload('/bucket/source', 'source')
+    self.Upload('/bucket/dst', 'old content')
+    self.stub.put_compose('/bucket/dst', ['/bucket/source'], {})
+    self.assertEqual('source', self.stub.get_object('/bucket/dst'))
+
+    # An upload in progress to the destination is discarded.
+    token, blobkeys = self.StartUpload('/bucket/upload', ['abc'])
+    self.stub.put_compose('/bucket/upload', ['/bucket/source'], {})
+    self.assertEqual('source', self.stub.get_object('/bucket/upload'))
+    self.assertEqual([], self.Partials())
+    self.assertEqual([], filter(self.BlobExists, blobkeys))
+
+  def testComposeMissingSource(self):
+    self.Upload('/bucket/source', 'source')
+    self.StartUpload('/bucket/unfinished', ['abc'])
+    for missing in ('/bucket/missing', '/bucket/unfinished'):
+      with self.assertRaises(ValueError) as cm:
+        self.stub.put_compose('/bucket/dst', ['/bucket/source', missing], {})
+      self.assertEqual(httplib.NOT_FOUND, cm.exception.args[1])
+      self.assertIn(missing, cm.exception.args[0])
+    self.assertIsNone(self.stub.head_object('/bucket/dst'))
+
+  def testComposeSourceCount(self):
+    self.Upload('/bucket/source', 'x')
+    for sources in ([], ['/bucket/source'] * 33):
+      with self.assertRaises(ValueError) as cm:
+        self.stub.put_compose('/bucket/dst', sources, {})
+      self.assertEqual(httplib.BAD_REQUEST, cm.exception.args[1])
+    self.stub.put_compose('/bucket/dst', ['/bucket/source'] * 32, {})
+    self.assertEqual('x' * 32, self.stub.get_object('/bucket/dst'))
+
+
+class FileCloudStorageStubTest(CloudStorageStubTest):
+  """Runs the same tests with blobs kept in files, which link copies."""
+
+  def MakeStorage(self):
+    self.storage_directory = tempfile.mkdtemp()
+    return file_blob_storage.FileBlobStorage(self.storage_directory,
+                                             'myapp')
+
+  def tearDown(self):
+    super(FileCloudStorageStubTest, self).tearDown()
+    shutil.rmtree(self.storage_directory)
+
+
+if __name__ == '__main__':
+  unittest.main()
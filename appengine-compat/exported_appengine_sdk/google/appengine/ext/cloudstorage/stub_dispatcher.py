@@ -151,6 +151,9 @@ def _handle_put(gcs_stub, filename, param_dict, headers, payload):
   if _iscopy(headers):
     return _copy(gcs_stub, filename, headers)
 
+  if 'compose' in param_dict:
+    return _compose(gcs_stub, filename, headers, payload)
+
 
   token = _get_param('upload_id', param_dict)
   content_range = _ContentRange(headers)
@@ -247,6 +250,34 @@ def _copy(gcs_stub, filename, headers):
   return _FakeUrlFetchResult(httplib.OK, {}, '')
 
 
+def _compose(gcs_stub, filename, headers, payload):
+  """Compose source objects into a new object.
+
+  Args:
+    gcs_stub: an instance of gcs stub.
+    filename: dst filename of format /bucket/filename
+    headers: a dict of request headers.
+    payload: a ComposeRequest XML document listing the source objects.
+
+  Returns:
+    An _FakeUrlFetchResult instance.
+  """
+  bucketpath = filename[:filename.index('/', 1)]
+  try:
+    root = ET.fromstring(payload)
+  except SyntaxError:
+    return _FakeUrlFetchResult(httplib.BAD_REQUEST, {},
+                               'Malformed compose request.')
+  sources = ['%s/%s' % (bucketpath, component.findtext('Name'))
+             for component in root.findall('Component')]
+  try:
+    gcs_file = gcs_stub.put_compose(filename, sources, headers)
+  except ValueError, e:
+    return _FakeUrlFetchResult(e.args[1], {}, e.args[0])
+  return _FakeUrlFetchResult(httplib.OK,
+                             {'content-length': 0, 'etag': gcs_file.etag}, '')
+
+
 def _handle_get(gcs_stub, filename, param_dict, headers):
   """Handle GET object and GET bucket."""
   mo = re.match(BUCKET_ONLY_PATH, filename)
@@ -442,6 +442,10 @@ def _initialize_properties(model_class, name, bases, dct):
     if not prop.indexed)
 
 
+  model_class._load_plan = tuple(
+    (prop.name, prop) for prop in model_class._properties.itervalues())
+
+
 def _coerce_to_key(value):
   """Returns the value's key.
 
@@ -1406,19 +1410,20 @@ class Model(object):
       entity: Entity which contain values to search dyanmic properties for.
     """
     entity_values = {}
-    for prop in cls.properties().values():
-      if prop.name in entity:
+    is_projection = entity.is_projection()
+    for name, prop in cls._load_plan:
+      if name in entity:
         try:
-          value = entity[prop.name]
+          value = entity[name]
         except KeyError:
 
-          entity_values[prop.name] = []
+          entity_values[name] = []
         else:
-          if entity.is_projection():
+          if is_projection:
             value = prop.make_value_from_datastore_index_value(value)
           else:
             value = prop.make_value_from_datastore(value)
-          entity_values[prop.name] = value
+          entity_values[name] = value
 
 
     return entity_values
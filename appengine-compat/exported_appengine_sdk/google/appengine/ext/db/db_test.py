@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for loading models with google.appengine.ext.db."""
+
+import unittest
+
+from google.appengine.api import datastore
+from google.appengine.ext import db
+from google.appengine.ext import testbed
+from google.appengine.ext.db import polymodel
+
+
+class Article(db.Model):
+  title = db.StringProperty(name='t', required=True)
+  body = db.TextProperty()
+  tags = db.StringListProperty()
+  rating = db.IntegerProperty(default=3)
+
+
+class Page(db.Expando):
+  title = db.StringProperty(name='t')
+  views = db.IntegerProperty()
+
+
+class Animal(polymodel.PolyModel):
+  name = db.StringProperty()
+
+
+class Dog(Animal):
+  breed = db.StringProperty()
+
+
+class Puppy(Dog):
+  age = db.IntegerProperty()
+
+
+class LoadTestBase(unittest.TestCase):
+
+  def setUp(self):
+    self.testbed = testbed.Testbed()
+    self.testbed.activate()
+    self.testbed.init_datastore_v3_stub()
+    self.testbed.init_memcache_stub()
+
+  def tearDown(self):
+    self.testbed.deactivate()
+
+
+class FromEntityTest(LoadTestBase):
+  """Tests for Model.from_entity and the class load plan."""
+
+  def testLoadPlan(self):
+    self.assertEqual(
+        set([('t', Article.title), ('body', Article.body),
+             ('tags', Article.tags), ('rating', Article.rating)]),
+        set(Article._load_plan))
+
+  def testPropertyName(self):
+    # The constructor takes the name the property is stored under.
+    key = Article(key_name='a', t='Title', body=db.Text('Body'),
+                  tags=['x', 'y']).put()
+    entity = datastore.Get(key)
+    self.assertEqual(set(['t', 'body', 'tags', 'rating']), set(entity))
+    article = Article.from_entity(entity)
+    self.assertEqual('Title', article.title)
+    self.assertEqual('Body', article.body)
+    self.assertEqual(['x', 'y'], article.tags)
+    self.assertEqual(3, article.rating)
+    self.assertEqual(key, article.key())
+
+  def testMissingProperty(self):
+    entity = datastore.Entity('Article', name='a')
+    entity['t'] = u'Title'
+    article = Article.from_entity(entity)
+    # Properties that are not stored get their defaults.
+    self.assertEqual(3, article.rating)
+    self.assertEqual([], article.tags)
+    self.assertEqual(None, article.body)
+
+  def testEmptyList(self):
+    key = Article(t='Title', tags=[]).put()
+    self.assertEqual([], Article.get(key).tags)
+
+  def testValidation(self):
+    entity = datastore.Entity('Article', name='a')
+    self.assertRaises(db.BadValueError, Article.from_entity, entity)
+
+  def testWrongKind(self):
+    self.assertRaises(db.KindError, Article.from_entity,
+                      datastore.Entity('Page'))
+
+  def testProjection(self):
+    Article(t='Title', tags=['x', 'y'], rating=5).put()
+    results = Article.all(projection=('t', 'rating')).fetch(10)
+    self.assertEqual(1, len(results))
+    self.assertEqual('Title', results[0].title)
+    self.assertEqual(5, results[0].rating)
+
+  def testExpando(self):
+    entity = datastore.Entity('Page', name='p')
+    entity['t'] = u'Title'
+    entity['views'] = 10
+    entity['extra'] = u'more'
+    entity['numbers'] = [1, 2]
+    datastore.Put(entity)
+    page = Page.get_by_key_name('p')
+    self.assertEqual('Title', page.title)
+    self.assertEqual(10, page.views)
+    self.assertEqual(u'more', page.extra)
+    self.assertEqual([1, 2], page.numbers)
+    self.assertEqual(set(['extra', 'numbers']),
+                     set(page.dynamic_properties()))
+    self.assertFalse(hasattr(page, 't'))
+
+    page.extra = u'changed'
+    page.put()
+    entity = datastore.Get(page.key())
+    self.assertEqual(set(['t', 'views', 'extra', 'numbers']), set(entity))
+    self.assertEqual(u'changed', entity['extra'])
+
+
+class PolyModelFromEntityTest(LoadTestBase):
+  """Tests for loading PolyModel hierarchies."""
+
+  def testLoadPlanIncludesInheritedProperties(self):
+    self.assertEqual(set(['class', 'name', 'breed', 'age']),
+                     set(name for name, _ in Puppy._load_plan))
+    self.assertEqual(set(['class', 'name']),
+                     set(name for name, _ in Animal._load_plan))
+
+  def testQueryBaseClass(self):
+    Animal(name='generic').put()
+    Dog(name='rex', breed='collie').put()
+    Puppy(name='bit', breed='pug', age=1).put()
+
+    animals = dict((a.name, a) for a in Animal.all())
+    self.assertEqual(set(['generic', 'rex', 'bit']), set(animals))
+    self.assertIs(Animal, type(animals['generic']))
+    self.assertIs(Dog, type(animals['rex']))
+    self.assertEqual('collie', animals['rex'].breed)
+    self.assertIs(Puppy, type(animals['bit']))
+    self.assertEqual('pug', animals['bit'].breed)
+    self.assertEqual(1, animals['bit'].age)
+    self.assertEqual('Puppy', animals['bit'].class_name())
+
+    dogs = Dog.all().fetch(10)
+    self.assertEqual(set(['rex', 'bit']), set(d.name for d in dogs))
+
+  def testClassProperty(self):
+    key = Puppy(name='bit', age=1).put()
+    entity = datastore.Get(key)
+    self.assertEqual(['Animal', 'Dog', 'Puppy'], entity['class'])
+    animal = Animal.from_entity(entity)
+    self.assertIs(Puppy, type(animal))
+    self.assertEqual(('Animal', 'Dog', 'Puppy'), animal.class_key())
+    self.assertEqual('bit', animal.name)
+    self.assertEqual(1, animal.age)
+
+
+if __name__ == '__main__':
+  unittest.main()
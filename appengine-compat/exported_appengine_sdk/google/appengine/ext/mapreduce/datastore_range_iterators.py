@@ -18,16 +18,23 @@
 
 
 
+import collections
+import time
 
+from google.appengine.api import apiproxy_rpc
+from google.appengine.api import datastore
 
 from google.appengine.datastore import datastore_query
 from google.appengine.datastore import datastore_rpc
 from google.appengine.ext import db
 from google.appengine.ext import key_range
+from google.appengine.ext import ndb
+from google.appengine.ext.mapreduce import context
 from google.appengine.ext.mapreduce import json_util
 from google.appengine.ext.mapreduce import key_ranges
 from google.appengine.ext.mapreduce import model
 from google.appengine.ext.mapreduce import namespace_range
+from google.appengine.ext.mapreduce import operation
 from google.appengine.ext.mapreduce import property_range
 from google.appengine.ext.mapreduce import util
 
@@ -42,6 +49,13 @@ __all__ = [
     "KeyRangeEntityProtoIterator"]
 
 
+
+COUNTER_INPUT_WAIT_MSEC = "input-wait-msec"
+
+
+COUNTER_INPUT_BATCHES = "input-batches"
+
+
 class RangeIteratorFactory(object):
   """Factory to create RangeIterator."""
 
@@ -380,33 +394,46 @@ class KeyRangeModelIterator(AbstractKeyRangeIterator):
   """Yields db/ndb model entities with a key range."""
 
   def __iter__(self):
-    self._query = self._key_range.make_ascending_query(
+    query = self._key_range.make_ascending_query(
         util.for_name(self._query_spec.model_class_path),
         filters=self._query_spec.filters)
-
-    if isinstance(self._query, db.Query):
-      if self._cursor:
-        self._query.with_cursor(self._cursor)
-      for model_instance in self._query.run(
-          batch_size=self._query_spec.batch_size,
-          keys_only=self._query_spec.keys_only):
-        yield model_instance
+    keys_only = self._query_spec.keys_only
+
+    if isinstance(query, db.Query):
+      raw_query = query._get_query()
+      connection = datastore._GetConnection()
+      config = raw_query.GetQueryOptions()
+      model_class = query._model_class
+      query = raw_query.GetQuery()
     else:
-      self._query = self._query.iter(batch_size=self._query_spec.batch_size,
-                                     keys_only=self._query_spec.keys_only,
-                                     start_cursor=self._cursor,
-                                     produce_cursors=True)
-      for model_instance in self._query:
-        yield model_instance
+      connection = ndb.model.make_connection()
+      config = None
+      model_class = None
+      query = query._get_query(connection)
+
+    cursor = self._cursor
+
+
+    if isinstance(cursor, basestring):
+      cursor = datastore_query.Cursor.from_websafe_string(cursor)
+    query_options = datastore_query.QueryOptions(
+        config=config,
+        batch_size=self._query_spec.batch_size,
+        keys_only=keys_only,
+        start_cursor=cursor,
+        produce_cursors=True)
+    self._query = _PrefetchingResultsIterator(
+        query, connection, query_options, self._query_spec.prefetch_depth)
+    for result in self._query:
+      if model_class is None or keys_only:
+        yield result
+      else:
+        yield model_class.from_entity(result)
 
   def _get_cursor(self):
     if self._query is None:
       return self._cursor
-
-    if isinstance(self._query, db.Query):
-      return self._query.cursor()
-    else:
-      return self._query.cursor_after()
+    return self._query.cursor()
 
 
 class KeyRangeEntityIterator(AbstractKeyRangeIterator):
@@ -415,18 +442,23 @@ class KeyRangeEntityIterator(AbstractKeyRangeIterator):
   _KEYS_ONLY = False
 
   def __iter__(self):
-    self._query = self._key_range.make_ascending_datastore_query(
+    query = self._key_range.make_ascending_datastore_query(
         self._query_spec.entity_kind, filters=self._query_spec.filters)
-    for entity in self._query.Run(config=datastore_query.QueryOptions(
+    query_options = datastore_query.QueryOptions(
+        config=query.GetQueryOptions(),
         batch_size=self._query_spec.batch_size,
         keys_only=self._query_spec.keys_only or self._KEYS_ONLY,
-        start_cursor=self._cursor)):
+        start_cursor=self._cursor)
+    self._query = _PrefetchingResultsIterator(
+        query.GetQuery(), datastore._GetConnection(), query_options,
+        self._query_spec.prefetch_depth)
+    for entity in self._query:
       yield entity
 
   def _get_cursor(self):
     if self._query is None:
       return self._cursor
-    return self._query.GetCursor()
+    return self._query.cursor()
 
 
 class KeyRangeKeyIterator(KeyRangeEntityIterator):
@@ -451,8 +483,9 @@ class KeyRangeEntityProtoIterator(AbstractKeyRangeIterator):
 
 
 
-    self._query = datastore_query.ResultsIterator(
-        query.GetQuery().run(connection, query_options))
+    self._query = _PrefetchingResultsIterator(
+        query.GetQuery(), connection, query_options,
+        self._query_spec.prefetch_depth)
     for entity_proto in self._query:
       yield entity_proto
 
@@ -462,6 +495,121 @@ class KeyRangeEntityProtoIterator(AbstractKeyRangeIterator):
     return self._query.cursor()
 
 
+class _PendingBatch(object):
+  """A datastore_query.Batch that has been requested but maybe not received."""
+
+  def __init__(self, rpc):
+    self.rpc = rpc
+    self.batch = None
+
+  def done(self):
+    """Returns True if the batch can be obtained without blocking."""
+    return (self.batch is not None or
+            self.rpc.state == apiproxy_rpc.RPC.FINISHING)
+
+
+class _PrefetchingResultsIterator(object):
+  """Iterates over query results while later batches are in flight.
+
+  datastore_query.ResultsIterator only requests the next batch when the
+  current one is handed out. This iterator keeps up to prefetch_depth batches
+  requested ahead of the batch being consumed. The datastore only allows a
+  batch to be requested once its predecessor has arrived, so additional
+  batches are chained as soon as the in flight ones complete.
+
+  cursor() always points just after the last result returned by next(), no
+  matter how many batches have been prefetched, so it is safe to serialize
+  into slice state.
+  """
+
+  def __init__(self, query, conn, query_options, prefetch_depth):
+    """Init.
+
+    Args:
+      query: the datastore_query.Query to run.
+      conn: the datastore_rpc.Connection to run the query with.
+      query_options: a datastore_query.QueryOptions for the query.
+      prefetch_depth: the maximum number of batches to keep requested ahead
+        of the current one. 0 fetches each batch on demand.
+    """
+    self._prefetch_depth = prefetch_depth
+    self._start_cursor = query_options.start_cursor
+    self._tail = _PendingBatch(query.run_async(conn, query_options))
+    self._pending = collections.deque([self._tail])
+    self._batch = None
+    self._pos = 0
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    """Returns the next query result."""
+    while self._batch is None or self._pos >= len(self._batch.results):
+      batch = self._next_batch()
+      if batch is None:
+        raise StopIteration()
+      self._batch = batch
+      self._pos = 0
+    result = self._batch.results[self._pos]
+    self._pos += 1
+    self._prefetch()
+    return result
+
+  def cursor(self):
+    """Returns a cursor that points just after the last result returned."""
+    if self._batch is None:
+      return self._start_cursor
+    return self._batch.cursor(self._pos)
+
+  def _next_batch(self):
+    """Returns the next batch or None if there are no more batches."""
+    if not self._pending and not self._request_next(wait=True):
+      return None
+    batch = self._get_batch(self._pending.popleft())
+    self._prefetch()
+    return batch
+
+  def _prefetch(self):
+    """Requests batches until prefetch_depth of them are pending."""
+    while (len(self._pending) < self._prefetch_depth and
+           self._request_next(wait=False)):
+      pass
+
+  def _request_next(self, wait):
+    """Requests the batch following the most recently requested one.
+
+    Args:
+      wait: whether to block until the most recently requested batch arrives.
+
+    Returns:
+      True if a new batch was requested.
+    """
+    tail = self._tail
+    if tail is None or not (wait or tail.done()):
+      return False
+    rpc = self._get_batch(tail).next_batch_async()
+    if rpc is None:
+      self._tail = None
+      return False
+    self._tail = _PendingBatch(rpc)
+    self._pending.append(self._tail)
+    return True
+
+  def _get_batch(self, pending):
+    """Gets the batch out of a _PendingBatch, recording time spent waiting."""
+    if pending.batch is None:
+      start_time = time.time()
+      pending.batch = pending.rpc.get_result()
+
+      ctx = context.get()
+      if ctx:
+        operation.counters.Increment(COUNTER_INPUT_BATCHES)(ctx)
+        operation.counters.Increment(
+            COUNTER_INPUT_WAIT_MSEC,
+            int((time.time() - start_time) * 1000))(ctx)
+    return pending.batch
+
+
 
 
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.ext.mapreduce.datastore_range_iterators."""
+
+import json
+import unittest
+
+from google.appengine.api import datastore
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import db
+from google.appengine.ext import key_range
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+from google.appengine.ext.mapreduce import context
+from google.appengine.ext.mapreduce import datastore_range_iterators as iters
+from google.appengine.ext.mapreduce import model
+
+NUM_ENTITIES = 23
+BATCH_SIZE = 5
+
+
+class DbEntity(db.Model):
+  value = db.IntegerProperty()
+
+
+class NdbEntity(ndb.Model):
+  value = ndb.IntegerProperty()
+
+
+def _Id(result):
+  """Returns the id of the key of any result an iterator yields."""
+  if isinstance(result, ndb.Model):
+    return result.key.id()
+  if isinstance(result, ndb.Key):
+    return result.id()
+  if isinstance(result, (db.Model, datastore.Entity)):
+    return result.key().id()
+  if isinstance(result, datastore.Key):
+    return result.id()
+  return result.key().path().element(0).id()
+
+
+class KeyRangeIteratorTest(unittest.TestCase):
+  """Tests iterating over a key range and resuming from slice state."""
+
+  def setUp(self):
+    self.testbed = testbed.Testbed()
+    self.testbed.activate()
+    self.testbed.init_datastore_v3_stub(
+        consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+            probability=1))
+    self.testbed.init_memcache_stub()
+    ndb.get_context().set_cache_policy(False)
+    self.ids = {
+        DbEntity: sorted(key.id() for key in db.put(
+            [DbEntity(value=i) for i in xrange(NUM_ENTITIES)])),
+        NdbEntity: sorted(key.id() for key in ndb.put_multi(
+            [NdbEntity(value=i) for i in xrange(NUM_ENTITIES)])),
+    }
+
+  def tearDown(self):
+    context.Context._set(None)
+    self.testbed.deactivate()
+
+  def QuerySpec(self, model_class, prefetch_depth, keys_only=False):
+    return model.QuerySpec(
+        model_class.__name__,
+        keys_only=keys_only,
+        batch_size=BATCH_SIZE,
+        model_class_path='%s.%s' % (__name__, model_class.__name__),
+        prefetch_depth=prefetch_depth)
+
+  def Resume(self, iterator_class, query_spec, stop_after):
+    """Iterates, stopping for slice state after stop_after results.
+
+    Returns:
+      The ids of the keys of the results, from before and after resuming.
+    """
+    iterator = iterator_class(key_range.KeyRange(), query_spec)
+    ids = []
+    for result in iterator:
+      ids.append(_Id(result))
+      if len(ids) == stop_after:
+        break
+    state = json.loads(json.dumps(iterator.to_json()))
+    resumed = iterator_class.from_json(state)
+    self.assertEqual(query_spec.prefetch_depth,
+                     resumed._query_spec.prefetch_depth)
+    ids.extend(_Id(result) for result in resumed)
+    return ids
+
+  def CheckResume(self, iterator_class, model_class, keys_only=False):
+    for prefetch_depth in (0, 1, 3):
+      query_spec = self.QuerySpec(model_class, prefetch_depth, keys_only)
+      for stop_after in (0, 1, 4, 5, 6, 12, NUM_ENTITIES - 1, NUM_ENTITIES):
+        self.assertEqual(
+            self.ids[model_class],
+            self.Resume(iterator_class, query_spec, stop_after),
+            (prefetch_depth, stop_after))
+
+  def testDbModel(self):
+    self.CheckResume(iters.KeyRangeModelIterator, DbEntity)
+    result = iter(iters.KeyRangeModelIterator(
+        key_range.KeyRange(), self.QuerySpec(DbEntity, 1))).next()
+    self.assertIsInstance(result, DbEntity)
+    self.assertEqual(self.ids[DbEntity][0], result.key().id())
+    self.assertEqual(DbEntity.get(result.key()).value, result.value)
+
+  def testDbModelKeysOnly(self):
+    self.CheckResume(iters.KeyRangeModelIterator, DbEntity, keys_only=True)
+
+  def testNdbModel(self):
+    self.CheckResume(iters.KeyRangeModelIterator, NdbEntity)
+    result = iter(iters.KeyRangeModelIterator(
+        key_range.KeyRange(), self.QuerySpec(NdbEntity, 1))).next()
+    self.assertIsInstance(result, NdbEntity)
+    self.assertEqual(self.ids[NdbEntity][0], result.key.id())
+    self.assertEqual(result.key.get().value, result.value)
+
+  def testNdbModelKeysOnly(self):
+    self.CheckResume(iters.KeyRangeModelIterator, NdbEntity, keys_only=True)
+
+  def testEntity(self):
+    self.CheckResume(iters.KeyRangeEntityIterator, DbEntity)
+
+  def testKey(self):
+    self.CheckResume(iters.KeyRangeKeyIterator, DbEntity)
+
+  def testEntityProto(self):
+    self.CheckResume(iters.KeyRangeEntityProtoIterator, DbEntity)
+
+  def testWebsafeCursorString(self):
+    # Slice state from before prefetching stored db cursors as strings.
+    query_spec = self.QuerySpec(DbEntity, 1)
+    iterator = iters.KeyRangeModelIterator(key_range.KeyRange(), query_spec)
+    results = iter(iterator)
+    for _ in xrange(7):
+      results.next()
+    state = iterator.to_json()
+    self.assertTrue(state['cursor_object'])
+    state['cursor_object'] = False
+    resumed = iters.KeyRangeModelIterator.from_json(state)
+    self.assertEqual(self.ids[DbEntity][7:], [_Id(r) for r in resumed])
+
+  def testCounters(self):
+    shard_state = model.ShardState.create_new('mapreduce-id', 0)
+    context.Context._set(context.Context(None, shard_state))
+    query_spec = self.QuerySpec(DbEntity, 2)
+    ids = [_Id(result) for result in
+           iters.KeyRangeEntityIterator(key_range.KeyRange(), query_spec)]
+    self.assertEqual(self.ids[DbEntity], ids)
+    counters = shard_state.counters_map
+    self.assertEqual(NUM_ENTITIES // BATCH_SIZE + 1,
+                     counters.get(iters.COUNTER_INPUT_BATCHES))
+    self.assertIn(iters.COUNTER_INPUT_WAIT_MSEC, counters.counters)
+    self.assertGreaterEqual(counters.get(iters.COUNTER_INPUT_WAIT_MSEC), 0)
+
+  def testNoContext(self):
+    query_spec = self.QuerySpec(DbEntity, 2)
+    self.assertEqual(
+        self.ids[DbEntity],
+        [_Id(result) for result in
+         iters.KeyRangeKeyIterator(key_range.KeyRange(), query_spec)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -265,6 +265,9 @@ class AbstractDatastoreInputReader(InputReader):
   _BATCH_SIZE = 50
 
 
+  _PREFETCH_DEPTH = 1
+
+
   _MAX_SHARD_COUNT = 256
 
 
@@ -276,6 +279,7 @@ class AbstractDatastoreInputReader(InputReader):
   ENTITY_KIND_PARAM = "entity_kind"
   KEYS_ONLY_PARAM = "keys_only"
   BATCH_SIZE_PARAM = "batch_size"
+  PREFETCH_DEPTH_PARAM = "prefetch_depth"
   KEY_RANGE_PARAM = "key_range"
   FILTERS_PARAM = "filters"
   WHOLE_EG_PARAM = "whole_eg"
@@ -337,7 +341,9 @@ class AbstractDatastoreInputReader(InputReader):
         batch_size=int(params.get(cls.BATCH_SIZE_PARAM, cls._BATCH_SIZE)),
         model_class_path=entity_kind,
         app=app,
-        ns=ns)
+        ns=ns,
+        prefetch_depth=int(params.get(cls.PREFETCH_DEPTH_PARAM,
+                                      cls._PREFETCH_DEPTH)))
 
   @classmethod
   def split_input(cls, mapper_spec):
@@ -554,6 +560,13 @@ class AbstractDatastoreInputReader(InputReader):
           raise BadReaderParamsError("Bad batch size: %s" % batch_size)
       except ValueError, e:
         raise BadReaderParamsError("Bad batch size: %s" % e)
+    if cls.PREFETCH_DEPTH_PARAM in params:
+      try:
+        prefetch_depth = int(params[cls.PREFETCH_DEPTH_PARAM])
+        if prefetch_depth < 0:
+          raise BadReaderParamsError("Bad prefetch depth: %s" % prefetch_depth)
+      except ValueError, e:
+        raise BadReaderParamsError("Bad prefetch depth: %s" % e)
     if cls.NAMESPACE_PARAM in params:
       if not isinstance(params[cls.NAMESPACE_PARAM],
                         (str, unicode, type(None))):
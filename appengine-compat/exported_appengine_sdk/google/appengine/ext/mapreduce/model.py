@@ -1206,6 +1206,7 @@ class QuerySpec(object):
   """Encapsulates everything about a query needed by DatastoreInputReader."""
 
   DEFAULT_BATCH_SIZE = 50
+  DEFAULT_PREFETCH_DEPTH = 1
 
   def __init__(self,
                entity_kind,
@@ -1214,7 +1215,8 @@ class QuerySpec(object):
                batch_size=None,
                model_class_path=None,
                app=None,
-               ns=None):
+               ns=None,
+               prefetch_depth=None):
     self.entity_kind = entity_kind
     self.keys_only = keys_only or False
     self.filters = filters or None
@@ -1222,6 +1224,9 @@ class QuerySpec(object):
     self.model_class_path = model_class_path
     self.app = app
     self.ns = ns
+    if prefetch_depth is None:
+      prefetch_depth = self.DEFAULT_PREFETCH_DEPTH
+    self.prefetch_depth = prefetch_depth
 
   def to_json(self):
     return {"entity_kind": self.entity_kind,
@@ -1230,7 +1235,8 @@ class QuerySpec(object):
             "batch_size": self.batch_size,
             "model_class_path": self.model_class_path,
             "app": self.app,
-            "ns": self.ns}
+            "ns": self.ns,
+            "prefetch_depth": self.prefetch_depth}
 
   @classmethod
   def from_json(cls, json):
@@ -1240,4 +1246,5 @@ class QuerySpec(object):
                json["batch_size"],
                json["model_class_path"],
                json["app"],
-               json["ns"])
+               json["ns"],
+               json.get("prefetch_depth"))
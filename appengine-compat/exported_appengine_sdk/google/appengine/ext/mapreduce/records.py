@@ -81,9 +81,12 @@ C will be stored as a FULL record in the fourth block.
 """
 
 __all__ = ['RecordsWriter',
-           'RecordsReader']
+           'RecordsReader',
+           'MmapRecordsReader']
 
 import logging
+import mmap
+import os
 import struct
 
 import google
@@ -92,13 +95,6 @@ import google
 from google.appengine.api.files import crc32c
 from . import errors
 
-try:
-
-  import crcmod
-  _CRC_FUN = crcmod.predefined.mkPredefinedCrcFun('crc-32c')
-except ImportError:
-  _CRC_FUN = None
-
 
 
 
@@ -153,27 +149,17 @@ def _unmask_crc(masked_crc):
   return ((rot >> 17) | (rot << 15)) & 0xFFFFFFFFL
 
 
-def _compute_native_crc(record_type, data):
-  """Computes crc using native crcmod library."""
-
-
-  return _CRC_FUN(chr(record_type) + data)
-
+def _compute_crc(record_type, data):
+  """Computes the crc of record type and data.
 
-def _compute_python_crc(record_type, data):
-  """Computes crc using naive python implementation."""
-  crc = crc32c.crc_update(crc32c.CRC_INIT, [record_type])
+  crc32c selects the fastest implementation available (SSE4.2, crcmod or
+  pure python) when it is imported.
+  """
+  crc = crc32c.crc_update(crc32c.CRC_INIT, chr(record_type))
   crc = crc32c.crc_update(crc, data)
   return crc32c.crc_finalize(crc)
 
 
-def _compute_crc(record_type, data):
-  """Computes the crc using crcmod (native) if available, crc32c otherwise."""
-  if _CRC_FUN is None:
-    return  _compute_python_crc(record_type, data)
-  return _compute_native_crc(record_type, data)
-
-
 class RecordsWriter(object):
   """A writer for records format."""
 
@@ -379,3 +365,278 @@ class RecordsReader(object):
     Arguments are passed directly to the underlying reader.
     """
     return self.__reader.seek(*args, **kwargs)
+
+
+class MmapRecordsReader(object):
+  """A zero-copy reader for records files on a local file system.
+
+  The file is memory mapped instead of being read block by block.
+  read_buffer() returns FULL records as buffer objects pointing into the
+  mapping. Fragmented records are joined once, after all of their fragments
+  have been located. read() and iteration return strings, like RecordsReader.
+  """
+
+  def __init__(self, local_file, verify_checksums=True):
+    """Init.
+
+    Args:
+      local_file: a file name or a file object opened for reading on a local
+        file system.
+      verify_checksums: whether to check the crc of each record as it is
+        read. verify() can be used to check the whole file in one pass
+        instead.
+    """
+    if isinstance(local_file, basestring):
+      with open(local_file, 'rb') as f:
+        self.__mmap = self.__map_file(f)
+    else:
+      self.__mmap = self.__map_file(local_file)
+    self.__size = len(self.__mmap)
+    self.__position = 0
+    self.__verify_checksums = verify_checksums
+    self.__skip_fragments = False
+    self.__record_offset = None
+
+  @staticmethod
+  def __map_file(f):
+    """Map a file read only. Empty files can't be mapped and map to ''."""
+    size = os.fstat(f.fileno()).st_size
+    if not size:
+      return ''
+    return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+  def __try_read_record(self):
+    """Try reading a record.
+
+    Returns:
+      (offset, length, record_type) tuple where offset and length locate the
+      record data in the file.
+    Raises:
+      EOFError: when end of file was reached.
+      InvalidRecordError: when valid record could not be read.
+    """
+    position = self.__position
+    block_remaining = _BLOCK_SIZE - position % _BLOCK_SIZE
+    if block_remaining < _HEADER_LENGTH:
+      return (position, 0, _RECORD_TYPE_NONE)
+
+    data_offset = position + _HEADER_LENGTH
+    if data_offset > self.__size:
+      raise EOFError('Read %s bytes instead of %s' %
+                     (self.__size - position, _HEADER_LENGTH))
+
+    (masked_crc, length, record_type) = struct.unpack_from(
+        _HEADER_FORMAT, self.__mmap, position)
+    self.__position = data_offset
+
+    if length + _HEADER_LENGTH > block_remaining:
+
+      raise errors.InvalidRecordError('Length is too big')
+
+    if data_offset + length > self.__size:
+      raise EOFError('Not enough data read. Expected: %s but got %s' %
+                     (length, self.__size - data_offset))
+    self.__position = data_offset + length
+
+    if record_type == _RECORD_TYPE_NONE:
+      return (data_offset, 0, record_type)
+
+
+
+
+    if self.__verify_checksums:
+      actual_crc = crc32c.crc(buffer(self.__mmap, data_offset - 1, length + 1))
+      if actual_crc != _unmask_crc(masked_crc):
+        raise errors.InvalidRecordError('Data crc does not match')
+    return (data_offset, length, record_type)
+
+  def __sync(self):
+    """Skip reader to the block boundary."""
+    pad_length = _BLOCK_SIZE - self.__position % _BLOCK_SIZE
+    if pad_length and pad_length != _BLOCK_SIZE:
+      if self.__position + pad_length > self.__size:
+        raise EOFError('Read %d bytes instead of %d' %
+                       (self.__size - self.__position, pad_length))
+      self.__position += pad_length
+
+  def read_buffer(self):
+    """Reads record from current position without copying when possible.
+
+    Returns:
+      a buffer into the mapped file for a FULL record, or a string holding
+      the joined fragments of a fragmented record.
+    Raises:
+      EOFError: when end of file was reached.
+    """
+    fragments = None
+    while True:
+      last_offset = self.__position
+      try:
+        (offset, length, record_type) = self.__try_read_record()
+        if record_type == _RECORD_TYPE_NONE:
+          self.__sync()
+        elif record_type == _RECORD_TYPE_FULL:
+          if fragments is not None:
+            logging.warning(
+                "Ordering corruption: Got FULL record while already "
+                "in a chunk at offset %d", last_offset)
+          self.__skip_fragments = False
+          self.__record_offset = last_offset
+          return buffer(self.__mmap, offset, length)
+        elif record_type == _RECORD_TYPE_FIRST:
+          if fragments is not None:
+            logging.warning(
+                "Ordering corruption: Got FIRST record while already "
+                "in a chunk at offset %d", last_offset)
+          self.__skip_fragments = False
+          first_offset = last_offset
+          fragments = [(offset, length)]
+        elif record_type == _RECORD_TYPE_MIDDLE:
+          if fragments is not None:
+            fragments.append((offset, length))
+          elif not self.__skip_fragments:
+            logging.warning(
+                "Ordering corruption: Got MIDDLE record before FIRST "
+                "record at offset %d", last_offset)
+        elif record_type == _RECORD_TYPE_LAST:
+          if fragments is not None:
+            fragments.append((offset, length))
+            self.__record_offset = first_offset
+            return ''.join(self.__mmap[start:start + size]
+                           for start, size in fragments)
+          elif not self.__skip_fragments:
+            logging.warning(
+                "Ordering corruption: Got LAST record but no chunk is in "
+                "progress at offset %d", last_offset)
+        else:
+          raise errors.InvalidRecordError(
+              "Unsupported record type: %s" % record_type)
+
+      except errors.InvalidRecordError, e:
+        logging.warning("Invalid record encountered at %s (%s). Syncing to "
+                        "the next block", last_offset, e)
+        fragments = None
+        self.__sync()
+
+  def read(self):
+    """Reads record from current position.
+
+    Returns:
+      original bytes stored in a single record.
+    Raises:
+      EOFError: when end of file was reached.
+    """
+    return str(self.read_buffer())
+
+  def __iter__(self):
+    try:
+      while True:
+        yield self.read()
+    except EOFError:
+      pass
+
+  def iter_buffers(self):
+    """Iterates over records as returned by read_buffer()."""
+    try:
+      while True:
+        yield self.read_buffer()
+    except EOFError:
+      pass
+
+  def verify(self):
+    """Checks the crc of every record in the file in one pass.
+
+    The current position is not changed.
+
+    Returns:
+      a list of offsets of the records that are corrupted.
+    """
+    corrupted = []
+    position = self.__position
+    verify_checksums = self.__verify_checksums
+    self.__position = 0
+    self.__verify_checksums = True
+    try:
+      while True:
+        offset = self.__position
+        try:
+          if self.__try_read_record()[2] == _RECORD_TYPE_NONE:
+            self.__sync()
+        except errors.InvalidRecordError:
+          corrupted.append(offset)
+          self.__sync()
+    except EOFError:
+      pass
+    finally:
+      self.__position = position
+      self.__verify_checksums = verify_checksums
+    return corrupted
+
+  def tell(self):
+    """Return file's current position."""
+    return self.__position
+
+  def seek(self, offset, whence=os.SEEK_SET):
+    """Set the file's current position.
+
+    Args:
+      offset: offset to seek to, interpreted according to whence.
+      whence: os.SEEK_SET, os.SEEK_CUR or os.SEEK_END.
+    """
+    if whence == os.SEEK_CUR:
+      offset += self.__position
+    elif whence == os.SEEK_END:
+      offset += self.__size
+    self.__position = offset
+
+  def seek_to_block(self, offset):
+    """Set the current position to the first block boundary >= offset.
+
+    Fragments of a record that began before that boundary are skipped
+    silently until the next record starts.
+
+    Args:
+      offset: offset in the file.
+    """
+    self.__position = -(-offset // _BLOCK_SIZE) * _BLOCK_SIZE
+    self.__skip_fragments = True
+
+  def record_offset(self):
+    """Return the offset of the header of the last record read."""
+    return self.__record_offset
+
+  def iter_split(self, start, end, buffers=False):
+    """Iterates over the records of one split of the file.
+
+    Split boundaries are rounded up to block boundaries. A split yields the
+    records whose first fragment starts within it, reading past its end to
+    finish the last one, so adjacent splits together yield every record
+    exactly once.
+
+    Args:
+      start: offset in the file the split starts at.
+      end: offset in the file the split ends at. Exclusive.
+      buffers: whether to yield records as returned by read_buffer()
+        instead of strings.
+
+    Yields:
+      records of the split.
+    """
+    end = -(-end // _BLOCK_SIZE) * _BLOCK_SIZE
+    self.seek_to_block(start)
+    try:
+      while self.__position < end:
+        record = self.read_buffer()
+        if self.__record_offset >= end:
+          break
+        if buffers:
+          yield record
+        else:
+          yield str(record)
+    except EOFError:
+      pass
+
+  def close(self):
+    """Unmap the file."""
+    if isinstance(self.__mmap, mmap.mmap):
+      self.__mmap.close()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.ext.mapreduce.records."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from google.appengine.ext.mapreduce import records
+
+BLOCK_SIZE = records._BLOCK_SIZE
+HEADER_LENGTH = records._HEADER_LENGTH
+
+
+def _MakeRecords():
+  """Returns records of all kinds: empty, FULL and split across blocks."""
+  rand = random.Random(42)
+  data = []
+  # Leaves exactly seven bytes in the first block, so that the next record
+  # starts with an empty FIRST fragment.
+  data.append('a' * (BLOCK_SIZE - 2 * HEADER_LENGTH))
+  data.append('b' * 10)
+  data.append('')
+  for length in (1, 100, BLOCK_SIZE - HEADER_LENGTH, BLOCK_SIZE,
+                 3 * BLOCK_SIZE + 17):
+    data.append(''.join(chr(rand.randrange(256)) for _ in xrange(length)))
+  for _ in xrange(200):
+    data.append(os.urandom(rand.choice((0, 7, 300, 5000, 40000))))
+  return data
+
+
+class MmapRecordsReaderTest(unittest.TestCase):
+  """Tests reading records files through MmapRecordsReader."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.records = _MakeRecords()
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = self.Write(self.records)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def Write(self, data, name='records'):
+    path = os.path.join(self.tmpdir, name)
+    with open(path, 'wb') as f:
+      writer = records.RecordsWriter(f)
+      for record in data:
+        writer.write(record)
+    return path
+
+  def Corrupt(self, offset, path=None):
+    """Flips the byte at offset in the file."""
+    with open(path or self.path, 'r+b') as f:
+      f.seek(offset)
+      byte = f.read(1)
+      f.seek(offset)
+      f.write(chr(ord(byte) ^ 0xff))
+
+  def ReadAll(self, path=None):
+    """Reads a file with RecordsReader, the reference implementation."""
+    with open(path or self.path, 'rb') as f:
+      return list(records.RecordsReader(f))
+
+  def Offsets(self):
+    """Returns the offsets of the headers of all records in the file."""
+    reader = records.MmapRecordsReader(self.path)
+    offsets = []
+    try:
+      while True:
+        reader.read_buffer()
+        offsets.append(reader.record_offset())
+    except EOFError:
+      return offsets
+    finally:
+      reader.close()
+
+  def testRoundTrip(self):
+    reader = records.MmapRecordsReader(self.path)
+    self.assertEqual(self.records, list(reader))
+    self.assertEqual(os.path.getsize(self.path), reader.tell())
+    self.assertRaises(EOFError, reader.read)
+    reader.close()
+
+  def testReadBuffer(self):
+    reader = records.MmapRecordsReader(self.path)
+    buffers = list(reader.iter_buffers())
+    self.assertEqual(self.records, [str(b) for b in buffers])
+    # Records that fit in a block are not copied, fragmented ones are joined.
+    self.assertIsInstance(buffers[3], buffer)
+    self.assertIsInstance(buffers[1], str)
+    del buffers
+    reader.close()
+
+  def testWithoutChecksums(self):
+    reader = records.MmapRecordsReader(self.path, verify_checksums=False)
+    self.assertEqual(self.records, list(reader))
+    reader.close()
+
+  def testFileObject(self):
+    with open(self.path, 'rb') as f:
+      reader = records.MmapRecordsReader(f)
+    self.assertEqual(self.records, list(reader))
+    reader.close()
+
+  def testEmptyFile(self):
+    reader = records.MmapRecordsReader(self.Write([], name='empty'))
+    self.assertEqual([], list(reader))
+    self.assertEqual([], list(reader.iter_split(0, BLOCK_SIZE)))
+    self.assertEqual([], reader.verify())
+    reader.close()
+
+  def testSeek(self):
+    offsets = self.Offsets()
+    reader = records.MmapRecordsReader(self.path)
+    reader.seek(offsets[5])
+    self.assertEqual(self.records[5], reader.read())
+    self.assertEqual(offsets[5], reader.record_offset())
+    reader.seek(offsets[7] - offsets[6], os.SEEK_CUR)
+    self.assertEqual(self.records[7], reader.read())
+    reader.seek(0, os.SEEK_END)
+    self.assertEqual([], list(reader))
+    reader.close()
+
+  def testSeekToBlock(self):
+    reader = records.MmapRecordsReader(self.path)
+    with mock.patch.object(records.logging, 'warning') as warning:
+      reader.seek_to_block(1)
+      self.assertEqual(BLOCK_SIZE, reader.tell())
+      # The rest of the record split across the first two blocks is skipped.
+      self.assertEqual(self.records[2], reader.read())
+      reader.seek_to_block(BLOCK_SIZE)
+      self.assertEqual(BLOCK_SIZE, reader.tell())
+    self.assertFalse(warning.called)
+    reader.close()
+
+  def testSplitsCoverFile(self):
+    size = os.path.getsize(self.path)
+    for split_size in (1, BLOCK_SIZE - 1, BLOCK_SIZE, 3 * BLOCK_SIZE + 5,
+                       size // 3, size):
+      found = []
+      reader = records.MmapRecordsReader(self.path)
+      with mock.patch.object(records.logging, 'warning') as warning:
+        for start in xrange(0, size, split_size):
+          found.extend(reader.iter_split(start, start + split_size))
+      self.assertFalse(warning.called, split_size)
+      self.assertEqual(self.records, found, split_size)
+      reader.close()
+
+  def testSplitBuffers(self):
+    reader = records.MmapRecordsReader(self.path)
+    found = list(reader.iter_split(0, os.path.getsize(self.path),
+                                   buffers=True))
+    self.assertEqual(self.records, [str(record) for record in found])
+    self.assertTrue(any(isinstance(record, buffer) for record in found))
+    del found
+    reader.close()
+
+  def testCorruptedRecord(self):
+    offsets = self.Offsets()
+    # The checksums of a FULL record, of a record spanning blocks and of the
+    # last record.
+    for index in (3, 7, len(self.records) - 1):
+      self.Corrupt(offsets[index])
+    expected = self.ReadAll()
+    self.assertLess(len(expected), len(self.records))
+
+    reader = records.MmapRecordsReader(self.path)
+    self.assertEqual(expected, list(reader))
+    reader.seek(0)
+    self.assertEqual(expected, [str(b) for b in reader.iter_buffers()])
+    size = os.path.getsize(self.path)
+    split = []
+    for start in xrange(0, size, 2 * BLOCK_SIZE):
+      split.extend(reader.iter_split(start, start + 2 * BLOCK_SIZE))
+    self.assertEqual(expected, split)
+    reader.close()
+
+  def testCorruptedHeader(self):
+    offsets = self.Offsets()
+    # The length becomes too big for the block.
+    self.Corrupt(offsets[4] + 5)
+    reader = records.MmapRecordsReader(self.path)
+    self.assertEqual(self.ReadAll(), list(reader))
+    self.assertEqual([offsets[4]], reader.verify())
+    reader.close()
+
+  def testVerify(self):
+    offsets = self.Offsets()
+    reader = records.MmapRecordsReader(self.path, verify_checksums=False)
+    self.assertEqual([], reader.verify())
+    # Data that only the checksums catch, in records of different blocks,
+    # since the rest of a block is skipped after a corrupted record.
+    later = min(index for index, offset in enumerate(offsets)
+                if offset > 8 * BLOCK_SIZE and self.records[index])
+    self.Corrupt(offsets[3] + HEADER_LENGTH)
+    self.Corrupt(offsets[later] + HEADER_LENGTH)
+    reader.close()
+
+    reader = records.MmapRecordsReader(self.path, verify_checksums=False)
+    reader.read()
+    position = reader.tell()
+    self.assertEqual([offsets[3], offsets[later]], reader.verify())
+    # Neither the position nor checksum verification are changed.
+    self.assertEqual(position, reader.tell())
+    self.assertEqual(self.records[1:3], [reader.read(), reader.read()])
+    self.assertNotEqual(self.records[3], reader.read())
+    reader.close()
+
+  def testTruncated(self):
+    size = os.path.getsize(self.path)
+    for length in (size - 1, size - HEADER_LENGTH - 1, BLOCK_SIZE + 3):
+      with open(self.path, 'rb') as f:
+        data = f.read(length)
+      path = os.path.join(self.tmpdir, 'truncated')
+      with open(path, 'wb') as f:
+        f.write(data)
+      reader = records.MmapRecordsReader(path)
+      self.assertEqual(self.ReadAll(path), list(reader))
+      self.assertEqual([], reader.verify())
+      reader.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
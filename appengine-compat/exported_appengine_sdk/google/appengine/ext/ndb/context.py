@@ -15,6 +15,7 @@
 
 """Context class."""
 
+import contextlib
 import logging
 import sys
 
@@ -35,11 +36,19 @@ from . import eventloop
 from . import utils
 
 __all__ = ['Context', 'ContextOptions', 'TransactionOptions', 'AutoBatcher',
-           'EVENTUAL_CONSISTENCY',
+           'EVENTUAL_CONSISTENCY', 'WriteBehindError',
           ]
 
 _LOCK_TIME = 32  # Time to lock out memcache.add() after datastore updates.
 _LOCKED = 0  # Special value to store in memcache indicating locked value.
+# The lock that get() sets before reading the datastore.  It compares equal
+# to _LOCKED, so that it locks out other get() calls just the same, but it
+# has a different type so that get() can tell if an update locked the value.
+_READ_LOCKED = 0L
+
+
+def _is_read_lock(value):
+  return isinstance(value, long) and value == _READ_LOCKED
 
 
 # Constant for read_policy.
@@ -96,6 +105,23 @@ class TransactionOptions(ContextOptions, datastore_rpc.TransactionOptions):
   """Support both context options and transaction options."""
 
 
+class WriteBehindError(datastore_errors.Error):
+  """Raised when writes held back by Context.write_behind() fail.
+
+  The errors attribute is a list of (key, exception) pairs, one for each
+  put or delete that failed.  Writes are sent in batches like other
+  writes, and a failure fails every write in its batch, so some of the
+  writes listed may in fact have been done if their batch took more than
+  one RPC.  The writes not listed have been done.
+  """
+
+  def __init__(self, errors):
+    self.errors = errors
+    super(WriteBehindError, self).__init__(
+        '%d of the writes held back by write_behind() failed: %s' %
+        (len(errors), '; '.join('%r: %s' % (key, err) for key, err in errors)))
+
+
 # options and config can be used interchangeably.
 _OPTION_TRANSLATIONS = {
     'options': 'config',
@@ -183,6 +209,9 @@ class AutoBatcher(object):
     utils.logging_debug('AutoBatcher(%s): %d items',
                         self._todo_tasklet.__name__, len(todo))
     batch_fut = self._todo_tasklet(todo, options)
+    profile = eventloop.get_profile()
+    if profile is not None:
+      profile._batched(self, todo, batch_fut)
     self._running.append(batch_fut)
     # Add a callback when we're done.
     batch_fut.add_callback(self._finished_callback, batch_fut, todo)
@@ -315,6 +344,9 @@ class Context(object):
     self._cache = {}
     self._memcache = memcache.Client()
     self._on_commit_queue = []
+    # While write_behind() is active, a map from Key to the (entity, or None
+    # for a delete, and ctx_options) of the last write held back for it.
+    self._pending_writes = None
 
   # NOTE: The default memcache prefix is altered if an incompatible change is
   # required. Remember to check release notes when using a custom prefix.
@@ -663,6 +695,19 @@ class Context(object):
     # If this returns None, the system default (typically, 5) will apply.
     return ContextOptions.memcache_deadline(options, self._conn.config)
 
+  def _load_from_pending_writes_if_available(self, key):
+    """Returns the entity of a write held back by write_behind(), if any.
+
+    Args:
+      key: Key instance.
+
+    Returns:
+      The Model instance put, or None if the key was deleted, if a write
+      to the key is being held back.
+    """
+    if self._is_held_back(key):
+      raise tasklets.Return(self._pending_writes[key][0])
+
   def _load_from_cache_if_available(self, key):
     """Returns a cached Model instance given the entity key if available.
 
@@ -701,6 +746,7 @@ class Context(object):
       A Model instance if the key exists in the datastore; None otherwise.
     """
     options = _make_ctx_options(ctx_options)
+    self._load_from_pending_writes_if_available(key)
     use_cache = self._use_cache(key, options)
     if use_cache:
       self._load_from_cache_if_available(key)
@@ -713,6 +759,7 @@ class Context(object):
       use_memcache = self._use_memcache(key, options)
     ns = key.namespace()
     memcache_deadline = None  # Avoid worries about uninitialized variable.
+    lock_future = None
 
     if use_memcache:
       mkey = self._memcache_prefix + key.urlsafe()
@@ -744,10 +791,15 @@ class Context(object):
           raise tasklets.Return(entity)
 
       if mvalue is None and use_datastore:
-        yield self.memcache_set(mkey, _LOCKED, time=_LOCK_TIME, namespace=ns,
-                                use_cache=True, deadline=memcache_deadline)
-        yield self.memcache_gets(mkey, namespace=ns, use_cache=True,
-                                 deadline=memcache_deadline)
+        yield self.memcache_set(mkey, _READ_LOCKED, time=_LOCK_TIME,
+                                namespace=ns, deadline=memcache_deadline)
+        # Once the lock is set, the datastore is read while the lock and its
+        # CAS id are retrieved, rather than after that.  An update that the
+        # read may not see locks the value again, either before the
+        # memcache_gets() (which then returns _LOCKED rather than
+        # _READ_LOCKED) or after it (so that the memcache_cas() fails).
+        lock_future = self.memcache_gets(mkey, namespace=ns, use_cache=True,
+                                         deadline=memcache_deadline)
 
     if not use_datastore:
       # NOTE: Do not cache this miss.  In some scenarios this would
@@ -759,6 +811,11 @@ class Context(object):
     else:
       entity = yield self._get_batcher.add(key, options)
 
+    if lock_future is not None:
+      lock = yield lock_future
+      if not _is_read_lock(lock):
+        mvalue = _LOCKED  # Don't write back what may be outdated.
+
     if entity is not None:
       if use_memcache and mvalue != _LOCKED:
         # Don't serialize the key since it's already the memcache key.
@@ -784,8 +841,98 @@ class Context(object):
 
     raise tasklets.Return(entity)
 
+  def _key_query(self, key, projection=None):
+    """Return a query whose only possible result is the entity for a key.
+
+    The key is its own ancestor, so the query is strongly consistent and
+    may be run in a transaction.  The projection, if any, is checked here.
+    """
+    from . import query  # query imports context.
+    return query.Query(kind=key.kind(), ancestor=key,
+                       filters=query.FilterNode('__key__', '=', key),
+                       projection=projection)
+
+  @tasklets.tasklet
+  def exists(self, key, **ctx_options):
+    """Return whether the entity for a key exists.
+
+    This looks in the context cache and memcache like get() does, and
+    then shares the batched datastore get RPCs of get(), but it neither
+    adds the entity to the context cache nor locks or writes memcache.
+    The datastore has no keys-only get, and a keys-only query per key
+    costs more than its share of a batched get.
+
+    Args:
+      key: Key instance.
+      **ctx_options: Context options.
+
+    Returns:
+      True if the entity exists in the datastore; False otherwise.
+    """
+    options = _make_ctx_options(ctx_options)
+    if self._is_held_back(key):
+      raise tasklets.Return(self._pending_writes[key][0] is not None)
+    if self._use_cache(key, options) and key in self._cache:
+      entity = self._cache[key]
+      if entity is None or entity._key == key:
+        raise tasklets.Return(entity is not None)
+
+    use_datastore = self._use_datastore(key, options)
+    if (self._use_memcache(key, options) and
+        not (use_datastore and
+             isinstance(self._conn, datastore_rpc.TransactionalConnection))):
+      mvalue = yield self.memcache_get(
+          self._memcache_prefix + key.urlsafe(), namespace=key.namespace(),
+          use_cache=True, deadline=self._get_memcache_deadline(options))
+      if mvalue not in (_LOCKED, None):
+        raise tasklets.Return(True)
+
+    if not use_datastore:
+      raise tasklets.Return(False)
+    entity = yield self._get_batcher.add(key, options)
+    raise tasklets.Return(entity is not None)
+
   @tasklets.tasklet
+  def get_projected(self, key, projection, **ctx_options):
+    """Return some of the properties of the entity for a key.
+
+    An entity in the context cache is returned as is.  Otherwise a
+    projection query for the key is run, and the partial entity it
+    returns, like any projection query result, is not cached.  As with a
+    projection query, the projected properties must be indexed, only the
+    first value of a repeated property is returned, and an entity without
+    a value for every projected property is not found.
+
+    Each key costs a query RPC rather than a share of a batched get RPC,
+    so this only pays off for a few keys of entities that are much larger
+    than the projected properties.
+
+    Args:
+      key: Key instance.
+      projection: A sequence of property names or Property instances.
+      **ctx_options: Context options.
+
+    Returns:
+      A Model instance if the key exists in the datastore; None otherwise.
+    """
+    options = _make_ctx_options(ctx_options)
+    # Check the projection even if the entity is cached.
+    key_query = self._key_query(key, projection)
+    self._load_from_pending_writes_if_available(key)
+    if self._use_cache(key, options):
+      self._load_from_cache_if_available(key)
+    if not self._use_datastore(key, options):
+      raise tasklets.Return(None)
+    entity = yield key_query.get_async(**ctx_options)
+    raise tasklets.Return(entity)
+
   def put(self, entity, **ctx_options):
+    if self._pending_writes is not None and entity._has_complete_key():
+      return self._hold_back(entity._key, entity, ctx_options)
+    return self._put(entity, **ctx_options)
+
+  @tasklets.tasklet
+  def _put(self, entity, **ctx_options):
     options = _make_ctx_options(ctx_options)
     # TODO: What if the same entity is being put twice?
     # TODO: What if two entities with the same key are being put?
@@ -843,8 +990,13 @@ class Context(object):
 
     raise tasklets.Return(key)
 
-  @tasklets.tasklet
   def delete(self, key, **ctx_options):
+    if self._pending_writes is not None:
+      return self._hold_back(key, None, ctx_options)
+    return self._delete(key, **ctx_options)
+
+  @tasklets.tasklet
+  def _delete(self, key, **ctx_options):
     options = _make_ctx_options(ctx_options)
     if self._use_memcache(key, options):
       memcache_deadline = self._get_memcache_deadline(options)
@@ -986,6 +1138,12 @@ class Context(object):
     retries = TransactionOptions.retries(options)
     if retries is None:
       retries = 3
+    if parent._pending_writes:
+      # Write the writes held back so far first, so that the transaction
+      # sees them and they don't overwrite what it writes.
+      pending = dict(parent._pending_writes)
+      parent._pending_writes.clear()
+      yield parent._write_pending(pending)
     yield parent.flush()
     for _ in xrange(1 + max(0, retries)):
       transaction = yield parent._conn.async_begin_transaction(options, app)
@@ -1075,6 +1233,128 @@ class Context(object):
     else:
       self._on_commit_queue.append(callback)
 
+  @contextlib.contextmanager
+  def write_behind(self):
+    """Hold back puts and deletes until the end of a with-block.
+
+    Use this as "with ctx.write_behind():" around code that writes
+    entities one by one, so that the writes are sent together, in as few
+    RPCs as the batch limits allow, when the block ends.  Only the last
+    put or delete of each key is sent.  A put of an entity with a complete
+    key returns its key at once; puts of entities without one are not
+    held back.  Entities are written, and prepared for writing as by
+    Model.put(), as they are at the end of the block.
+
+    The Futures returned by put_async() and delete_async() complete at
+    once, so they can be waited for in the block.  Post-put and
+    post-delete hooks run when the writes are done, and are passed the
+    Futures of the actual writes.  The hooks of a put superseded by a
+    later put of the same key, or of a delete superseded by a delete, run
+    with the later write; those of a put superseded by a delete, or the
+    other way around, run when it is superseded.
+
+    get() and exists() in this context see the writes held back, but
+    queries do not.  A transaction started in the block first writes the
+    writes held back so far.  Nested blocks join the outer one.
+
+    The writes are sent even if the block raises an exception, in which
+    case their errors are only logged.
+
+    Raises:
+      WriteBehindError if any of the writes failed.
+    """
+    if self._pending_writes is not None:
+      yield
+      return
+    pending = self._pending_writes = {}
+    try:
+      yield
+    except Exception:
+      t, e, tb = sys.exc_info()
+      self._pending_writes = None
+      err = self._write_pending(pending).get_exception()
+      if err is not None:
+        logging.error('Error while writing after an exception: %s', err)
+      raise t, e, tb
+    finally:
+      self._pending_writes = None
+    self._write_pending(pending).check_success()
+
+  def _is_held_back(self, key):
+    """Tell whether a write to the key is held back by write_behind()."""
+    return bool(self._pending_writes) and key in self._pending_writes
+
+  def _hold_back(self, key, entity, ctx_options):
+    """Hold back a put, or a delete if entity is None, for write_behind().
+
+    Returns:
+      A Future whose result is the key for a put, or None for a delete.
+    """
+    hooks = []
+    if key in self._pending_writes:
+      earlier, _, earlier_hooks = self._pending_writes[key]
+      if (earlier is None) == (entity is None):
+        hooks = earlier_hooks
+      else:
+        for hook, args, fut in earlier_hooks:
+          hook(*(args + (fut,)))
+    self._pending_writes[key] = (entity, ctx_options, hooks)
+    if self._use_cache(key, _make_ctx_options(dict(ctx_options))):
+      self._cache[key] = entity
+    fut = tasklets.Future('write_behind')
+    fut.set_result(key if entity is not None else None)
+    return fut
+
+  def _add_post_write_hook(self, key, fut, hook, *args):
+    """Arrange for a post-put or post-delete hook to run.
+
+    The hook is called with args and the Future of the write when the
+    write is done.  For a write held back by write_behind(), fut has
+    already completed, so the hook runs with the Future of the actual
+    write at the end of the block.
+    """
+    if self._is_held_back(key):
+      self._pending_writes[key][2].append((hook, args, fut))
+    else:
+      fut.add_immediate_callback(hook, *(args + (fut,)))
+
+  @tasklets.tasklet
+  def _write_pending(self, pending):
+    """Send the writes held back by write_behind().
+
+    Args:
+      pending: A dict of held back writes, as in self._pending_writes.
+
+    Raises:
+      WriteBehindError if any of the writes failed.
+    """
+    # All the writes are issued before the first yield, so that the
+    # autobatchers send them together.
+    writes = []
+    for key, (entity, ctx_options, hooks) in pending.iteritems():
+      if entity is None:
+        future = self._delete(key, **ctx_options)
+      else:
+        future = tasklets.Future('write_behind')
+        try:
+          # The entity may have changed since it was put.
+          entity._prepare_for_put()
+        except Exception, err:
+          future.set_exception(err, sys.exc_info()[2])
+        else:
+          future = self._put(entity, **ctx_options)
+      for hook, args, _ in hooks:
+        future.add_immediate_callback(hook, *(args + (future,)))
+      writes.append((key, future))
+    errors = []
+    for key, future in writes:
+      try:
+        yield future
+      except Exception, err:
+        errors.append((key, err))
+    if errors:
+      raise WriteBehindError(errors)
+
   def clear_cache(self):
     """Clears the in-memory cache.
 
@@ -1117,7 +1397,9 @@ class Context(object):
     method = getattr(self._memcache, methodname)
     mapping = {}
     for unused_fut, (key, value) in todo:
-      mapping[key] = value
+      # Setting _READ_LOCKED must not undo setting _LOCKED.
+      if not (_is_read_lock(value) and key in mapping):
+        mapping[key] = value
     rpc = memcache.create_rpc(deadline=deadline)
     results = yield method(mapping, time=time, namespace=namespace, rpc=rpc)
     for fut, (key, unused_value) in todo:
@@ -0,0 +1,360 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for context.py."""
+
+import unittest
+
+from google.appengine.api import datastore
+from google.appengine.api import datastore_errors
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from google.appengine.ext.ndb import context
+from google.appengine.ext.ndb import model
+from google.appengine.ext.ndb import test_utils
+
+
+class Note(ndb.Model):
+  title = ndb.StringProperty()
+  rank = ndb.IntegerProperty()
+  body = ndb.TextProperty()
+
+
+class ExistsTest(test_utils.NDBTest):
+  """Tests for Context.exists() and ndb.exists_multi()."""
+
+  def setUp(self):
+    super(ExistsTest, self).setUp()
+    self.key = Note(id=1, title='one', rank=1, body='body').put()
+    self.missing_key = ndb.Key(Note, 2)
+    self.ctx.clear_cache()
+
+  def isMemcached(self, key):
+    return memcache.get(self.ctx._memcache_prefix + key.urlsafe()) is not None
+
+  def testExistsMulti(self):
+    self.assertEqual([True, False],
+                     ndb.exists_multi([self.key, self.missing_key]))
+    # Neither the context cache nor memcache is filled.
+    self.assertNotIn(self.key, self.ctx._cache)
+    self.assertNotIn(self.missing_key, self.ctx._cache)
+    self.assertFalse(self.isMemcached(self.key))
+
+  def testDeleted(self):
+    self.key.delete()
+    self.assertEqual([False], ndb.exists_multi([self.key]))
+
+  def testContextCache(self):
+    key = Note(id=3).put(use_datastore=False, use_memcache=False)
+    self.assertEqual([True], ndb.exists_multi([key]))
+    self.assertEqual([False], ndb.exists_multi([key], use_cache=False))
+    # A cached miss is trusted, like get() trusts it.
+    self.assertIsNone(self.missing_key.get())
+    Note(id=2).put(use_cache=False)
+    self.assertEqual([False], ndb.exists_multi([self.missing_key]))
+    self.assertEqual([True],
+                     ndb.exists_multi([self.missing_key], use_cache=False))
+
+  def testMemcache(self):
+    key = Note(id=3).put(use_cache=False, use_datastore=False)
+    self.assertTrue(self.isMemcached(key))
+    self.assertEqual([True], ndb.exists_multi([key]))
+    self.assertEqual([False], ndb.exists_multi([key], use_memcache=False))
+
+  def testInTransaction(self):
+    def check():
+      return ndb.exists_multi([self.key, self.missing_key])
+    self.assertEqual([True, False], ndb.transaction(check, xg=True))
+
+
+class GetProjectedTest(test_utils.NDBTest):
+  """Tests for Context.get_projected() and get_multi(projection=...)."""
+
+  def setUp(self):
+    super(GetProjectedTest, self).setUp()
+    self.key = Note(id=1, title='one', rank=1, body='body').put()
+    self.missing_key = ndb.Key(Note, 2)
+    self.ctx.clear_cache()
+
+  def testGetMulti(self):
+    note, missing = ndb.get_multi([self.key, self.missing_key],
+                                  projection=['title', Note.rank])
+    self.assertIsNone(missing)
+    self.assertEqual(self.key, note.key)
+    self.assertEqual(set(['title', 'rank']), set(note._projection))
+    self.assertEqual(('one', 1), (note.title, note.rank))
+    self.assertRaises(model.UnprojectedPropertyError, getattr, note, 'body')
+    # Partial entities are not cached.
+    self.assertNotIn(self.key, self.ctx._cache)
+
+  def testContextCache(self):
+    cached = self.key.get()
+    self.assertIs(cached, ndb.get_multi([self.key], projection=['title'])[0])
+    self.assertIsNone(self.missing_key.get())
+    Note(id=2, title='two').put(use_cache=False)
+    self.assertEqual([None],
+                     ndb.get_multi([self.missing_key], projection=['title']))
+
+  def testInTransaction(self):
+    def get():
+      return ndb.get_multi([self.key, self.missing_key], projection=['title'])
+    note, missing = ndb.transaction(get, xg=True)
+    self.assertEqual('one', note.title)
+    self.assertIsNone(missing)
+
+  def testUnindexedProperty(self):
+    self.assertRaises(model.InvalidPropertyError, ndb.get_multi, [self.key],
+                      projection=['body'])
+    # Also when the entity would be served from the context cache.
+    self.key.get()
+    self.assertRaises(model.InvalidPropertyError, ndb.get_multi, [self.key],
+                      projection=[Note.body])
+
+
+class HookedNote(Note):
+  length = ndb.ComputedProperty(lambda self: len(self.body or ''))
+  hooked = []
+
+  def _post_put_hook(self, future):
+    self.hooked.append(('put', future))
+
+  @classmethod
+  def _post_delete_hook(cls, key, future):
+    cls.hooked.append(('delete', future))
+
+
+class WriteBehindTest(test_utils.NDBTest):
+  """Tests for Context.write_behind()."""
+
+  def setUp(self):
+    super(WriteBehindTest, self).setUp()
+    HookedNote.hooked = []
+
+  def stored(self, key):
+    # Bypasses the context, which sees the writes held back.
+    try:
+      return datastore.Get(key.to_old_key())
+    except datastore_errors.EntityNotFoundError:
+      return None
+
+  def testPostPutHook(self):
+    note = HookedNote(id=1)
+    with self.ctx.write_behind():
+      self.assertEqual(note.key, note.put_async().get_result())
+      self.assertEqual(note.key, note.put())
+      self.assertEqual([], HookedNote.hooked)
+      self.assertIsNone(self.stored(note.key))
+    [(put, fut), (_, other)] = HookedNote.hooked
+    self.assertEqual('put', put)
+    self.assertIs(fut, other)
+    self.assertEqual(note.key, fut.get_result())
+    self.assertIsNotNone(self.stored(note.key))
+
+  def testPostDeleteHook(self):
+    key = HookedNote(id=1).put()
+    HookedNote.hooked = []
+    with self.ctx.write_behind():
+      self.assertIsNone(key.delete_async().get_result())
+      self.assertEqual([], HookedNote.hooked)
+      self.assertIsNotNone(self.stored(key))
+    [(delete, fut)] = HookedNote.hooked
+    self.assertEqual('delete', delete)
+    self.assertTrue(fut.done())
+    self.assertIsNone(self.stored(key))
+
+  def testTaskletsWaitForWrites(self):
+    @ndb.tasklet
+    def incr(key):
+      note = yield key.get_async()
+      note.rank += 1
+      yield note.put_async()
+      raise ndb.Return(note.rank)
+
+    @ndb.tasklet
+    def remove(key):
+      yield key.delete_async()
+      raise ndb.Return((yield key.get_async()))
+
+    key = Note(id=1, rank=1).put()
+    other_key = Note(id=2).put()
+    with self.ctx.write_behind():
+      self.assertEqual(2, incr(key).get_result())
+      self.assertEqual(3, incr(key).get_result())
+      self.assertIsNone(remove(other_key).get_result())
+      self.assertEqual(1, self.stored(key)['rank'])
+    # The event loop is still usable after the block.
+    self.assertEqual(3, self.stored(key)['rank'])
+    self.assertIsNone(self.stored(other_key))
+    self.assertEqual(4, incr(key).get_result())
+
+  def testPutSupersededByDelete(self):
+    note = HookedNote(id=1)
+    with self.ctx.write_behind():
+      note.put()
+      note.key.delete()
+      # The put is never written, so its hook runs at once.
+      [(put, fut)] = HookedNote.hooked
+      self.assertEqual(note.key, fut.get_result())
+    self.assertEqual(['put', 'delete'],
+                     [name for name, _ in HookedNote.hooked])
+    self.assertIsNone(self.stored(note.key))
+
+  def testPreparedAtFlush(self):
+    note = HookedNote(id=1)
+    with self.ctx.write_behind():
+      note.put()
+      note.body = 'body'
+    self.assertEqual(4, self.stored(note.key)['length'])
+
+  def testSupersededWrite(self):
+    with self.ctx.write_behind():
+      first = Note(id=1, title='first').put_async()
+      second = Note(id=1, title='second').put_async()
+    self.assertEqual(first.get_result(), second.get_result())
+    self.assertEqual('second', self.stored(first.get_result())['title'])
+
+  def testFailedWrite(self):
+    bad_key = ndb.Key(HookedNote, 1, app='other-app')
+    with self.assertRaises(context.WriteBehindError) as cm:
+      with self.ctx.write_behind():
+        good = Note(id=1).put_async()
+        HookedNote(key=bad_key).put_async(use_memcache=False)
+    [(key, err)] = cm.exception.errors
+    self.assertEqual(bad_key, key)
+    # The hook sees the failed write.
+    [(_, fut)] = HookedNote.hooked
+    self.assertIs(err, fut.get_exception())
+    self.assertIsNotNone(self.stored(good.get_result()))
+
+  def testFailedPrepare(self):
+    class Failing(Note):
+      ratio = ndb.ComputedProperty(lambda self: 1 / len(self.body))
+
+    with self.assertRaises(context.WriteBehindError) as cm:
+      with self.ctx.write_behind():
+        good = Note(id=1).put_async()
+        failing = Failing(id=1, body='body')
+        failing.put_async()
+        failing.body = ''
+    [(key, err)] = cm.exception.errors
+    self.assertEqual(ndb.Key(Failing, 1), key)
+    self.assertIsInstance(err, ZeroDivisionError)
+    self.assertIsNotNone(self.stored(good.get_result()))
+
+
+class ReadLockTest(test_utils.NDBTest):
+  """Tests for the memcache lock that get() sets before reading."""
+
+  def setUp(self):
+    super(ReadLockTest, self).setUp()
+    self.key = Note(id=1, title='one').put(use_memcache=False)
+    self.ctx.clear_cache()
+    self.mkey = self.ctx._memcache_prefix + self.key.urlsafe()
+
+  def testColdGetWritesBack(self):
+    self.assertEqual('one', self.key.get().title)
+    self.assertIsInstance(memcache.get(self.mkey), str)
+
+  def testUpdateBeforeGets(self):
+    memcache_gets = self.ctx.memcache_gets
+
+    def locking_gets(key, **kwds):
+      # An update locks the value between the read's set and gets.
+      memcache.set(key, context._LOCKED)
+      return memcache_gets(key, **kwds)
+    self.ctx.memcache_gets = locking_gets
+
+    self.assertEqual('one', self.key.get().title)
+    value = memcache.get(self.mkey)
+    self.assertEqual(context._LOCKED, value)
+    self.assertFalse(context._is_read_lock(value))
+
+  def testUpdateAfterGets(self):
+    memcache_cas = self.ctx.memcache_cas
+
+    def locking_cas(key, value, **kwds):
+      # An update locks the value after the read retrieved the CAS id.
+      memcache.set(key, context._LOCKED)
+      return memcache_cas(key, value, **kwds)
+    self.ctx.memcache_cas = locking_cas
+
+    self.assertEqual('one', self.key.get().title)
+    self.assertEqual(context._LOCKED, memcache.get(self.mkey))
+
+  def testLockedWinsInBatch(self):
+    for values in ((context._READ_LOCKED, context._LOCKED),
+                   (context._LOCKED, context._READ_LOCKED)):
+      memcache.delete(self.mkey)
+      futures = [self.ctx.memcache_set(self.mkey, value) for value in values]
+      ndb.Future.wait_all(futures)
+      value = memcache.get(self.mkey)
+      self.assertEqual(0, value)
+      self.assertFalse(context._is_read_lock(value))
+
+  def testPutAndGetInOneBatch(self):
+    for put_first in (True, False):
+      self.ctx.clear_cache()
+      memcache.flush_all()
+      self.checkPutAndGetInOneBatch(put_first)
+
+  def checkPutAndGetInOneBatch(self, put_first):
+    memcache_set = self.ctx.memcache_set
+    puts = []
+
+    def racing_set(key, value, **kwds):
+      # A put starts in the same batch as the get's read lock.
+      if not context._is_read_lock(value):
+        return memcache_set(key, value, **kwds)
+      if put_first:
+        puts.append(Note(id=1, title='two').put_async())
+      future = memcache_set(key, value, **kwds)
+      if not put_first:
+        puts.append(Note(id=1, title='two').put_async())
+      return future
+    self.ctx.memcache_set = racing_set
+
+    sets = []
+    set_multi_async = self.ctx._memcache.set_multi_async
+
+    def recording_set_multi_async(mapping, **kwds):
+      sets.append(dict(mapping))
+      return set_multi_async(mapping, **kwds)
+    self.ctx._memcache.set_multi_async = recording_set_multi_async
+
+    try:
+      self.key.get()
+      puts[0].get_result()
+    finally:
+      del self.ctx.memcache_set
+      del self.ctx._memcache.set_multi_async
+    # Both locks go out in one batch, where the put's lock wins.
+    [locks] = sets
+    self.assertFalse(context._is_read_lock(locks[self.mkey]))
+    # The value the get read is not written back.
+    self.assertIsNone(memcache.get(self.mkey))
+    self.ctx.clear_cache()
+    self.assertEqual('two', self.key.get().title)
+
+  def testOldReaderSeesLock(self):
+    # Code from before the read lock only compares with _LOCKED.
+    self.assertTrue(context._READ_LOCKED in (context._LOCKED, None))
+    memcache.set(self.mkey, context._READ_LOCKED)
+    self.assertEqual('one', self.key.get().title)
+    value = memcache.get(self.mkey)
+    self.assertTrue(context._is_read_lock(value))
+
+
+if __name__ == '__main__':
+  unittest.main()
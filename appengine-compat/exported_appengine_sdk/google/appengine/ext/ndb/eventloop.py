@@ -37,7 +37,7 @@ from . import utils
 
 __all__ = ['EventLoop',
            'add_idle', 'queue_call', 'queue_rpc',
-           'get_event_loop',
+           'get_event_loop', 'get_profile',
            'run', 'run0', 'run1',
           ]
 
@@ -79,6 +79,7 @@ class EventLoop(object):
         sorted by time. These callbacks run only after the said time.
       rpcs: a map from rpc to (callback, args, kwds). Callback is called
         when the rpc finishes.
+      profile: a profiling.Profile while profiling is on, otherwise None.
     """
     self.clock = clock or _Clock()
     self.current = collections.deque()
@@ -86,6 +87,7 @@ class EventLoop(object):
     self.inactive = 0  # How many idlers in a row were no-ops
     self.queue = []
     self.rpcs = {}
+    self.profile = None
 
   def clear(self):
     """Remove all pending events without running any."""
@@ -178,6 +180,8 @@ class EventLoop(object):
       rpcs = [rpc]
     for rpc in rpcs:
       self.rpcs[rpc] = (callback, args, kwds)
+      if self.profile is not None:
+        self.profile._rpc_queued(rpc)
 
   def add_idle(self, callback, *args, **kwds):
     """Add an idle callback.
@@ -204,7 +208,12 @@ class EventLoop(object):
     idler = self.idlers.popleft()
     callback, args, kwds = idler
     _logging_debug('idler: %s', callback.__name__)
+    profile = self.profile
+    if profile is not None:
+      start = time.time()
     res = callback(*args, **kwds)
+    if profile is not None:
+      profile._idled(time.time() - start)
     # See add_idle() for the meaning of the callback return value.
     if res is not None:
       if res:
@@ -243,7 +252,12 @@ class EventLoop(object):
         return 0
     if self.rpcs:
       self.inactive = 0
+      profile = self.profile
+      if profile is not None:
+        start = time.time()
       rpc = datastore_rpc.MultiRpc.wait_any(self.rpcs)
+      if profile is not None:
+        profile._blocked(time.time() - start, rpc)
       if rpc is not None:
         _logging_debug('rpc: %s.%s', rpc.service, rpc.method)
         # Yes, wait_any() may return None even for a non-empty argument.
@@ -270,6 +284,8 @@ class EventLoop(object):
       return False
     if delay > 0:
       self.clock.sleep(delay)
+      if self.profile is not None:
+        self.profile._slept(delay)
     return True
 
   def run(self):
@@ -309,6 +325,18 @@ def get_event_loop():
   return ev
 
 
+def get_profile():
+  """Return the current event loop's profiling.Profile, or None.
+
+  Unlike get_event_loop(), this does not check for a new request, as it
+  is called for every tasklet step.
+  """
+  ev = _state.event_loop
+  if ev is None:
+    return None
+  return ev.profile
+
+
 def queue_call(*args, **kwds):
   ev = get_event_loop()
   ev.queue_call(*args, **kwds)
@@ -87,6 +87,7 @@ __author__ = 'guido@google.com (Guido van Rossum)'
 
 import base64
 import os
+import string
 
 from .google_imports import datastore_errors
 from .google_imports import datastore_types
@@ -99,6 +100,7 @@ __all__ = ['Key']
 
 _MAX_LONG = 2L ** 63  # Use 2L, see issue 65.  http://goo.gl/ELczz
 _MAX_KEYPART_BYTES = 500
+_MAX_DECODED_KEYS = 1000  # Keys kept by Key.from_urlsafe_multi().
 
 
 class Key(object):
@@ -121,6 +123,9 @@ class Key(object):
   You can also construct a Key from a 'url-safe' encoded string:
   - Key(urlsafe=<string>)
 
+  or a list of Keys from a list of them:
+  - Key.from_urlsafe_multi(<list of strings>)
+
   For esoteric purposes the following constructors exist:
   - Key(reference=<reference>) -- passing in a low-level Reference object
   - Key(serialized=<string>) -- passing in a serialized low-level Reference
@@ -180,6 +185,8 @@ class Key(object):
 
   - key.urlsafe() -- a websafe-base64-encoded serialized Reference.
 
+  - Key.urlsafe_multi(keys) -- the same for a list of Keys, faster.
+
   - key.serialized() -- a serialized Reference.
 
   - key.reference() -- a Reference object.  The caller promises not to
@@ -561,6 +568,79 @@ class Key(object):
     urlsafe = base64.b64encode(self.reference().Encode())
     return urlsafe.rstrip('=').replace('+', '-').replace('/', '_')
 
+  @classmethod
+  def urlsafe_multi(cls, keys):
+    """Return the url-safe strings of a list of Keys.
+
+    This is the same as [key.urlsafe() for key in keys], but serializes
+    the References directly instead of building a Reference object for
+    each Key.
+    """
+    parts = {}  # Map from (app, namespace) to the serialized app, namespace.
+    elements = {}  # Map from kind to the start of a serialized path element.
+    urlsafes = []
+    for key in keys:
+      app = key.__app
+      namespace = key.__namespace
+      part = parts.get((app, namespace))
+      if part is None:
+        part = parts[app, namespace] = (
+            _TAG_APP + _PrefixedString(app),
+            namespace and _TAG_NAMESPACE + _PrefixedString(namespace) or '')
+      path = []
+      for kind, id in key.__pairs:
+        element = elements.get(kind)
+        if element is None:
+          if type(kind) is str and 1 <= len(kind) <= _MAX_KEYPART_BYTES:
+            element = _TAG_ELEMENT_START + _PrefixedString(kind)
+          else:
+            element = ''
+          elements[kind] = element
+        t = type(id)
+        if (t is int or t is long) and 1 <= id < _MAX_LONG:
+          id = _TAG_ID + _VarInt(id)
+        elif t is str and 1 <= len(id) <= _MAX_KEYPART_BYTES:
+          id = _TAG_NAME + _PrefixedString(id)
+        else:
+          element = ''
+        if not element:
+          # Let urlsafe() handle or reject anything unusual.
+          path = None
+          break
+        path.append(element + id + _TAG_ELEMENT_END)
+      if path is None:
+        urlsafes.append(key.urlsafe())
+        continue
+      path = ''.join(path)
+      serialized = part[0] + _TAG_PATH + _VarInt(len(path)) + path + part[1]
+      urlsafes.append(
+          base64.b64encode(serialized).rstrip('=').translate(_URLSAFE_CHARS))
+    return urlsafes
+
+  @classmethod
+  def from_urlsafe_multi(cls, urlsafes):
+    """Return the Keys for a list of url-safe strings.
+
+    This is the same as [Key(urlsafe=urlsafe) for urlsafe in urlsafes],
+    but parses the serialized References directly instead of building a
+    Reference object for each string, and reuses the Keys of recently
+    decoded strings.
+    """
+    keys = []
+    for urlsafe in urlsafes:
+      key = _decoded_keys.get(urlsafe)
+      if key is None:
+        parsed = _ParseSerialized(_DecodeUrlSafe(urlsafe))
+        if parsed is None:
+          key = Key(urlsafe=urlsafe)
+        else:
+          key = super(Key, cls).__new__(Key)
+          key.__reference = None
+          key.__app, key.__namespace, key.__pairs = parsed
+        _decoded_keys.put(urlsafe, key)
+      keys.append(key)
+    return keys
+
   # Datastore API using the default context.
   # These use local import since otherwise they'd be recursive imports.
 
@@ -615,7 +695,7 @@ class Key(object):
       post_hook = cls._post_delete_hook
       if not cls._is_default_hook(model.Model._default_post_delete_hook,
                                   post_hook):
-        fut.add_immediate_callback(post_hook, self, fut)
+        ctx._add_post_write_hook(self, fut, post_hook, self)
     return fut
 
   @classmethod
@@ -837,6 +917,140 @@ def _DecodeUrlSafe(urlsafe):
   return base64.b64decode(urlsafe.replace('-', '+').replace('_', '/'))
 
 
+# Tags of the fields of a serialized Reference, as entity_pb writes them.
+_TAG_APP = '\x6a'
+_TAG_PATH = '\x72'
+_TAG_ELEMENT = '\x0b'
+_TAG_TYPE = '\x12'
+_TAG_ID = '\x18'
+_TAG_NAME = '\x22'
+_TAG_ELEMENT_END = '\x0c'
+_TAG_NAMESPACE = '\xa2\x01'
+_TAG_ELEMENT_START = _TAG_ELEMENT + _TAG_TYPE
+
+_URLSAFE_CHARS = string.maketrans('+/', '-_')
+
+
+def _VarInt(value):
+  """Encode a non-negative integer as a protocol buffer varint."""
+  if value < 128:
+    return chr(value)
+  chars = []
+  while value > 127:
+    chars.append(chr(value & 127 | 128))
+    value >>= 7
+  chars.append(chr(value))
+  return ''.join(chars)
+
+
+def _PrefixedString(value):
+  """Encode a string prefixed with its length."""
+  return _VarInt(len(value)) + value
+
+
+def _ReadVarInt(data, pos):
+  """Decode the varint at data[pos:], returning it and the position after."""
+  value = shift = 0
+  while True:
+    byte = ord(data[pos])
+    pos += 1
+    value |= (byte & 127) << shift
+    if byte < 128:
+      return value, pos
+    shift += 7
+
+
+def _ParseSerialized(serialized):
+  """Parse a serialized Reference as written for a complete Key.
+
+  Returns:
+    An (app, namespace, pairs) tuple, or None if serialized is anything
+    but an app, a path of complete elements and an optional namespace, in
+    the order entity_pb writes them.
+  """
+  try:
+    if serialized[0] != _TAG_APP:
+      return None
+    size, pos = _ReadVarInt(serialized, 1)
+    app = serialized[pos:pos + size]
+    pos += size
+    if serialized[pos] != _TAG_PATH:
+      return None
+    size, pos = _ReadVarInt(serialized, pos + 1)
+    end = pos + size
+    pairs = []
+    while pos < end:
+      if serialized[pos:pos + 2] != _TAG_ELEMENT_START:
+        return None
+      size, pos = _ReadVarInt(serialized, pos + 2)
+      kind = serialized[pos:pos + size]
+      pos += size
+      tag = serialized[pos]
+      if tag == _TAG_ID:
+        id, pos = _ReadVarInt(serialized, pos + 1)
+        if not 1 <= id < _MAX_LONG:
+          return None
+        id = long(id)  # Like the ids of keys decoded from a Reference.
+      elif tag == _TAG_NAME:
+        size, pos = _ReadVarInt(serialized, pos + 1)
+        id = serialized[pos:pos + size]
+        pos += size
+      else:
+        return None
+      if not kind or not id or serialized[pos] != _TAG_ELEMENT_END:
+        return None
+      pos += 1
+      pairs.append((kind, id))
+    if pos != end:
+      return None
+    namespace = ''
+    if pos < len(serialized):
+      if serialized[pos:pos + 2] != _TAG_NAMESPACE:
+        return None
+      size, pos = _ReadVarInt(serialized, pos + 2)
+      namespace = serialized[pos:pos + size]
+      pos += size
+    if pos != len(serialized):
+      return None
+  except IndexError:
+    return None
+  if not pairs or not app:
+    return None
+  return app, namespace, tuple(pairs)
+
+
+class _KeyCache(object):
+  """A cache of recently used Keys, by any hashable value.
+
+  Entries are kept in two dicts.  Entries are added to and looked up in
+  the newer one first, and moved to it when found in the older one.  When
+  the newer one is full, the older one is dropped, so the least recently
+  used entries go first.
+  """
+
+  def __init__(self, max_size):
+    self._max_generation_size = max(1, max_size // 2)
+    self._newer = {}
+    self._older = {}
+
+  def get(self, value):
+    key = self._newer.get(value)
+    if key is None:
+      key = self._older.get(value)
+      if key is not None:
+        self.put(value, key)
+    return key
+
+  def put(self, value, key):
+    if len(self._newer) >= self._max_generation_size:
+      self._older = self._newer
+      self._newer = {}
+    self._newer[value] = key
+
+
+_decoded_keys = _KeyCache(_MAX_DECODED_KEYS)
+
+
 def _DefaultAppId():
   """Return the default application id.
 
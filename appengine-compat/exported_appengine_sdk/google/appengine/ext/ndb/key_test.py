@@ -0,0 +1,84 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for key.py."""
+
+import unittest
+
+from google.appengine.ext.ndb import key as key_module
+
+Key = key_module.Key
+
+
+class UrlsafeMultiTest(unittest.TestCase):
+  """Tests for Key.urlsafe_multi() and Key.from_urlsafe_multi()."""
+
+  def setUp(self):
+    key_module._decoded_keys = key_module._KeyCache(
+        key_module._MAX_DECODED_KEYS)
+    self.keys = [
+        Key('Child', 1, app='app'),
+        Key('Child', 2 ** 62, app='app'),
+        Key('Child', 'name', app='app', namespace='ns'),
+        Key('Parent', u'p\xe9re', 'Child', 3, app='dev~app'),
+        Key('Parent', 1, 'Child', 'x' * 500, app='app', namespace='ns'),
+    ]
+
+  def assertSameKeys(self, expected, actual):
+    self.assertEqual(expected, actual)
+    for expected_key, key in zip(expected, actual):
+      self.assertEqual(expected_key.app(), key.app())
+      self.assertEqual(expected_key.namespace(), key.namespace())
+      self.assertEqual(expected_key.pairs(), key.pairs())
+      self.assertEqual([map(type, pair) for pair in expected_key.pairs()],
+                       [map(type, pair) for pair in key.pairs()])
+      self.assertEqual(hash(expected_key), hash(key))
+      self.assertEqual(expected_key.reference(), key.reference())
+
+  def testUrlsafeMulti(self):
+    self.assertEqual([key.urlsafe() for key in self.keys],
+                     Key.urlsafe_multi(self.keys))
+
+  def testFromUrlsafeMulti(self):
+    urlsafes = [key.urlsafe() for key in self.keys]
+    self.assertSameKeys([Key(urlsafe=urlsafe) for urlsafe in urlsafes],
+                        Key.from_urlsafe_multi(urlsafes))
+
+  def testIdsAreLong(self):
+    urlsafe = Key('Child', 1, app='app').urlsafe()
+    self.assertIs(long, type(Key(urlsafe=urlsafe).id()))
+    self.assertIs(long, type(Key.from_urlsafe_multi([urlsafe])[0].id()))
+
+  def testRepeated(self):
+    urlsafe = self.keys[0].urlsafe()
+    first, second = Key.from_urlsafe_multi([urlsafe, urlsafe])
+    self.assertIs(first, second)
+    self.assertIs(first, Key.from_urlsafe_multi([urlsafe])[0])
+
+  def testIncompleteKey(self):
+    # Not parsed directly, but decoded like Key(urlsafe=...).
+    urlsafe = Key('Child', None, app='app').urlsafe()
+    self.assertSameKeys([Key(urlsafe=urlsafe)],
+                        Key.from_urlsafe_multi([urlsafe]))
+
+  def testPadded(self):
+    urlsafe = self.keys[0].urlsafe()
+    padded = urlsafe + '=' * (-len(urlsafe) % 4)
+    self.assertSameKeys([Key(urlsafe=padded)],
+                        Key.from_urlsafe_multi([padded]))
+
+
+if __name__ == '__main__':
+  unittest.main()
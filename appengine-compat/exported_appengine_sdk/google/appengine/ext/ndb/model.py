@@ -307,6 +307,11 @@ import datetime
 import logging
 import zlib
 
+try:
+  import bz2
+except ImportError:
+  bz2 = None
+
 from .google_imports import datastore
 from .google_imports import datastore_errors
 from .google_imports import datastore_query
@@ -329,10 +334,12 @@ __all__ = ['Key', 'BlobKey', 'GeoPt', 'Rollback',
            'transactional', 'transactional_async', 'transactional_tasklet',
            'non_transactional',
            'get_multi', 'get_multi_async',
+           'exists_multi', 'exists_multi_async',
            'put_multi', 'put_multi_async',
            'delete_multi', 'delete_multi_async',
            'get_indexes', 'get_indexes_async',
            'make_connection',
+           'Codec', 'ZlibCodec', 'Bz2Codec',
           ]
 
 
@@ -885,6 +892,12 @@ class Property(ModelAttribute):
   _verbose_name = None
   _write_empty_list = False
 
+  # The results of _find_methods() used by _call_to_base_type() and
+  # _call_from_base_type(), cached on the instance on first use since they
+  # are needed for every value converted.
+  _to_base_type_methods = None
+  _from_base_type_methods = None
+
   __creation_counter_global = 0
 
   _attributes = ['_name', '_indexed', '_repeated', '_required', '_default',
@@ -1240,9 +1253,15 @@ class Property(ModelAttribute):
     This calls the methods in the reverse method resolution order of
     the property's class.
     """
-    methods = self._find_methods('_from_base_type', reverse=True)
-    call = self._apply_list(methods)
-    return call(value)
+    methods = self._from_base_type_methods
+    if methods is None:
+      methods = self._from_base_type_methods = self._find_methods(
+          '_from_base_type', reverse=True)
+    for method in methods:
+      newvalue = method(self, value)
+      if newvalue is not None:
+        value = newvalue
+    return value
 
   def _call_to_base_type(self, value):
     """Call all _validate() and _to_base_type() methods on the value.
@@ -1250,9 +1269,15 @@ class Property(ModelAttribute):
     This calls the methods in the method resolution order of the
     property's class.
     """
-    methods = self._find_methods('_validate', '_to_base_type')
-    call = self._apply_list(methods)
-    return call(value)
+    methods = self._to_base_type_methods
+    if methods is None:
+      methods = self._to_base_type_methods = self._find_methods(
+          '_validate', '_to_base_type')
+    for method in methods:
+      newvalue = method(self, value)
+      if newvalue is not None:
+        value = newvalue
+    return value
 
   def _call_shallow_validation(self, value):
     """Call the initial set of _validate() methods.
@@ -1425,9 +1450,9 @@ class Property(ModelAttribute):
       return
 
     if self._indexed:
-      create_prop = lambda: pb.add_property()
+      create_prop = pb.add_property
     else:
-      create_prop = lambda: pb.add_raw_property()
+      create_prop = pb.add_raw_property
 
     if self._repeated and not values and self._write_empty_list:
       # We want to write the empty list
@@ -1655,37 +1680,170 @@ class FloatProperty(Property):
     return v.doublevalue()
 
 
-# A custom 'meaning' for compressed properties.
+# Custom 'meanings' for compressed properties.
 _MEANING_URI_COMPRESSED = 'ZLIB'
+_MEANING_URI_BZ2 = 'BZ2'
 
 
 class _CompressedValue(_NotEqualMixin):
   """A marker object wrapping compressed values."""
 
-  __slots__ = ['z_val']
+  __slots__ = ['z_val', 'meaning_uri']
 
-  def __init__(self, z_val):
-    """Constructor.  Argument is a string returned by zlib.compress()."""
+  def __init__(self, z_val, meaning_uri=_MEANING_URI_COMPRESSED):
+    """Constructor.
+
+    Args:
+      z_val: A string returned by the compress() method of the codec
+        registered for meaning_uri; by default, by zlib.compress().
+      meaning_uri: The meaning_uri stored with the value.
+    """
     assert isinstance(z_val, str), repr(z_val)
     self.z_val = z_val
+    self.meaning_uri = meaning_uri
 
   def __repr__(self):
-    return '_CompressedValue(%s)' % repr(self.z_val)
+    if self.meaning_uri == _MEANING_URI_COMPRESSED:
+      return '_CompressedValue(%s)' % repr(self.z_val)
+    return '_CompressedValue(%r, %r)' % (self.z_val, self.meaning_uri)
 
   def __eq__(self, other):
     if not isinstance(other, _CompressedValue):
       return NotImplemented
-    return self.z_val == other.z_val
+    return (self.z_val == other.z_val and
+            self.meaning_uri == other.meaning_uri)
 
   def __hash__(self):
     raise TypeError('_CompressedValue is not immutable')
 
+  def _decompress(self):
+    """Return the uncompressed string."""
+    return _codecs[self.meaning_uri].decompress(self.z_val)
+
+
+# Map meaning_uri values to the codecs that decompress them.
+_codecs = {}
+
+
+class Codec(object):
+  """Compresses the stored bytes of property values.
+
+  A codec can be passed as the compressed argument of BlobProperty and its
+  subclasses, and of GenericProperty; compressed=True is the same as
+  compressed=ZlibCodec().  Values shorter than threshold bytes, and values
+  that do not get any smaller, are stored uncompressed.
+
+  Each codec class stores its values with its own meaning_uri, from which
+  readers find the codec to decompress them with.  Values can therefore
+  be read back whatever codec their property uses now, but only by code
+  that has registered the codec class with Codec.register().  Older
+  versions of NDB, and other datastore APIs, only decompress values
+  written by ZlibCodec.
+  """
+
+  meaning_uri = None
+  default_level = None
+
+  def __init__(self, level=None, threshold=0):
+    """Constructor.
+
+    Args:
+      level: The compression level; the meaning and range of levels
+        depend on the codec.  Defaults to default_level.
+      threshold: The minimum length, in bytes, of the values to compress.
+    """
+    if level is None:
+      level = self.default_level
+    self._level = level
+    self._threshold = threshold
+
+  def __repr__(self):
+    return '%s(level=%r, threshold=%r)' % (self.__class__.__name__,
+                                           self._level, self._threshold)
+
+  @classmethod
+  def register(cls):
+    """Make values stored with this codec's meaning_uri decompressible."""
+    _codecs[cls.meaning_uri] = cls()
+
+  def compress(self, data):
+    """Return data compressed.  Subclasses must override this."""
+    raise NotImplementedError
+
+  def decompress(self, data):
+    """Return data decompressed.  Subclasses must override this."""
+    raise NotImplementedError
+
+  def _encode(self, value):
+    """Return a _CompressedValue for a string, or None to store it as is."""
+    if len(value) < self._threshold:
+      return None
+    z_val = self.compress(value)
+    if len(z_val) >= len(value):
+      return None
+    return _CompressedValue(z_val, self.meaning_uri)
+
+
+class ZlibCodec(Codec):
+  """A Codec using zlib, with levels from 1 (fastest) to 9 (smallest)."""
+
+  meaning_uri = _MEANING_URI_COMPRESSED
+  default_level = 6
+
+  def compress(self, data):
+    return zlib.compress(data, self._level)
+
+  def decompress(self, data):
+    return zlib.decompress(data)
+
+
+class Bz2Codec(Codec):
+  """A Codec using bz2, with levels from 1 to 9 (smallest).
+
+  bz2 is slower than zlib but stores large, repetitive values in fewer
+  bytes.
+  """
+
+  meaning_uri = _MEANING_URI_BZ2
+  default_level = 9
+
+  def __init__(self, level=None, threshold=0):
+    if bz2 is None:
+      raise NotImplementedError('Bz2Codec requires the bz2 module.')
+    super(Bz2Codec, self).__init__(level=level, threshold=threshold)
+
+  def compress(self, data):
+    return bz2.compress(data, self._level)
+
+  def decompress(self, data):
+    return bz2.decompress(data)
+
+
+ZlibCodec.register()
+if bz2 is not None:
+  Bz2Codec.register()
+
+_default_codec = ZlibCodec()
+
+
+def _make_codec(compressed):
+  """Internal helper to turn a compressed argument into a Codec or None."""
+  if not compressed:
+    return None
+  if compressed is True:
+    return _default_codec
+  if not isinstance(compressed, Codec):
+    raise TypeError('compressed must be a bool or a Codec; received %r' %
+                    (compressed,))
+  return compressed
+
 
 class BlobProperty(Property):
   """A Property whose value is a byte string.  It may be compressed."""
 
   _indexed = False
   _compressed = False
+  _codec = None
 
   _attributes = Property._attributes + ['_compressed']
 
@@ -1693,6 +1851,7 @@ class BlobProperty(Property):
   def __init__(self, name=None, compressed=False, **kwds):
     super(BlobProperty, self).__init__(name=name, **kwds)
     self._compressed = compressed
+    self._codec = _make_codec(compressed)
     if compressed and self._indexed:
       # TODO: Allow this, but only allow == and IN comparisons?
       raise NotImplementedError('BlobProperty %s cannot be compressed and '
@@ -1720,12 +1879,12 @@ class BlobProperty(Property):
           (self._name, _MAX_STRING_LENGTH))
 
   def _to_base_type(self, value):
-    if self._compressed:
-      return _CompressedValue(zlib.compress(value))
+    if self._codec is not None:
+      return self._codec._encode(value)
 
   def _from_base_type(self, value):
     if isinstance(value, _CompressedValue):
-      return zlib.decompress(value.z_val)
+      return value._decompress()
 
   def _datastore_type(self, value):
     # Since this is only used for queries, and queries imply an
@@ -1734,17 +1893,18 @@ class BlobProperty(Property):
 
   def _db_set_value(self, v, p, value):
     if isinstance(value, _CompressedValue):
-      self._db_set_compressed_meaning(p)
+      self._db_set_compressed_meaning(p, value.meaning_uri)
       value = value.z_val
     else:
       self._db_set_uncompressed_meaning(p)
     v.set_stringvalue(value)
 
-  def _db_set_compressed_meaning(self, p):
+  def _db_set_compressed_meaning(self, p,
+                                 meaning_uri=_MEANING_URI_COMPRESSED):
     # Use meaning_uri because setting meaning to something else that is not
     # BLOB or BYTESTRING will cause the value to be decoded from utf-8 in
     # datastore_types.FromPropertyPb. That would break the compressed string.
-    p.set_meaning_uri(_MEANING_URI_COMPRESSED)
+    p.set_meaning_uri(meaning_uri)
     p.set_meaning(entity_pb.Property.BLOB)
 
   def _db_set_uncompressed_meaning(self, p):
@@ -1757,8 +1917,9 @@ class BlobProperty(Property):
     if not v.has_stringvalue():
       return None
     value = v.stringvalue()
-    if p.meaning_uri() == _MEANING_URI_COMPRESSED:
-      value = _CompressedValue(value)
+    meaning_uri = p.meaning_uri()
+    if meaning_uri in _codecs:
+      value = _CompressedValue(value, meaning_uri)
     return value
 
 
@@ -2390,8 +2551,7 @@ class StructuredProperty(_StructuredGetForDictMixin):
     values = self._get_base_value_unwrapped_as_list(entity)
     for value in values:
       if value is not None:
-        # TODO: Avoid re-sorting for repeated values.
-        for unused_name, prop in sorted(value._properties.iteritems()):
+        for unused_name, prop in value._get_encode_plan():
           prop._serialize(value, pb, prefix + self._name + '.',
                           self._repeated or parent_repeated,
                           projection=projection)
@@ -2420,7 +2580,7 @@ class StructuredProperty(_StructuredGetForDictMixin):
       # won't override a set argument. We need to force it at this level.
       # TODO(pcostello): Remove this hack by passing indexed to _deserialize.
       # This cannot happen until we version the API.
-      indexed = p.meaning_uri() != _MEANING_URI_COMPRESSED
+      indexed = p.meaning_uri() not in _codecs
       prop = subentity._get_property_for(p, depth=depth, indexed=indexed)
       if prop is None:
         # Special case: kill subentity after all.
@@ -2454,7 +2614,7 @@ class StructuredProperty(_StructuredGetForDictMixin):
       # need this passed in from _from_pb(), which would mean a
       # signature change for _deserialize(), which might break valid
       # end-user code that overrides it.
-      compressed = p.meaning_uri() == _MEANING_URI_COMPRESSED
+      compressed = p.meaning_uri() in _codecs
       prop = GenericProperty(next, compressed=compressed)
       prop._code_name = next
       prop_is_fake = True
@@ -2608,11 +2768,12 @@ class GenericProperty(Property):
   also be used explicitly for properties with dynamically-typed
   values.
 
-  This supports compressed=True, which is only effective for str
-  values (not for unicode), and implies indexed=False.
+  This supports compressed=True or a Codec, which is only effective for
+  str values (not for unicode), and implies indexed=False.
   """
 
   _compressed = False
+  _codec = None
 
   _attributes = Property._attributes + ['_compressed']
 
@@ -2622,18 +2783,19 @@ class GenericProperty(Property):
       kwds.setdefault('indexed', False)
     super(GenericProperty, self).__init__(name=name, **kwds)
     self._compressed = compressed
+    self._codec = _make_codec(compressed)
     if compressed and self._indexed:
       # TODO: Allow this, but only allow == and IN comparisons?
       raise NotImplementedError('GenericProperty %s cannot be compressed and '
                                 'indexed at the same time.' % self._name)
 
   def _to_base_type(self, value):
-    if self._compressed and isinstance(value, str):
-      return _CompressedValue(zlib.compress(value))
+    if self._codec is not None and isinstance(value, str):
+      return self._codec._encode(value)
 
   def _from_base_type(self, value):
     if isinstance(value, _CompressedValue):
-      return zlib.decompress(value.z_val)
+      return value._decompress()
 
   def _validate(self, value):
     if self._indexed:
@@ -2655,8 +2817,8 @@ class GenericProperty(Property):
       if meaning == entity_pb.Property.BLOBKEY:
         sval = BlobKey(sval)
       elif meaning == entity_pb.Property.BLOB:
-        if p.meaning_uri() == _MEANING_URI_COMPRESSED:
-          sval = _CompressedValue(sval)
+        if p.meaning_uri() in _codecs:
+          sval = _CompressedValue(sval, p.meaning_uri())
       elif meaning == entity_pb.Property.ENTITY_PROTO:
         # NOTE: This is only used for uncompressed LocalStructuredProperties.
         pb = entity_pb.EntityProto()
@@ -2758,9 +2920,9 @@ class GenericProperty(Property):
       v.set_stringvalue(value)
       p.set_meaning(entity_pb.Property.ENTITY_PROTO)
     elif isinstance(value, _CompressedValue):
+      p.set_meaning_uri(value.meaning_uri)
       value = value.z_val
       v.set_stringvalue(value)
-      p.set_meaning_uri(_MEANING_URI_COMPRESSED)
       p.set_meaning(entity_pb.Property.BLOB)
     else:
       raise NotImplementedError('Property %s does not support %s types.' %
@@ -2889,6 +3051,11 @@ class Model(_NotEqualMixin):
   _has_repeated = False
   _kind_map = {}  # Dict mapping {kind: Model subclass}
 
+  # Class variables computed on first use from _properties and reset by
+  # _fix_up_properties(); see _get_encode_plan() and _get_decode_plan().
+  _encode_plan = None
+  _decode_plan = None
+
   # Defaults for instance variables.
   _entity_key = None
   _values = None
@@ -3163,11 +3330,38 @@ class Model(_NotEqualMixin):
       # TODO: Move the key stuff into ModelAdapter.entity_to_pb()?
       self._key_to_pb(pb)
 
-    for unused_name, prop in sorted(self._properties.iteritems()):
+    for unused_name, prop in self._get_encode_plan():
       prop._serialize(self, pb, projection=self._projection)
 
     return pb
 
+  def _get_encode_plan(self):
+    """Internal helper to get the (name, Property) pairs to serialize.
+
+    The pairs are sorted by name.  Entities without properties of their own
+    (see _clone_properties()) share a tuple computed once per class.
+    """
+    cls = self.__class__
+    if self._properties is not cls._properties:
+      return sorted(self._properties.iteritems())
+    plan = cls._encode_plan
+    if plan is None:
+      plan = cls._encode_plan = tuple(sorted(cls._properties.iteritems()))
+    return plan
+
+  @classmethod
+  def _get_decode_plan(cls):
+    """Internal helper to get the class's map of protobuf-level property
+    names to the declared Property that deserializes them.
+
+    It is filled in by _from_pb() as names are encountered, so that each
+    name is resolved by _get_property_for() only once per class.
+    """
+    plan = cls._decode_plan
+    if plan is None:
+      plan = cls._decode_plan = {}
+    return plan
+
   def _key_to_pb(self, pb):
     """Internal helper to copy the key into a protobuf."""
     key = self._key
@@ -3200,20 +3394,30 @@ class Model(_NotEqualMixin):
     if key is not None and (set_key or key.id() or key.parent()):
       ent._key = key
 
-    # NOTE(darke): Keep a map from (indexed, property name) to the property.
-    # This allows us to skip the (relatively) expensive call to
-    # _get_property_for for repeated fields.
+    # Names of declared properties are resolved once per class, see
+    # _get_decode_plan().  Other (e.g. Expando) properties are resolved once
+    # per entity and name.
+    decode_plan = ent._get_decode_plan()
+    declared_properties = ent.__class__._properties
     _property_map = {}
     projection = []
     for indexed, plist in ((True, pb.property_list()),
                            (False, pb.raw_property_list())):
       for p in plist:
+        name = p.name()
         if p.meaning() == entity_pb.Property.INDEX_VALUE:
-          projection.append(p.name())
-        property_map_key = (p.name(), indexed)
-        if property_map_key not in _property_map:
-          _property_map[property_map_key] = ent._get_property_for(p, indexed)
-        _property_map[property_map_key]._deserialize(ent, p)
+          projection.append(name)
+        if name in decode_plan:
+          prop = decode_plan[name]
+        else:
+          property_map_key = (name, indexed)
+          prop = _property_map.get(property_map_key)
+          if prop is None:
+            prop = ent._get_property_for(p, indexed)
+            _property_map[property_map_key] = prop
+            if declared_properties.get(name.split('.', 1)[0]) is prop:
+              decode_plan[name] = prop
+        prop._deserialize(ent, p)
 
     ent._set_projection(projection)
     return ent
@@ -3265,7 +3469,7 @@ class Model(_NotEqualMixin):
       prop = StructuredProperty(Expando, next)
       prop._store_value(self, _BaseValue(Expando()))
     else:
-      compressed = p.meaning_uri() == _MEANING_URI_COMPRESSED
+      compressed = p.meaning_uri() in _codecs
       prop = GenericProperty(next,
                              repeated=p.multiple(),
                              indexed=indexed,
@@ -3323,6 +3527,8 @@ class Model(_NotEqualMixin):
                         'a Unicode string (%r); please encode using utf-8' %
                         (cls.__name__, kind))
     cls._properties = {}  # Map of {name: Property}
+    cls._encode_plan = None
+    cls._decode_plan = None
     if cls.__module__ == __name__:  # Skip the classes in *this* file.
       return
     for name in set(dir(cls)):
@@ -3348,7 +3554,7 @@ class Model(_NotEqualMixin):
 
   def _prepare_for_put(self):
     if self._properties:
-      for _, prop in sorted(self._properties.iteritems()):
+      for _, prop in self._get_encode_plan():
         prop._prepare_for_put(self)
 
   @classmethod
@@ -3474,7 +3680,7 @@ class Model(_NotEqualMixin):
     fut = ctx.put(self, **ctx_options)
     post_hook = self._post_put_hook
     if not self._is_default_hook(Model._default_post_put_hook, post_hook):
-      fut.add_immediate_callback(post_hook, fut)
+      ctx._add_post_write_hook(self._key, fut, post_hook)
     return fut
   put_async = _put_async
 
@@ -3903,24 +4109,33 @@ def non_transactional(func, args, kwds, allow_existing=True):
     datastore._SetConnection(save_ds_conn)
 
 
-def get_multi_async(keys, **ctx_options):
+def get_multi_async(keys, projection=None, **ctx_options):
   """Fetches a sequence of keys.
 
   Args:
     keys: A sequence of keys.
+    projection: Optional sequence of the property names or Property
+      instances to fetch; see Context.get_projected().  Entities fetched
+      with a projection are not cached, and get hooks are not called.
     **ctx_options: Context options.
 
   Returns:
     A list of futures.
   """
+  if projection:
+    from . import tasklets
+    ctx = tasklets.get_context()
+    return [ctx.get_projected(key, projection, **ctx_options) for key in keys]
   return [key.get_async(**ctx_options) for key in keys]
 
 
-def get_multi(keys, **ctx_options):
+def get_multi(keys, projection=None, **ctx_options):
   """Fetches a sequence of keys.
 
   Args:
     keys: A sequence of keys.
+    projection: Optional sequence of the property names or Property
+      instances to fetch; see get_multi_async().
     **ctx_options: Context options.
 
   Returns:
@@ -3928,7 +4143,43 @@ def get_multi(keys, **ctx_options):
     found.
   """
   return [future.get_result()
-          for future in get_multi_async(keys, **ctx_options)]
+          for future in get_multi_async(keys, projection=projection,
+                                        **ctx_options)]
+
+
+def exists_multi_async(keys, **ctx_options):
+  """Checks whether the entities for a sequence of keys exist.
+
+  Entities that are not in the context cache or memcache are still fetched
+  from the datastore, in the same batched get RPCs as get_multi_async(),
+  since the datastore has no keys-only get.  Unlike get_multi_async(), the
+  entities are neither returned nor added to the context cache or memcache;
+  see Context.exists().
+
+  Args:
+    keys: A sequence of keys.
+    **ctx_options: Context options.
+
+  Returns:
+    A list of futures.
+  """
+  from . import tasklets
+  ctx = tasklets.get_context()
+  return [ctx.exists(key, **ctx_options) for key in keys]
+
+
+def exists_multi(keys, **ctx_options):
+  """Checks whether the entities for a sequence of keys exist.
+
+  Args:
+    keys: A sequence of keys.
+    **ctx_options: Context options.
+
+  Returns:
+    A list of bools, True where the entity for the key exists.
+  """
+  return [future.get_result()
+          for future in exists_multi_async(keys, **ctx_options)]
 
 
 def put_multi_async(entities, **ctx_options):
@@ -0,0 +1,329 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for model.py."""
+
+import os
+import unittest
+import zlib
+
+from google.appengine.api import datastore_errors
+from google.appengine.datastore import entity_pb
+from google.appengine.ext import ndb
+from google.appengine.ext.ndb import test_utils
+
+TEXT = 'All work and no play makes Jack a dull boy. ' * 50
+
+
+class CodecTest(test_utils.NDBTest):
+  """Tests for compressing blob properties with codecs."""
+
+  def roundTrip(self, entity):
+    """Stores an entity and reads it back from the datastore."""
+    key = entity.put(use_cache=False, use_memcache=False)
+    return key.get(use_cache=False, use_memcache=False)
+
+  def storedProperty(self, entity, name):
+    for p in entity._to_pb().raw_property_list():
+      if p.name() == name:
+        return p
+    self.fail('%s not stored' % name)
+
+  def oldEntityPb(self, name, value, compressed):
+    """Returns an EntityProto with a blob property as older NDB stored it."""
+    pb = entity_pb.EntityProto()
+    pb.mutable_key().CopyFrom(ndb.Key('Note', 1).reference())
+    pb.mutable_entity_group()
+    p = pb.add_raw_property()
+    p.set_name(name)
+    p.set_multiple(False)
+    p.set_meaning(entity_pb.Property.BLOB)
+    if compressed:
+      p.set_meaning_uri('ZLIB')
+      value = zlib.compress(value)
+    p.mutable_value().set_stringvalue(value)
+    return pb
+
+  def testRoundTrips(self):
+    for codec in (True, ndb.ZlibCodec(), ndb.ZlibCodec(level=1),
+                  ndb.Bz2Codec(), ndb.Bz2Codec(level=1)):
+      class Note(ndb.Model):
+        blob = ndb.BlobProperty(compressed=codec)
+        text = ndb.TextProperty(compressed=codec)
+        data = ndb.JsonProperty(compressed=codec)
+      note = Note(blob=TEXT, text=TEXT.decode('utf-8'), data={'text': TEXT})
+      self.assertEqual(note, self.roundTrip(note), codec)
+      self.assertTrue(self.storedProperty(note, 'blob').has_meaning_uri())
+
+  def testGenericProperty(self):
+    class Note(ndb.Model):
+      blob = ndb.GenericProperty(indexed=False, compressed=ndb.Bz2Codec())
+    note = Note(blob=TEXT)
+    self.assertEqual('BZ2', self.storedProperty(note, 'blob').meaning_uri())
+    self.assertEqual(TEXT, self.roundTrip(note).blob)
+
+  def testZlibWritesOldFormat(self):
+    class Note(ndb.Model):
+      blob = ndb.BlobProperty(compressed=ndb.ZlibCodec(level=1))
+    p = self.storedProperty(Note(blob=TEXT), 'blob')
+    self.assertEqual('ZLIB', p.meaning_uri())
+    self.assertEqual(TEXT, zlib.decompress(p.value().stringvalue()))
+
+  def testStoredUncompressed(self):
+    class Note(ndb.Model):
+      blob = ndb.BlobProperty(compressed=ndb.ZlibCodec(threshold=100))
+    # Shorter than the threshold.
+    note = Note(blob=TEXT[:99])
+    self.assertFalse(self.storedProperty(note, 'blob').has_meaning_uri())
+    self.assertEqual(note, self.roundTrip(note))
+    # Does not get any smaller.
+    note = Note(blob=os.urandom(1000))
+    self.assertFalse(self.storedProperty(note, 'blob').has_meaning_uri())
+    self.assertEqual(note, self.roundTrip(note))
+
+  def testReadOldFormat(self):
+    for compressed in (False, True, ndb.Bz2Codec()):
+      class Note(ndb.Model):
+        blob = ndb.BlobProperty(compressed=compressed)
+        text = ndb.TextProperty(compressed=compressed)
+      for old_compressed in (False, True):
+        pb = self.oldEntityPb('blob', TEXT, old_compressed)
+        self.assertEqual(TEXT, Note._from_pb(pb).blob)
+        pb = self.oldEntityPb('text', TEXT, old_compressed)
+        self.assertEqual(TEXT.decode('utf-8'), Note._from_pb(pb).text)
+
+  def testReadWithOtherCodec(self):
+    class Note(ndb.Model):
+      blob = ndb.BlobProperty(compressed=ndb.Bz2Codec())
+    pb = Note(id=1, blob=TEXT)._to_pb()
+    # The value is read with the codec it was written with.
+    for compressed in (False, True):
+      class Note(ndb.Model):
+        blob = ndb.BlobProperty(compressed=compressed)
+      self.assertEqual(TEXT, Note._from_pb(pb).blob)
+
+  def testInvalidCodec(self):
+    self.assertRaises(TypeError, ndb.BlobProperty, compressed='zlib')
+    self.assertRaises(NotImplementedError, ndb.BlobProperty, indexed=True,
+                      compressed=ndb.ZlibCodec())
+
+
+class Address(ndb.Model):
+  street = ndb.StringProperty()
+  city = ndb.StringProperty(name='c')
+
+
+class Contact(ndb.Model):
+  name = ndb.StringProperty()
+  address = ndb.StructuredProperty(Address)
+  others = ndb.StructuredProperty(Address, repeated=True)
+  local = ndb.LocalStructuredProperty(Address)
+
+
+class Listing(ndb.Expando):
+  name = ndb.StringProperty()
+  count = ndb.IntegerProperty(indexed=False)
+  address = ndb.StructuredProperty(Address)
+
+
+class UpperProperty(ndb.StringProperty):
+  """Stores strings upper-cased and reads them back lower-cased."""
+
+  def _validate(self, value):
+    if not value:
+      raise datastore_errors.BadValueError('empty')
+
+  def _to_base_type(self, value):
+    return value.upper()
+
+  def _from_base_type(self, value):
+    return value.lower()
+
+
+class ReversedUpperProperty(UpperProperty):
+
+  def _to_base_type(self, value):
+    return value[::-1]
+
+  def _from_base_type(self, value):
+    return value[::-1]
+
+
+class SerializationPlanTest(test_utils.NDBTest):
+  """Tests for the encode and decode plans cached on model classes."""
+
+  def setUp(self):
+    super(SerializationPlanTest, self).setUp()
+    for cls in (Address, Contact, Listing):
+      cls._fix_up_properties()
+
+  def roundTrip(self, entity):
+    return entity.__class__._from_pb(entity._to_pb(), set_key=False)
+
+  def testEncodePlan(self):
+    contact = Contact(name='a')
+    plan = contact._get_encode_plan()
+    self.assertEqual(['address', 'local', 'name', 'others'],
+                     [name for name, _ in plan])
+    self.assertIs(Contact.name, dict(plan)['name'])
+    # The plan is computed once and shared by every entity.
+    self.assertIs(plan, Contact(name='b')._get_encode_plan())
+    self.assertIs(plan, Contact._encode_plan)
+
+  def testFixUpPropertiesInvalidatesPlans(self):
+    class Plan(ndb.Model):
+      a = ndb.StringProperty()
+
+    entity = Plan(a='x')
+    self.assertEqual(entity, self.roundTrip(entity))
+    self.assertEqual(['a'], [name for name, _ in Plan._encode_plan])
+    self.assertEqual(['a'], Plan._decode_plan.keys())
+
+    # Properties added to a class are picked up after _fix_up_properties().
+    Plan.b = ndb.IntegerProperty(name='bee')
+    Plan._fix_up_properties()
+    self.assertEqual(None, Plan._encode_plan)
+    self.assertEqual(None, Plan._decode_plan)
+    entity = Plan(a='x', b=1)
+    pb = entity._to_pb()
+    self.assertEqual(['a', 'bee'], [p.name() for p in pb.property_list()])
+    loaded = Plan._from_pb(pb, set_key=False)
+    self.assertEqual(entity, loaded)
+    self.assertIs(Plan.b, Plan._decode_plan['bee'])
+
+    # The plans of other classes are left alone.
+    class Other(Plan):
+      c = ndb.StringProperty()
+
+    self.assertEqual(['a', 'bee'], [name for name, _ in Plan._encode_plan])
+    self.assertEqual(['a', 'bee', 'c'],
+                     [name for name, _ in Other(c='z')._get_encode_plan()])
+
+  def testExpandoMixesDynamicAndDeclared(self):
+    item = Listing(name='a', count=1, colour='red', sizes=[1, 2])
+    plan = item._get_encode_plan()
+    self.assertEqual(['address', 'colour', 'count', 'name', 'sizes'],
+                     [name for name, _ in plan])
+    # Dynamic properties belong to the entity, not to the class plan.
+    self.assertEqual(['address', 'count', 'name'],
+                     [name for name, _ in Listing(name='b')._get_encode_plan()])
+    self.assertEqual(['address', 'count', 'name'],
+                     [name for name, _ in Listing._encode_plan])
+
+    loaded = self.roundTrip(item)
+    self.assertEqual(item, loaded)
+    self.assertEqual('red', loaded.colour)
+    self.assertEqual([1, 2], loaded.sizes)
+    # address was stored as None.
+    self.assertEqual(set(['address', 'count', 'name']), set(Listing._decode_plan))
+
+    # A later entity with other dynamic properties is not affected by the
+    # ones decoded before.
+    other = self.roundTrip(Listing(name='c', weight=3.5))
+    self.assertEqual(3.5, other.weight)
+    self.assertFalse(hasattr(other, 'colour'))
+    self.assertEqual(set(['address', 'count', 'name', 'weight']),
+                     set(other._properties))
+    self.assertEqual(set(['address', 'count', 'name']),
+                     set(Listing._properties))
+
+  def testExpandoDynamicStructured(self):
+    item = Listing(name='a', address=Address(street='main', city='x'),
+                extra=Address(street='side'))
+    loaded = self.roundTrip(item)
+    self.assertEqual('main', loaded.address.street)
+    self.assertEqual('x', loaded.address.city)
+    # An unknown structured property is read back as an Expando.
+    self.assertEqual('side', loaded.extra.street)
+    self.assertIs(Listing.address, Listing._decode_plan['address.street'])
+    self.assertIs(Listing.address, Listing._decode_plan['address.c'])
+    self.assertNotIn('extra.street', Listing._decode_plan)
+
+  def testStructuredProperty(self):
+    contacts = [
+        Contact(name='a', address=Address(street='main', city='x'),
+                others=[Address(street='one', city='1'),
+                        Address(street='two', city='2')],
+                local=Address(street='local')),
+        Contact(name='b', others=[Address(street='three', city='y')]),
+        Contact(name='c', address=Address(city='z'), others=[]),
+    ]
+    for contact in contacts:
+      self.assertEqual(contact, self.roundTrip(contact))
+    # The same entities again, now through the filled in decode plan.
+    self.assertIs(Contact.address, Contact._decode_plan['address.street'])
+    self.assertIs(Contact.address, Contact._decode_plan['address.c'])
+    self.assertIs(Contact.others, Contact._decode_plan['others.street'])
+    self.assertIs(Contact.local, Contact._decode_plan['local'])
+    for contact in contacts:
+      loaded = self.roundTrip(contact)
+      self.assertEqual(contact, loaded)
+    loaded = self.roundTrip(contacts[0])
+    self.assertEqual([Address(street='one', city='1'),
+                      Address(street='two', city='2')], loaded.others)
+    self.assertEqual('x', loaded.address.city)
+    # The nested model class uses its own plan to encode.
+    self.assertEqual(['c', 'street'],
+                     [name for name, _ in Address._encode_plan])
+
+  def testStoredThroughDatastore(self):
+    contact = Contact(name='a', address=Address(street='main'),
+                      others=[Address(street='one', city='1')])
+    key = contact.put(use_cache=False, use_memcache=False)
+    self.assertEqual(contact, key.get(use_cache=False, use_memcache=False))
+    results = Contact.query(Contact.address.street == 'main').fetch()
+    self.assertEqual([contact], results)
+
+  def testProjection(self):
+    Contact(name='a', address=Address(street='main', city='x')).put()
+    results = Contact.query().fetch(projection=['name', 'address.street'])
+    self.assertEqual(1, len(results))
+    self.assertEqual('a', results[0].name)
+    self.assertEqual('main', results[0].address.street)
+    self.assertEqual(set(['name', 'address.street']),
+                     set(results[0]._projection))
+
+  def testBaseTypeMethods(self):
+    class Word(ndb.Model):
+      upper = UpperProperty()
+      reversed = ReversedUpperProperty()
+
+    word = Word(upper='Hello', reversed='Hello')
+    pb = word._to_pb()
+    self.assertEqual(
+        {'upper': 'HELLO', 'reversed': 'OLLEH'},
+        dict((p.name(), p.value().stringvalue()) for p in pb.property_list()))
+    loaded = Word._from_pb(pb)
+    self.assertEqual('hello', loaded.upper)
+    self.assertEqual('hello', loaded.reversed)
+    self.assertRaises(datastore_errors.BadValueError, Word, upper='')
+    # The shallow validation stops at ReversedUpperProperty._to_base_type().
+    word = Word(reversed='')
+    self.assertRaises(datastore_errors.BadValueError, word._to_pb)
+
+    # The methods are found once per property and kept on the instance.
+    for prop in (Word.upper, Word.reversed):
+      self.assertIn('_to_base_type_methods', prop.__dict__)
+      self.assertIn('_from_base_type_methods', prop.__dict__)
+    self.assertEqual(None, ndb.StringProperty._to_base_type_methods)
+    self.assertEqual(
+        [ReversedUpperProperty.__dict__['_to_base_type'],
+         UpperProperty.__dict__['_validate'],
+         UpperProperty.__dict__['_to_base_type']],
+        Word.reversed._to_base_type_methods[:3])
+
+
+if __name__ == '__main__':
+  unittest.main()
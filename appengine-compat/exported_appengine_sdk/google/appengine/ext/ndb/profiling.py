@@ -0,0 +1,290 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-request profiling of the event loop, tasklets and auto-batchers.
+
+When code using NDB is slow, the time may go to waiting for RPCs, to
+running tasklet generators, or to idling until the auto-batchers send
+their batches.  Profiling is off by default; start() turns it on for the
+current request and stop() turns it off again and returns what was
+recorded::
+
+  from google.appengine.ext.ndb import profiling
+
+  profiling.start(sample_rate=0.01)
+  ...
+  profile = profiling.stop()
+  if profile is not None:
+    logging.info('NDB profile:\n%s', profile.summary())
+
+The profile is kept by the request's event loop, so it is dropped with it
+at the end of the request.  While profiling is off, the event loop and
+tasklets only check whether it is on, so it can be sampled in production.
+"""
+
+import os
+import random
+import time
+
+from . import eventloop
+from . import tasklets
+
+__all__ = ['Profile', 'start', 'stop', 'get_profile']
+
+
+class _FutureRecord(object):
+  """What a tasklet's Future did while profiling."""
+
+  __slots__ = ('name', 'start', 'end', 'waits')
+
+  def __init__(self, name, start):
+    self.name = name
+    self.start = start
+    self.end = start
+    self.waits = []  # A list of [Future or RPC, start, end or None].
+
+
+def _code_name(code):
+  return '%s(%s:%s)' % (code.co_name, os.path.basename(code.co_filename),
+                        code.co_firstlineno)
+
+
+def _rpc_name(rpc):
+  # A UserRPC, or a MultiRpc of several of them.
+  rpcs = getattr(rpc, 'rpcs', None) or [rpc]
+  name = '%s.%s' % (rpcs[0].service, rpcs[0].method)
+  if len(rpcs) > 1:
+    name += ' x%d' % len(rpcs)
+  return name
+
+
+class Profile(object):
+  """What was recorded while profiling one request.
+
+  Attributes:
+    tasklets: A dict mapping tasklet functions, as 'name(file:line)', to
+      [calls, steps, seconds] lists: the number of times the tasklet ran,
+      the number of times its generator was resumed, and the total seconds
+      spent resuming it.
+    batches: A dict mapping auto-batchers, by the name of the tasklet that
+      sends their batches (e.g. '_get_tasklet'), to the list of the sizes
+      of the batches they sent.
+    rpcs: A dict mapping 'service.method' to [count, seconds] lists, where
+      seconds is the total time from the RPCs being given to the event loop
+      until it saw them complete.
+    blocked_seconds: The seconds the event loop spent waiting for RPCs.
+    sleep_seconds: The seconds the event loop slept until a delayed
+      callback was due.
+    idle_calls: The number of idle callbacks run, e.g. auto-batchers
+      sending batches that were not full.
+    idle_seconds: The seconds spent in idle callbacks.
+  """
+
+  def __init__(self):
+    self.tasklets = {}
+    self.batches = {}
+    self.rpcs = {}
+    self.blocked_seconds = 0.0
+    self.sleep_seconds = 0.0
+    self.idle_calls = 0
+    self.idle_seconds = 0.0
+    self.start_time = time.time()
+    self.stop_time = None
+    self._futures = {}  # Map from tasklet Future to _FutureRecord.
+    self._first = None  # The Future of the first tasklet resumed.
+    self._links = {}  # Map from AutoBatcher.add() Future to batch Future.
+    self._rpc_starts = {}
+
+  # The methods below are called by the event loop, tasklets and
+  # auto-batchers while this profile is active.
+
+  def _resumed(self, fut, gen):
+    now = time.time()
+    record = self._futures.get(fut)
+    if record is None:
+      name = _code_name(gen.gi_code)
+      record = self._futures[fut] = _FutureRecord(name, now)
+      if self._first is None:
+        self._first = fut
+      stats = self.tasklets.get(name)
+      if stats is None:
+        stats = self.tasklets[name] = [0, 0, 0.0]
+      stats[0] += 1
+    elif record.waits and record.waits[-1][2] is None:
+      record.waits[-1][2] = now
+    return now
+
+  def _stepped(self, fut, start):
+    now = time.time()
+    record = self._futures[fut]
+    record.end = now
+    stats = self.tasklets[record.name]
+    stats[1] += 1
+    stats[2] += now - start
+
+  def _waiting(self, fut, target):
+    self._futures[fut].waits.append([target, time.time(), None])
+
+  def _batched(self, batcher, todo, batch_fut):
+    name = batcher._todo_tasklet.__name__
+    self.batches.setdefault(name, []).append(len(todo))
+    for fut, _ in todo:
+      self._links[fut] = batch_fut
+
+  def _rpc_queued(self, rpc):
+    self._rpc_starts[rpc] = time.time()
+
+  def _blocked(self, seconds, rpc):
+    now = time.time()
+    self.blocked_seconds += seconds
+    if rpc is not None:
+      name = _rpc_name(rpc)
+      stats = self.rpcs.get(name)
+      if stats is None:
+        stats = self.rpcs[name] = [0, 0.0]
+      stats[0] += 1
+      stats[1] += now - self._rpc_starts.pop(rpc, now)
+
+  def _slept(self, seconds):
+    self.sleep_seconds += seconds
+
+  def _idled(self, seconds):
+    self.idle_calls += 1
+    self.idle_seconds += seconds
+
+  def _resolve(self, target):
+    # Follow a waited-for Future to the tasklet or RPC that completed it.
+    while True:
+      if isinstance(target, tasklets.MultiFuture):
+        if not target._results:
+          return target
+        target = max(target._results, key=self._end_time)
+      elif target in self._links:
+        target = self._links[target]
+      else:
+        return target
+
+  def _end_time(self, fut):
+    record = self._futures.get(self._resolve(fut))
+    if record is None:
+      return 0
+    return record.end
+
+  def critical_path(self, fut=None):
+    """Returns the chain of waits that determined how long a tasklet took.
+
+    Starting from the tasklet, this repeatedly follows its longest wait to
+    the tasklet or RPC it waited for.  A yield of several Futures is
+    followed to the one that finished last, and a Future returned by an
+    auto-batcher to the tasklet that sent its batch.
+
+    Args:
+      fut: The Future of a tasklet that ran while profiling.  Defaults to
+        the first tasklet that ran, normally the toplevel one.
+
+    Returns:
+      A list of (description, seconds) pairs: for a tasklet its name and
+      how long it ran, and for anything else what it is and how long it
+      was waited for.
+    """
+    if fut is None:
+      fut = self._first
+    path = []
+    seen = set()
+    while fut is not None and fut not in seen:
+      seen.add(fut)
+      record = self._futures.get(fut)
+      if record is None:
+        break
+      path.append((record.name, record.end - record.start))
+      waits = [wait for wait in record.waits if wait[2] is not None]
+      if not waits:
+        break
+      target, start, end = max(waits, key=lambda wait: wait[2] - wait[1])
+      fut = self._resolve(target)
+      if fut not in self._futures:
+        if isinstance(fut, tasklets.Future):
+          description = fut._info or 'Future'
+        else:
+          description = 'RPC ' + _rpc_name(fut)
+        path.append((description, end - start))
+        break
+    return path
+
+  def summary(self, limit=10):
+    """Returns a human-readable report of this profile.
+
+    Args:
+      limit: The maximum number of tasklets listed.
+    """
+    stop_time = self.stop_time or time.time()
+    lines = ['%.1f ms profiled: %.1f ms blocked on RPCs, %.1f ms sleeping, '
+             '%d idle callbacks taking %.1f ms' %
+             ((stop_time - self.start_time) * 1000,
+              self.blocked_seconds * 1000, self.sleep_seconds * 1000,
+              self.idle_calls, self.idle_seconds * 1000)]
+    lines.append('Tasklets (calls, steps, ms):')
+    for name, (calls, steps, seconds) in sorted(
+        self.tasklets.iteritems(), key=lambda item: -item[1][2])[:limit]:
+      lines.append('  %s: %d, %d, %.1f' % (name, calls, steps, seconds * 1000))
+    lines.append('Batches (count, min/mean/max size):')
+    for name, sizes in sorted(self.batches.iteritems()):
+      lines.append('  %s: %d, %d/%.1f/%d' % (
+          name, len(sizes), min(sizes), float(sum(sizes)) / len(sizes),
+          max(sizes)))
+    lines.append('RPCs (count, ms):')
+    for name, (count, seconds) in sorted(self.rpcs.iteritems()):
+      lines.append('  %s: %d, %.1f' % (name, count, seconds * 1000))
+    lines.append('Critical path (ms):')
+    for description, seconds in self.critical_path():
+      lines.append('  %s: %.1f' % (description, seconds * 1000))
+    return '\n'.join(lines)
+
+
+def start(sample_rate=1):
+  """Starts profiling the current request.
+
+  Args:
+    sample_rate: The probability that profiling is started, so that only
+      a fraction of requests are profiled.
+
+  Returns:
+    The Profile being recorded, or None if this request was not sampled.
+  """
+  if sample_rate < 1 and random.random() >= sample_rate:
+    return None
+  ev = eventloop.get_event_loop()
+  if ev.profile is None:
+    ev.profile = Profile()
+  return ev.profile
+
+
+def stop():
+  """Stops profiling the current request.
+
+  Returns:
+    The Profile recorded, or None if the request was not being profiled.
+  """
+  ev = eventloop.get_event_loop()
+  profile = ev.profile
+  if profile is not None:
+    ev.profile = None
+    profile.stop_time = time.time()
+  return profile
+
+
+def get_profile():
+  """Returns the Profile being recorded for the current request, or None."""
+  return eventloop.get_event_loop().profile
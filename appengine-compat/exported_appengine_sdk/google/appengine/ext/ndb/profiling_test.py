@@ -0,0 +1,122 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for profiling.py."""
+
+import unittest
+
+from google.appengine.ext import ndb
+from google.appengine.ext.ndb import profiling
+from google.appengine.ext.ndb import test_utils
+
+
+class Record(ndb.Model):
+  title = ndb.StringProperty()
+
+
+@ndb.tasklet
+def get_records(keys):
+  records = yield ndb.get_multi_async(keys, use_cache=False, use_memcache=False)
+  raise ndb.Return(records)
+
+
+class ProfilingTest(test_utils.NDBTest):
+  """Tests for start(), stop() and Profile."""
+
+  def setUp(self):
+    super(ProfilingTest, self).setUp()
+    self.keys = ndb.put_multi([Record(id=1), Record(id=2)])
+
+  def profile(self):
+    profile = profiling.start()
+    self.assertIs(profile, profiling.get_profile())
+    try:
+      get_records(self.keys).get_result()
+    finally:
+      self.assertIs(profile, profiling.stop())
+    self.assertIsNone(profiling.get_profile())
+    return profile
+
+  def names(self, names):
+    # Strip the '(file:line)' from tasklet names.
+    return [name.split('(')[0] for name in names]
+
+  def testOff(self):
+    self.assertIsNone(profiling.stop())
+    self.assertIsNone(profiling.start(sample_rate=0))
+    self.assertIsNone(profiling.get_profile())
+
+  def testStartTwice(self):
+    profile = profiling.start()
+    self.assertIs(profile, profiling.start())
+    profiling.stop()
+
+  def testRecorded(self):
+    profile = self.profile()
+    self.assertEqual(['_get_tasklet', 'get', 'get_records'],
+                     sorted(self.names(profile.tasklets)))
+    calls, steps, _ = profile.tasklets[
+        [name for name in profile.tasklets if name.startswith('get(')][0]]
+    self.assertEqual(2, calls)
+    self.assertEqual(4, steps)
+    self.assertEqual({'_get_tasklet': [2]}, profile.batches)
+    self.assertEqual(['datastore_v3.Get'], profile.rpcs.keys())
+    self.assertEqual(1, profile.rpcs['datastore_v3.Get'][0])
+    self.assertIsNotNone(profile.stop_time)
+
+  def testNothingRecordedWhenOff(self):
+    profile = self.profile()
+    get_records(self.keys).get_result()
+    self.assertEqual(1, profile.rpcs['datastore_v3.Get'][0])
+
+  def testCriticalPath(self):
+    profile = self.profile()
+    path = profile.critical_path()
+    # The wait for the batch is followed to the tasklet that sent it.
+    self.assertEqual(
+        ['get_records', 'get', '_get_tasklet', 'RPC datastore_v3.Get'],
+        self.names(description for description, _ in path))
+    seconds = [seconds for _, seconds in path]
+    self.assertEqual(sorted(seconds, reverse=True), seconds)
+
+  def testCriticalPathOfOtherTasklet(self):
+    profiling.start()
+    get_records(self.keys[:1]).get_result()
+    fut = get_records(self.keys[1:])
+    fut.get_result()
+    profile = profiling.stop()
+    description, _ = profile.critical_path(fut)[0]
+    self.assertEqual(['get_records'], self.names([description]))
+    self.assertEqual([], profile.critical_path(ndb.Future()))
+
+  def testSummary(self):
+    lines = self.profile().summary().splitlines()
+    self.assertIn('blocked on RPCs', lines[0])
+    self.assertEqual('Tasklets (calls, steps, ms):', lines[1])
+    self.assertIn('  _get_tasklet: 1, 2/2.0/2', lines)
+    self.assertIn('RPCs (count, ms):', lines)
+    self.assertTrue(any(line.startswith('  datastore_v3.Get: 1, ')
+                        for line in lines))
+    path = lines[lines.index('Critical path (ms):') + 1:]
+    self.assertEqual(4, len(path))
+    self.assertTrue(path[0].startswith('  get_records('))
+
+  def testSummaryLimit(self):
+    lines = self.profile().summary(limit=1).splitlines()
+    self.assertEqual('Batches (count, min/mean/max size):', lines[3])
+
+
+if __name__ == '__main__':
+  unittest.main()
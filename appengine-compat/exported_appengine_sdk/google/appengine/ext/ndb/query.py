@@ -536,6 +536,26 @@ class FilterNode(Node):
     return datastore_query.make_filter(self.__name.decode('utf-8'),
                                        self.__opsymbol, value)
 
+  def _get_name(self):
+    return self.__name
+
+  def _excludes(self, other):
+    """Internal helper to tell whether no value can match both filters.
+
+    This recognizes the filters that IN and != expand to: equality
+    filters for different values, and < and > filters for the same
+    value.  Note that an entity with several values for the property
+    can still match both.
+    """
+    if not isinstance(other, FilterNode) or self.__name != other.__name:
+      return False
+    opsymbols = (self.__opsymbol, other.__opsymbol)
+    if opsymbols == ('=', '='):
+      return self.__value != other.__value
+    if opsymbols in (('<', '>'), ('>', '<')):
+      return self.__value == other.__value
+    return False
+
 
 class PostFilterNode(Node):
   """Tree node representing an in-memory filtering operation.
@@ -1009,7 +1029,7 @@ class Query(object):
     filters = self.filters
     return filters is not None and isinstance(filters, DisjunctionNode)
 
-  def _maybe_multi_query(self):
+  def _maybe_multi_query(self, unordered=False):
     if not self._needs_multi_query():
       return None
     # Switch to a _MultiQuery.
@@ -1023,7 +1043,7 @@ class Query(object):
                                 projection=self.projection,
                                 group_by=self.group_by)
       subqueries.append(subquery)
-    return _MultiQuery(subqueries)
+    return _MultiQuery(subqueries, unordered=unordered)
 
   @property
   def kind(self):
@@ -1308,13 +1328,20 @@ class Query(object):
     elif limit is None:
       limit = _MAX_LIMIT
     if self._needs_multi_query():
-      # _MultiQuery does not support iterating over result batches,
-      # so just fetch results and count them.
-      # TODO: Use QueryIterator to avoid materializing the results list.
-      q_options.setdefault('batch_size', limit)
-      q_options.setdefault('keys_only', True)
-      results = yield self.fetch_async(limit, **q_options)
-      raise tasklets.Return(len(results))
+      options = self._make_options(dict(q_options))
+      if options is not None and (options.start_cursor or options.end_cursor):
+        # The cursors are positions in the merged results, so they cannot be
+        # applied to each subquery; count the results fetch() would return.
+        q_options.setdefault('batch_size', limit)
+        q_options.setdefault('keys_only', True)
+        results = yield self.fetch_async(limit, **q_options)
+        raise tasklets.Return(len(results))
+      # Merging the results in order does not change their number, but the
+      # subqueries keep their orders, which exclude entities that lack an
+      # ordered property.
+      multiquery = self._maybe_multi_query(unordered=True)
+      total = yield multiquery.count_async(limit, **q_options)
+      raise tasklets.Return(total)
 
     # Issue a special query requesting 0 results at a given offset.
     # The skipped_results count will tell us how many hits there were
@@ -1857,6 +1884,28 @@ class _SubQueryIteratorState(object):
     return self.orders._cmp(lhs_value_map, rhs_value_map)
 
 
+def _is_single_valued(modelclass, name):
+  """Tell whether a model class declares a property with a single value.
+
+  Args:
+    modelclass: A Model subclass.
+    name: A property name as used in filters, e.g. 'address.city' for a
+      property of a StructuredProperty.
+
+  Returns:
+    False if the property is not declared, or is repeated or part of a
+    repeated StructuredProperty; True otherwise.
+  """
+  for part in name.split('.'):
+    prop = None
+    if modelclass is not None:
+      prop = modelclass._properties.get(part)
+    if prop is None or prop._repeated:
+      return False
+    modelclass = getattr(prop, '_modelclass', None)
+  return True
+
+
 class _MultiQuery(object):
   """Helper class to run queries involving !=, IN or OR operators."""
 
@@ -1871,7 +1920,16 @@ class _MultiQuery(object):
   # are identical except one has an ancestor and the other doesn't.
   # Cloud Datastore makes that a useful special case.
 
-  def __init__(self, subqueries):
+  def __init__(self, subqueries, unordered=False):
+    """Constructor.
+
+    Args:
+      subqueries: A list of Query instances for a common kind with the same
+        orders.
+      unordered: If True, results are passed on as the subqueries produce
+        them rather than merged in order.  The subqueries still apply their
+        orders.
+    """
     if not isinstance(subqueries, list):
       raise TypeError('subqueries must be a list; received %r' % subqueries)
     for subq in subqueries:
@@ -1892,7 +1950,7 @@ class _MultiQuery(object):
                          (subq.orders, orders))
     # TODO: Ensure that app and namespace match, when we support them.
     self.__subqueries = subqueries
-    self.__orders = orders
+    self.__orders = None if unordered else orders
     self.ancestor = None  # Hack for map_query().
 
   def _make_options(self, q_options):
@@ -1954,29 +2012,39 @@ class _MultiQuery(object):
       limit = _MAX_LIMIT
 
     if self.__orders is None:
-      # Run the subqueries sequentially; there is no order to keep.
+      # Run the subqueries concurrently; there is no order to keep, so
+      # each result is passed on as soon as its subquery produces it.
       keys_seen = set()
-      for subq in self.__subqueries:
-        if limit <= 0:
-          break
-        subit = tasklets.SerialQueueFuture('_MultiQuery.run_to_queue[ser]')
-        subq.run_to_queue(subit, conn, options=options)
-        while limit > 0:
+      remaining = [offset, limit]  # Shared by all drain() tasklets.
+
+      @tasklets.tasklet
+      def drain(subit):
+        while remaining[1] > 0:
           try:
             batch, index, result = yield subit.getq()
           except EOFError:
             break
+          if remaining[1] <= 0:
+            break
           if keys_only:
             key = result
           else:
             key = result._key
           if key not in keys_seen:
             keys_seen.add(key)
-            if offset > 0:
-              offset -= 1
+            if remaining[0] > 0:
+              remaining[0] -= 1
             else:
-              limit -= 1
+              remaining[1] -= 1
               queue.putq((None, None, result))
+
+      drains = []
+      if limit > 0:
+        for subq in self.__subqueries:
+          subit = tasklets.SerialQueueFuture('_MultiQuery.run_to_queue[ser]')
+          subq.run_to_queue(subit, conn, options=options)
+          drains.append(drain(subit))
+      yield drains
       queue.complete()
       return
 
@@ -2046,6 +2114,65 @@ class _MultiQuery(object):
           heapq.heappush(state, item)
       queue.complete()
 
+  @tasklets.tasklet
+  def count_async(self, limit, **q_options):
+    """Count the distinct results of the subqueries, up to a limit.
+
+    If no entity can match more than one subquery (see _are_disjoint()),
+    the subqueries are counted without fetching any results, as by
+    Query.count_async(), and the counts are added up.  Otherwise their
+    keys are fetched and counted once each.
+    """
+    if self._are_disjoint():
+      counts = yield [subq._count_async(limit, **q_options)
+                      for subq in self.__subqueries]
+      raise tasklets.Return(min(limit, sum(counts)))
+
+    q_options['limit'] = limit
+    q_options.setdefault('batch_size', limit)
+    q_options.setdefault('keys_only', True)
+    options = self.__subqueries[0]._make_options(q_options)
+    queue = tasklets.SerialQueueFuture('_MultiQuery.count_async')
+    self.run_to_queue(queue, tasklets.get_context()._conn, options=options)
+    total = 0
+    while True:
+      try:
+        yield queue.getq()
+      except EOFError:
+        break
+      total += 1
+    raise tasklets.Return(total)
+
+  def _are_disjoint(self):
+    """Tell whether every entity matches at most one of the subqueries.
+
+    This is the case if every pair of subqueries has filters that exclude
+    each other on a property that the model class declares with a single
+    value, as for the subqueries that IN and != produce.  Projection
+    queries may return several results per entity, so they are never
+    considered disjoint.
+    """
+    first_subquery = self.__subqueries[0]
+    if first_subquery.projection or first_subquery.group_by:
+      return False
+    modelclass = model.Model._kind_map.get(first_subquery.kind)
+    if modelclass is None:
+      return False
+    clauses = []
+    for subq in self.__subqueries:
+      nodes = subq.filters
+      if not isinstance(nodes, ConjunctionNode):
+        nodes = [nodes]
+      clauses.append([node for node in nodes
+                      if isinstance(node, FilterNode) and
+                      _is_single_valued(modelclass, node._get_name())])
+    for i, clause in enumerate(clauses):
+      for other_clause in clauses[i + 1:]:
+        if not any(node._excludes(other_node)
+                   for node in clause for other_node in other_clause):
+          return False
+    return True
+
   # Datastore API using the default context.
 
   def iter(self, **q_options):
@@ -0,0 +1,76 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for query.py."""
+
+import unittest
+
+from google.appengine.ext import ndb
+from google.appengine.ext.ndb import test_utils
+
+
+class Item(ndb.Expando):
+  category = ndb.IntegerProperty()
+  name = ndb.StringProperty()
+
+
+class MultiQueryCountTest(test_utils.NDBTest):
+  """Tests that count() agrees with fetch() for IN and OR queries."""
+
+  def setUp(self):
+    super(MultiQueryCountTest, self).setUp()
+    items = []
+    for index in range(30):
+      item = Item(id=index + 1, category=index % 3,
+                  name='item %d' % (index % 4))
+      # Ordering by rank leaves out the entities that lack it.
+      if index % 5:
+        item.rank = index % 7
+      items.append(item)
+    ndb.put_multi(items)
+    self.rank = ndb.GenericProperty('rank')
+
+  def assertCountMatchesFetch(self, query, **q_options):
+    expected = len(query.fetch(**q_options))
+    self.assertEqual(expected, query.count(**q_options))
+    limit = expected // 2
+    self.assertEqual(limit, query.count(limit, **q_options))
+
+  def testDisjointIn(self):
+    query = Item.query(Item.category.IN([0, 2]))
+    self.assertCountMatchesFetch(query)
+    self.assertCountMatchesFetch(query.order(self.rank))
+    self.assertCountMatchesFetch(query.order(-self.rank, Item.key))
+
+  def testOverlappingOr(self):
+    query = Item.query(ndb.OR(Item.category == 1, Item.name == 'item 2'))
+    self.assertCountMatchesFetch(query)
+    self.assertCountMatchesFetch(query.order(self.rank))
+    self.assertCountMatchesFetch(query.order(self.rank, Item.key))
+
+  def testOrderedCountIsSmaller(self):
+    query = Item.query(Item.category.IN([0, 1, 2]))
+    self.assertEqual(30, query.count())
+    self.assertEqual(24, query.order(self.rank).count())
+
+  def testCursor(self):
+    query = Item.query(Item.category.IN([0, 1])).order(Item.key)
+    _, cursor, _ = query.fetch_page(5)
+    self.assertCountMatchesFetch(query, start_cursor=cursor)
+    self.assertCountMatchesFetch(query, end_cursor=cursor)
+
+
+if __name__ == '__main__':
+  unittest.main()
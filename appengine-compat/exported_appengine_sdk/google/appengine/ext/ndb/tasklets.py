@@ -411,6 +411,9 @@ class Future(object):
     info = utils.gen_info(gen)
     # pylint: disable=invalid-name
     __ndb_debug__ = info
+    profile = eventloop.get_profile()
+    if profile is not None:
+      start = profile._resumed(self, gen)
     try:
       save_context = get_context()
       save_namespace = namespace_manager.get_namespace()
@@ -437,6 +440,8 @@ class Future(object):
           namespace_manager.set_namespace(save_namespace)
         if save_ds_connection is not ds_conn:
           datastore._SetConnection(save_ds_connection)
+        if profile is not None:
+          profile._stepped(self, start)
 
     except StopIteration, err:
       result = get_return_value(err)
@@ -474,6 +479,8 @@ class Future(object):
       if isinstance(value, (apiproxy_stub_map.UserRPC,
                             datastore_rpc.MultiRpc)):
         # TODO: Tail recursion if the RPC is already complete.
+        if profile is not None:
+          profile._waiting(self, value)
         eventloop.queue_rpc(value, self._on_rpc_completion,
                             value, ns, ds_conn, gen)
         return
@@ -485,6 +492,8 @@ class Future(object):
         self._next = value
         self._geninfo = utils.gen_info(gen)
         _logging_debug('%s is now blocked waiting for %s', self, value)
+        if profile is not None:
+          profile._waiting(self, value)
         value.add_callback(self._on_future_completion, value, ns, ds_conn, gen)
         return
       if isinstance(value, (tuple, list)):
@@ -500,6 +509,8 @@ class Future(object):
         except Exception, err:
           _, _, tb = sys.exc_info()
           mfut.set_exception(err, tb)
+        if profile is not None:
+          profile._waiting(self, mfut)
         mfut.add_callback(self._on_future_completion, mfut, ns, ds_conn, gen)
         return
       if _is_generator(value):
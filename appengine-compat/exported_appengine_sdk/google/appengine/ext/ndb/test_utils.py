@@ -0,0 +1,58 @@
+#
+# Copyright 2008 The ndb Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test utilities for writing NDB tests.
+
+Tests derive from NDBTest, which sets up in-memory datastore and memcache
+stubs and a fresh context for every test.
+"""
+
+import unittest
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import testbed
+
+from . import eventloop
+from . import model
+from . import tasklets
+
+
+class NDBTest(unittest.TestCase):
+  """Base class for tests that use the datastore and memcache through NDB."""
+
+  APP_ID = 'ndb-test-app-id'
+
+  def setUp(self):
+    self.testbed = testbed.Testbed()
+    self.testbed.activate()
+    self.testbed.setup_env(app_id=self.APP_ID, overwrite=True)
+    # Make every write visible to queries at once.
+    self.testbed.init_datastore_v3_stub(
+        consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+            probability=1))
+    self.testbed.init_memcache_stub()
+    self._saved_kind_map = model.Model._kind_map.copy()
+    self.ctx = tasklets.make_default_context()
+    tasklets.set_context(self.ctx)
+
+  def tearDown(self):
+    # Finish the work that tests leave behind, e.g. futures they ignore.
+    ev = eventloop.get_event_loop()
+    while ev.run1():
+      pass
+    tasklets.set_context(None)
+    model.Model._kind_map.clear()
+    model.Model._kind_map.update(self._saved_kind_map)
+    self.testbed.deactivate()
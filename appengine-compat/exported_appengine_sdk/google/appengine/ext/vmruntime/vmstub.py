@@ -43,15 +43,7 @@ from google.appengine.runtime import apiproxy_errors
 
 
 
-requests = imp.load_module('requests_nologs', *imp.find_module('requests'))
-
-
-
-
-
-
-
-logging.getLogger('requests_nologs').setLevel(logging.ERROR)
+requests = None
 
 TICKET_HEADER = 'HTTP_X_APPENGINE_API_TICKET'
 DEV_TICKET_HEADER = 'HTTP_X_APPENGINE_DEV_REQUEST_ID'
@@ -123,6 +115,32 @@ _DEADLINE_EXCEEDED_EXCEPTION = _EXCEPTIONS_MAP[
 app_is_loaded = False
 
 
+def _GetRequests():
+  """Returns the requests module, importing it on first use.
+
+  requests is only needed once the application makes an API call, so it is not
+  imported when the runtime starts. It is imported under a different name so
+  that its logging can be silenced without affecting the application's own use
+  of requests.
+
+  The import lock serializes the import; it is reentrant, so this is also safe
+  while the calling thread is importing the application.
+
+  Returns:
+    The requests module.
+  """
+  global requests
+  imp.acquire_lock()
+  try:
+    if requests is None:
+      module = imp.load_module('requests_nologs', *imp.find_module('requests'))
+      logging.getLogger('requests_nologs').setLevel(logging.ERROR)
+      requests = module
+  finally:
+    imp.release_lock()
+  return requests
+
+
 def CaptureStacktrace(func, *args, **kwargs):
   """Ensure the trace is not discarded by appending it to the error message."""
   try:
@@ -250,6 +268,7 @@ class VMEngineRPC(apiproxy_rpc.RPC):
 
     self._state = apiproxy_rpc.RPC.RUNNING
 
+    requests_module = _GetRequests()
     request_kwargs = dict(url=endpoint_url,
                           timeout=DEADLINE_DELTA_SECONDS + deadline,
                           headers=headers, data=body_data)
@@ -258,7 +277,7 @@ class VMEngineRPC(apiproxy_rpc.RPC):
 
     if imp.lock_held() and not app_is_loaded:
       try:
-        value = CaptureStacktrace(requests.post, **request_kwargs)
+        value = CaptureStacktrace(requests_module.post, **request_kwargs)
         success = True
       except Exception as e:
         value = e
@@ -269,7 +288,7 @@ class VMEngineRPC(apiproxy_rpc.RPC):
 
 
       self._result_future = self.stub.thread_pool.apply_async(
-          CaptureStacktrace, args=[requests.post], kwds=request_kwargs)
+          CaptureStacktrace, args=[requests_module.post], kwds=request_kwargs)
 
   def _WaitImpl(self):
 
@@ -376,10 +395,21 @@ class VMStub(object):
 
 
   def __init__(self, default_ticket=None):
-
-    self.thread_pool = multiprocessing.dummy.Pool(MAX_CONCURRENT_API_CALLS)
+    self._thread_pool = None
+    self._thread_pool_lock = threading.Lock()
     self.default_ticket = default_ticket
 
+  @property
+  def thread_pool(self):
+    """The pool of threads making asynchronous API calls.
+
+    Its threads are only started on the first asynchronous call.
+    """
+    with self._thread_pool_lock:
+      if self._thread_pool is None:
+        self._thread_pool = multiprocessing.dummy.Pool(MAX_CONCURRENT_API_CALLS)
+      return self._thread_pool
+
 
   def DefaultTicket(self):
     return self.default_ticket or os.environ['DEFAULT_TICKET']
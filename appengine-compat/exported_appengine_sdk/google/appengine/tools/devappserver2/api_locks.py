@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Locks that serialize calls to API stubs that are not threadsafe.
+
+Each service gets its own readers-writer lock so that a slow call to one stub
+(e.g. a search query or an image transform) does not stall calls to every
+other stub. Methods that a stub declares as read-only share the lock. A
+service can additionally be split into partitions (e.g. one per search index)
+which are locked independently of each other.
+
+The time spent waiting for each service lock is recorded so that contention
+can be inspected during load tests.
+"""
+
+
+
+import collections
+import contextlib
+import thread
+import threading
+import time
+
+
+LockWaitStats = collections.namedtuple(
+    'LockWaitStats', ['acquisitions', 'contended', 'wait_seconds',
+                      'max_wait_seconds'])
+
+
+class ReadWriteLock(object):
+  """A reentrant readers-writer lock that prefers writers.
+
+  Any number of threads may hold the lock for reading at the same time while
+  holding it for writing is exclusive. A thread holding the lock may acquire
+  it again for reading, and a thread holding it for writing may also acquire
+  it again for writing. Waiting writers block new readers so that a steady
+  stream of reads cannot starve them.
+  """
+
+  def __init__(self):
+    self._condition = threading.Condition(threading.Lock())
+    # Maps thread ident to the number of read holds of that thread.
+    self._readers = {}
+    self._writer = None
+    self._write_count = 0
+    self._waiting_writers = 0
+
+  def acquire_read(self):
+    """Acquires the lock for reading, blocking until it is available."""
+    me = thread.get_ident()
+    with self._condition:
+      if self._writer == me or me in self._readers:
+        self._readers[me] = self._readers.get(me, 0) + 1
+        return
+      while self._writer is not None or self._waiting_writers:
+        self._condition.wait()
+      self._readers[me] = 1
+
+  def release_read(self):
+    """Releases a read hold acquired by the calling thread."""
+    me = thread.get_ident()
+    with self._condition:
+      count = self._readers.get(me)
+      if not count:
+        raise RuntimeError('cannot release un-acquired read lock')
+      if count > 1:
+        self._readers[me] = count - 1
+      else:
+        del self._readers[me]
+        if not self._readers:
+          self._condition.notify_all()
+
+  def acquire_write(self):
+    """Acquires the lock for writing, blocking until it is available.
+
+    Raises:
+      RuntimeError: if the calling thread holds the lock only for reading.
+          Upgrading a read hold would deadlock with any other upgrading thread.
+    """
+    me = thread.get_ident()
+    with self._condition:
+      if self._writer == me:
+        self._write_count += 1
+        return
+      if me in self._readers:
+        raise RuntimeError('cannot upgrade a read lock to a write lock')
+      self._waiting_writers += 1
+      try:
+        while self._writer is not None or self._readers:
+          self._condition.wait()
+      finally:
+        self._waiting_writers -= 1
+      self._writer = me
+      self._write_count = 1
+
+  def release_write(self):
+    """Releases a write hold acquired by the calling thread."""
+    with self._condition:
+      if self._writer != thread.get_ident():
+        raise RuntimeError('cannot release un-acquired write lock')
+      self._write_count -= 1
+      if not self._write_count:
+        self._writer = None
+        self._condition.notify_all()
+
+  @contextlib.contextmanager
+  def read_locked(self):
+    self.acquire_read()
+    try:
+      yield
+    finally:
+      self.release_read()
+
+  @contextlib.contextmanager
+  def write_locked(self):
+    self.acquire_write()
+    try:
+      yield
+    finally:
+      self.release_write()
+
+
+class _ServiceLockState(object):
+  """The locks and wait statistics of a single service."""
+
+  def __init__(self):
+    self.lock = ReadWriteLock()
+    self.partition_locks = {}
+    self.acquisitions = 0
+    self.contended = 0
+    self.wait_seconds = 0.0
+    self.max_wait_seconds = 0.0
+
+
+class ServiceLocks(object):
+  """Hands out per-service (and per-partition) locks for API calls."""
+
+  # Waits shorter than this are not counted as contended; acquiring an
+  # uncontended lock takes a few microseconds.
+  _CONTENDED_WAIT_SECONDS = 0.001
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._services = {}
+
+  def _get_state(self, service):
+    with self._lock:
+      state = self._services.get(service)
+      if state is None:
+        state = self._services[service] = _ServiceLockState()
+      return state
+
+  def _get_partition_lock(self, state, partition):
+    with self._lock:
+      lock = state.partition_locks.get(partition)
+      if lock is None:
+        lock = state.partition_locks[partition] = ReadWriteLock()
+      return lock
+
+  @contextlib.contextmanager
+  def hold(self, service, read_only=False, partition=None):
+    """Holds the lock for a call to the given service.
+
+    Args:
+      service: The name of the API service e.g. "search".
+      read_only: True if the call does not modify the stub's state and may run
+          concurrently with other read-only calls.
+      partition: An optional hashable identifying the part of the service's
+          state that the call touches e.g. a (namespace, index name) pair.
+          Calls to different partitions of a service run concurrently.
+          Partitioned calls share the service lock, so calls to a partitioned
+          service that may touch several partitions must pass
+          read_only=False to exclude them.
+
+    Yields:
+      None, once the lock is held.
+    """
+    state = self._get_state(service)
+    start = time.time()
+    if partition is None:
+      if read_only:
+        state.lock.acquire_read()
+        release = [state.lock.release_read]
+      else:
+        state.lock.acquire_write()
+        release = [state.lock.release_write]
+    else:
+      partition_lock = self._get_partition_lock(state, partition)
+      state.lock.acquire_read()
+      release = [state.lock.release_read]
+      try:
+        if read_only:
+          partition_lock.acquire_read()
+          release.append(partition_lock.release_read)
+        else:
+          partition_lock.acquire_write()
+          release.append(partition_lock.release_write)
+      except Exception:
+        state.lock.release_read()
+        raise
+    wait = time.time() - start
+    with self._lock:
+      state.acquisitions += 1
+      if wait >= self._CONTENDED_WAIT_SECONDS:
+        state.contended += 1
+      state.wait_seconds += wait
+      state.max_wait_seconds = max(state.max_wait_seconds, wait)
+    try:
+      yield
+    finally:
+      for release_lock in reversed(release):
+        release_lock()
+
+  def get_stats(self):
+    """Returns the lock wait statistics of every service used so far.
+
+    Returns:
+      A dict mapping service names to LockWaitStats.
+    """
+    with self._lock:
+      return dict(
+          (service, LockWaitStats(state.acquisitions, state.contended,
+                                  state.wait_seconds, state.max_wait_seconds))
+          for service, state in self._services.iteritems())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.apphosting.tools.devappserver2.api_locks."""
+
+
+
+import threading
+import unittest
+
+from google.appengine.tools.devappserver2 import api_locks
+
+
+def _run_in_thread(target):
+  """Runs target in a new thread, returns the thread and a "done" event."""
+  done = threading.Event()
+
+  def run():
+    target()
+    done.set()
+
+  t = threading.Thread(target=run)
+  t.daemon = True
+  t.start()
+  return t, done
+
+
+class ReadWriteLockTest(unittest.TestCase):
+  """Tests for api_locks.ReadWriteLock."""
+
+  def setUp(self):
+    self.lock = api_locks.ReadWriteLock()
+
+  def test_concurrent_readers(self):
+    self.lock.acquire_read()
+    _, done = _run_in_thread(
+        lambda: (self.lock.acquire_read(), self.lock.release_read()))
+    self.assertTrue(done.wait(5))
+    self.lock.release_read()
+
+  def test_writer_excludes_readers(self):
+    self.lock.acquire_write()
+    t, done = _run_in_thread(
+        lambda: (self.lock.acquire_read(), self.lock.release_read()))
+    self.assertFalse(done.wait(0.1))
+    self.lock.release_write()
+    self.assertTrue(done.wait(5))
+    t.join()
+
+  def test_reader_excludes_writers(self):
+    self.lock.acquire_read()
+    _, done = _run_in_thread(
+        lambda: (self.lock.acquire_write(), self.lock.release_write()))
+    self.assertFalse(done.wait(0.1))
+    self.lock.release_read()
+    self.assertTrue(done.wait(5))
+
+  def test_waiting_writer_blocks_new_readers(self):
+    self.lock.acquire_read()
+    _, writer_done = _run_in_thread(
+        lambda: (self.lock.acquire_write(), self.lock.release_write()))
+    self.assertFalse(writer_done.wait(0.1))
+    _, reader_done = _run_in_thread(
+        lambda: (self.lock.acquire_read(), self.lock.release_read()))
+    self.assertFalse(reader_done.wait(0.1))
+    self.lock.release_read()
+    self.assertTrue(writer_done.wait(5))
+    self.assertTrue(reader_done.wait(5))
+
+  def test_reentrant(self):
+    with self.lock.write_locked():
+      with self.lock.write_locked():
+        with self.lock.read_locked():
+          pass
+    with self.lock.read_locked():
+      with self.lock.read_locked():
+        pass
+    _, done = _run_in_thread(
+        lambda: (self.lock.acquire_write(), self.lock.release_write()))
+    self.assertTrue(done.wait(5))
+
+  def test_upgrade_fails(self):
+    with self.lock.read_locked():
+      self.assertRaises(RuntimeError, self.lock.acquire_write)
+
+  def test_release_unacquired(self):
+    self.assertRaises(RuntimeError, self.lock.release_read)
+    self.assertRaises(RuntimeError, self.lock.release_write)
+
+
+class ServiceLocksTest(unittest.TestCase):
+  """Tests for api_locks.ServiceLocks."""
+
+  def setUp(self):
+    self.locks = api_locks.ServiceLocks()
+
+  def _hold_in_thread(self, *args):
+    def hold():
+      with self.locks.hold(*args):
+        pass
+    return _run_in_thread(hold)[1]
+
+  def test_services_do_not_block_each_other(self):
+    with self.locks.hold('search'):
+      self.assertTrue(self._hold_in_thread('images').wait(5))
+
+  def test_same_service_blocks(self):
+    with self.locks.hold('search'):
+      done = self._hold_in_thread('search')
+      self.assertFalse(done.wait(0.1))
+    self.assertTrue(done.wait(5))
+
+  def test_read_only_calls_share(self):
+    with self.locks.hold('images', True):
+      self.assertTrue(self._hold_in_thread('images', True).wait(5))
+      done = self._hold_in_thread('images', False)
+      self.assertFalse(done.wait(0.1))
+    self.assertTrue(done.wait(5))
+
+  def test_partitions(self):
+    with self.locks.hold('search', False, ('', 'a')):
+      self.assertTrue(self._hold_in_thread('search', False, ('', 'b')).wait(5))
+      same_partition = self._hold_in_thread('search', True, ('', 'a'))
+      whole_service = self._hold_in_thread('search', False)
+      self.assertFalse(same_partition.wait(0.1))
+      self.assertFalse(whole_service.wait(0.1))
+    self.assertTrue(same_partition.wait(5))
+    self.assertTrue(whole_service.wait(5))
+
+  def test_stats(self):
+    self.assertEqual({}, self.locks.get_stats())
+    with self.locks.hold('search'):
+      done = self._hold_in_thread('search')
+      self.assertFalse(done.wait(0.1))
+    self.assertTrue(done.wait(5))
+    with self.locks.hold('images', True):
+      pass
+    stats = self.locks.get_stats()
+    self.assertEqual(['images', 'search'], sorted(stats))
+    self.assertEqual(2, stats['search'].acquisitions)
+    self.assertEqual(1, stats['search'].contended)
+    self.assertGreaterEqual(stats['search'].max_wait_seconds, 0.1)
+    self.assertGreaterEqual(stats['search'].wait_seconds,
+                            stats['search'].max_wait_seconds)
+    self.assertEqual(1, stats['images'].acquisitions)
+    self.assertEqual(0, stats['images'].contended)
+
+
+if __name__ == '__main__':
+  unittest.main()
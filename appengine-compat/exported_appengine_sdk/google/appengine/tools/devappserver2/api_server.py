@@ -82,6 +82,7 @@ from google.appengine.datastore import datastore_v4_stub
 from google.appengine.ext.remote_api import remote_api_pb
 from google.appengine.ext.remote_api import remote_api_services
 from google.appengine.runtime import apiproxy_errors
+from google.appengine.tools.devappserver2 import api_locks
 from google.appengine.tools.devappserver2 import application_configuration
 from google.appengine.tools.devappserver2 import cli_parser
 from google.appengine.tools.devappserver2 import constants
@@ -93,8 +94,8 @@ from google.appengine.tools.devappserver2 import wsgi_request_info
 from google.appengine.tools.devappserver2 import wsgi_server
 
 
-# The API lock is applied when calling API stubs that are not threadsafe.
-GLOBAL_API_LOCK = threading.RLock()
+# Per-service locks applied when calling API stubs that are not threadsafe.
+_API_LOCKS = api_locks.ServiceLocks()
 
 # The default app id used when launching the api_server.py as a binary, without
 # providing the context of a specific application.
@@ -125,6 +126,22 @@ _DATASTORE_V4_METHODS = {
                  datastore_v4_pb.RunQueryResponse),
 }
 
+
+
+def _search_lock_partition(method, request):
+  """Returns the (namespace, index name) a search call is confined to."""
+  if method in ('DeleteDocument', 'IndexDocument', 'ListDocuments', 'Search'):
+    index_spec = request.params().index_spec()
+    return index_spec.namespace(), index_spec.name()
+  return None
+
+# Functions taking a method name and its request and returning the partition
+# of the service's state that the call touches, or None if it may touch all of
+# it. Calls to different partitions of a service do not block each other.
+_LOCK_PARTITIONERS = {
+    'search': _search_lock_partition,
+}
+
 # TODO: Remove after the Files API is really gone.
 _FILESAPI_USE_TRACKER = None
 _FILESAPI_ENABLED = True
@@ -147,6 +164,16 @@ def set_filesapi_enabled(enabled):
   _FILESAPI_ENABLED = enabled
 
 
+def get_api_lock_stats():
+  """Returns how long API calls waited for the lock of each service.
+
+  Returns:
+    A dict mapping service names to api_locks.LockWaitStats. Services whose
+    stubs are threadsafe are not locked and do not appear.
+  """
+  return _API_LOCKS.get_stats()
+
+
 def _execute_request(request, use_proto3=False):
   """Executes an API method call and returns the response object.
 
@@ -218,12 +245,17 @@ def _execute_request(request, use_proto3=False):
                               response_data,
                               request_id)
 
-  # If the service has not declared itself as threadsafe acquire
-  # GLOBAL_API_LOCK.
+  # If the service has not declared itself as threadsafe acquire its lock,
+  # shared with other read-only calls and, where the service is partitioned,
+  # only for the partition that the call touches.
   if service_stub.THREADSAFE:
     make_request()
   else:
-    with GLOBAL_API_LOCK:
+    partitioner = _LOCK_PARTITIONERS.get(service)
+    partition = partitioner(method, request_data) if partitioner else None
+    read_only = (method in getattr(service_stub, 'READ_ONLY_METHODS', ()) and
+                 (partitioner is None or partition is not None))
+    with _API_LOCKS.hold(service, read_only, partition):
       make_request()
   metrics.GetMetricsLogger().LogOnceOnStop(
       metrics.API_STUB_USAGE_CATEGORY,
@@ -308,6 +340,11 @@ class APIServer(wsgi_server.WsgiServer):
     logging.info('Starting API server at: http://%s:%d', self._host, self.port)
 
   def quit(self):
+    for service, stats in sorted(get_api_lock_stats().iteritems()):
+      logging.debug('API lock for %s: %d calls, %d contended, waited %.3fs '
+                    '(max %.3fs)', service, stats.acquisitions,
+                    stats.contended, stats.wait_seconds,
+                    stats.max_wait_seconds)
     cleanup_stubs()
     super(APIServer, self).quit()
 
@@ -502,7 +539,8 @@ def create_api_server(
       user_login_url=user_login_url,
       user_logout_url=user_logout_url,
       default_gcs_bucket_name=options.default_gcs_bucket_name,
-      appidentity_oauth_url=options.appidentity_oauth_url)
+      appidentity_oauth_url=options.appidentity_oauth_url,
+      scrub_blob_storage=True)
 
   return APIServer(options.api_host, options.api_port, app_id,
                    datastore_emulator_host)
@@ -562,6 +600,18 @@ def get_storage_path(path, app_id):
     return path
 
 
+def _scrub_blob_storage(blob_storage):
+  """Removes blob contents that are no longer used by any blob."""
+  try:
+    result = blob_storage.Scrub()
+  except (IOError, OSError):
+    logging.exception('Failed to remove unused blob contents')
+  else:
+    if result.files_removed:
+      logging.info('Removed %d unused blob content files (%d bytes)',
+                   result.files_removed, result.bytes_removed)
+
+
 def _generate_storage_paths(app_id):
   """Yield an infinite sequence of possible storage paths."""
   if sys.platform == 'win32':
@@ -610,7 +660,8 @@ def setup_stubs(
     user_login_url,
     user_logout_url,
     default_gcs_bucket_name,
-    appidentity_oauth_url=None):
+    appidentity_oauth_url=None,
+    scrub_blob_storage=False):
   """Configures the APIs hosted by this server.
 
   Args:
@@ -673,6 +724,8 @@ def setup_stubs(
     appidentity_oauth_url: A str containing the url to the oauth2 server to use
         to authenticate the private key. If set to None, then the standard
         google oauth2 server is used.
+    scrub_blob_storage: A bool indicating whether blob contents that are no
+        longer used by any blob should be removed in a background thread.
   """
   identity_stub = app_identity_stub.AppIdentityServiceStub.Create(
       email_address=appidentity_email_address,
@@ -687,6 +740,13 @@ def setup_stubs(
       'blobstore',
       blobstore_stub.BlobstoreServiceStub(blob_storage,
                                           request_data=request_data))
+  if scrub_blob_storage:
+    # Deleting blobs leaves their content behind until it is scrubbed, which
+    # may take a while for a large store so do it in the background.
+    scrub_thread = threading.Thread(target=_scrub_blob_storage,
+                                    args=(blob_storage,))
+    scrub_thread.daemon = True
+    scrub_thread.start()
 
   apiproxy_stub_map.apiproxy.RegisterStub(
       'capability_service',
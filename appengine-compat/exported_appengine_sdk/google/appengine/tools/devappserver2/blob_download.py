@@ -30,6 +30,9 @@ from google.appengine.ext import blobstore
 # The MIME type from apps to tell Blobstore to select the mime type.
 _AUTO_MIME_TYPE = 'application/vnd.google.appengine.auto'
 
+# The size of the chunks that blobs are streamed to the client in.
+_STREAM_BLOCK_SIZE = 64 * 1024
+
 
 def _get_blob_storage():
   """Gets the BlobStorage instance from the API proxy stub map.
@@ -40,6 +43,30 @@ def _get_blob_storage():
   return apiproxy_stub_map.apiproxy.GetStub('blobstore').storage
 
 
+def _stream_blob(blob_open_key, start, length):
+  """Yields part of a blob's content in chunks, without holding all of it.
+
+  Args:
+    blob_open_key: The key to pass to BlobStorage.OpenBlob.
+    start: The offset of the first byte to yield.
+    length: The number of bytes to yield.
+
+  Yields:
+    Strings of at most _STREAM_BLOCK_SIZE bytes.
+  """
+  blob_stream = _get_blob_storage().OpenBlob(blob_open_key)
+  try:
+    blob_stream.seek(start)
+    while length > 0:
+      block = blob_stream.read(min(length, _STREAM_BLOCK_SIZE))
+      if not block:
+        break
+      length -= len(block)
+      yield block
+  finally:
+    blob_stream.close()
+
+
 def _parse_range_header(range_header):
   """Parse HTTP Range header.
 
@@ -184,9 +211,8 @@ def blobstore_download_rewriter(state):
         state.headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end - 1,
                                                              blob_size)
 
-    blob_stream = _get_blob_storage().OpenBlob(blob_open_key)
-    blob_stream.seek(start)
-    state.body = [blob_stream.read(content_length)]
+    state.body = _stream_blob(blob_open_key, start, content_length)
+    state.body_length = content_length
     state.headers['Content-Length'] = str(content_length)
 
     content_type = state.headers.get('Content-Type')
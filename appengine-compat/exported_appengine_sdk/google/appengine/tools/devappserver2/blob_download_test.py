@@ -209,6 +209,26 @@ class BlobDownloadTest(DownloadTestBase, wsgi_test_utils.WSGITestCase):
     self.assertEqual('a blob', ''.join(state.body))
     self.assertTrue(state.allow_large_response)
 
+  def test_rewrite_for_download_streams_blob(self):
+    """Tests that the blob content is streamed in chunks, not read at once."""
+    blob_key = self.create_blob()
+
+    headers = [
+        (blobstore.BLOB_KEY_HEADER, str(blob_key)),
+        (blobstore.BLOB_RANGE_HEADER, 'bytes=1-4'),
+    ]
+    state = request_rewriter.RewriterState({}, '200 original message', headers,
+                                           'original body')
+
+    old_block_size = blob_download._STREAM_BLOCK_SIZE
+    blob_download._STREAM_BLOCK_SIZE = 3
+    try:
+      blob_download.blobstore_download_rewriter(state)
+      self.assertEqual(4, state.body_length)
+      self.assertEqual([' bl', 'o'], list(state.body))
+    finally:
+      blob_download._STREAM_BLOCK_SIZE = old_block_size
+
   def test_rewrite_for_download_not_200(self):
     """Download requested, but status code is not 200."""
     blob_key = self.create_blob()
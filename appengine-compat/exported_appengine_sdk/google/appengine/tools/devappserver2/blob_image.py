@@ -16,13 +16,22 @@
 #
 """Handles dynamic serving of images from blobstore."""
 
+import collections
+import email.utils
+import errno
+import hashlib
 import httplib
 import logging
+import math
+import os
 import re
+import tempfile
+import threading
 
 from google.appengine.api import apiproxy_stub_map
 from google.appengine.api import datastore
 from google.appengine.api import datastore_errors
+from google.appengine.api.blobstore import file_blob_storage
 from google.appengine.api.images import images_service_pb
 from google.appengine.ext import blobstore
 from google.appengine.tools.devappserver2 import blob_download
@@ -37,6 +46,13 @@ _PATH_RE = re.compile(r'/_ah/img/([-\w:]+)([=]*)([-\w]+)?')
 _MIME_TYPE_MAP = {images_service_pb.OutputSettings.JPEG: 'image/jpeg',
                   images_service_pb.OutputSettings.PNG: 'image/png',
                   images_service_pb.OutputSettings.WEBP: 'image/webp'}
+_CACHE_CONTROL = 'public, max-age=600, no-transform'
+# The total size of the transformed images kept in memory and on disk.
+_MEMORY_CACHE_BYTES = 32 * 1024 * 1024
+_DISK_CACHE_BYTES = 256 * 1024 * 1024
+# The directory, relative to the blob storage directory, where transformed
+# images are cached. Application IDs cannot start with a ".".
+_DISK_CACHE_DIRECTORY = '.image_cache'
 
 # Check there's a working images stub.
 try:
@@ -51,6 +67,45 @@ def _get_images_stub():
   return apiproxy_stub_map.apiproxy.GetStub('images')
 
 
+def _get_blob_storage():
+  blobstore_stub = apiproxy_stub_map.apiproxy.GetStub('blobstore')
+  return blobstore_stub and blobstore_stub.storage
+
+
+def _get_blob_mtime(blob_key):
+  """Returns the modification time of a blob or None if it is not known.
+
+  Args:
+    blob_key: A str containing the blob key.
+
+  Returns:
+    The modification time of the blob's contents in seconds since the epoch
+    or None if the blob storage does not keep blobs in files.
+  """
+  storage = _get_blob_storage()
+  if storage is None:
+    return None
+  try:
+    blob_file = storage.OpenBlob(blob_key)
+  except (IOError, OSError):
+    return None
+  try:
+    return os.fstat(blob_file.fileno()).st_mtime
+  except (AttributeError, IOError, OSError):
+    return None
+  finally:
+    blob_file.close()
+
+
+def _get_disk_cache_directory():
+  """Returns the directory to cache transformed images in or None."""
+  storage = _get_blob_storage()
+  if isinstance(storage, file_blob_storage.FileBlobStorage):
+    # pylint: disable=protected-access
+    return os.path.join(storage._storage_directory, _DISK_CACHE_DIRECTORY)
+  return None
+
+
 class Error(Exception):
   pass
 
@@ -59,6 +114,179 @@ class InvalidRequestError(Error):
   """The request was invalid."""
 
 
+class _TransformCache(object):
+  """A size-bounded LRU cache of transformed images.
+
+  Recently used images are kept in memory and every image is also written to
+  a directory on disk, if one is given, so that they survive restarts of the
+  development server. Both are bounded by the total size of the cached images.
+
+  This class is thread-safe.
+  """
+
+  def __init__(self, max_memory_bytes, max_disk_bytes, directory_getter):
+    """Initializer for _TransformCache.
+
+    Args:
+      max_memory_bytes: The maximum total size of the images kept in memory.
+      max_disk_bytes: The maximum total size of the images kept on disk.
+      directory_getter: A function returning the directory to keep images in
+          or None if they should only be cached in memory. It is called the
+          first time that the cache is used.
+    """
+    self._lock = threading.Lock()
+    self._max_memory_bytes = max_memory_bytes
+    self._max_disk_bytes = max_disk_bytes
+    self._directory_getter = directory_getter
+    self._directory = None
+    self._directory_initialized = False
+    # Maps a cache key to a (data, mime_type) tuple, least recently used first.
+    self._memory = collections.OrderedDict()  # Protected by self._lock.
+    self._memory_bytes = 0  # Protected by self._lock.
+    # Maps a file name in self._directory to its size, least recently used
+    # first.
+    self._disk = collections.OrderedDict()  # Protected by self._lock.
+    self._disk_bytes = 0  # Protected by self._lock.
+
+  @staticmethod
+  def _filename(key):
+    return hashlib.sha1(repr(key)).hexdigest()
+
+  def _init_directory(self):
+    """Loads the existing contents of the cache directory.
+
+    Must be called with self._lock held.
+    """
+    if self._directory_initialized:
+      return
+    self._directory_initialized = True
+    directory = self._directory_getter()
+    if directory is None:
+      return
+    try:
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+      entries = []
+      for filename in os.listdir(directory):
+        if filename.endswith('.tmp'):
+          continue
+        st = os.stat(os.path.join(directory, filename))
+        entries.append((st.st_atime, filename, st.st_size))
+    except (IOError, OSError):
+      logging.warning('Unable to use %r to cache transformed images',
+                      directory, exc_info=True)
+      return
+    self._directory = directory
+    for _, filename, size in sorted(entries):
+      self._disk[filename] = size
+      self._disk_bytes += size
+    self._evict_disk()
+
+  def _add_to_memory(self, key, data, mime_type):
+    """Must be called with self._lock held."""
+    if len(data) > self._max_memory_bytes:
+      return
+    self._memory[key] = (data, mime_type)
+    self._memory_bytes += len(data)
+    while self._memory_bytes > self._max_memory_bytes:
+      _, (evicted, _) = self._memory.popitem(last=False)
+      self._memory_bytes -= len(evicted)
+
+  def _evict_disk(self):
+    """Must be called with self._lock held."""
+    while self._disk_bytes > self._max_disk_bytes:
+      filename, size = self._disk.popitem(last=False)
+      self._disk_bytes -= size
+      try:
+        os.remove(os.path.join(self._directory, filename))
+      except OSError as e:
+        if e.errno != errno.ENOENT:
+          raise
+
+  def get(self, key):
+    """Returns the cached image for a key or None if it is not cached.
+
+    Args:
+      key: A hashable identifying the transformed image.
+
+    Returns:
+      A tuple (data, mime_type) containing the transformed image and its mime
+      type or None.
+    """
+    with self._lock:
+      entry = self._memory.pop(key, None)
+      if entry is not None:
+        self._memory[key] = entry
+        return entry
+      self._init_directory()
+      filename = self._filename(key)
+      size = self._disk.pop(filename, None)
+      if size is None:
+        return None
+      try:
+        with open(os.path.join(self._directory, filename), 'rb') as f:
+          mime_type = f.readline().rstrip('\n')
+          data = f.read()
+      except IOError:
+        self._disk_bytes -= size
+        return None
+      self._disk[filename] = size
+      self._add_to_memory(key, data, mime_type)
+      return data, mime_type
+
+  def put(self, key, data, mime_type):
+    """Caches a transformed image.
+
+    Args:
+      key: A hashable identifying the transformed image.
+      data: A str containing the transformed image.
+      mime_type: The mime type of the image.
+    """
+    with self._lock:
+      self._memory.pop(key, None)
+      self._add_to_memory(key, data, mime_type)
+      self._init_directory()
+      if self._directory is None or len(data) >= self._max_disk_bytes:
+        return
+      filename = self._filename(key)
+      contents = '%s\n%s' % (mime_type, data)
+      # Write to a temporary file first so that other processes sharing the
+      # directory never see a partially written image.
+      try:
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+      except (IOError, OSError):
+        logging.warning('Unable to cache transformed image', exc_info=True)
+        return
+      try:
+        with os.fdopen(fd, 'wb') as f:
+          f.write(contents)
+        os.rename(temp_path, os.path.join(self._directory, filename))
+      except (IOError, OSError):
+        logging.warning('Unable to cache transformed image', exc_info=True)
+        os.remove(temp_path)
+        return
+      self._disk_bytes -= self._disk.pop(filename, 0)
+      self._disk[filename] = len(contents)
+      self._disk_bytes += len(contents)
+      self._evict_disk()
+
+  def clear(self):
+    """Removes every image from memory; cached files are left on disk."""
+    with self._lock:
+      self._memory.clear()
+      self._memory_bytes = 0
+      self._disk.clear()
+      self._disk_bytes = 0
+      self._directory = None
+      self._directory_initialized = False
+
+
+# Shared by every Application since they are recreated when the module
+# configuration changes.
+_transform_cache = _TransformCache(
+    _MEMORY_CACHE_BYTES, _DISK_CACHE_BYTES, _get_disk_cache_directory)
+
+
 class Application(object):
   """A WSGI application that handles image serving requests."""
 
@@ -79,6 +307,13 @@ class Application(object):
     original_mime_type = image.format
     width, height = image.size
 
+    if resize is None:
+      if width > _DEFAULT_SERVING_SIZE or height > _DEFAULT_SERVING_SIZE:
+        resize = _DEFAULT_SERVING_SIZE
+
+    if resize and original_mime_type == 'JPEG':
+      self._set_draft_mode(image, resize, crop)
+
     # Crop to square if necessary
     if crop:
       crop_xform = None
@@ -99,11 +334,6 @@ class Application(object):
       if crop_xform:
         image = _get_images_stub()._Crop(image, crop_xform)
 
-    # Resize
-    if resize is None:
-      if width > _DEFAULT_SERVING_SIZE or height > _DEFAULT_SERVING_SIZE:
-        resize = _DEFAULT_SERVING_SIZE
-
     # resize value of 0 is valid and translates to 'serve at original size'.
     if resize:
       # Note that resize transform maintains the image aspect ratio.
@@ -122,6 +352,29 @@ class Application(object):
     return (_get_images_stub()._EncodeImage(image, output_settings),
             _MIME_TYPE_MAP[output_mime_type])
 
+  @staticmethod
+  def _set_draft_mode(image, resize, crop):
+    """Makes a JPEG image decode at a reduced scale if it is being shrunk.
+
+    JPEG images can be decoded at 1/2, 1/4 or 1/8 scale for a fraction of the
+    cost of decoding them at full size. The smallest scale that is still at
+    least as large as the resized image is used so the resize produces an
+    image of the same dimensions.
+
+    Args:
+      image: The PIL.Image.Image to decode, which must not be loaded yet.
+      resize: An integer for the size of the resulting image.
+      crop: A boolean determining if the image will be cropped to a square.
+    """
+    width, height = image.size
+    if crop:
+      scale = float(resize) / min(width, height)
+    else:
+      scale = float(resize) / max(width, height)
+    if scale < 1:
+      image.draft(image.mode, (int(math.ceil(width * scale)),
+                               int(math.ceil(height * scale))))
+
   def _parse_options(self, options):
     """Parse an options string into a tuple containing the options.
 
@@ -209,13 +462,83 @@ class Application(object):
                       'module. The image is served without resizing.')
       return self.serve_unresized_image(blobkey, environ, start_response)
     else:
-      # Use Images service to transform blob.
+      return self._serve_transformed_image(blobkey, resize, crop, environ,
+                                           start_response)
+
+  def _serve_transformed_image(self, blobkey, resize, crop, environ,
+                               start_response):
+    """Serves a transformed image, using the cached image when possible.
+
+    Transformed images are identified by the blob's modification time as well
+    as the transform options so the cache and the "ETag" and "Last-Modified"
+    headers are only used for blobs that are stored in files.
+
+    Args:
+      blobkey: A str containing the blob key of the image.
+      resize: An integer for the size of the resulting image or None.
+      crop: A boolean determining if the image should be cropped.
+      environ: An environ dict for the current request as defined in PEP-333.
+      start_response: A function with semantics defined in PEP-333.
+
+    Returns:
+      An iterable over strings containing the body of the HTTP response.
+    """
+    mtime = _get_blob_mtime(blobkey)
+    if mtime is None:
       image, mime_type = self._transform_image(blobkey, resize, crop)
       start_response('200 OK', [
           ('Content-Type', mime_type),
-          ('Cache-Control', 'public, max-age=600, no-transform')])
+          ('Cache-Control', _CACHE_CONTROL)])
       return [image]
 
+    cache_key = (blobkey, resize, crop, mtime)
+    etag = hashlib.sha1(repr(cache_key)).hexdigest()
+    last_modified = email.utils.formatdate(mtime, usegmt=True)
+    headers = [('ETag', '"%s"' % etag),
+               ('Last-Modified', last_modified),
+               ('Cache-Control', _CACHE_CONTROL)]
+    if self._is_not_modified(environ, etag, mtime):
+      start_response('304 Not Modified', headers)
+      return []
+
+    cached = _transform_cache.get(cache_key)
+    if cached is None:
+      image, mime_type = self._transform_image(blobkey, resize, crop)
+      _transform_cache.put(cache_key, image, mime_type)
+    else:
+      image, mime_type = cached
+    start_response('200 OK', [('Content-Type', mime_type)] + headers)
+    return [image]
+
+  @staticmethod
+  def _is_not_modified(environ, etag, mtime):
+    """Returns True if the client's copy of the image is up to date.
+
+    Args:
+      environ: An environ dict for the current request as defined in PEP-333.
+      etag: The ETag of the transformed image.
+      mtime: The modification time of the blob in seconds since the epoch.
+
+    Returns:
+      True if the request's "If-None-Match" header matches etag or, if it has
+      no such header, if its "If-Modified-Since" header is not before mtime.
+    """
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+      for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+          tag = tag[2:]
+        if tag in ('*', '"%s"' % etag):
+          return True
+      return False
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since:
+      parsed = email.utils.parsedate_tz(if_modified_since)
+      if parsed is not None:
+        return email.utils.mktime_tz(parsed) >= int(mtime)
+    return False
+
   def __call__(self, environ, start_response):
     if environ['REQUEST_METHOD'] != 'GET':
       start_response('405 %s' % httplib.responses[405], [])
@@ -18,6 +18,8 @@
 
 import httplib
 import os
+import shutil
+import tempfile
 import unittest
 
 import google
@@ -40,6 +42,11 @@ class MockImage(object):
   def __init__(self):
     self.format = None
     self.size = None
+    self.mode = 'RGB'
+    self.draft_request = None
+
+  def draft(self, mode, size):
+    self.draft_request = (mode, size)
 
 
 class BlobImageTest(wsgi_test_utils.WSGITestCase):
@@ -60,10 +67,18 @@ class BlobImageTest(wsgi_test_utils.WSGITestCase):
     blob_image._get_images_stub = lambda: self._images_stub
     self._blobstore_rewriter = blob_download.blobstore_download_rewriter
     blob_download.blobstore_download_rewriter = self._mock_rewriter
+    self._blob_mtime = None
+    self._get_blob_mtime = blob_image._get_blob_mtime
+    blob_image._get_blob_mtime = lambda unused_blob_key: self._blob_mtime
+    self._transform_cache = blob_image._transform_cache
+    blob_image._transform_cache = blob_image._TransformCache(
+        1024, 1024, lambda: None)
 
   def tearDown(self):
     blob_image._HAS_WORKING_IMAGES_STUB = self._has_working_images_stub
     blob_image._get_images_stub = self._get_images_stub
+    blob_image._get_blob_mtime = self._get_blob_mtime
+    blob_image._transform_cache = self._transform_cache
     blob_download.blobstore_download_rewriter = self._blobstore_rewriter
     self.mox.UnsetStubs()
 
@@ -291,6 +306,48 @@ class BlobImageTest(wsgi_test_utils.WSGITestCase):
                       self.app._transform_image('SomeBlobKey', 0))
     self.mox.VerifyAll()
 
+  def test_transform_image_resize_draft(self):
+    """Tests that JPEG images are decoded at a reduced scale."""
+    self.expect_open_image('SomeBlobKey', (1600, 1200))
+    self.expect_resize(32)
+    self.expect_encode_image('SomeImageSize32')
+    self.mox.ReplayAll()
+    self.app._transform_image('SomeBlobKey', 32)
+    self.mox.VerifyAll()
+    self.assertEquals(('RGB', (32, 24)), self._image.draft_request)
+
+  def test_transform_image_resize_and_crop_draft(self):
+    """Tests that a cropped JPEG is decoded large enough to fill the crop."""
+    self.expect_open_image('SomeBlobKey', (1600, 1200))
+    self.expect_crop(left_x=0.125, right_x=0.875)
+    self.expect_resize(32)
+    self.expect_encode_image('SomeImageSize32-c')
+    self.mox.ReplayAll()
+    self.app._transform_image('SomeBlobKey', 32, True)
+    self.mox.VerifyAll()
+    self.assertEquals(('RGB', (43, 32)), self._image.draft_request)
+
+  def test_transform_image_no_draft_png(self):
+    """Tests that only JPEG images are decoded at a reduced scale."""
+    self.expect_open_image('SomeBlobKey', (1600, 1200), mime_type='PNG')
+    self.expect_resize(32)
+    self.expect_encode_image('SomeImageSize32',
+                             images_service_pb.OutputSettings.PNG)
+    self.mox.ReplayAll()
+    self.app._transform_image('SomeBlobKey', 32)
+    self.mox.VerifyAll()
+    self.assertIsNone(self._image.draft_request)
+
+  def test_transform_image_no_draft_upscale(self):
+    """Tests that images being enlarged are decoded at full scale."""
+    self.expect_open_image('SomeBlobKey', (400, 300))
+    self.expect_resize(1000)
+    self.expect_encode_image('SomeImageSize1000')
+    self.mox.ReplayAll()
+    self.app._transform_image('SomeBlobKey', 1000)
+    self.mox.VerifyAll()
+    self.assertIsNone(self._image.draft_request)
+
   def test_transform_image_resize_png(self):
     """Tests resizing."""
     self.expect_open_image('SomeBlobKey', (1600, 1200), mime_type='PNG')
@@ -408,6 +465,51 @@ class BlobImageTest(wsgi_test_utils.WSGITestCase):
     self._environ['PATH_INFO'] += '=====s32-c'
     self.run_request('image/jpeg', 'SomeImageSize32')
 
+  def test_run_resize_cached(self):
+    """Tests that transformed images are cached."""
+    self._blob_mtime = 1234567890.5
+    self.expect_datatore_lookup('SomeBlobKey', True)
+    datastore.Get(mox.IsA(datastore.Key)).AndReturn(True)
+    self.expect_open_image('SomeBlobKey', (1600, 1200))
+    self.expect_resize(32)
+    self.expect_encode_image('SomeImageSize32')
+    self.mox.ReplayAll()
+    self._environ['PATH_INFO'] += '=s32'
+    for _ in range(2):
+      self.assertResponse(
+          '200 OK',
+          [('Content-Type', 'image/jpeg'),
+           ('ETag', mox.Regex(r'^"\w+"$')),
+           ('Last-Modified', 'Fri, 13 Feb 2009 23:31:30 GMT'),
+           ('Cache-Control', 'public, max-age=600, no-transform')],
+          'SomeImageSize32',
+          self.app,
+          self._environ)
+    self.mox.VerifyAll()
+
+  def test_run_resize_not_modified(self):
+    """Tests conditional requests for transformed images."""
+    self._blob_mtime = 1234567890.5
+    self.expect_datatore_lookup('SomeBlobKey', True)
+    datastore.Get(mox.IsA(datastore.Key)).MultipleTimes().AndReturn(True)
+    self.mox.ReplayAll()
+    self._environ['PATH_INFO'] += '=s32'
+    cache_key = ('SomeBlobKey', 32, False, self._blob_mtime)
+    etag = '"%s"' % blob_image.hashlib.sha1(repr(cache_key)).hexdigest()
+    expected_headers = [
+        ('ETag', etag),
+        ('Last-Modified', 'Fri, 13 Feb 2009 23:31:30 GMT'),
+        ('Cache-Control', 'public, max-age=600, no-transform')]
+
+    self._environ['HTTP_IF_NONE_MATCH'] = etag
+    self.assertResponse('304 Not Modified', expected_headers, '', self.app,
+                        self._environ)
+    del self._environ['HTTP_IF_NONE_MATCH']
+    self._environ['HTTP_IF_MODIFIED_SINCE'] = 'Fri, 13 Feb 2009 23:31:30 GMT'
+    self.assertResponse('304 Not Modified', expected_headers, '', self.app,
+                        self._environ)
+    self.mox.VerifyAll()
+
   def test_not_get(self):
     """Tests POSTing to a url."""
     self._environ['REQUEST_METHOD'] = 'POST'
@@ -438,5 +540,43 @@ class BlobImageTest(wsgi_test_utils.WSGITestCase):
                         self._environ)
 
 
+class TransformCacheTest(unittest.TestCase):
+  """Tests for blob_image._TransformCache."""
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_memory_only(self):
+    cache = blob_image._TransformCache(10, 100, lambda: None)
+    cache.put('a', '12345', 'image/png')
+    cache.put('b', '12345', 'image/jpeg')
+    self.assertEqual(('12345', 'image/png'), cache.get('a'))
+    # 'b' is now the least recently used image.
+    cache.put('c', '123', 'image/png')
+    self.assertIsNone(cache.get('b'))
+    self.assertEqual(('12345', 'image/png'), cache.get('a'))
+    self.assertEqual(('123', 'image/png'), cache.get('c'))
+    cache.put('d', '12345678901', 'image/png')
+    self.assertIsNone(cache.get('d'))
+
+  def test_disk(self):
+    cache = blob_image._TransformCache(10, 100, lambda: self.directory)
+    cache.put('a', 'x' * 50, 'image/png')
+    cache.put('b', 'y' * 20, 'image/jpeg')
+    cache.clear()
+    self.assertEqual(('x' * 50, 'image/png'), cache.get('a'))
+    self.assertEqual(('y' * 20, 'image/jpeg'), cache.get('b'))
+
+    # A new cache picks up the images written by an earlier one.
+    cache = blob_image._TransformCache(10, 100, lambda: self.directory)
+    self.assertEqual(('y' * 20, 'image/jpeg'), cache.get('b'))
+    cache.put('c', 'z' * 40, 'image/png')
+    self.assertEqual(2, len(os.listdir(self.directory)))
+    self.assertIsNone(cache.get('a'))
+
+
 if __name__ == '__main__':
   unittest.main()
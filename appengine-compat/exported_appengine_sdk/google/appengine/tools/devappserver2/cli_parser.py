@@ -479,6 +479,22 @@ def create_command_line_parser(configuration=None):
       restrict_configuration=[DEV_APPSERVER_CONFIGURATION],
       help='the arguments made available to the script specified in '
       '--python_startup_script.')
+  python_group.add_argument(
+      '--python_fork_server',
+      action=boolean_action.BooleanAction,
+      const=True,
+      default=False,
+      restrict_configuration=[DEV_APPSERVER_CONFIGURATION],
+      help='start new Python runtime instances by forking a process that has '
+      'already loaded the runtime, which makes restarting instances after file '
+      'changes faster (not supported on Windows)')
+  python_group.add_argument(
+      '--python_fork_server_spares',
+      type=int,
+      default=0,
+      restrict_configuration=[DEV_APPSERVER_CONFIGURATION],
+      help='the number of processes that the --python_fork_server keeps '
+      'forked ahead of time, ready to become new instances')
 
   # Java
   java_group = parser.add_argument_group('Java')
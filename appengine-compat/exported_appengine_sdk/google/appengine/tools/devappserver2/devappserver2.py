@@ -31,6 +31,7 @@ from google.appengine.tools.devappserver2 import cli_parser
 from google.appengine.tools.devappserver2 import constants
 from google.appengine.tools.devappserver2 import dispatcher
 from google.appengine.tools.devappserver2 import metrics
+from google.appengine.tools.devappserver2 import python_runtime
 from google.appengine.tools.devappserver2 import runtime_config_pb2
 from google.appengine.tools.devappserver2 import shutdown
 from google.appengine.tools.devappserver2 import update_checker
@@ -138,6 +139,13 @@ class DevelopmentServer(object):
     # imported in local python runtime sandbox. For more details, see
     # grpc_proxy_util.py.
     grpc_proxy_port = portpicker.PickUnusedPort()
+
+    if (options.python_fork_server and
+        not python_runtime.PythonRuntimeInstanceFactory.enable_fork_server(
+            options.python_fork_server_spares)):
+      logging.warning('--python_fork_server is not supported on this platform; '
+                      'Python instances will be started as new processes')
+
     self._dispatcher = dispatcher.Dispatcher(
         configuration, options.host, options.port, options.auth_domain,
         constants.LOG_LEVEL_TO_RUNTIME_CONSTANT[options.log_level],
@@ -212,6 +220,7 @@ class DevelopmentServer(object):
       self._running_modules.pop().quit()
     if self._dispatcher:
       self._dispatcher.quit()
+    python_runtime.PythonRuntimeInstanceFactory.disable_fork_server()
     if self._options.google_analytics_client_id:
       kwargs = {}
       watcher_results = (self._dispatcher.get_watcher_results()
@@ -187,7 +187,7 @@ class HttpRuntimeProxy(instance.RuntimeProxy):
 
   def __init__(self, args, runtime_config_getter, module_configuration,
                env=None, start_process_flavor=START_PROCESS,
-               extra_args_getter=None):
+               extra_args_getter=None, start_process_file=None):
     """Initializer for HttpRuntimeProxy.
 
     Args:
@@ -206,6 +206,10 @@ class HttpRuntimeProxy(instance.RuntimeProxy):
           by this http_runtime,
           and returns the extra command line parameter that refers to the port
           number.
+      start_process_file: A function with the signature of
+          safe_subprocess.start_process_file used to start the runtime process
+          with the START_PROCESS_REVERSE flavor. Defaults to
+          safe_subprocess.start_process_file.
 
     Raises:
       ValueError: An unknown value for start_process_flavor was used.
@@ -216,6 +220,7 @@ class HttpRuntimeProxy(instance.RuntimeProxy):
     self._stderr_tee = None
     self._runtime_config_getter = runtime_config_getter
     self._extra_args_getter = extra_args_getter
+    self._start_process_file = start_process_file
     self._args = args
     self._module_configuration = module_configuration
     self._env = env
@@ -352,7 +357,9 @@ class HttpRuntimeProxy(instance.RuntimeProxy):
         # pass the port along to the subprocess as a command-line argument.
         args = [arg.replace('{port}', str(port)) for arg in self._args]
 
-        self._process = safe_subprocess.start_process_file(
+        start_process_file = (self._start_process_file or
+                              safe_subprocess.start_process_file)
+        self._process = start_process_file(
             args=args,
             input_string=serialized_config,
             env=self._env,
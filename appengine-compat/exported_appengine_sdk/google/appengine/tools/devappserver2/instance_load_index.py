@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tracks the load of a pool of instances to pick request targets cheaply."""
+
+
+
+class InstanceLoadIndex(object):
+  """Instances bucketed by their number of outstanding requests.
+
+  Each instance is kept in the bucket for the number of requests that have been
+  dispatched to it and have not yet completed, so the instance that should
+  serve the next request can be found by looking at the buckets rather than
+  by sorting every instance. The cost of choose() depends on the maximum
+  number of concurrent requests per instance, not on the number of instances.
+
+  This class is not thread-safe; callers must provide their own locking.
+  """
+
+  def __init__(self, max_concurrent_requests):
+    """Initializer for InstanceLoadIndex.
+
+    Args:
+      max_concurrent_requests: The number of concurrent requests that each
+          instance can handle.
+    """
+    self._max_load = max_concurrent_requests
+    # self._buckets[n] is the set of instances with n outstanding requests;
+    # the last bucket also holds instances that are over capacity.
+    self._buckets = [set() for _ in xrange(max_concurrent_requests + 1)]
+    self._loads = {}
+
+  @property
+  def max_concurrent_requests(self):
+    return self._max_load
+
+  def set_max_concurrent_requests(self, max_concurrent_requests):
+    """Changes the number of concurrent requests each instance can handle."""
+    self._max_load = max_concurrent_requests
+    self._buckets = [set() for _ in xrange(max_concurrent_requests + 1)]
+    for inst, load in self._loads.iteritems():
+      self._bucket(load).add(inst)
+
+  def __len__(self):
+    return len(self._loads)
+
+  def __contains__(self, inst):
+    return inst in self._loads
+
+  def __iter__(self):
+    return iter(list(self._loads))
+
+  def _bucket(self, load):
+    return self._buckets[min(load, self._max_load)]
+
+  def add(self, inst, load=0):
+    """Starts tracking an instance.
+
+    Args:
+      inst: The instance.Instance to track. Ignored if already tracked.
+      load: The number of requests that the instance is currently handling.
+    """
+    if inst not in self._loads:
+      self._loads[inst] = load
+      self._bucket(load).add(inst)
+
+  def discard(self, inst):
+    """Stops tracking an instance, if it is tracked."""
+    load = self._loads.pop(inst, None)
+    if load is not None:
+      self._bucket(load).discard(inst)
+
+  def clear(self):
+    for bucket in self._buckets:
+      bucket.clear()
+    self._loads.clear()
+
+  def get_load(self, inst):
+    """Returns the number of outstanding requests of a tracked instance."""
+    return self._loads[inst]
+
+  def _move(self, inst, load):
+    self._bucket(self._loads[inst]).discard(inst)
+    self._loads[inst] = load
+    self._bucket(load).add(inst)
+
+  def acquire(self, inst):
+    """Records that a request has been dispatched to an instance.
+
+    Args:
+      inst: The instance.Instance. Ignored if it is not tracked.
+    """
+    if inst in self._loads:
+      self._move(inst, self._loads[inst] + 1)
+
+  def release(self, inst):
+    """Records that a request dispatched to an instance has completed.
+
+    Args:
+      inst: The instance.Instance. Ignored if it is not tracked.
+    """
+    if inst in self._loads and self._loads[inst]:
+      self._move(inst, self._loads[inst] - 1)
+
+  def _target_load(self, num_required):
+    """Returns the load of the instances that should get the next request.
+
+    Args:
+      num_required: The number of instances required to handle the current
+          request load.
+
+    Returns:
+      The number of outstanding requests of the instances that the next
+      request should be sent to, or None if every instance is at capacity.
+    """
+    # The required instances are the num_required most loaded ones. The least
+    # loaded of them gets the request, unless it is at capacity.
+    if num_required > 0 and self._loads:
+      seen = 0
+      least_required_load = None
+      for load in xrange(self._max_load, -1, -1):
+        if self._buckets[load]:
+          seen += len(self._buckets[load])
+          least_required_load = load
+          if seen >= num_required:
+            break
+      if least_required_load < self._max_load:
+        return least_required_load
+    # Otherwise pick the *most* loaded instance with spare capacity, to avoid
+    # using idle instances that are not needed.
+    for load in xrange(self._max_load - 1, -1, -1):
+      if self._buckets[load]:
+        return load
+    return None
+
+  def choose(self, num_required, is_usable):
+    """Picks the instance that should handle the next request.
+
+    A request is recorded as dispatched to the returned instance, as if
+    acquire() had been called.
+
+    Args:
+      num_required: The number of instances required to handle the current
+          request load.
+      is_usable: A function taking an instance.Instance and returning False
+          if it cannot currently accept requests. Such instances stop being
+          tracked and must be re-added by the caller once they are usable.
+
+    Returns:
+      The chosen instance.Instance, or None if every instance is at capacity.
+    """
+    while True:
+      load = self._target_load(num_required)
+      if load is None:
+        return None
+      bucket = self._buckets[load]
+      while bucket:
+        inst = next(iter(bucket))
+        if is_usable(inst):
+          self._move(inst, load + 1)
+          return inst
+        self.discard(inst)
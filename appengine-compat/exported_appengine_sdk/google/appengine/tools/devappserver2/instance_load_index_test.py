@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.tools.devappserver2.instance_load_index."""
+
+
+
+import unittest
+
+from google.appengine.tools.devappserver2 import instance_load_index
+
+
+def _usable(unused_inst):
+  return True
+
+
+class InstanceLoadIndexTest(unittest.TestCase):
+  """Tests for instance_load_index.InstanceLoadIndex."""
+
+  def setUp(self):
+    self.index = instance_load_index.InstanceLoadIndex(10)
+
+  def _add(self, *loads):
+    instances = []
+    for i, load in enumerate(loads):
+      inst = 'instance%d' % i
+      self.index.add(inst, load)
+      instances.append(inst)
+    return instances
+
+  def test_choose_no_instances(self):
+    self.assertIsNone(self.index.choose(0, _usable))
+    self.assertIsNone(self.index.choose(3, _usable))
+
+  def test_choose_required_available(self):
+    _, _, instance3, _ = self._add(1, 2, 3, 4)
+    # The least busy of the two required (i.e. busiest) instances.
+    self.assertEqual(instance3, self.index.choose(2, _usable))
+    self.assertEqual(4, self.index.get_load(instance3))
+
+  def test_choose_more_required_than_instances(self):
+    _, instance2 = self._add(5, 2)
+    self.assertEqual(instance2, self.index.choose(5, _usable))
+
+  def test_choose_required_full(self):
+    _, instance2, _, _ = self._add(1, 2, 10, 10)
+    # The busiest non-required instance with spare capacity.
+    self.assertEqual(instance2, self.index.choose(2, _usable))
+
+  def test_choose_no_required_instances(self):
+    _, _, instance3 = self._add(0, 1, 7)
+    self.assertEqual(instance3, self.index.choose(0, _usable))
+
+  def test_choose_all_full(self):
+    self._add(10, 12)
+    self.assertIsNone(self.index.choose(1, _usable))
+    self.assertIsNone(self.index.choose(0, _usable))
+
+  def test_choose_skips_unusable(self):
+    instance1, instance2 = self._add(3, 2)
+    self.assertEqual(
+        instance2, self.index.choose(0, lambda inst: inst != instance1))
+    self.assertNotIn(instance1, self.index)
+    self.assertEqual(1, len(self.index))
+
+  def test_acquire_and_release(self):
+    instance1, = self._add(0)
+    for _ in range(10):
+      self.assertEqual(instance1, self.index.choose(1, _usable))
+    self.assertIsNone(self.index.choose(1, _usable))
+    self.index.release(instance1)
+    self.assertEqual(9, self.index.get_load(instance1))
+    self.assertEqual(instance1, self.index.choose(1, _usable))
+    self.index.acquire(instance1)
+    self.assertEqual(11, self.index.get_load(instance1))
+    self.index.release(instance1)
+    self.index.release(instance1)
+    self.assertEqual(instance1, self.index.choose(1, _usable))
+
+  def test_untracked_instances_ignored(self):
+    self.index.acquire('unknown')
+    self.index.release('unknown')
+    self.index.discard('unknown')
+    self.assertEqual(0, len(self.index))
+
+  def test_set_max_concurrent_requests(self):
+    instance1, instance2 = self._add(3, 8)
+    self.index.set_max_concurrent_requests(5)
+    self.assertEqual(5, self.index.max_concurrent_requests)
+    self.assertEqual(instance1, self.index.choose(1, _usable))
+    self.assertEqual(8, self.index.get_load(instance2))
+
+  def test_clear(self):
+    self._add(1, 2)
+    self.index.clear()
+    self.assertEqual(0, len(self.index))
+    self.assertIsNone(self.index.choose(0, _usable))
+
+
+if __name__ == '__main__':
+  unittest.main()
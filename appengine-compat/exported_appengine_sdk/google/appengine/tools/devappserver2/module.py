@@ -57,6 +57,7 @@ from google.appengine.tools.devappserver2 import http_proxy
 from google.appengine.tools.devappserver2 import http_runtime
 from google.appengine.tools.devappserver2 import http_runtime_constants
 from google.appengine.tools.devappserver2 import instance
+from google.appengine.tools.devappserver2 import instance_load_index
 from google.appengine.tools.devappserver2 import login
 from google.appengine.tools.devappserver2 import request_rewriter
 from google.appengine.tools.devappserver2 import runtime_config_pb2
@@ -1249,11 +1250,24 @@ class AutoScalingModule(Module):
         self._module_configuration.automatic_scaling)
 
     self._instances = set()  # Protected by self._condition.
+    # The instances in self._instances that can accept requests, bucketed by
+    # their number of outstanding requests. Protected by self._condition.
+    self._instance_loads = instance_load_index.InstanceLoadIndex(
+        self.max_instance_concurrent_requests)
+    # Instances that were dropped from self._instance_loads because they could
+    # not accept requests. Protected by self._condition.
+    self._unavailable_instances = set()
     # A deque containg (time, num_outstanding_instance_requests) 2-tuples.
     # This is used to track the maximum number of outstanding requests in a time
-    # period. Protected by self._condition.
+    # period. Counts are strictly decreasing from left to right, so the peak of
+    # the period is the leftmost entry. Protected by self._condition.
     self._outstanding_request_history = collections.deque()
     self._num_outstanding_instance_requests = 0  # Protected by self._condition.
+    # The number of requests waiting for an instance to be chosen for them.
+    self._num_waiting_requests = 0  # Protected by self._condition.
+    # The number of instances that are starting up and cannot accept requests
+    # yet. Protected by self._condition.
+    self._num_starting_instances = 0
     # The time when the last instance was quit in seconds since the epoch.
     self._last_instance_quit_time = 0  # Protected by self._condition.
 
@@ -1282,6 +1296,8 @@ class AutoScalingModule(Module):
     with self._condition:
       instances = self._instances
       self._instances = set()
+      self._instance_loads.clear()
+      self._unavailable_instances.clear()
       self._condition.notify_all()
     for inst in instances:
       inst.quit(force=True)
@@ -1322,11 +1338,14 @@ class AutoScalingModule(Module):
     Returns:
       An iterable over strings containing the body of the HTTP response.
     """
-    if request_type != instance.READY_REQUEST:
-      with self._condition:
+    counts_towards_load = request_type not in (instance.BACKGROUND_REQUEST,
+                                               instance.SHUTDOWN_REQUEST)
+    with self._condition:
+      if request_type != instance.READY_REQUEST:
         self._num_outstanding_instance_requests += 1
-        self._outstanding_request_history.append(
-            (time.time(), self.num_outstanding_instance_requests))
+        self._record_outstanding_requests()
+      if counts_towards_load:
+        self._instance_loads.acquire(inst)
     try:
       logging.debug('Dispatching request to %s', inst)
       return inst.handle(environ, start_response, url_map, match, request_id,
@@ -1335,6 +1354,8 @@ class AutoScalingModule(Module):
       with self._condition:
         if request_type != instance.READY_REQUEST:
           self._num_outstanding_instance_requests -= 1
+        if counts_towards_load:
+          self._instance_loads.release(inst)
         self._condition.notify()
 
   def _handle_script_request(self,
@@ -1369,8 +1390,9 @@ class AutoScalingModule(Module):
 
     with self._condition:
       self._num_outstanding_instance_requests += 1
-      self._outstanding_request_history.append(
-          (time.time(), self.num_outstanding_instance_requests))
+      self._record_outstanding_requests()
+      self._num_waiting_requests += 1
+    waiting = True
 
     try:
       start_time = time.time()
@@ -1380,14 +1402,21 @@ class AutoScalingModule(Module):
         if self._quit_event.is_set():
           return self._error_response(environ, start_response, 404)
         inst = self._choose_instance(timeout_time)
-        if not inst:
+        if (not inst and
+            not self._starting_instances_can_serve_waiting_requests()):
           inst = self._add_instance(permit_warmup=False)
-          if not inst:
-            # No instance is available nor can a new one be created, so loop
-            # waiting for one to be free.
-            timeout_time = time.time() + 0.2
-            continue
+          if inst:
+            with self._condition:
+              self._instance_loads.acquire(inst)
+        if not inst:
+          # No instance is available nor can a new one be created (or enough
+          # are already starting), so loop waiting for one to be free.
+          timeout_time = time.time() + 0.2
+          continue
 
+        with self._condition:
+          self._num_waiting_requests -= 1
+        waiting = False
         try:
           logging.debug('Dispatching request to %s after %0.4fs pending',
                         inst, time.time() - start_time)
@@ -1398,12 +1427,32 @@ class AutoScalingModule(Module):
                              request_id,
                              request_type)
         except instance.CannotAcceptRequests:
+          with self._condition:
+            self._num_waiting_requests += 1
+          waiting = True
           continue
+        finally:
+          with self._condition:
+            self._instance_loads.release(inst)
     finally:
       with self._condition:
         self._num_outstanding_instance_requests -= 1
+        if waiting:
+          self._num_waiting_requests -= 1
         self._condition.notify()
 
+  def _starting_instances_can_serve_waiting_requests(self):
+    """Returns True if instances being started can absorb the waiting requests.
+
+    Used to avoid starting one instance per waiting request when a burst of
+    requests arrives: each new instance can handle
+    max_instance_concurrent_requests of them.
+    """
+    with self._condition:
+      return (self._num_starting_instances *
+              self.max_instance_concurrent_requests >=
+              self._num_waiting_requests)
+
   def _add_instance(self, permit_warmup):
     """Creates and adds a new instance.Instance to the Module.
 
@@ -1432,18 +1481,68 @@ class AutoScalingModule(Module):
       if self._quit_event.is_set():
         return None
       self._instances.add(inst)
+      self._num_starting_instances += 1
 
-    if not inst.start():
+    try:
+      started = inst.start()
+    finally:
+      with self._condition:
+        self._num_starting_instances -= 1
+    if not started:
       return None
 
     if perform_warmup:
       self._async_warmup(inst)
     else:
       with self._condition:
+        self._add_available_instance(inst)
         self._condition.notify(self.max_instance_concurrent_requests)
     logging.debug('Created instance: %s', inst)
     return inst
 
+  def _add_available_instance(self, inst):
+    """Makes an instance eligible to be chosen by _choose_instance.
+
+    Must be called with self._condition held.
+
+    Args:
+      inst: The instance.Instance, which must be in self._instances.
+    """
+    if inst in self._instances:
+      self._unavailable_instances.discard(inst)
+      self._instance_loads.add(inst, inst.num_outstanding_requests)
+
+  def _is_instance_available(self, inst):
+    """Returns True if an instance in self._instance_loads can be chosen.
+
+    Instances that cannot be chosen are remembered so that
+    _refresh_available_instances can make them available again.
+
+    Must be called with self._condition held.
+
+    Args:
+      inst: The instance.Instance.
+    """
+    if inst not in self._instances:
+      return False
+    if not inst.can_accept_requests:
+      self._unavailable_instances.add(inst)
+      return False
+    return True
+
+  def _refresh_available_instances(self):
+    """Reconciles self._instance_loads with the state of the instances."""
+    with self._condition:
+      for inst in self._instance_loads:
+        if inst not in self._instances:
+          self._instance_loads.discard(inst)
+      for inst in list(self._unavailable_instances):
+        if inst not in self._instances:
+          self._unavailable_instances.discard(inst)
+        elif inst.can_accept_requests:
+          self._add_available_instance(inst)
+          self._condition.notify(self.max_instance_concurrent_requests)
+
   @staticmethod
   def generate_instance_id():
     return ''.join(random.choice(_LOWER_HEX_DIGITS) for _ in range(36))
@@ -1460,6 +1559,7 @@ class AutoScalingModule(Module):
                            inst=inst,
                            request_type=instance.READY_REQUEST)
       with self._condition:
+        self._add_available_instance(inst)
         self._condition.notify(self.max_instance_concurrent_requests)
     except:
       logging.exception('Internal error while handling warmup request.')
@@ -1468,6 +1568,20 @@ class AutoScalingModule(Module):
     """Asynchronously send a markup request to the given Instance."""
     return _THREAD_POOL.submit(self._warmup, inst)
 
+  def _record_outstanding_requests(self):
+    """Appends the current number of outstanding requests to the history.
+
+    Entries that are not larger than the new count are dropped first: they
+    are older, so they can never again be the peak of the period.
+
+    Must be called with self._condition held.
+    """
+    num_requests = self._num_outstanding_instance_requests
+    history = self._outstanding_request_history
+    while history and history[-1][1] <= num_requests:
+      history.pop()
+    history.append((time.time(), num_requests))
+
   def _trim_outstanding_request_history(self):
     """Removes obsolete entries from _outstanding_request_history."""
     window_start = time.time() - self._REQUIRED_INSTANCE_WINDOW_SECONDS
@@ -1486,10 +1600,7 @@ class AutoScalingModule(Module):
       if not self._outstanding_request_history:
         return 0
       else:
-        peak_concurrent_requests = max(
-            current_requests
-            for (t, current_requests)
-            in self._outstanding_request_history)
+        _, peak_concurrent_requests = self._outstanding_request_history[0]
         return int(math.ceil(peak_concurrent_requests /
                              self.max_instance_concurrent_requests))
 
@@ -1515,40 +1626,91 @@ class AutoScalingModule(Module):
       return required, self._instances - required
 
   def _choose_instance(self, timeout_time):
-    """Returns the best Instance to handle a request or None if all are busy."""
+    """Returns the best Instance to handle a request or None if all are busy.
+
+    The request is counted as outstanding on the returned Instance; the caller
+    must release it with self._instance_loads.release() once it completes.
+
+    Args:
+      timeout_time: The time, in seconds since the epoch, after which to give
+          up waiting for an Instance with spare capacity.
+    """
     with self._condition:
+      if (self._instance_loads.max_concurrent_requests !=
+          self.max_instance_concurrent_requests):
+        self._instance_loads.set_max_concurrent_requests(
+            self.max_instance_concurrent_requests)
       while time.time() < timeout_time:
-        required_instances, not_required_instances = self._split_instances()
-        if required_instances:
-          # Pick the instance with the most remaining capacity to handle
-          # requests.
-          required_instances = sorted(
-              required_instances,
-              key=lambda inst: inst.remaining_request_capacity)
-          if required_instances[-1].remaining_request_capacity:
-            return required_instances[-1]
-
-        available_instances = [inst for inst in not_required_instances
-                               if inst.remaining_request_capacity > 0 and
-                               inst.can_accept_requests]
-        if available_instances:
-          # Pick the instance with the *least* capacity to handle requests
-          # to avoid using unnecessary idle instances.
-          available_instances.sort(
-              key=lambda instance: instance.num_outstanding_requests)
-          return available_instances[-1]
-        else:
-          self._condition.wait(timeout_time - time.time())
+        # Of the instances required to handle the current load, pick the one
+        # with the most remaining capacity. If they are all busy, pick the
+        # instance with the *least* capacity to handle requests to avoid using
+        # unnecessary idle instances.
+        inst = self._instance_loads.choose(self._get_num_required_instances(),
+                                           self._is_instance_available)
+        if inst:
+          return inst
+        self._condition.wait(timeout_time - time.time())
     return None
 
+  def _get_num_instances_to_add(self, num_idle_instances):
+    """Returns the number of Instances to start to keep up with the load.
+
+    Enough instances are started to keep min_idle_instances idle instances and
+    to serve the requests waiting for an instance within max_pending_latency,
+    given the average latency of recent requests.
+
+    Args:
+      num_idle_instances: The number of Instances not required to handle the
+          current request load.
+
+    Returns:
+      The number of Instances to start, possibly 0.
+    """
+    with self._condition:
+      instances = list(self._instances)
+      num_waiting_requests = self._num_waiting_requests
+      num_starting_instances = self._num_starting_instances
+
+    num_to_add = self._min_idle_instances - num_idle_instances
+    if num_waiting_requests:
+      latencies = [latency for latency in
+                   (inst.get_latency_60s() for inst in instances) if latency]
+      if latencies:
+        latency = sum(latencies) / len(latencies)
+        # The number of requests that one request slot serves within the
+        # maximum pending latency.
+        requests_per_slot = max(1.0, self._max_pending_latency / latency)
+      else:
+        requests_per_slot = 1.0
+      # Busy slots free up and take waiting requests; whatever they cannot
+      # serve in time needs new instances.
+      num_slots = ((len(instances) - num_starting_instances) *
+                   self.max_instance_concurrent_requests)
+      backlog = (num_waiting_requests -
+                 num_slots * (requests_per_slot - 1) -
+                 num_starting_instances * self.max_instance_concurrent_requests)
+      if backlog > 0:
+        num_to_add = max(num_to_add, int(math.ceil(
+            backlog / (requests_per_slot *
+                       self.max_instance_concurrent_requests))))
+
+    if self._max_instances is not None:
+      num_to_add = min(num_to_add, self._max_instances - len(instances))
+    return max(0, num_to_add)
+
   def _adjust_instances(self):
     """Creates new Instances or deletes idle Instances based on current load."""
     now = time.time()
+    self._refresh_available_instances()
     with self._condition:
       _, not_required_instances = self._split_instances()
 
-    if len(not_required_instances) < self._min_idle_instances:
-      self._add_instance(permit_warmup=True)
+    num_to_add = self._get_num_instances_to_add(len(not_required_instances))
+    if num_to_add:
+      # Start the instances concurrently; each start blocks until the runtime
+      # is ready to serve.
+      futures.wait([_THREAD_POOL.submit(self._add_instance, permit_warmup=True)
+                    for _ in xrange(num_to_add)])
     elif (len(not_required_instances) > self._max_idle_instances and
           now >
           (self._last_instance_quit_time + self._MIN_SECONDS_BETWEEN_QUITS)):
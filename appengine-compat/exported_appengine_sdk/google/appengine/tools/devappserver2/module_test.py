@@ -989,12 +989,21 @@ class TestAutoScalingInstancePoolGetNumRequiredInstances(googletest.TestCase):
 
   def test_get_num_required_instances(self):
     now = time.time()
-    self.servr._outstanding_request_history.append((now, 42))
-    self.servr._outstanding_request_history.append((now + 1, 43))
-    self.servr._outstanding_request_history.append((now + 3, 44))
-    self.servr._outstanding_request_history.append((now + 4, 45))
+    self.servr._outstanding_request_history.append((now, 45))
+    self.servr._outstanding_request_history.append((now + 1, 44))
+    self.servr._outstanding_request_history.append((now + 3, 43))
+    self.servr._outstanding_request_history.append((now + 4, 42))
     self.assertEqual(9, self.servr._get_num_required_instances())
 
+  def test_record_outstanding_requests(self):
+    for num_requests in (3, 5, 4, 2, 4, 1):
+      self.servr._num_outstanding_instance_requests = num_requests
+      self.servr._record_outstanding_requests()
+    self.assertEqual([5, 4, 1],
+                     [num_requests for _, num_requests
+                      in self.servr._outstanding_request_history])
+    self.assertEqual(1, self.servr._get_num_required_instances())
+
   def test_no_requests(self):
     self.assertEqual(0, self.servr._get_num_required_instances())
 
@@ -1099,7 +1108,6 @@ class TestAutoScalingInstancePoolChooseInstances(googletest.TestCase):
 
     def __init__(self, num_outstanding_requests, can_accept_requests=True):
       self.num_outstanding_requests = num_outstanding_requests
-      self.remaining_request_capacity = 10 - num_outstanding_requests
       self.can_accept_requests = can_accept_requests
 
   def setUp(self):
@@ -1108,7 +1116,7 @@ class TestAutoScalingInstancePoolChooseInstances(googletest.TestCase):
     self.mox = mox.Mox()
     self.servr = AutoScalingModuleFacade(
         instance_factory=instance.InstanceFactory(object(), 10))
-    self.mox.StubOutWithMock(self.servr, '_split_instances')
+    self.mox.StubOutWithMock(self.servr, '_get_num_required_instances')
     self.mox.StubOutWithMock(self.servr._condition, 'wait')
     self.time = 10
     self.mox.stubs.Set(time, 'time', lambda: self.time)
@@ -1119,22 +1127,28 @@ class TestAutoScalingInstancePoolChooseInstances(googletest.TestCase):
   def tearDown(self):
     self.mox.UnsetStubs()
 
+  def _add_instances(self, *instances):
+    for inst in instances:
+      self.servr._instances.add(inst)
+      self.servr._add_available_instance(inst)
+
   def test_choose_instance_required_available(self):
     instance1 = self.Instance(1)
     instance2 = self.Instance(2)
     instance3 = self.Instance(3)
     instance4 = self.Instance(4)
+    self._add_instances(instance1, instance2, instance3, instance4)
 
-    self.servr._split_instances().AndReturn((set([instance3, instance4]),
-                                             set([instance1, instance2])))
+    self.servr._get_num_required_instances().AndReturn(2)
 
     self.mox.ReplayAll()
     self.assertEqual(instance3,  # Least busy required instance.
                      self.servr._choose_instance(15))
     self.mox.VerifyAll()
+    self.assertEqual(4, self.servr._instance_loads.get_load(instance3))
 
   def test_choose_instance_no_instances(self):
-    self.servr._split_instances().AndReturn((set([]), set([])))
+    self.servr._get_num_required_instances().AndReturn(0)
     self.servr._condition.wait(5).WithSideEffects(self.advance_time)
 
     self.mox.ReplayAll()
@@ -1143,21 +1157,28 @@ class TestAutoScalingInstancePoolChooseInstances(googletest.TestCase):
 
   def test_choose_instance_no_instance_that_can_accept_requests(self):
     instance1 = self.Instance(1, can_accept_requests=False)
-    self.servr._split_instances().AndReturn((set([]), set([instance1])))
+    self._add_instances(instance1)
+    self.servr._get_num_required_instances().AndReturn(0)
     self.servr._condition.wait(5).WithSideEffects(self.advance_time)
 
     self.mox.ReplayAll()
     self.assertEqual(None, self.servr._choose_instance(15))
     self.mox.VerifyAll()
+    self.assertEqual(set([instance1]), self.servr._unavailable_instances)
+
+    instance1.can_accept_requests = True
+    self.servr._refresh_available_instances()
+    self.assertIn(instance1, self.servr._instance_loads)
+    self.assertEqual(set(), self.servr._unavailable_instances)
 
   def test_choose_instance_required_full(self):
     instance1 = self.Instance(1)
     instance2 = self.Instance(2)
     instance3 = self.Instance(10)
     instance4 = self.Instance(10)
+    self._add_instances(instance1, instance2, instance3, instance4)
 
-    self.servr._split_instances().AndReturn((set([instance3, instance4]),
-                                             set([instance1, instance2])))
+    self.servr._get_num_required_instances().AndReturn(2)
 
     self.mox.ReplayAll()
     self.assertEqual(instance2,  # Busyest non-required instance.
@@ -1167,9 +1188,9 @@ class TestAutoScalingInstancePoolChooseInstances(googletest.TestCase):
   def test_choose_instance_must_wait(self):
     instance1 = self.Instance(10)
     instance2 = self.Instance(10)
+    self._add_instances(instance1, instance2)
 
-    self.servr._split_instances().AndReturn((set([instance1]),
-                                             set([instance2])))
+    self.servr._get_num_required_instances().AndReturn(1)
     self.servr._condition.wait(5).WithSideEffects(self.advance_time)
 
     self.mox.ReplayAll()
@@ -1259,6 +1280,59 @@ class TestAutoScalingInstancePoolAdjustInstances(googletest.TestCase):
     self.mox.VerifyAll()
 
 
+class TestAutoScalingInstancePoolGetNumInstancesToAdd(googletest.TestCase):
+  """Tests for module.AutoScalingModule._get_num_instances_to_add."""
+
+  class Instance(object):
+
+    def __init__(self, latency):
+      self.latency = latency
+
+    def get_latency_60s(self):
+      return self.latency
+
+  def setUp(self):
+    api_server.test_setup_stubs()
+    self.servr = AutoScalingModuleFacade(
+        module_configuration=ModuleConfigurationStub(
+            automatic_scaling=appinfo.AutomaticScaling(
+                min_pending_latency='0.1s',
+                max_pending_latency='1.0s',
+                min_idle_instances=1,
+                max_idle_instances=2)),
+        instance_factory=instance.InstanceFactory(object(), 10))
+
+  def test_min_idle_instances(self):
+    self.assertEqual(1, self.servr._get_num_instances_to_add(0))
+    self.assertEqual(0, self.servr._get_num_instances_to_add(1))
+
+  def test_waiting_requests_served_in_time(self):
+    self.servr._instances = set([self.Instance(0.1)])
+    # Each of the 10 slots serves 10 requests within max_pending_latency.
+    self.servr._num_waiting_requests = 90
+    self.assertEqual(0, self.servr._get_num_instances_to_add(1))
+    self.servr._num_waiting_requests = 100
+    self.assertEqual(1, self.servr._get_num_instances_to_add(1))
+
+  def test_waiting_requests_slow_instances(self):
+    self.servr._instances = set([self.Instance(2.0)])
+    self.servr._num_waiting_requests = 25
+    self.assertEqual(3, self.servr._get_num_instances_to_add(1))
+
+  def test_waiting_requests_starting_instances(self):
+    self.servr._instances = set(
+        [self.Instance(2.0), self.Instance(None), self.Instance(None)])
+    self.servr._num_starting_instances = 2
+    self.servr._num_waiting_requests = 25
+    self.assertEqual(1, self.servr._get_num_instances_to_add(1))
+
+  def test_max_instances(self):
+    self.servr._max_instances = 2
+    self.servr._instances = set([self.Instance(2.0)])
+    self.servr._num_waiting_requests = 25
+    self.assertEqual(1, self.servr._get_num_instances_to_add(1))
+
+
 class InstancePoolHandleChangesBase(googletest.TestCase):
 
   def setUp(self):
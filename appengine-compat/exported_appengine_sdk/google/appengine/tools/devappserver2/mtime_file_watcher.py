@@ -16,21 +16,55 @@
 #
 """Monitors a directory tree for changes using mtime polling."""
 
+import collections
 import os
+import stat
 import threading
-import warnings
+import time
 
 from google.appengine.tools.devappserver2 import watcher_common
 
-_MAX_MONITORED_FILES = 10000
+# The maximum amount of time that a single call to changes() spends scanning
+# before returning; the rest of the tree is scanned by the following calls.
+_SCAN_BUDGET_SECONDS = 0.05
+
+# Directories whose mtime is this close to the time they were last listed are
+# listed again on the next scan: on file systems with coarse timestamps an
+# entry added right after the listing may not change the directory's mtime.
+_MTIME_GRANULARITY_SECONDS = 2.0
 
 
 class ShutdownError(Exception):
   pass
 
 
+class _Directory(object):
+  """The cached state of a watched directory."""
+
+  __slots__ = ('parent', 'key', 'mtime', 'listed_at', 'subdirs', 'files')
+
+  def __init__(self, parent, key):
+    # The path of the parent directory, or None for the watched directory.
+    self.parent = parent
+    # The (st_dev, st_ino) pair of the directory, used to detect symlink loops.
+    self.key = key
+    self.mtime = None
+    self.listed_at = None
+    # The names of the watched subdirectories.
+    self.subdirs = set()
+    # A dict mapping the names of the watched files to their mtimes.
+    self.files = {}
+
+
 class MtimeFileWatcher(object):
-  """Monitors a directory tree for changes using mtime polling."""
+  """Monitors a directory tree for changes using mtime polling.
+
+  The tree is scanned incrementally: the entries of a directory are only
+  listed again when the mtime of the directory itself changes (which happens
+  when entries are added, removed or renamed), otherwise only the files that
+  it is known to contain are stat-ed. A scan that takes longer than
+  _SCAN_BUDGET_SECONDS is continued by the next call to changes().
+  """
 
   # TODO: evaluate whether we can directly support multiple directories.
   SUPPORTS_MULTIPLE_DIRECTORIES = False
@@ -40,12 +74,20 @@ class MtimeFileWatcher(object):
     self._quit_event = threading.Event()
     self._watcher_ignore_re = None
     self._skip_files_re = None
-    self._filename_to_mtime = None
+    # A dict mapping the paths of all watched directories to _Directory.
+    self._directories = {}
+    # The directories that remain to be scanned in the current pass.
+    self._pending = collections.deque()
     self._timeout = threading.Event()
     self._startup_thread = None
 
   def _refresh(self):
-    self._filename_to_mtime = self._generate_filename_to_mtime()
+    self._directories = {}
+    self._pending.clear()
+    try:
+      self._add_directory(self._directory, None, set())
+    except ShutdownError:
+      pass
 
   def set_watcher_ignore_re(self, watcher_ignore_re):
     """Allows the file watcher to ignore a custom pattern set by the user.
@@ -92,46 +134,21 @@ class MtimeFileWatcher(object):
       since start was called.
     """
     self._startup_thread.join()
-    timeout_s = timeout_ms / 1000.0
+    end_time = time.time() + timeout_ms / 1000.0
 
-    old_filename_to_mtime = self._filename_to_mtime
+    changes = set()
     try:
-      self._refresh()
-      diff_items = set(self._filename_to_mtime.items()).symmetric_difference(
-          old_filename_to_mtime.items())
-      # os.path.getmtime() updates parent directory timestamps. E.g: There's a
-      # directory structure 'root/foo/bar.txt', if you only touched 'bar.txt',
-      # getmtime() would return a new timestamp for both 'bar.txt' and 'foo/'.
-      #
-      # Due to enabling 'skip_files_re', we have the following corner case:
-      # Suppose in the above example 'foo/' is not-skippable, while 'foo/bar' is
-      # skippable. Then diff_items would be like:
-      # set([('foo/', timestamp1), ('foo/', timestamp2)])
-      # 'where timestamp1 is the nearest mtime before the last time
-      # _generate_filename_to_mtime() was run; while timestamp2 is the mtime
-      # after the most recent change.'
-      #
-      # But we actually want to return an empty set.
-      # 'effective_diff_items' excludes such unwanted items from 'diff_items'.
-      dir_items = {}
-      for k, _ in diff_items:
-        if os.path.isdir(k):
-          dir_items[k] = dir_items.setdefault(k, 0) + 1
-
-      # If k is not in dir_items, then it is a file that has been changed.
-      # If it appears in dir_items[k] once, it is a directory that has been
-      # created or deleted. If it appears more than once, it is a directory
-      # whose files or directories have changed underneath it. In the latter
-      # case, the directory is not reloaded in entirety, rather the individual
-      # files are reloaded.
-      effective_diff_items = {k for k, _ in diff_items if (k not in dir_items
-                                                           or dir_items[k] == 1)
-                             }
-      # returns immediately if we found a difference.
-      if effective_diff_items or timeout_ms == 0:
-        return effective_diff_items
-
-      self._timeout.wait(timeout_s)
+      while True:
+        scan_complete = self._scan(changes)
+        # returns immediately if we found a difference.
+        if changes:
+          return changes
+        remaining = end_time - time.time()
+        if remaining <= 0:
+          return changes
+        if scan_complete:
+          self._timeout.wait(remaining)
+          return changes
     except ShutdownError:
       pass
     return set()
@@ -149,45 +166,172 @@ class MtimeFileWatcher(object):
     return watcher_common.ignore_file(
         file_path, self._skip_files_re, self._watcher_ignore_re)
 
-  def _generate_filename_to_mtime(self):
-    """Records the state of a directory.
+  def _dir_ignored(self, dirpath, dirname):
+    """Determines if a directory is ignored or not.
+
+    Args:
+      dirpath: The path of the directory containing the directory.
+      dirname: The name of the directory.
+
+    Returns:
+      Boolean, True if ignored else False.
+    """
+    return bool(
+        watcher_common.ignore_dir(dirpath, dirname, self._skip_files_re) or
+        watcher_common.ignore_dir(dirpath, dirname, self._watcher_ignore_re))
+
+  def _scan(self, changes):
+    """Scans watched directories until the scan budget is exhausted.
+
+    Args:
+      changes: A set that the paths of changed files and directories are
+          added to.
 
     Returns:
-      A dictionary of subdirectories and files under
-      directory associated with their timestamps.
-      the keys are absolute paths and values are epoch timestamps.
+      True if every watched directory has been scanned since the last pass
+      completed, False if the pass will be continued by the next call.
 
     Raises:
       ShutdownError: if the quit event has been fired during processing.
     """
-    filename_to_mtime = {}
-    num_files = 0
-    for dirpath, dirnames, filenames in os.walk(
-        self._directory, followlinks=True):
+    if not self._pending:
+      self._pending.extend(self._directories)
+    deadline = time.time() + _SCAN_BUDGET_SECONDS
+    while self._pending:
       if self._quit_event.is_set():
         raise ShutdownError()
+      path = self._pending.popleft()
+      directory = self._directories.get(path)
+      # The directory may have been removed earlier in this pass.
+      if directory is not None:
+        self._scan_directory(path, directory, changes)
+      if time.time() >= deadline:
+        break
+    return not self._pending
+
+  def _scan_directory(self, path, directory, changes):
+    """Checks a single watched directory and the files it contains.
 
-      watcher_common.skip_ignored_dirs(dirpath, dirnames, self._skip_files_re)
-      watcher_common.skip_ignored_dirs(dirpath, dirnames,
-                                       self._watcher_ignore_re)
-      filenames = [
-          f for f in filenames
-          if not self._path_ignored(os.path.join(dirpath, f))
-      ]
-      for filename in filenames + dirnames:
-        if self._quit_event.is_set():
-          raise ShutdownError()
-        if num_files == _MAX_MONITORED_FILES:
-          warnings.warn(
-              'There are too many files in your application for '
-              'changes in all of them to be monitored. You may have to '
-              'restart the development server to see some changes to your '
-              'files.')
-          return filename_to_mtime
-        num_files += 1
-        path = os.path.join(dirpath, filename)
-        try:
-          filename_to_mtime[path] = os.path.getmtime(path)
-        except (IOError, OSError):
-          pass
-    return filename_to_mtime
+    Args:
+      path: The path of the directory.
+      directory: The _Directory for path.
+      changes: A set that the paths of changed files and directories are
+          added to.
+    """
+    try:
+      mtime = os.stat(path).st_mtime
+    except OSError:
+      # The directory is gone; the scan of its parent reports the removal.
+      return
+    if (mtime != directory.mtime or
+        mtime >= directory.listed_at - _MTIME_GRANULARITY_SECONDS):
+      self._list_directory(path, directory, mtime, changes)
+      return
+
+    for filename, old_mtime in directory.files.items():
+      file_path = os.path.join(path, filename)
+      try:
+        file_mtime = os.stat(file_path).st_mtime
+      except OSError:
+        del directory.files[filename]
+        changes.add(file_path)
+        continue
+      if file_mtime != old_mtime:
+        directory.files[filename] = file_mtime
+        changes.add(file_path)
+
+  def _list_directory(self, path, directory, mtime, changes):
+    """Lists a directory and records the entries added or removed since.
+
+    Args:
+      path: The path of the directory.
+      directory: The _Directory for path.
+      mtime: The current mtime of the directory.
+      changes: A set that the paths of changed files and directories are
+          added to.
+
+    Raises:
+      ShutdownError: if the quit event has been fired during processing.
+    """
+    if self._quit_event.is_set():
+      raise ShutdownError()
+    directory.mtime = mtime
+    directory.listed_at = time.time()
+    try:
+      names = os.listdir(path)
+    except OSError:
+      names = []
+
+    subdirs = set()
+    files = {}
+    for name in names:
+      entry_path = os.path.join(path, name)
+      try:
+        entry_stat = os.stat(entry_path)
+      except OSError:
+        # E.g. a dangling symlink.
+        continue
+      if stat.S_ISDIR(entry_stat.st_mode):
+        if not self._dir_ignored(path, name):
+          subdirs.add(name)
+      elif not self._path_ignored(entry_path):
+        files[name] = entry_stat.st_mtime
+
+    for name in directory.subdirs - subdirs:
+      self._remove_directory(os.path.join(path, name), changes)
+    for name, file_mtime in files.iteritems():
+      if directory.files.get(name) != file_mtime:
+        changes.add(os.path.join(path, name))
+    for name in set(directory.files) - set(files):
+      changes.add(os.path.join(path, name))
+    for name in subdirs - directory.subdirs:
+      subdir_path = os.path.join(path, name)
+      changes.add(subdir_path)
+      self._add_directory(subdir_path, path, changes)
+    directory.subdirs = subdirs
+    directory.files = files
+
+  def _add_directory(self, path, parent, changes):
+    """Starts watching a directory and everything below it.
+
+    Directories that are symlinks to one of their own ancestors are reported
+    but not descended into.
+
+    Args:
+      path: The path of the directory.
+      parent: The path of the watched directory containing path, or None for
+          the root of the watched tree.
+      changes: A set that the paths of the files and directories found under
+          path are added to.
+    """
+    try:
+      dir_stat = os.stat(path)
+    except OSError:
+      return
+    key = (dir_stat.st_dev, dir_stat.st_ino)
+    ancestor = parent
+    while ancestor is not None:
+      ancestor_directory = self._directories[ancestor]
+      if ancestor_directory.key == key:
+        return
+      ancestor = ancestor_directory.parent
+    directory = _Directory(parent, key)
+    self._directories[path] = directory
+    self._list_directory(path, directory, dir_stat.st_mtime, changes)
+
+  def _remove_directory(self, path, changes):
+    """Stops watching a directory, reporting it and everything below it.
+
+    Args:
+      path: The path of the directory.
+      changes: A set that the paths of the removed files and directories are
+          added to.
+    """
+    changes.add(path)
+    directory = self._directories.pop(path, None)
+    if directory is None:
+      return
+    for filename in directory.files:
+      changes.add(os.path.join(path, filename))
+    for name in directory.subdirs:
+      self._remove_directory(os.path.join(path, name), changes)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Starts Python runtime instances by forking a pre-initialized process.
+
+Starting a Python runtime instance normally means starting a new interpreter
+that has to import the SDK before it can serve its first request. The fork
+server is a runtime process that does these imports once and then forks a copy
+of itself for every new instance, so instances (e.g. those restarted after a
+file change) start without paying for interpreter startup.
+
+The fork server only imports the runtime itself; application code is still
+imported by each instance after the sandbox is enabled, so instances always
+see the current application files.
+
+The devappserver process talks to the fork server over a socket. For each
+instance it sends the serialized runtime_config_pb2.Config, the environment and
+working directory of the instance, followed by the file descriptor that the
+instance should use as stderr. The fork server replies with the pid of the
+instance. The fork server can also keep a number of processes forked ahead of
+time which wait to be handed an instance. None are kept by default: fork() is
+cheap compared to starting an interpreter, and spares have not been shown to
+make instances start faster.
+
+Only supported on platforms with fork() and file descriptor passing.
+"""
+
+
+
+import collections
+import errno
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+try:
+  import _multiprocessing
+except ImportError:
+  _multiprocessing = None
+
+from google.appengine.tools.devappserver2 import safe_subprocess
+
+# The runtime argument that makes it act as a fork server. It is followed by the
+# file descriptor of the control socket, the number of spare processes and the
+# path of a file to delete (see safe_subprocess.start_process_file).
+FORK_SERVER_FLAG = '--fork_server'
+
+
+class Error(Exception):
+  """Base class for exceptions in this module."""
+
+
+class ForkServerError(Error):
+  """The fork server could not start an instance."""
+
+
+def is_supported():
+  """Returns True if instances can be started by a fork server."""
+  return (hasattr(os, 'fork') and
+          hasattr(_multiprocessing, 'sendfd') and
+          hasattr(_multiprocessing, 'recvfd'))
+
+
+class ForkedProcess(object):
+  """A subprocess.Popen-like handle of an instance started by a fork server.
+
+  The instance is a child of the fork server rather than of this process, so
+  its exit status is not available; poll() returns -1 once it has exited.
+  """
+
+  def __init__(self, pid, stderr):
+    """Initializer for ForkedProcess.
+
+    Args:
+      pid: The process id of the instance.
+      stderr: A file object reading the stderr of the instance, or None.
+    """
+    self.pid = pid
+    self.stderr = stderr
+    self.returncode = None
+
+  def poll(self):
+    if self.returncode is None:
+      try:
+        os.kill(self.pid, 0)
+      except OSError, e:
+        # The fork server reaps its children as soon as they exit.
+        if e.errno == errno.ESRCH:
+          self.returncode = -1
+    return self.returncode
+
+  def terminate(self):
+    os.kill(self.pid, signal.SIGTERM)
+
+  def kill(self):
+    os.kill(self.pid, signal.SIGKILL)
+
+
+class ForkServer(object):
+  """Starts runtime instances by asking a fork server process to fork them.
+
+  The fork server process is started on first use and restarted if it exits.
+  Its start_process_file method can be used instead of
+  safe_subprocess.start_process_file to start instances.
+  """
+
+  def __init__(self, args, env=None, num_spares=0):
+    """Initializer for ForkServer.
+
+    Args:
+      args: The arguments used to start a runtime process. FORK_SERVER_FLAG and
+          its values are appended to them to start the fork server.
+      env: A dict of environment variables of the fork server process.
+      num_spares: The number of processes that the fork server keeps forked
+          ahead of time to hand new instances to.
+    """
+    self._args = args
+    self._env = env
+    self._num_spares = num_spares
+    self._lock = threading.Lock()
+    self._process = None
+    self._connection = None
+
+  def _start_locked(self):
+    self._connection, child_connection = multiprocessing.Pipe()
+    try:
+      args = self._args + [FORK_SERVER_FLAG, str(child_connection.fileno()),
+                           str(self._num_spares)]
+      # The fork server inherits the control socket, and also stdin and stdout
+      # so that forked instances can use them e.g. for pdb prompts.
+      self._process = safe_subprocess.start_process_file(
+          args=args, input_string='', env=self._env, cwd=None)
+    finally:
+      child_connection.close()
+    # Like other runtimes the fork server deletes the file it was passed, but
+    # it does not use the file created for it to write to.
+    self._process.child_out.close()
+    os.remove(self._process.child_out.name)
+
+  def _quit_locked(self):
+    if self._process:
+      self._connection.close()
+      try:
+        self._process.kill()
+      except OSError:
+        pass
+      self._process.wait()
+      self._process = None
+      self._connection = None
+
+  def start(self):
+    """Starts the fork server process, if it is not already running."""
+    with self._lock:
+      if self._process and self._process.poll() is not None:
+        self._quit_locked()
+      if not self._process:
+        self._start_locked()
+
+  def quit(self):
+    """Stops the fork server. Instances that it started keep running."""
+    with self._lock:
+      self._quit_locked()
+
+  def start_process_file(self, args, input_string, env, cwd, stdin=None,
+                         stdout=None, stderr=None):
+    """Starts an instance like safe_subprocess.start_process_file.
+
+    Unlike safe_subprocess.start_process_file, no files are created to
+    communicate with the instance; the instance reads its configuration from
+    input_string and should be told its port through env.
+
+    Args:
+      args: Ignored; the instance runs the fork server's arguments.
+      input_string: The serialized runtime_config_pb2.Config of the instance.
+      env: A dict containing environment variables for the instance.
+      cwd: A string containing the directory to switch to before running the
+          instance.
+      stdin: Must be None; the instance inherits the fork server's stdin.
+      stdout: Must be None; the instance inherits the fork server's stdout.
+      stderr: None to inherit the fork server's stderr or subprocess.PIPE.
+
+    Returns:
+      A ForkedProcess for the new instance.
+
+    Raises:
+      ForkServerError: The fork server could not be reached. It will be
+          restarted the next time an instance is started.
+    """
+    assert stdin is None and stdout is None
+    assert stderr in (None, subprocess.PIPE)
+    self.start()
+    if stderr == subprocess.PIPE:
+      stderr_read_fd, stderr_write_fd = os.pipe()
+    else:
+      stderr_read_fd, stderr_write_fd = None, os.dup(sys.stderr.fileno())
+    try:
+      with self._lock:
+        try:
+          self._connection.send((input_string, env, cwd))
+          _multiprocessing.sendfd(self._connection.fileno(), stderr_write_fd)
+          pid = self._connection.recv()
+        except (EOFError, IOError, OSError), e:
+          self._quit_locked()
+          if stderr_read_fd is not None:
+            os.close(stderr_read_fd)
+          raise ForkServerError('Python fork server failed: %s' % e)
+    finally:
+      os.close(stderr_write_fd)
+    stderr_file = None
+    if stderr_read_fd is not None:
+      stderr_file = os.fdopen(stderr_read_fd, 'rb')
+    return ForkedProcess(pid, stderr_file)
+
+
+def _run_forked_instance(connection, run_instance):
+  """Waits to be handed an instance and runs it. Called in forked processes.
+
+  Args:
+    connection: The _multiprocessing.Connection to receive the instance from.
+    run_instance: A function taking a serialized runtime_config_pb2.Config that
+        runs the instance.
+  """
+  try:
+    serialized_config, env, cwd = connection.recv()
+    stderr_fd = _multiprocessing.recvfd(connection.fileno())
+  except (EOFError, IOError, OSError):
+    # The fork server exited before handing over an instance.
+    return
+  finally:
+    connection.close()
+  os.dup2(stderr_fd, sys.stderr.fileno())
+  os.close(stderr_fd)
+  os.environ.clear()
+  os.environ.update(env)
+  if cwd:
+    os.chdir(cwd)
+  if 'random' in sys.modules:
+    # Instances must not share the fork server's random number generator state.
+    sys.modules['random'].seed()
+  run_instance(serialized_config)
+
+
+def _fork(server_connection, spares, run_instance):
+  """Forks a process that waits to be handed an instance.
+
+  Args:
+    server_connection: The _multiprocessing.Connection of the fork server's
+        control socket.
+    spares: A collections.deque of the (pid, connection) pairs of the
+        processes previously forked and not yet handed an instance.
+    run_instance: A function taking a serialized runtime_config_pb2.Config that
+        runs the instance.
+
+  Returns:
+    A (pid, connection) pair for the forked process, where connection is used
+    to hand it an instance.
+  """
+  connection, child_connection = multiprocessing.Pipe()
+  pid = os.fork()
+  if pid == 0:
+    exit_code = 0
+    try:
+      signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+      server_connection.close()
+      connection.close()
+      for _, spare_connection in spares:
+        spare_connection.close()
+      _run_forked_instance(child_connection, run_instance)
+    except SystemExit, e:
+      exit_code = e.code if isinstance(e.code, int) else 1
+    except KeyboardInterrupt:
+      pass
+    except BaseException:
+      exit_code = 1
+      sys.excepthook(*sys.exc_info())
+    finally:
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os._exit(exit_code)
+  child_connection.close()
+  return pid, connection
+
+
+def serve(control_fd, num_spares, run_instance):
+  """Forks instances when asked to by a ForkServer until it disconnects.
+
+  Args:
+    control_fd: The file descriptor of the socket connected to the ForkServer.
+    num_spares: The number of processes to keep forked ahead of time.
+    run_instance: A function taking a serialized runtime_config_pb2.Config that
+        runs an instance. It is called in the forked process.
+  """
+  # Have the kernel reap exited instances so they do not linger as zombies.
+  signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+  server_connection = _multiprocessing.Connection(control_fd)
+  spares = collections.deque()
+  try:
+    while True:
+      while len(spares) < num_spares:
+        spares.append(_fork(server_connection, spares, run_instance))
+      try:
+        request = server_connection.recv()
+        stderr_fd = _multiprocessing.recvfd(server_connection.fileno())
+      except (EOFError, IOError):
+        return
+      if spares:
+        pid, connection = spares.popleft()
+      else:
+        pid, connection = _fork(server_connection, spares, run_instance)
+      try:
+        connection.send(request)
+        _multiprocessing.sendfd(connection.fileno(), stderr_fd)
+      except (IOError, OSError):
+        # The spare died; fork a fresh process for this instance instead.
+        connection.close()
+        pid, connection = _fork(server_connection, spares, run_instance)
+        connection.send(request)
+        _multiprocessing.sendfd(connection.fileno(), stderr_fd)
+      finally:
+        os.close(stderr_fd)
+      connection.close()
+      server_connection.send(pid)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    # Spares exit when their connection is closed.
+    for _, connection in spares:
+      connection.close()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.tools.devappserver2.python.fork_server."""
+
+
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import google
+
+from google.appengine.tools.devappserver2.python import fork_server
+
+# A stand-in for the runtime that runs instances which report their
+# configuration on stderr and then either exit or wait to be killed.
+_FAKE_RUNTIME = """
+import os
+import sys
+import time
+
+from google.appengine.tools.devappserver2.python import fork_server
+
+
+def run_instance(config):
+  sys.stderr.write('%s %s %s\\n' % (config, os.environ['PORT'], os.getcwd()))
+  sys.stderr.flush()
+  if config == 'wait':
+    while True:
+      time.sleep(1)
+
+
+control_fd, num_spares, child_in_path = sys.argv[2:5]
+os.remove(child_in_path)
+fork_server.serve(int(control_fd), int(num_spares), run_instance)
+"""
+
+
+def _wait_for_exit(process):
+  for _ in range(100):
+    if process.poll() is not None:
+      return process.poll()
+    time.sleep(0.05)
+  return None
+
+
+@unittest.skipUnless(fork_server.is_supported(), 'fork() is not available')
+class ForkServerTest(unittest.TestCase):
+  """Tests for fork_server.ForkServer."""
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    runtime_path = os.path.join(self.tmpdir, 'runtime.py')
+    with open(runtime_path, 'w') as f:
+      f.write(_FAKE_RUNTIME)
+    sdk_root = os.path.dirname(os.path.dirname(os.path.abspath(
+        google.__file__)))
+    self.env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [sdk_root] + sys.path))
+    self.args = [sys.executable, runtime_path]
+    self.server = None
+
+  def tearDown(self):
+    if self.server:
+      self.server.quit()
+    shutil.rmtree(self.tmpdir)
+
+  def _start_instance(self, config, port='8080'):
+    return self.server.start_process_file(
+        self.args, config, dict(self.env, PORT=port), self.tmpdir,
+        stderr=subprocess.PIPE)
+
+  def test_start_process_file(self):
+    self.server = fork_server.ForkServer(self.args, self.env)
+    process = self._start_instance('config1')
+    self.assertEqual('config1 8080 %s\n' % os.path.realpath(self.tmpdir),
+                     process.stderr.readline())
+    self.assertEqual(-1, _wait_for_exit(process))
+
+  def test_spares(self):
+    self.server = fork_server.ForkServer(self.args, self.env, num_spares=2)
+    processes = [self._start_instance('wait', str(port))
+                 for port in range(8080, 8085)]
+    self.assertEqual(5, len(set(process.pid for process in processes)))
+    for port, process in enumerate(processes, 8080):
+      self.assertTrue(process.stderr.readline().startswith('wait %d ' % port))
+      self.assertIsNone(process.poll())
+      process.kill()
+      self.assertEqual(-1, _wait_for_exit(process))
+
+  def test_instances_outlive_server(self):
+    self.server = fork_server.ForkServer(self.args, self.env)
+    process = self._start_instance('wait')
+    self.assertTrue(process.stderr.readline().startswith('wait '))
+    self.server.quit()
+    self.assertIsNone(process.poll())
+    process.terminate()
+    self.assertEqual(-1, _wait_for_exit(process))
+
+  def test_restart(self):
+    self.server = fork_server.ForkServer(self.args, self.env)
+    self.server.start()
+    self.server._process.kill()
+    self.server._process.wait()
+    process = self._start_instance('config2')
+    self.assertTrue(process.stderr.readline().startswith('config2 '))
+
+  def test_server_fails(self):
+    self.server = fork_server.ForkServer([sys.executable, '-c', 'pass'],
+                                         self.env)
+    self.assertRaises(fork_server.ForkServerError,
+                      self._start_instance, 'config')
+
+
+if __name__ == '__main__':
+  unittest.main()
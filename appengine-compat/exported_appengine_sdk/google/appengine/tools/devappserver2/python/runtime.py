@@ -30,6 +30,7 @@ from google.appengine.ext.remote_api import remote_api_stub
 from google.appengine.tools.devappserver2 import request_rewriter
 from google.appengine.tools.devappserver2 import runtime_config_pb2
 from google.appengine.tools.devappserver2 import wsgi_server
+from google.appengine.tools.devappserver2.python import fork_server
 from google.appengine.tools.devappserver2.python import sandbox
 
 
@@ -140,16 +141,12 @@ def expand_user(path):
   return path
 
 
-def main():
-  # Required so PDB prompts work properly. Originally tried to disable buffering
-  # (both by adding the -u flag when starting this process and by adding
-  # "stdout = os.fdopen(sys.stdout.fileno(), 'w', 0)" but neither worked).
-  sys.stdout = AutoFlush(sys.stdout)
-  assert len(sys.argv) == 3
-  child_in_path = sys.argv[1]
-  config = runtime_config_pb2.Config()
-  config.ParseFromString(open(child_in_path, 'rb').read())
-  os.remove(child_in_path)
+def _run(config):
+  """Serves requests for a runtime instance until it is killed.
+
+  Args:
+    config: The runtime_config_pb2.Config of the instance.
+  """
   debugging_app = None
   if config.python_config and config.python_config.startup_script:
     global_vars = {'config': config}
@@ -188,5 +185,28 @@ def main():
     server.quit()
 
 
+def _run_serialized_config(serialized_config):
+  config = runtime_config_pb2.Config()
+  config.ParseFromString(serialized_config)
+  _run(config)
+
+
+def main():
+  # Required so PDB prompts work properly. Originally tried to disable buffering
+  # (both by adding the -u flag when starting this process and by adding
+  # "stdout = os.fdopen(sys.stdout.fileno(), 'w', 0)" but neither worked).
+  sys.stdout = AutoFlush(sys.stdout)
+  if len(sys.argv) == 6 and sys.argv[1] == fork_server.FORK_SERVER_FLAG:
+    control_fd, num_spares, child_in_path = sys.argv[2:5]
+    os.remove(child_in_path)
+    fork_server.serve(int(control_fd), int(num_spares), _run_serialized_config)
+    return
+  assert len(sys.argv) == 3
+  child_in_path = sys.argv[1]
+  serialized_config = open(child_in_path, 'rb').read()
+  os.remove(child_in_path)
+  _run_serialized_config(serialized_config)
+
+
 if __name__ == '__main__':
   main()
@@ -18,6 +18,7 @@
 
 
 
+import logging
 import os
 import sys
 
@@ -25,6 +26,8 @@ import google
 from google.appengine.api import appinfo
 from google.appengine.tools.devappserver2 import http_runtime
 from google.appengine.tools.devappserver2 import instance
+from google.appengine.tools.devappserver2 import safe_subprocess
+from google.appengine.tools.devappserver2.python import fork_server
 
 _RUNTIME_PATH = os.path.abspath(
     os.path.join(os.path.dirname(sys.argv[0]), '_python_runtime.py'))
@@ -45,6 +48,40 @@ class PythonRuntimeInstanceFactory(instance.InstanceFactory):
   SUPPORTS_INTERACTIVE_REQUESTS = True
   FILE_CHANGE_INSTANCE_RESTART_POLICY = instance.AFTER_FIRST_REQUEST
 
+  # A fork_server.ForkServer shared by all factories, or None if instances are
+  # started as new processes.
+  _fork_server = None
+
+  @classmethod
+  def enable_fork_server(cls, num_spares):
+    """Configures new instances to be forked from a pre-initialized process.
+
+    Args:
+      num_spares: The number of processes that the fork server keeps forked
+          ahead of time.
+
+    Returns:
+      True if the fork server was started, False if it is not supported on
+      this platform.
+    """
+    if not fork_server.is_supported():
+      return False
+    if cls._fork_server:
+      cls._fork_server.quit()
+    cls._fork_server = fork_server.ForkServer(
+        _RUNTIME_ARGS, env=dict(os.environ, PYTHONHASHSEED='random'),
+        num_spares=num_spares)
+    # Start it now so that it is initialized before the first instance starts.
+    cls._fork_server.start()
+    return True
+
+  @classmethod
+  def disable_fork_server(cls):
+    """Stops the fork server, if any. Running instances are not affected."""
+    if cls._fork_server:
+      cls._fork_server.quit()
+      cls._fork_server = None
+
   def __init__(self, request_data, runtime_config_getter, module_configuration):
     """Initializer for PythonRuntimeInstanceFactory.
 
@@ -88,10 +125,33 @@ class PythonRuntimeInstanceFactory(instance.InstanceFactory):
         instance_config_getter,
         self._module_configuration,
         env=dict(os.environ, PYTHONHASHSEED='random'),
-        start_process_flavor=http_runtime.START_PROCESS_REVERSE)
+        start_process_flavor=http_runtime.START_PROCESS_REVERSE,
+        start_process_file=(self._fork_process_file if self._fork_server
+                            else None))
     return instance.Instance(self.request_data,
                              instance_id,
                              proxy,
                              self.max_concurrent_requests,
                              self.max_background_threads,
                              expect_ready_request)
+
+  def _fork_process_file(self, args, input_string, env, cwd, stdin=None,
+                         stdout=None, stderr=None):
+    """Starts an instance using the fork server if possible.
+
+    Has the signature of safe_subprocess.start_process_file. Falls back to
+    starting a new process if the fork server fails or has been disabled.
+    """
+    server = self._fork_server
+    if server:
+      try:
+        return server.start_process_file(
+            args, input_string, env, cwd, stdin=stdin, stdout=stdout,
+            stderr=stderr)
+      except fork_server.ForkServerError:
+        logging.exception('Failed to fork instance, starting a new process')
+    # The fork server may also have been disabled since the instance was
+    # created.
+    return safe_subprocess.start_process_file(
+        args, input_string, env, cwd, stdin=stdin, stdout=stdout,
+        stderr=stderr)
@@ -86,6 +86,9 @@ class RewriterState(object):
     body: An iterable of strings containing the response body.
     allow_large_response: A Boolean value. If True, there is no limit to the
       size of the response body. Defaults to False.
+    body_length: The total length of the strings in body, if known without
+      traversing it, or None. Set by rewriters that replace the body with an
+      iterable that should be streamed rather than held in memory.
   """
 
   def __init__(self, environ, status, headers, body):
@@ -102,6 +105,7 @@ class RewriterState(object):
     self.headers = wsgiref.headers.Headers(headers)
     self.body = body
     self.allow_large_response = False
+    self.body_length = None
 
   @property
   def status_code(self):
@@ -212,6 +216,22 @@ def _cache_rewriter(state):
     state.headers['Cache-Control'] = ', '.join(cache_directives)
 
 
+def _discard_body(state, new_body):
+  """Replaces the response body, closing the old one if it supports it.
+
+  Streamed bodies (such as blob downloads) may hold open resources that are
+  only released when the iterable is closed, as PEP-333 requires of servers.
+
+  Args:
+    state: A RewriterState to modify.
+    new_body: An iterable of strings to use as the new response body.
+  """
+  old_body = state.body
+  state.body = new_body
+  if hasattr(old_body, 'close'):
+    old_body.close()
+
+
 def _content_length_rewriter(state):
   """Rewrite the Content-Length header.
 
@@ -226,22 +246,24 @@ def _content_length_rewriter(state):
   Args:
     state: A RewriterState to modify.
   """
-  # Convert the body into a list of strings, to allow it to be traversed more
-  # than once. This is the only way to get the Content-Length before streaming
-  # the output.
-  state.body = list(state.body)
-
-  length = sum(len(block) for block in state.body)
+  if state.body_length is not None:
+    length = state.body_length
+  else:
+    # Convert the body into a list of strings, to allow it to be traversed
+    # more than once. This is the only way to get the Content-Length before
+    # streaming the output.
+    state.body = list(state.body)
+    length = sum(len(block) for block in state.body)
 
   if state.status_code in constants.NO_BODY_RESPONSE_STATUSES:
     # Delete the body and Content-Length response header.
-    state.body = []
+    _discard_body(state, [])
     del state.headers['Content-Length']
   elif state.environ.get('REQUEST_METHOD') == 'HEAD':
     if length:
       # Delete the body, but preserve the Content-Length response header.
       logging.warning('Dropping unexpected body in response to HEAD request')
-      state.body = []
+      _discard_body(state, [])
   else:
     if (not state.allow_large_response and
         length > constants.MAX_RUNTIME_RESPONSE_SIZE):
@@ -255,7 +277,7 @@ def _content_length_rewriter(state):
       state.status = '500 Internal Server Error'
       state.headers['Content-Type'] = 'text/html'
       state.headers['Content-Length'] = str(len(new_response))
-      state.body = [new_response]
+      _discard_body(state, [new_response])
     else:
       state.headers['Content-Length'] = str(length)
 
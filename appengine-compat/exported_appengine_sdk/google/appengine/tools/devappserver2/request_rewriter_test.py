@@ -728,5 +728,35 @@ class ResponseRewritersTest(wsgi_test_utils.RewriterTestCase):
                                    expected_body, application)
 
 
+class DiscardedBodyTest(unittest.TestCase):
+  """Tests that streamed bodies are closed when a rewriter drops them."""
+
+  def _rewrite_streamed_body(self, status, environ):
+    closed = []
+
+    def stream():
+      try:
+        yield 'this is my data'
+      finally:
+        closed.append(True)
+
+    body = stream()
+    body.next()  # Start the generator so that closing it runs its finally.
+    state = request_rewriter.RewriterState(
+        environ, status, [('Content-Length', '15')], body)
+    state.body_length = 15
+    request_rewriter._content_length_rewriter(state)
+    self.assertEqual([], list(state.body))
+    return closed
+
+  def test_head_closes_body(self):
+    self.assertTrue(
+        self._rewrite_streamed_body('200 OK', {'REQUEST_METHOD': 'HEAD'}))
+
+  def test_no_body_304_closes_body(self):
+    self.assertTrue(self._rewrite_streamed_body(
+        '304 Not Modified', {'REQUEST_METHOD': 'GET'}))
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-"""Runs the unit test suite for devappserver2."""
+"""Runs the unit test suites of the SDK."""
 
 
 
@@ -28,6 +28,26 @@ import unittest
 
 DIR_PATH = os.path.dirname(__file__)
 
+# The directories searched for *_test.py files.
+TEST_DIRS = [
+    os.path.join(DIR_PATH, 'google', 'appengine', 'api'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'api', 'blobstore'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'api', 'files'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'api', 'images'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'api', 'taskqueue'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'tools', 'devappserver2'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'ext', 'cloudstorage'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'ext', 'db'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'ext', 'mapreduce'),
+    os.path.join(DIR_PATH, 'google', 'appengine', 'ext', 'ndb'),
+]
+
+# The files searched for where the default of *_test.py would also find the
+# suites of subpackages, which are listed above on their own.
+TEST_PATTERNS = {
+    os.path.join(DIR_PATH, 'google', 'appengine', 'api'): 'datastore*_test.py',
+}
+
 TEST_LIBRARY_PATHS = [
     DIR_PATH,
     os.path.join(DIR_PATH, 'lib', 'cherrypy'),
@@ -48,7 +68,7 @@ def main():
   sys.path.extend(TEST_LIBRARY_PATHS)
 
   parser = argparse.ArgumentParser(
-      description='Run the devappserver2 test suite.')
+      description='Run the SDK test suites.')
   parser.add_argument(
       'tests', nargs='*',
       help='The fully qualified names of the tests to run (e.g. '
@@ -61,9 +81,12 @@ def main():
   if args.tests:
     tests = loader.loadTestsFromNames(args.tests)
   else:
-    tests = loader.discover(
-        os.path.join(DIR_PATH, 'google/appengine/tools/devappserver2'),
-        '*_test.py')
+    # A loader keeps the top-level directory of the first discovery, so use a
+    # new one for each directory.
+    tests = unittest.TestSuite(
+        unittest.TestLoader().discover(
+            test_dir, TEST_PATTERNS.get(test_dir, '*_test.py'))
+        for test_dir in TEST_DIRS)
 
   runner = unittest.TextTestRunner(verbosity=2)
   runner.run(tests)
@@ -0,0 +1,159 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A cache of parsed module configurations, shared by runtime processes.
+
+Parsing app.yaml validates every field and resolves its includes, which is a
+noticeable part of the startup time of every worker process. The first process
+to parse a configuration pickles the resulting AppInfoExternal into the cache
+directory, and later processes load it from there as long as app.yaml and
+every file it includes are unchanged, as checked by their SHA-1 digests.
+
+The cache directory can be set with the VMRUNTIME_APPINFO_CACHE_DIR
+environment variable; setting it to an empty string disables the cache.
+"""
+
+import cPickle
+import errno
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+
+from google.appengine.api import appinfo_includes
+
+CACHE_DIR_ENV_VAR = 'VMRUNTIME_APPINFO_CACHE_DIR'
+
+# Increment when the format of cache entries changes.
+CACHE_FORMAT_VERSION = 1
+
+
+def get_cache_dir():
+    """Returns the cache directory, or None if the cache is disabled."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(),
+                                 'vmruntime-appinfo-cache-%d' % os.getuid())
+    return cache_dir or None
+
+
+def load(filename, cache_dir=None):
+    """Returns the parsed module config, from the cache if it is up to date.
+
+    Args:
+        filename: The path of the module configuration file (e.g. 'app.yaml').
+        cache_dir: The cache directory, defaults to get_cache_dir().
+
+    Returns:
+        The appinfo.AppInfoExternal for the configuration.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    if not cache_dir or not _prepare_cache_dir(cache_dir):
+        return _parse(filename)[0]
+
+    entry_path = os.path.join(
+        cache_dir,
+        hashlib.sha1(os.path.abspath(filename)).hexdigest() + '.pickle')
+    app_info = _read_entry(entry_path)
+    if app_info is not None:
+        return app_info
+
+    digest = _file_digest(filename)
+    app_info, include_paths = _parse(filename)
+    digests = [(os.path.abspath(filename), digest)]
+    digests.extend((path, _file_digest(path)) for path in include_paths)
+    # Do not cache a configuration that changed while it was being parsed.
+    if digest == _file_digest(filename):
+        _write_entry(entry_path, digests, app_info)
+    return app_info
+
+
+def _parse(filename):
+    with open(filename) as f:
+        return appinfo_includes.ParseAndReturnIncludePaths(f)
+
+
+def _file_digest(path):
+    """Returns the SHA-1 hex digest of a file, or None if it is missing."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except IOError:
+        return None
+
+
+def _prepare_cache_dir(cache_dir):
+    """Creates the cache directory, returning False if it cannot be used.
+
+    Cache entries are pickles, so only a directory owned by this user and not
+    writable by others is trusted.
+    """
+    try:
+        os.makedirs(cache_dir, 0700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            logging.warning('Cannot create appinfo cache directory %s: %s',
+                            cache_dir, e)
+            return False
+    stat = os.stat(cache_dir)
+    if stat.st_uid != os.getuid() or stat.st_mode & 022:
+        logging.warning('Not using appinfo cache directory %s as it is not '
+                        'private to this user', cache_dir)
+        return False
+    return True
+
+
+def _read_entry(entry_path):
+    """Returns the cached AppInfoExternal, or None if missing or outdated."""
+    try:
+        with open(entry_path, 'rb') as f:
+            version, python_version, digests, app_info = cPickle.load(f)
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            logging.warning('Cannot read appinfo cache entry %s: %s',
+                            entry_path, e)
+        return None
+    except Exception:  # pylint: disable=broad-except
+        # Unpickling can fail in many ways, e.g. after the SDK has changed.
+        logging.warning('Ignoring invalid appinfo cache entry %s', entry_path,
+                        exc_info=True)
+        return None
+    if version != CACHE_FORMAT_VERSION or python_version != sys.version:
+        return None
+    for path, digest in digests:
+        if _file_digest(path) != digest:
+            return None
+    return app_info
+
+
+def _write_entry(entry_path, digests, app_info):
+    """Atomically writes a cache entry, so that readers never see a partial one.
+    """
+    cache_dir = os.path.dirname(entry_path)
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                cPickle.dump(
+                    (CACHE_FORMAT_VERSION, sys.version, digests, app_info),
+                    f, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, entry_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+    except (IOError, OSError, cPickle.PicklingError) as e:
+        logging.warning('Cannot write appinfo cache entry %s: %s', entry_path,
+                        e)
@@ -0,0 +1,139 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure how long importing each module takes during runtime startup.
+
+Set the VMRUNTIME_PROFILE_IMPORTS environment variable in the environment of
+the runtime process (e.g. with ENV in the Dockerfile; variables from the
+env_variables section of app.yaml are only applied after startup) to log a
+report of the slowest imports once the runtime has loaded the application. The
+value is the number of modules to report, or any other non-empty value for the
+default.
+"""
+
+import imp
+import logging
+import os
+import sys
+import time
+
+PROFILE_IMPORTS_ENV_VAR = 'VMRUNTIME_PROFILE_IMPORTS'
+DEFAULT_REPORT_LIMIT = 40
+
+
+class ImportProfiler(object):
+    """An import hook that records the time taken to import each module.
+
+    For every module it records the cumulative time, which includes the time
+    taken by the imports that the module triggers, and the self time, which
+    does not.
+
+    Modules that imp cannot find (e.g. modules in zip files, or modules handled
+    by other import hooks) are imported as usual but are not timed.
+    """
+
+    def __init__(self):
+        # Maps module names to [cumulative seconds, self seconds].
+        self.timings = {}
+        self._found = {}
+        self._child_seconds = []
+
+    def start(self):
+        """Starts timing imports."""
+        if self not in sys.meta_path:
+            sys.meta_path.append(self)
+
+    def stop(self):
+        """Stops timing imports. The timings recorded so far are kept."""
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_module(self, fullname, path=None):
+        """Finds a module as the default import machinery would (PEP 302)."""
+        if fullname in sys.modules:
+            return None
+        try:
+            found = imp.find_module(fullname.rpartition('.')[2], path)
+        except ImportError:
+            return None
+        self._found[fullname] = found
+        return self
+
+    def load_module(self, fullname):
+        """Loads a module found by find_module and records its timing."""
+        module_file, pathname, description = self._found.pop(fullname)
+        self._child_seconds.append(0.0)
+        start = time.time()
+        try:
+            return imp.load_module(fullname, module_file, pathname,
+                                   description)
+        finally:
+            elapsed = time.time() - start
+            child_seconds = self._child_seconds.pop()
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+            if module_file:
+                module_file.close()
+            self.timings[fullname] = [elapsed, elapsed - child_seconds]
+
+    def report(self, limit=DEFAULT_REPORT_LIMIT):
+        """Returns a table of the modules that took longest to import.
+
+        Args:
+            limit: The maximum number of modules to include.
+
+        Returns:
+            A string with a line per module, ordered by decreasing cumulative
+            import time.
+        """
+        lines = ['%10s %10s  %s' % ('cumul. ms', 'self ms', 'module')]
+        slowest = sorted(self.timings.iteritems(),
+                         key=lambda item: -item[1][0])
+        for name, (cumulative, own) in slowest[:limit]:
+            lines.append('%10.1f %10.1f  %s' % (
+                cumulative * 1000, own * 1000, name))
+        total = sum(own for _, own in self.timings.itervalues())
+        lines.append('%10.1f %10s  total for %d modules' % (
+            total * 1000, '', len(self.timings)))
+        return '\n'.join(lines)
+
+
+def start_from_environment(environ=None):
+    """Starts an ImportProfiler if requested by the environment.
+
+    Args:
+        environ: The environment to check, defaults to os.environ.
+
+    Returns:
+        A tuple of the started ImportProfiler and the number of modules to
+        report, or (None, None) if imports should not be profiled.
+    """
+    value = (os.environ if environ is None else environ).get(
+        PROFILE_IMPORTS_ENV_VAR)
+    if not value:
+        return None, None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = DEFAULT_REPORT_LIMIT
+    profiler = ImportProfiler()
+    profiler.start()
+    return profiler, limit
+
+
+def stop_and_log(profiler, limit):
+    """Stops a profiler started by start_from_environment and logs its report.
+    """
+    profiler.stop()
+    logging.info('Import times during startup:\n%s', profiler.report(limit))
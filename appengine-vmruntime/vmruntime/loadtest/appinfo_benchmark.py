@@ -0,0 +1,147 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures loading app.yaml with and without the shared appinfo cache.
+
+Every worker process loads its module configuration at startup through
+appinfo_cache.load(). This benchmark writes configurations with a number of
+static file handlers and an included file, and reports the elapsed and CPU
+time of loading them in three ways: parsing with the cache disabled, a cold
+load that parses and writes the cache entry, and a load from the cache entry.
+
+Example:
+
+    python -m vmruntime.loadtest.appinfo_benchmark --handlers 10 95
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from vmruntime import appinfo_cache
+from vmruntime.loadtest import timing
+
+APP_YAML = """
+runtime: python27
+api_version: 1
+threadsafe: true
+vm: true
+includes:
+- include.yaml
+handlers:
+{handlers}
+- url: /.*
+  script: main.app
+"""
+
+INCLUDE_YAML = """
+env_variables:
+  FOO: bar
+skip_files:
+- ^(.*/)?.*\\.py[co]$
+- ^(.*/)?\\..*$
+"""
+
+STATIC_HANDLER = """
+- url: /static{index}/(.*)
+  static_files: static{index}/\\1
+  upload: static{index}/.*
+  expiration: 1d 2h
+  http_headers:
+    X-Handler: handler{index}
+    Cache-Control: public
+"""
+
+# app.yaml allows at most 100 handlers, including the catch-all one.
+MAX_STATIC_HANDLERS = 99
+
+
+def write_config(directory, num_handlers):
+    """Writes app.yaml and include.yaml, returning the path of app.yaml."""
+    handlers = ''.join(STATIC_HANDLER.format(index=index)
+                       for index in xrange(num_handlers))
+    with open(os.path.join(directory, 'include.yaml'), 'w') as f:
+        f.write(INCLUDE_YAML)
+    app_yaml_path = os.path.join(directory, 'app.yaml')
+    with open(app_yaml_path, 'w') as f:
+        f.write(APP_YAML.format(handlers=handlers))
+    return app_yaml_path
+
+
+def run(handler_counts, repeat):
+    """Times loading configurations of different sizes.
+
+    Args:
+        handler_counts: The numbers of static file handlers to time loading
+            configurations with.
+        repeat: How many times to time each case; the best time is used.
+
+    Returns:
+        A list of (handlers, case, milliseconds, CPU milliseconds) tuples,
+        where case is 'parse', 'cold' or 'cached'.
+
+    Raises:
+        AssertionError: A cached configuration differs from the parsed one.
+    """
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        cache_dir = os.path.join(directory, 'cache')
+
+        def clear_cache():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        for num_handlers in handler_counts:
+            app_yaml_path = write_config(directory, num_handlers)
+            clear_cache()
+            expected = appinfo_cache.load(app_yaml_path, cache_dir).ToDict()
+            assert (appinfo_cache.load(app_yaml_path, cache_dir).ToDict() ==
+                    expected)
+            assert len(expected['handlers']) == num_handlers + 1
+            cases = (
+                ('parse', lambda: appinfo_cache._parse(app_yaml_path), None),
+                ('cold', lambda: appinfo_cache.load(app_yaml_path, cache_dir),
+                 clear_cache),
+                ('cached',
+                 lambda: appinfo_cache.load(app_yaml_path, cache_dir), None),
+            )
+            for case, function, setup in cases:
+                seconds = timing.best_seconds(function, repeat, setup=setup)
+                results.append((num_handlers, case) + tuple(
+                    s * 1000 for s in seconds))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark loading app.yaml through the appinfo cache.')
+    parser.add_argument('--handlers', type=int, nargs='+',
+                        default=[0, 10, 50, MAX_STATIC_HANDLERS],
+                        help='the numbers of static file handlers to load '
+                        'configurations with')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print '%-8s %-7s %8s %8s' % ('handlers', 'case', 'ms', 'cpu ms')
+    for result in run(args.handlers, args.repeat):
+        print '%-8d %-7s %8.2f %8.2f' % result
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
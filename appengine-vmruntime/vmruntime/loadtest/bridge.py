@@ -0,0 +1,148 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local stand-in for the service bridge, backed by the SDK's API stubs.
+
+vmstub sends API calls to the service bridge as serialized
+remote_api_pb.Requests, which is also what the devappserver2 API server
+accepts. The stand-in runs that API server in a separate interpreter, since the
+stubs it calls through apiproxy_stub_map would otherwise be replaced by vmstub.
+
+Only the datastore_v3 and memcache services are served, both in memory.
+"""
+
+import contextlib
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import datastore_file_stub
+from google.appengine.api.memcache import memcache_stub
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext.vmruntime import vmstub
+
+
+def register_stubs(app_id):
+    """Registers in-memory stubs for the services that the bridge serves."""
+    apiproxy_stub_map.apiproxy = apiproxy_stub_map.APIProxyStubMap()
+    apiproxy_stub_map.apiproxy.RegisterStub(
+        'datastore_v3',
+        datastore_file_stub.DatastoreFileStub(
+            app_id, None, save_changes=False, use_atexit=False,
+            consistency_policy=(
+                datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+                    probability=1))))
+    apiproxy_stub_map.apiproxy.RegisterStub(
+        'memcache', memcache_stub.MemcacheServiceStub())
+
+
+class ServiceBridge(object):
+    """Runs the service bridge stand-in in a child process."""
+
+    def __init__(self, app_id, latency_ms=0):
+        """Initializer for ServiceBridge.
+
+        Args:
+            app_id: The application id, including the partition, that the
+                stubs serve (e.g. 'dev~myapp').
+            latency_ms: Milliseconds to wait before handling each API call,
+                to stand in for the network round trip to the real service
+                bridge.
+        """
+        self._app_id = app_id
+        self._latency_ms = latency_ms
+        self._process = None
+        self.port = None
+
+    def start(self):
+        """Starts the bridge process and returns the port it listens on."""
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', __name__, self._app_id,
+             str(self._latency_ms)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.port = int(self._process.stdout.readline())
+        return self.port
+
+    def stop(self):
+        """Stops the bridge process."""
+        if self._process:
+            # The bridge exits when its stdin is closed.
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+
+@contextlib.contextmanager
+def vmstub_connection(app_id, latency_ms=0):
+    """Sends the API calls of this process to a new ServiceBridge.
+
+    The calls go through vmstub, as they do in the runtime. The environment
+    and the API proxy are restored on exit.
+
+    Args:
+        app_id: The application id, including the partition.
+        latency_ms: The latency of API calls, see ServiceBridge.
+    """
+    service_bridge = ServiceBridge(app_id, latency_ms)
+    port = service_bridge.start()
+    saved_environ = os.environ.copy()
+    saved_apiproxy = apiproxy_stub_map.apiproxy
+    try:
+        os.environ.update({'API_HOST': 'localhost', 'API_PORT': str(port),
+                           'APPLICATION_ID': app_id})
+        vmstub.Register(vmstub.VMStub('benchmark-ticket'))
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        apiproxy_stub_map.apiproxy = saved_apiproxy
+        service_bridge.stop()
+
+
+def _start_api_server(app_id, latency_seconds):
+    """Starts an API server that waits before handling each call."""
+    # The API server needs packages that only the bridge process uses.
+    # pylint: disable=g-import-not-at-top
+    from google.appengine.tools.devappserver2 import api_server
+
+    class DelayedAPIServer(api_server.APIServer):
+
+        def __call__(self, environ, start_response):
+            time.sleep(latency_seconds)
+            return super(DelayedAPIServer, self).__call__(environ,
+                                                          start_response)
+
+    server = DelayedAPIServer('localhost', 0, app_id)
+    server.start()
+    return server
+
+
+def main(argv):
+    logging.getLogger().setLevel(logging.WARNING)
+    register_stubs(argv[1])
+    latency_ms = float(argv[2]) if len(argv) > 2 else 0
+    server = _start_api_server(argv[1], latency_ms / 1000)
+    sys.stdout.write('%d\n' % server.port)
+    sys.stdout.flush()
+    sys.stdin.read()
+    # The API server's threads would keep the process alive.
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,100 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the latency of ndb gets through memcache.
+
+A get that misses memcache locks the memcache entry, reads the datastore and
+writes the entity back to memcache; a get that hits memcache only reads it.
+This benchmark sends the memcache and datastore calls through vmstub to the
+local service bridge stand-in, so that each one is a separate HTTP request as
+in production, and times single gets with a cold and a warm memcache. The
+in-context cache is not used. Each API call is delayed by --latency_ms to
+stand in for the network, as the calls made by one get are mostly waiting for
+their round trips.
+
+Example:
+
+    python -m vmruntime.loadtest.cache_benchmark --entities=200
+"""
+
+import argparse
+import sys
+import time
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from vmruntime.loadtest import bridge
+
+APP_ID = 'dev~benchmark'
+
+
+class Record(ndb.Model):
+    name = ndb.StringProperty()
+    value = ndb.IntegerProperty()
+
+
+def _time_gets(keys):
+    """Returns the mean milliseconds taken by key.get() for each key."""
+    start = time.time()
+    for key in keys:
+        assert key.get(use_cache=False) is not None, key
+    return (time.time() - start) * 1000 / len(keys)
+
+
+def run(num_entities, repeat, latency_ms=0):
+    """Times gets of entities with a cold and a warm memcache.
+
+    Args:
+        num_entities: The number of entities to get in each measurement.
+        repeat: How many times to time each case; the best time is used.
+        latency_ms: The latency of each API call, see bridge.ServiceBridge.
+
+    Returns:
+        A tuple of the mean milliseconds per get with a cold memcache and
+        with a warm memcache.
+    """
+    with bridge.vmstub_connection(APP_ID, latency_ms):
+        keys = ndb.put_multi(
+            [Record(name='record %d' % index, value=index)
+             for index in xrange(num_entities)], use_memcache=False)
+        cold_ms = warm_ms = None
+        for _ in xrange(repeat):
+            memcache.flush_all()
+            elapsed_ms = _time_gets(keys)
+            if cold_ms is None or elapsed_ms < cold_ms:
+                cold_ms = elapsed_ms
+            elapsed_ms = _time_gets(keys)
+            if warm_ms is None or elapsed_ms < warm_ms:
+                warm_ms = elapsed_ms
+        return cold_ms, warm_ms
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ndb gets through memcache.')
+    parser.add_argument('--entities', type=int, default=200,
+                        help='the number of entities to get')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    parser.add_argument('--latency_ms', type=float, default=2,
+                        help='the latency of each API call')
+    args = parser.parse_args(argv[1:])
+    cold_ms, warm_ms = run(args.entities, args.repeat, args.latency_ms)
+    print 'cold memcache: %.2f ms per get' % cold_ms
+    print 'warm memcache: %.2f ms per get' % warm_ms
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,128 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures ndb JsonProperty puts and gets with different compression codecs.
+
+Compressing a property costs CPU time on every put and get in exchange for
+fewer stored bytes. This benchmark stores JSON payloads of a few sizes
+through vmstub to the local service bridge stand-in, with no compression,
+with zlib at its default level, with zlib at level 1 above a 1 KB threshold,
+and with bz2, and reports the elapsed and CPU time per entity of put_multi()
+and get_multi() along with the mean size of the stored property.
+
+Example:
+
+    python -m vmruntime.loadtest.compression_benchmark --entities=200
+"""
+
+import argparse
+import sys
+
+from google.appengine.ext import ndb
+from vmruntime.loadtest import bridge
+from vmruntime.loadtest import timing
+
+APP_ID = 'dev~benchmark'
+
+CODECS = (
+    ('none', False),
+    ('zlib', True),
+    ('zlib-1-1k', ndb.ZlibCodec(level=1, threshold=1024)),
+    ('bz2', ndb.Bz2Codec()),
+)
+
+PAYLOAD_RECORDS = (('small', 2), ('medium', 20), ('large', 200))
+
+
+def _make_model(name, codec):
+    return type('Document_%s' % name.replace('-', '_'), (ndb.Model,),
+                {'payload': ndb.JsonProperty(compressed=codec)})
+
+
+MODELS = [(name, _make_model(name, codec)) for name, codec in CODECS]
+
+
+def make_payload(num_records, seed):
+    """Returns a JSON-encodable list of records like an API response."""
+    return [{'id': seed * 1000 + index,
+             'name': 'user %d' % (seed + index),
+             'email': 'user%d@example.com' % (seed + index),
+             'active': bool(index % 3),
+             'score': (seed + index) / 7.0,
+             'tags': ['tag%d' % (index % 5), 'tag%d' % (seed % 7)]}
+            for index in xrange(num_records)]
+
+
+def _stored_bytes(entity):
+    """Returns the number of bytes stored for the payload property."""
+    [prop] = entity._to_pb().raw_property_list()
+    return len(prop.value().stringvalue())
+
+
+def run(num_entities, repeat):
+    """Times putting and getting JSON payloads with each codec.
+
+    Args:
+        num_entities: The number of entities to put and get at a time.
+        repeat: How many times to time each case; the best time is used.
+
+    Returns:
+        A list of (payload size, codec, stored bytes, put milliseconds, put
+        CPU milliseconds, get milliseconds, get CPU milliseconds) tuples, with
+        the bytes and times per entity.
+
+    Raises:
+        AssertionError: A payload read back differs from the one stored.
+    """
+    options = {'use_cache': False, 'use_memcache': False}
+    results = []
+    with bridge.vmstub_connection(APP_ID):
+        for size, num_records in PAYLOAD_RECORDS:
+            payloads = [make_payload(num_records, index)
+                        for index in xrange(num_entities)]
+            for name, model_class in MODELS:
+                entities = [model_class(id=index + 1, payload=payload)
+                            for index, payload in enumerate(payloads)]
+                keys = ndb.put_multi(entities, **options)
+                assert ([entity.payload for entity in
+                         ndb.get_multi(keys, **options)] == payloads)
+                stored = sum(_stored_bytes(entity)
+                             for entity in entities) / num_entities
+                put_seconds = timing.best_seconds(
+                    lambda: ndb.put_multi(entities, **options), repeat)
+                get_seconds = timing.best_seconds(
+                    lambda: ndb.get_multi(keys, **options), repeat)
+                results.append((size, name, stored) + tuple(
+                    seconds * 1000 / num_entities
+                    for seconds in put_seconds + get_seconds))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark compressed ndb JsonProperty puts and gets.')
+    parser.add_argument('--entities', type=int, default=200,
+                        help='the number of entities to put and get')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print '%-7s %-10s %8s %8s %8s %8s %8s' % (
+        'payload', 'codec', 'bytes', 'put ms', 'put cpu', 'get ms', 'get cpu')
+    for result in run(args.entities, args.repeat):
+        print '%-7s %-10s %8d %8.3f %8.3f %8.3f %8.3f' % result
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,120 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures how long ext.db takes to load fetched entities.
+
+Every entity that db.get() or a db query returns is decoded from its protocol
+buffer into a datastore.Entity, which is then loaded into a Model instance.
+This benchmark fetches entities through vmstub from the local service bridge
+stand-in, and reports the CPU time spent in the benchmark process along with
+the elapsed time, most of which the stubs spend executing the calls. It also
+times model_from_protobuf() alone.
+
+Example:
+
+    python -m vmruntime.loadtest.db_benchmark --entities=1000
+"""
+
+import argparse
+import datetime
+import sys
+
+from google.appengine.ext import db
+from vmruntime.loadtest import bridge
+from vmruntime.loadtest import timing
+
+APP_ID = 'dev~benchmark'
+
+
+class Record(db.Model):
+    name = db.StringProperty(required=True)
+    email = db.EmailProperty()
+    age = db.IntegerProperty()
+    score = db.FloatProperty()
+    active = db.BooleanProperty()
+    created = db.DateTimeProperty()
+    bio = db.TextProperty()
+    tags = db.StringListProperty()
+    owner = db.ReferenceProperty()
+
+
+def make_records(num_entities):
+    owner = db.Key.from_path('Owner', 1, _app=APP_ID)
+    return [Record(name='record %d' % index,
+                   email='user%d@example.com' % index, age=index % 100,
+                   score=index / 3.0, active=bool(index % 2),
+                   created=datetime.datetime(2015, 1, 1, 12, 30),
+                   bio=db.Text('bio ' * 20), tags=['a', 'b', 'c'],
+                   owner=owner)
+            for index in xrange(num_entities)]
+
+
+def _contents(record):
+    """Returns the key and property values of a record, for comparison."""
+    return record.key(), db.to_dict(record)
+
+
+def run(num_entities, repeat):
+    """Times loading entities with db.get(), a query and from protobufs.
+
+    Args:
+        num_entities: The number of entities to load.
+        repeat: How many times to time each case; the best time is used.
+
+    Returns:
+        A list of (case, milliseconds, CPU milliseconds) tuples.
+
+    Raises:
+        AssertionError: The entities loaded differ from those stored.
+    """
+    with bridge.vmstub_connection(APP_ID):
+        records = make_records(num_entities)
+        keys = db.put(records)
+        pbs = [db.model_to_protobuf(record).Encode() for record in records]
+        expected = [_contents(record) for record in records]
+        assert [_contents(record) for record in db.get(keys)] == expected
+        assert sorted(_contents(record) for record in
+                      Record.all().fetch(num_entities)) == sorted(expected)
+        assert [_contents(db.model_from_protobuf(pb))
+                for pb in pbs] == expected
+
+        cases = (
+            ('get', lambda: db.get(keys)),
+            ('query', lambda: Record.all().fetch(num_entities)),
+            ('from_protobuf',
+             lambda: [db.model_from_protobuf(pb) for pb in pbs]),
+        )
+        results = []
+        for name, function in cases:
+            seconds = timing.best_seconds(function, repeat)
+            results.append((name,) + tuple(s * 1000 for s in seconds))
+        return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark loading ext.db entities.')
+    parser.add_argument('--entities', type=int, default=1000,
+                        help='the number of entities to load')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    print '%-14s %12s %12s' % ('case', 'ms', 'cpu ms')
+    for result in run(args.entities, args.repeat):
+        print '%-14s %12.1f %12.1f' % result
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
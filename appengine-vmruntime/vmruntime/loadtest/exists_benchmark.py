@@ -0,0 +1,128 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures ndb existence checks and projected gets of wide entities.
+
+ndb.exists_multi() answers whether entities exist from memcache or batched
+datastore gets without caching the entities, and ndb.get_multi() with a
+projection fetches a couple of properties with a projection query per key.
+This benchmark sends the calls through vmstub to the local service bridge
+stand-in, with each API call delayed by --latency_ms, and compares them with
+full gets, both with an empty memcache and with one that get_multi() has
+filled.
+
+Example:
+
+    python -m vmruntime.loadtest.exists_benchmark --keys=200
+"""
+
+import argparse
+import sys
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from vmruntime.loadtest import bridge
+from vmruntime.loadtest import timing
+
+APP_ID = 'dev~benchmark'
+NUM_FIELDS = 40
+
+
+class Wide(ndb.Expando):
+    name = ndb.StringProperty()
+    rank = ndb.IntegerProperty()
+    body = ndb.TextProperty()
+
+
+def populate(num_keys):
+    """Stores entities for half of the keys and returns all of them."""
+    keys = [ndb.Key(Wide, index + 1) for index in xrange(num_keys)]
+    entities = []
+    for key in keys[::2]:
+        entity = Wide(key=key, name='wide %d' % key.id(), rank=key.id(),
+                      body='text ' * 1000)
+        for field in xrange(NUM_FIELDS):
+            setattr(entity, 'field%d' % field, 'value %d' % field)
+        entities.append(entity)
+    ndb.put_multi(entities, use_cache=False, use_memcache=False)
+    return keys
+
+
+def run(num_keys, repeat, latency_ms=0):
+    """Times existence checks and projected gets against full gets.
+
+    Args:
+        num_keys: The number of keys to check, half of which exist.
+        repeat: How many times to time each case; the best time is used.
+        latency_ms: The latency of each API call, see bridge.ServiceBridge.
+
+    Returns:
+        A list of (case, milliseconds, CPU milliseconds) tuples.
+
+    Raises:
+        AssertionError: The cases disagree about which entities exist.
+    """
+    with bridge.vmstub_connection(APP_ID, latency_ms):
+        keys = populate(num_keys)
+        expected = [index % 2 == 0 for index in xrange(num_keys)]
+        projection = ['name', 'rank']
+        assert [entity is not None for entity in
+                ndb.get_multi(keys)] == expected
+        assert ndb.exists_multi(keys) == expected
+        projected = ndb.get_multi(keys, projection=projection)
+        assert [entity is not None for entity in projected] == expected
+        assert all(entity.rank == entity.key.id()
+                   for entity in projected if entity is not None)
+
+        cases = (
+            ('get', lambda: ndb.get_multi(keys)),
+            ('exists', lambda: ndb.exists_multi(keys)),
+            ('get_projected',
+             lambda: ndb.get_multi(keys, projection=projection)),
+        )
+        memcache_states = (
+            ('cold', memcache.flush_all),
+            ('warm', lambda: ndb.get_multi(keys, use_cache=False)),
+        )
+        results = []
+        for state, prepare_memcache in memcache_states:
+            def prepare():
+                prepare_memcache()
+                ndb.get_context().clear_cache()
+
+            for name, function in cases:
+                seconds = timing.best_seconds(function, repeat, setup=prepare)
+                results.append(('%s %s' % (name, state),) +
+                               tuple(s * 1000 for s in seconds))
+        return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ndb existence checks and projected gets.')
+    parser.add_argument('--keys', type=int, default=200,
+                        help='the number of keys to check')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    parser.add_argument('--latency_ms', type=float, default=2,
+                        help='the latency of each API call')
+    args = parser.parse_args(argv[1:])
+    print '%-19s %12s %12s' % ('case', 'ms', 'cpu ms')
+    for result in run(args.keys, args.repeat, args.latency_ms):
+        print '%-19s %12.1f %12.1f' % result
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
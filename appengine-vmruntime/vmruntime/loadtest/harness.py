@@ -0,0 +1,401 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the throughput and latency of meta_app under load.
+
+The harness boots vmruntime.wsgi.meta_app in a multi-threaded WSGI server. It
+serves sample_app and a static file, and its API calls go through vmstub to a
+local service bridge stand-in (see bridge.py). Client threads then send a mix
+of requests, after which the throughput, the latency percentiles of each kind
+of request and the time spent in each layer of meta_app are reported.
+
+Example:
+
+    python -m vmruntime.loadtest.harness --requests=5000 --concurrency=16 \\
+        --mix=hello=2,memcache=1,datastore_get=1
+
+With --max_p99_ms or --min_requests_per_second the harness exits with status 1
+if the results are worse, so that it can be used to catch regressions.
+"""
+
+import argparse
+import collections
+import contextlib
+import httplib
+import json
+import logging
+import os
+import Queue
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from vmruntime import appinfo_cache
+from vmruntime import dispatcher
+from vmruntime import middleware
+from vmruntime.loadtest import bridge
+from werkzeug import serving
+
+APP_ID = 'loadtest'
+PARTITION = 'dev'
+
+# The paths requested for each kind of request.
+REQUEST_PATHS = collections.OrderedDict([
+    ('hello', '/hello'),
+    ('static', '/static/hello.txt'),
+    ('health', '/_ah/health'),
+    ('memcache', '/memcache'),
+    ('datastore_put', '/datastore/put'),
+    ('datastore_get', '/datastore/get'),
+    ('datastore_query', '/datastore/query'),
+])
+
+DEFAULT_MIX = ','.join('%s=1' % kind for kind in REQUEST_PATHS)
+
+APP_YAML = """
+runtime: python27
+api_version: 1
+threadsafe: true
+vm: true
+handlers:
+- url: /static/(.*)
+  static_files: {static_dir}/\\1
+  upload: {static_dir}/.*
+- url: /.*
+  script: vmruntime.loadtest.sample_app.app
+"""
+
+# The functions that vmruntime.wsgi uses to build the layers of meta_app, from
+# the innermost to the outermost layer.
+LAYERS = (
+    (dispatcher, 'dispatcher'),
+    (middleware, 'health_check_middleware'),
+    (middleware, 'reset_environment_middleware'),
+    (middleware, 'callback_middleware'),
+)
+
+
+class LayerTimer(object):
+    """Records the time spent in each layer of meta_app."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Discards the times recorded so far."""
+        with self._lock:
+            # The total seconds spent in each layer, including inner layers.
+            self._seconds = collections.defaultdict(float)
+            self._calls = collections.defaultdict(int)
+
+    def _timed(self, name, app):
+        def timed_app(wsgi_env, start_response):
+            start = time.time()
+            try:
+                return app(wsgi_env, start_response)
+            finally:
+                elapsed = time.time() - start
+                with self._lock:
+                    self._seconds[name] += elapsed
+                    self._calls[name] += 1
+        return timed_app
+
+    def _timed_factory(self, name, factory):
+        def timed_factory(*args, **kwargs):
+            return self._timed(name, factory(*args, **kwargs))
+        return timed_factory
+
+    @contextlib.contextmanager
+    def instrument(self):
+        """Times the apps that the layer functions return while active."""
+        originals = [(module, name, getattr(module, name))
+                     for module, name in LAYERS]
+        for module, name, factory in originals:
+            setattr(module, name, self._timed_factory(name, factory))
+        try:
+            yield
+        finally:
+            for module, name, factory in originals:
+                setattr(module, name, factory)
+
+    def mean_milliseconds(self):
+        """Returns the mean time spent per request in each layer.
+
+        Returns:
+            An OrderedDict mapping layer names, from the outermost to the
+            innermost layer, to the mean milliseconds spent in the layer
+            excluding inner layers. The dispatcher includes the application.
+        """
+        result = collections.OrderedDict()
+        with self._lock:
+            inner_seconds = 0.0
+            for _, name in LAYERS:
+                calls = self._calls[name]
+                own_seconds = self._seconds[name] - inner_seconds
+                inner_seconds = self._seconds[name]
+                result[name] = own_seconds * 1000 / calls if calls else 0.0
+        return collections.OrderedDict(reversed(result.items()))
+
+
+def parse_mix(mix):
+    """Parses a request mix such as 'hello=2,memcache=1'.
+
+    Returns:
+        A list of (kind, weight) tuples.
+
+    Raises:
+        ValueError: The mix is not valid.
+    """
+    weights = []
+    for item in mix.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in REQUEST_PATHS:
+            raise ValueError('Unknown kind of request %r, expected one of %s' %
+                             (kind, ', '.join(REQUEST_PATHS)))
+        weights.append((kind, float(weight or 1)))
+    return weights
+
+
+def choose_kinds(weights, num_requests, seed=0):
+    """Returns a list of num_requests kinds, chosen according to weights."""
+    rng = random.Random(seed)
+    total = sum(weight for _, weight in weights)
+    kinds = []
+    for _ in xrange(num_requests):
+        point = rng.uniform(0, total)
+        for kind, weight in weights:
+            point -= weight
+            if point <= 0:
+                break
+        kinds.append(kind)
+    return kinds
+
+
+def send_requests(port, kinds, concurrency):
+    """Sends requests from concurrent client threads.
+
+    Args:
+        port: The port that meta_app is served on.
+        kinds: The kinds of request to send, in order.
+        concurrency: The number of client threads.
+
+    Returns:
+        A tuple of the list of (kind, seconds, status) tuples of the requests,
+        where status is None if the request failed, and the seconds taken to
+        send all of them.
+    """
+    work = Queue.Queue()
+    for kind in kinds:
+        work.put(kind)
+    results = []
+
+    def client():
+        while True:
+            try:
+                kind = work.get_nowait()
+            except Queue.Empty:
+                return
+            start = time.time()
+            try:
+                connection = httplib.HTTPConnection('localhost', port,
+                                                    timeout=60)
+                # Like the front end, give each request its own trace context,
+                # which the runtime uses as the request id.
+                connection.request('GET', REQUEST_PATHS[kind], headers={
+                    'X-Cloud-Trace-Context': uuid.uuid4().hex})
+                response = connection.getresponse()
+                response.read()
+                connection.close()
+                status = response.status
+            except (httplib.HTTPException, socket.error):
+                status = None
+            results.append((kind, time.time() - start, status))
+
+    start = time.time()
+    threads = [threading.Thread(target=client) for _ in xrange(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.time() - start
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at the given fraction of a sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[int(round(fraction * (len(sorted_values) - 1)))]
+
+
+def _latency_stats(results):
+    latencies = sorted(seconds * 1000 for _, seconds, _ in results)
+    return collections.OrderedDict([
+        ('requests', len(results)),
+        ('errors', sum(1 for _, _, status in results
+                       if status is None or status >= 500)),
+        ('p50_ms', percentile(latencies, 0.5)),
+        ('p99_ms', percentile(latencies, 0.99)),
+    ])
+
+
+def summarize(results, wall_seconds, layer_timer):
+    """Returns the statistics to report for a load test, as an OrderedDict."""
+    summary = _latency_stats(results)
+    summary['requests_per_second'] = len(results) / wall_seconds
+    summary['kinds'] = collections.OrderedDict(
+        (kind, _latency_stats([result for result in results
+                               if result[0] == kind]))
+        for kind in REQUEST_PATHS
+        if any(result[0] == kind for result in results))
+    summary['layer_ms'] = layer_timer.mean_milliseconds()
+    return summary
+
+
+def format_summary(summary):
+    """Formats the statistics returned by summarize as a table."""
+    lines = ['%d requests, %d errors, %.1f requests/s' % (
+        summary['requests'], summary['errors'],
+        summary['requests_per_second'])]
+    lines.append('%-16s %9s %7s %9s %9s' % ('kind', 'requests', 'errors',
+                                            'p50 ms', 'p99 ms'))
+    for kind, stats in summary['kinds'].items() + [('all', summary)]:
+        lines.append('%-16s %9d %7d %9.2f %9.2f' % (
+            kind, stats['requests'], stats['errors'], stats['p50_ms'],
+            stats['p99_ms']))
+    lines.append('Mean time per request in each layer of meta_app:')
+    for name, milliseconds in summary['layer_ms'].iteritems():
+        lines.append('%-30s %9.3f ms' % (name, milliseconds))
+    return '\n'.join(lines)
+
+
+def load_meta_app(app_dir, api_port, layer_timer):
+    """Imports vmruntime.wsgi, configured to serve sample_app.
+
+    This can only be done once per process.
+
+    Args:
+        app_dir: A directory to write app.yaml and the static files to.
+        api_port: The port that the service bridge stand-in listens on.
+        layer_timer: The LayerTimer to record the time spent in each layer.
+
+    Returns:
+        The instrumented meta_app.
+    """
+    static_dir = os.path.join(app_dir, 'static')
+    os.mkdir(static_dir)
+    with open(os.path.join(static_dir, 'hello.txt'), 'w') as f:
+        f.write('Hello, World!\n')
+    app_yaml_path = os.path.join(app_dir, 'app.yaml')
+    with open(app_yaml_path, 'w') as f:
+        f.write(APP_YAML.format(static_dir=static_dir))
+
+    os.environ.update({
+        'MODULE_YAML_PATH': app_yaml_path,
+        # Keep the parsed config of this throwaway app out of the shared cache.
+        appinfo_cache.CACHE_DIR_ENV_VAR: os.path.join(app_dir, 'cache'),
+        'API_HOST': 'localhost',
+        'API_PORT': str(api_port),
+        'GAE_LONG_APP_ID': APP_ID,
+        'GAE_PARTITION': PARTITION,
+        'GAE_MODULE_NAME': 'default',
+        'GAE_MODULE_VERSION': 'loadtest',
+        'GAE_MINOR_VERSION': '1',
+        'GAE_MODULE_INSTANCE': '0',
+        'SERVER_SOFTWARE': middleware.RESERVED_ENV_KEYS['SERVER_SOFTWARE'],
+    })
+    with layer_timer.instrument():
+        from vmruntime import wsgi  # pylint: disable=g-import-not-at-top
+    return wsgi.meta_app
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Load test vmruntime.wsgi.meta_app.')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='the number of requests to send')
+    parser.add_argument('--warmup_requests', type=int, default=100,
+                        help='the number of requests to send before measuring')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='the number of concurrent clients')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='comma-separated kind=weight pairs, where kind '
+                        'is one of: %s' % ', '.join(REQUEST_PATHS))
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('--max_p99_ms', type=float,
+                        help='fail if the p99 latency is higher')
+    parser.add_argument('--min_requests_per_second', type=float,
+                        help='fail if the throughput is lower')
+    args = parser.parse_args(argv[1:])
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    service_bridge = bridge.ServiceBridge('%s~%s' % (PARTITION, APP_ID))
+    api_port = service_bridge.start()
+    app_dir = tempfile.mkdtemp()
+    try:
+        layer_timer = LayerTimer()
+        meta_app = load_meta_app(app_dir, api_port, layer_timer)
+        # Leave only the report on the console, not a log line per request.
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = serving.make_server('localhost', 0, meta_app, threaded=True)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        try:
+            send_requests(server.server_port,
+                          choose_kinds(weights, args.warmup_requests, seed=1),
+                          args.concurrency)
+            layer_timer.reset()
+            results, wall_seconds = send_requests(
+                server.server_port, choose_kinds(weights, args.requests),
+                args.concurrency)
+        finally:
+            server.shutdown()
+    finally:
+        service_bridge.stop()
+        shutil.rmtree(app_dir)
+
+    summary = summarize(results, wall_seconds, layer_timer)
+    if args.json:
+        print json.dumps(summary, indent=2)
+    else:
+        print format_summary(summary)
+
+    failures = []
+    if summary['errors']:
+        failures.append('%d requests failed' % summary['errors'])
+    if args.max_p99_ms is not None and summary['p99_ms'] > args.max_p99_ms:
+        failures.append('p99 latency %.2f ms is over %.2f ms' % (
+            summary['p99_ms'], args.max_p99_ms))
+    if (args.min_requests_per_second is not None and
+            summary['requests_per_second'] < args.min_requests_per_second):
+        failures.append('throughput %.1f requests/s is under %.1f' % (
+            summary['requests_per_second'], args.min_requests_per_second))
+    for failure in failures:
+        sys.stderr.write('FAILED: %s\n' % failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,108 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures how long ndb takes to fetch and count IN queries.
+
+ndb runs a query with an IN filter as one datastore query per value. This
+benchmark sends those queries through vmstub to the local service bridge
+stand-in, so that each one is a separate HTTP request as in production, and
+times fetch() and count() for IN filters with a growing number of values.
+Most of the elapsed time is spent by the stubs executing the queries, so the
+CPU time spent in the benchmark process itself is reported as well.
+
+Example:
+
+    python -m vmruntime.loadtest.query_benchmark --entities=3000
+"""
+
+import argparse
+import sys
+
+from google.appengine.ext import ndb
+from vmruntime.loadtest import bridge
+from vmruntime.loadtest import timing
+
+APP_ID = 'dev~benchmark'
+DEFAULT_DISJUNCTS = (10, 20, 30)
+
+
+class Item(ndb.Model):
+    category = ndb.IntegerProperty()
+    name = ndb.StringProperty()
+
+
+def populate(num_entities, num_categories):
+    """Stores entities spread evenly over the categories."""
+    items = [Item(category=index % num_categories, name='item %d' % index)
+             for index in xrange(num_entities)]
+    for start in xrange(0, len(items), 500):
+        ndb.put_multi(items[start:start + 500], use_cache=False,
+                      use_memcache=False)
+
+
+def run(num_entities, disjuncts, repeat):
+    """Times fetching and counting IN queries against the service bridge.
+
+    Args:
+        num_entities: The number of entities to query.
+        disjuncts: The numbers of values in the IN filters to time.
+        repeat: How many times to time each query; the best time is used.
+
+    Returns:
+        A list of (number of values, matching entities, fetch milliseconds,
+        fetch CPU milliseconds, count milliseconds, count CPU milliseconds)
+        tuples.
+
+    Raises:
+        AssertionError: A count did not match the number of results fetched.
+    """
+    with bridge.vmstub_connection(APP_ID):
+        populate(num_entities, max(disjuncts))
+        results = []
+        for num_values in disjuncts:
+            query = Item.query(Item.category.IN(range(num_values)))
+            ndb.get_context().clear_cache()
+            matching = len(query.fetch(keys_only=True))
+            count = query.count()
+            assert count == matching, '%d != %d' % (count, matching)
+            fetch_seconds = timing.best_seconds(
+                lambda: query.fetch(use_cache=False, use_memcache=False),
+                repeat)
+            count_seconds = timing.best_seconds(query.count, repeat)
+            results.append((num_values, matching) + tuple(
+                seconds * 1000 for seconds in fetch_seconds + count_seconds))
+        return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ndb IN queries against the service bridge.')
+    parser.add_argument('--entities', type=int, default=3000,
+                        help='the number of entities to store')
+    parser.add_argument('--disjuncts', default=','.join(
+        str(n) for n in DEFAULT_DISJUNCTS),
+                        help='comma-separated numbers of IN values to time')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    args = parser.parse_args(argv[1:])
+    disjuncts = [int(n) for n in args.disjuncts.split(',')]
+    print '%-8s %10s %12s %12s %12s %12s' % (
+        'values', 'entities', 'fetch ms', 'fetch cpu', 'count ms', 'count cpu')
+    for result in run(args.entities, disjuncts, args.repeat):
+        print '%-8d %10d %12.1f %12.1f %12.1f %12.1f' % result
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,78 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The application served by meta_app during load tests.
+
+Each path exercises a different kind of request, from one that makes no API
+calls to ones that make memcache and datastore calls through vmstub.
+"""
+
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from werkzeug import wrappers
+
+# Entities and memcache keys are picked from this many ids, so that reads
+# mostly find something once the first writes are done.
+NUM_IDS = 100
+
+
+class Greeting(ndb.Model):
+    content = ndb.StringProperty()
+    index = ndb.IntegerProperty()
+
+
+def hello(unused_request):
+    return 'Hello, World!'
+
+
+def memcache_set_get(unused_request):
+    key = 'greeting-%d' % random.randrange(NUM_IDS)
+    memcache.set(key, 'Hello, World!')
+    return memcache.get(key) or ''
+
+
+def datastore_put(unused_request):
+    index = random.randrange(NUM_IDS)
+    Greeting(id=index + 1, content='Hello, World!', index=index).put()
+    return 'OK'
+
+
+def datastore_get(unused_request):
+    greeting = ndb.Key(Greeting, random.randrange(NUM_IDS) + 1).get()
+    return greeting.content if greeting else ''
+
+
+def datastore_query(unused_request):
+    greetings = Greeting.query(Greeting.index < 10).fetch(10)
+    return '\n'.join(greeting.content for greeting in greetings)
+
+
+HANDLERS = {
+    '/hello': hello,
+    '/memcache': memcache_set_get,
+    '/datastore/put': datastore_put,
+    '/datastore/get': datastore_get,
+    '/datastore/query': datastore_query,
+}
+
+
+@wrappers.Request.application
+def app(request):
+    handler = HANDLERS.get(request.path)
+    if handler is None:
+        return wrappers.Response('Not found', status=404)
+    # A fresh ndb context per request, as with ndb.toplevel.
+    return wrappers.Response(ndb.toplevel(handler)(request))
@@ -0,0 +1,185 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the startup time of a runtime worker process.
+
+A worker is ready to serve once importing vmruntime.wsgi has built meta_app.
+This benchmark starts a new interpreter for every measurement, so that no
+module is already imported, and reports:
+
+- the elapsed time of the whole process, against that of an interpreter that
+  exits at once;
+- the time spent importing vmruntime.wsgi, as measured in the process;
+- the number of modules imported by then.
+
+Startup is measured with the parsed app.yaml missing from the appinfo cache
+('cold') and present in it ('cached'). The 'requests' case is the cached one
+with requests imported up front, as the runtime did before it deferred that
+import to the first API call.
+
+Example:
+
+    python -m vmruntime.loadtest.startup_benchmark --repeat=10
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from vmruntime import appinfo_cache
+from vmruntime import import_profiler
+from vmruntime import middleware
+from vmruntime.loadtest import harness
+from vmruntime.loadtest import timing
+
+# Imports vmruntime.wsgi and prints how long that took and what was imported.
+# Any modules to import beforehand, as part of the startup, replace %s.
+STARTUP_SCRIPT = """
+import time
+start = time.time(), time.clock()
+%s
+from vmruntime import wsgi
+elapsed = time.time() - start[0], time.clock() - start[1]
+
+import json
+import sys
+assert wsgi.meta_app
+print json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)})
+"""
+
+
+def startup_environment(app_dir):
+    """Returns the process environment for a worker serving a small app.
+
+    Args:
+        app_dir: A directory to write app.yaml to; the appinfo cache is kept
+            in its 'cache' subdirectory.
+    """
+    app_yaml_path = os.path.join(app_dir, 'app.yaml')
+    with open(app_yaml_path, 'w') as f:
+        f.write(harness.APP_YAML.format(
+            static_dir=os.path.join(app_dir, 'static')))
+    env = dict(os.environ)
+    env.pop(import_profiler.PROFILE_IMPORTS_ENV_VAR, None)
+    env.update({
+        'PYTHONPATH': os.pathsep.join(sys.path),
+        'MODULE_YAML_PATH': app_yaml_path,
+        appinfo_cache.CACHE_DIR_ENV_VAR: os.path.join(app_dir, 'cache'),
+        'GAE_LONG_APP_ID': harness.APP_ID,
+        'GAE_PARTITION': harness.PARTITION,
+        'GAE_MODULE_NAME': 'default',
+        'GAE_MODULE_VERSION': 'startup',
+        'GAE_MINOR_VERSION': '1',
+        'GAE_MODULE_INSTANCE': '0',
+        'SERVER_SOFTWARE': middleware.RESERVED_ENV_KEYS['SERVER_SOFTWARE'],
+    })
+    return env
+
+
+def start_worker(env, imports=()):
+    """Starts a worker process that exits once meta_app is built.
+
+    Args:
+        env: The process environment, see startup_environment().
+        imports: The names of modules to import before vmruntime.wsgi.
+
+    Returns:
+        A dict with the (elapsed, CPU) seconds of importing vmruntime.wsgi
+        and the names of the modules imported by then.
+
+    Raises:
+        RuntimeError: The worker failed; its log output is included.
+    """
+    script = STARTUP_SCRIPT % ''.join('import %s\n' % name
+                                      for name in imports)
+    process = subprocess.Popen([sys.executable, '-c', script],
+                               env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    output, log_output = process.communicate()
+    if process.returncode:
+        raise RuntimeError('Worker exited with status %d:\n%s' %
+                           (process.returncode, log_output))
+    return json.loads(output)
+
+
+def run(repeat):
+    """Times starting worker processes.
+
+    Args:
+        repeat: How many processes to start for each case; the best time is
+            used.
+
+    Returns:
+        A list of (case, process milliseconds, import milliseconds, import
+        CPU milliseconds, number of modules) tuples, where case is
+        'interpreter', 'cold', 'cached' or 'requests'. The interpreter case
+        only has a process time.
+    """
+    app_dir = tempfile.mkdtemp()
+    try:
+        env = startup_environment(app_dir)
+        cache_dir = env[appinfo_cache.CACHE_DIR_ENV_VAR]
+        interpreter_seconds, _ = timing.best_seconds(
+            lambda: subprocess.check_call([sys.executable, '-c', 'pass'],
+                                          env=env), repeat)
+        results = [('interpreter', interpreter_seconds * 1000, None, None,
+                    None)]
+        for case, imports in (('cold', ()), ('cached', ()),
+                              ('requests', ('requests',))):
+            outputs = []
+
+            def start():
+                outputs.append(start_worker(env, imports))
+
+            def clear_cache():
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+            if case == 'cached':
+                # Fill the cache, and compile any module not compiled yet.
+                start()
+                del outputs[:]
+            process_seconds, _ = timing.best_seconds(
+                start, repeat, setup=clear_cache if case == 'cold' else None)
+            import_seconds = min(output['seconds'] for output in outputs)
+            results.append((case, process_seconds * 1000,
+                            import_seconds[0] * 1000, import_seconds[1] * 1000,
+                            len(outputs[0]['modules'])))
+    finally:
+        shutil.rmtree(app_dir)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the startup time of runtime worker processes.')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='the number of processes to start for each case')
+    args = parser.parse_args(argv[1:])
+    print '%-12s %10s %10s %10s %8s' % (
+        'case', 'process ms', 'import ms', 'cpu ms', 'modules')
+    for case, process_ms, import_ms, cpu_ms, modules in run(args.repeat):
+        if import_ms is None:
+            print '%-12s %10.1f' % (case, process_ms)
+        else:
+            print '%-12s %10.1f %10.1f %10.1f %8d' % (
+                case, process_ms, import_ms, cpu_ms, modules)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
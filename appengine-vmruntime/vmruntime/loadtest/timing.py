@@ -0,0 +1,42 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timing helpers shared by the benchmarks."""
+
+import time
+
+
+def best_seconds(function, repeat, setup=None):
+    """Returns the lowest elapsed and process CPU seconds of calls.
+
+    Args:
+        function: The function to time, called without arguments.
+        repeat: How many times to call the function.
+        setup: A function called without arguments before each call, outside
+            of the timing, or None.
+
+    Returns:
+        A (wall seconds, CPU seconds) tuple for the call with the lowest
+        elapsed time.
+    """
+    best = None
+    for _ in xrange(repeat):
+        if setup:
+            setup()
+        start = time.time(), time.clock()
+        function()
+        elapsed = time.time() - start[0], time.clock() - start[1]
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,121 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures ndb puts from independent code paths with and without write-behind.
+
+Request handlers often update entities one at a time from code paths that do
+not know about each other, each with a synchronous put(), so that every put
+is a separate datastore RPC. Inside Context.write_behind() the puts are held
+back and sent together when the block ends, with repeated puts of the same
+entity coalesced. This benchmark sends the calls through vmstub to the local
+service bridge stand-in, with each API call delayed by --latency_ms, and
+reports the elapsed time and the number of datastore Put RPCs made.
+
+Example:
+
+    python -m vmruntime.loadtest.write_behind_benchmark --entities=100
+"""
+
+import argparse
+import sys
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.ext import ndb
+from vmruntime.loadtest import bridge
+from vmruntime.loadtest import timing
+
+APP_ID = 'dev~benchmark'
+
+
+class Counter(ndb.Model):
+    count = ndb.IntegerProperty(default=0)
+    touched = ndb.DateTimeProperty(auto_now=True)
+
+
+def update_counters(keys):
+    """Increments each counter twice, one synchronous put at a time."""
+    for key in keys + keys:
+        counter = key.get() or Counter(key=key)
+        counter.count += 1
+        counter.put()
+
+
+def run(num_entities, repeat, latency_ms=0):
+    """Times updating counters with and without write-behind.
+
+    Args:
+        num_entities: The number of counters to update.
+        repeat: How many times to time each case; the best time is used.
+        latency_ms: The latency of each API call, see bridge.ServiceBridge.
+
+    Returns:
+        A list of (case, milliseconds, CPU milliseconds, datastore Put RPCs)
+        tuples.
+
+    Raises:
+        AssertionError: The counters were not updated.
+    """
+    write_calls = []
+
+    def count_writes(service, call, request, response):
+        if call == 'Put':
+            write_calls.append(call)
+
+    with bridge.vmstub_connection(APP_ID, latency_ms):
+        apiproxy_stub_map.apiproxy.GetPostCallHooks().Append(
+            'write_behind_benchmark', count_writes, 'datastore_v3')
+        keys = [ndb.Key(Counter, index + 1)
+                for index in xrange(num_entities)]
+        ctx = ndb.get_context()
+
+        def write_behind():
+            with ctx.write_behind():
+                update_counters(keys)
+
+        def prepare():
+            ndb.delete_multi(keys)
+            ctx.clear_cache()
+            del write_calls[:]
+
+        results = []
+        for name, function in (('direct', lambda: update_counters(keys)),
+                               ('write_behind', write_behind)):
+            seconds = timing.best_seconds(function, repeat, setup=prepare)
+            put_rpcs = len(write_calls)
+            ctx.clear_cache()
+            assert [counter.count for counter in ndb.get_multi(keys)] == (
+                [2] * num_entities)
+            results.append((name,) + tuple(s * 1000 for s in seconds) +
+                           (put_rpcs,))
+        return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark ndb puts with and without write-behind.')
+    parser.add_argument('--entities', type=int, default=100,
+                        help='the number of entities to update')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the number of times to repeat each measurement')
+    parser.add_argument('--latency_ms', type=float, default=2,
+                        help='the latency of each API call')
+    args = parser.parse_args(argv[1:])
+    print '%-14s %12s %12s %12s' % ('case', 'ms', 'cpu ms', 'put rpcs')
+    for result in run(args.entities, args.repeat, args.latency_ms):
+        print '%-14s %12.1f %12.1f %12d' % result
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,50 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from mock import patch
+from vmruntime import appinfo_cache
+from vmruntime.loadtest import appinfo_benchmark
+
+
+class AppInfoBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = appinfo_benchmark.run(
+            [1, appinfo_benchmark.MAX_STATIC_HANDLERS], repeat=1)
+        self.assertEqual(
+            [(num_handlers, case)
+             for num_handlers in (1, appinfo_benchmark.MAX_STATIC_HANDLERS)
+             for case in ('parse', 'cold', 'cached')],
+            [result[:2] for result in results])
+        for result in results:
+            self.assertGreaterEqual(min(result[2:]), 0)
+
+    def test_cached_case_does_not_parse(self):
+        parse = appinfo_cache._parse
+        parsed = []
+
+        def recording_parse(filename):
+            parsed.append(filename)
+            return parse(filename)
+
+        with patch.object(appinfo_cache, '_parse', recording_parse):
+            appinfo_benchmark.run([5], repeat=2)
+        # Once to fill the cache, twice for each of 'parse' and 'cold'.
+        self.assertEqual(5, len(parsed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from vmruntime import appinfo_cache
+
+APP_YAML = """
+runtime: python27
+api_version: 1
+threadsafe: true
+vm: true
+includes:
+- include.yaml
+handlers:
+{handlers}
+- url: /.*
+  script: main.app
+"""
+
+INCLUDE_YAML = """
+env_variables:
+  FOO: {value}
+"""
+
+STATIC_HANDLER = """
+- url: /static{index}/(.*)
+  static_files: static/\\1
+  upload: static/.*
+  expiration: 1d 2h
+  http_headers:
+    X-Handler: handler{index}
+"""
+
+
+class AppInfoCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.app_yaml_path = os.path.join(self.tmpdir, 'app.yaml')
+        self.write_app_yaml()
+        self.write_include_yaml('bar')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_app_yaml(self, num_handlers=0):
+        handlers = ''.join(STATIC_HANDLER.format(index=index)
+                           for index in range(num_handlers))
+        with open(self.app_yaml_path, 'w') as f:
+            f.write(APP_YAML.format(handlers=handlers))
+
+    def write_include_yaml(self, value):
+        with open(os.path.join(self.tmpdir, 'include.yaml'), 'w') as f:
+            f.write(INCLUDE_YAML.format(value=value))
+
+    def load(self):
+        return appinfo_cache.load(self.app_yaml_path, self.cache_dir)
+
+    def test_load_from_cache(self):
+        app_info = self.load()
+        self.assertEqual('bar', app_info.env_variables['FOO'])
+        with patch.object(appinfo_cache, '_parse') as mock_parse:
+            cached_app_info = self.load()
+        self.assertFalse(mock_parse.called)
+        self.assertEqual(app_info.ToDict(), cached_app_info.ToDict())
+        self.assertEqual(0700, os.stat(self.cache_dir).st_mode & 0777)
+
+    def test_app_yaml_changed(self):
+        self.load()
+        self.write_app_yaml(num_handlers=1)
+        app_info = self.load()
+        self.assertEqual('/static0/(.*)', app_info.handlers[0].url)
+        with patch.object(appinfo_cache, '_parse') as mock_parse:
+            self.load()
+        self.assertFalse(mock_parse.called)
+
+    def test_include_changed(self):
+        self.load()
+        self.write_include_yaml('baz')
+        self.assertEqual('baz', self.load().env_variables['FOO'])
+
+    def test_invalid_entry(self):
+        self.load()
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'w') as f:
+                f.write('not a pickle')
+        self.assertEqual('bar', self.load().env_variables['FOO'])
+
+    def test_cache_disabled(self):
+        with patch.dict(os.environ,
+                        {appinfo_cache.CACHE_DIR_ENV_VAR: ''}):
+            self.assertIsNone(appinfo_cache.get_cache_dir())
+            appinfo_cache.load(self.app_yaml_path)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_shared_cache_dir_not_used(self):
+        os.mkdir(self.cache_dir)
+        os.chmod(self.cache_dir, 0777)
+        self.load()
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_large_config_from_cache(self):
+        # Close to the limit of 100 handlers, including the catch-all one.
+        self.write_app_yaml(num_handlers=95)
+        app_info = self.load()
+        with patch.object(appinfo_cache, '_parse') as mock_parse:
+            cached_app_info = self.load()
+        self.assertFalse(mock_parse.called)
+        self.assertEqual(96, len(cached_app_info.handlers))
+        self.assertEqual(app_info.ToDict(), cached_app_info.ToDict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from vmruntime.loadtest import cache_benchmark
+
+
+class CacheBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        cold_ms, warm_ms = cache_benchmark.run(num_entities=10, repeat=1,
+                                               latency_ms=1)
+        self.assertGreater(cold_ms, 0)
+        self.assertGreater(warm_ms, 0)
+        # Gets from a warm memcache make a single API call.
+        self.assertLess(warm_ms, cold_ms)
+
+
+if __name__ == '__main__':
+    unittest.main()
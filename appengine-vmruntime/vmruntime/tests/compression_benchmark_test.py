@@ -0,0 +1,36 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from vmruntime.loadtest import compression_benchmark
+
+
+class CompressionBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = compression_benchmark.run(num_entities=5, repeat=1)
+        stored = dict(((size, codec), stored_bytes)
+                      for size, codec, stored_bytes in
+                      (result[:3] for result in results))
+        self.assertEqual(12, len(stored))
+        # Small payloads are below the threshold, large ones are above it.
+        self.assertEqual(stored['small', 'none'],
+                         stored['small', 'zlib-1-1k'])
+        for codec in ('zlib', 'zlib-1-1k', 'bz2'):
+            self.assertLess(stored['large', codec], stored['large', 'none'])
+
+
+if __name__ == '__main__':
+    unittest.main()
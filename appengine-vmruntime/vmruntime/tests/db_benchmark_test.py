@@ -0,0 +1,46 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from google.appengine.ext import db
+from mock import patch
+from vmruntime.loadtest import db_benchmark
+
+
+class DbBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = db_benchmark.run(num_entities=20, repeat=1)
+        self.assertEqual(['get', 'query', 'from_protobuf'],
+                         [result[0] for result in results])
+        for _, elapsed_ms, cpu_ms in results:
+            self.assertGreaterEqual(elapsed_ms, 0)
+            self.assertGreaterEqual(cpu_ms, 0)
+
+    def test_run_checks_loaded_entities(self):
+        def model_from_protobuf_without_score(pb):
+            record = model_from_protobuf(pb)
+            record.score = None
+            return record
+
+        model_from_protobuf = db.model_from_protobuf
+        with patch.object(db, 'model_from_protobuf',
+                          model_from_protobuf_without_score):
+            with self.assertRaises(AssertionError):
+                db_benchmark.run(num_entities=2, repeat=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
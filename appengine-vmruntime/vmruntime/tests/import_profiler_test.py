@@ -0,0 +1,121 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from vmruntime import import_profiler
+
+# Modules that the runtime only imports once the application needs them.
+LAZILY_IMPORTED_MODULES = ('requests', 'requests_nologs')
+
+# Imports the modules that vmruntime.wsgi imports at startup and prints the
+# names of all modules that were imported.
+STARTUP_IMPORTS_SCRIPT = """
+import sys
+
+from google.appengine.ext.vmruntime import vmconfig
+from google.appengine.ext.vmruntime import vmstub
+from vmruntime import cloud_logging
+from vmruntime import dispatcher
+from vmruntime import middleware
+from vmruntime import wsgi_config
+
+vmstub.VMStub('ticket')
+print '\\n'.join(sys.modules)
+"""
+
+
+class ImportProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        package_dir = os.path.join(self.tmpdir, 'profiled_package')
+        os.mkdir(package_dir)
+        with open(os.path.join(package_dir, '__init__.py'), 'w') as f:
+            f.write('from profiled_package import child\n')
+        with open(os.path.join(package_dir, 'child.py'), 'w') as f:
+            f.write('import time\ntime.sleep(0.05)\n')
+        sys.path.insert(0, self.tmpdir)
+        self.profiler = import_profiler.ImportProfiler()
+
+    def tearDown(self):
+        self.profiler.stop()
+        sys.path.remove(self.tmpdir)
+        for name in ('profiled_package', 'profiled_package.child'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.tmpdir)
+
+    def test_timings(self):
+        self.profiler.start()
+        import profiled_package  # noqa: F401
+        self.profiler.stop()
+
+        package_cumulative, package_self = self.profiler.timings[
+            'profiled_package']
+        child_cumulative, child_self = self.profiler.timings[
+            'profiled_package.child']
+        self.assertGreaterEqual(child_self, 0.05)
+        self.assertGreaterEqual(package_cumulative, child_cumulative)
+        self.assertLess(package_self, 0.05)
+
+    def test_stop(self):
+        self.profiler.start()
+        self.profiler.stop()
+        self.assertNotIn(self.profiler, sys.meta_path)
+        import profiled_package  # noqa: F401
+        self.assertEqual({}, self.profiler.timings)
+
+    def test_report(self):
+        self.profiler.timings = {'a': [0.002, 0.001], 'b': [0.003, 0.003],
+                                 'c': [0.001, 0.001]}
+        self.assertEqual(
+            ' cumul. ms    self ms  module\n'
+            '       3.0        3.0  b\n'
+            '       2.0        1.0  a\n'
+            '       5.0             total for 3 modules',
+            self.profiler.report(limit=2))
+
+    def test_start_from_environment(self):
+        self.assertEqual((None, None),
+                         import_profiler.start_from_environment({}))
+        for value, expected_limit in (
+                ('10', 10), ('yes', import_profiler.DEFAULT_REPORT_LIMIT)):
+            profiler, limit = import_profiler.start_from_environment(
+                {import_profiler.PROFILE_IMPORTS_ENV_VAR: value})
+            try:
+                self.assertIn(profiler, sys.meta_path)
+                self.assertEqual(expected_limit, limit)
+            finally:
+                profiler.stop()
+
+
+class StartupImportsTestCase(unittest.TestCase):
+
+    def test_lazily_imported_modules(self):
+        # Run in a new interpreter, as other tests may have imported anything.
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP_IMPORTS_SCRIPT],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        imported = set(output.split())
+        for name in LAZILY_IMPORTED_MODULES:
+            self.assertNotIn(name, imported)
+
+
+if __name__ == '__main__':
+    unittest.main()
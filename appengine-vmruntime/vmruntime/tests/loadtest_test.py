@@ -0,0 +1,81 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from vmruntime import middleware
+from vmruntime.loadtest import harness
+
+
+def fake_app(wsgi_env, start_response):
+    start_response('200 OK', [])
+    return ['OK']
+
+
+class HarnessTestCase(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual([('hello', 2.0), ('memcache', 1.0)],
+                         harness.parse_mix('hello=2,memcache'))
+        self.assertRaises(ValueError, harness.parse_mix, 'hello=1,unknown=1')
+
+    def test_choose_kinds(self):
+        kinds = harness.choose_kinds([('hello', 3), ('static', 1)], 1000)
+        self.assertEqual(1000, len(kinds))
+        counts = collections.Counter(kinds)
+        self.assertTrue(650 < counts['hello'] < 850, counts)
+        self.assertEqual(kinds, harness.choose_kinds(
+            [('hello', 3), ('static', 1)], 1000))
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(51, harness.percentile(values, 0.5))
+        self.assertEqual(99, harness.percentile(values, 0.99))
+        self.assertEqual(0.0, harness.percentile([], 0.5))
+
+    def test_layer_timer(self):
+        timer = harness.LayerTimer()
+        original = middleware.callback_middleware
+        with timer.instrument():
+            app = middleware.callback_middleware(fake_app)
+        self.assertIs(original, middleware.callback_middleware)
+        self.assertEqual(['OK'], app({}, lambda status, headers: None))
+        layer_ms = timer.mean_milliseconds()
+        self.assertEqual([name for _, name in reversed(harness.LAYERS)],
+                         layer_ms.keys())
+        self.assertGreater(layer_ms['callback_middleware'], 0)
+        timer.reset()
+        self.assertEqual(0, timer.mean_milliseconds()['callback_middleware'])
+
+    def test_load_test(self):
+        # meta_app can only be loaded once per process.
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'vmruntime.loadtest.harness',
+             '--requests=70', '--warmup_requests=7', '--concurrency=4',
+             '--json'],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        summary = json.loads(output)
+        self.assertEqual(70, summary['requests'])
+        self.assertEqual(0, summary['errors'])
+        self.assertItemsEqual(harness.REQUEST_PATHS, summary['kinds'])
+        self.assertGreater(summary['layer_ms']['dispatcher'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from vmruntime.loadtest import query_benchmark
+
+
+class QueryBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        # run() also checks that each count matches the results fetched.
+        results = query_benchmark.run(num_entities=60, disjuncts=[3, 6],
+                                      repeat=1)
+        self.assertEqual([(3, 30), (6, 60)],
+                         [result[:2] for result in results])
+        for result in results:
+            for milliseconds in result[2:]:
+                self.assertGreaterEqual(milliseconds, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
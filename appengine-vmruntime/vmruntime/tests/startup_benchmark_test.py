@@ -0,0 +1,49 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+import unittest
+
+from vmruntime.loadtest import startup_benchmark
+
+
+class StartupBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = startup_benchmark.run(repeat=1)
+        self.assertEqual(['interpreter', 'cold', 'cached', 'requests'],
+                         [result[0] for result in results])
+        self.assertEqual((None, None, None), results[0][2:])
+        for _, process_ms, import_ms, cpu_ms, modules in results[1:]:
+            self.assertGreater(process_ms, 0)
+            self.assertGreater(import_ms, 0)
+            self.assertGreaterEqual(cpu_ms, 0)
+            self.assertGreater(modules, 0)
+        # Importing requests up front loads more modules.
+        self.assertGreater(results[3][4], results[2][4])
+
+    def test_worker_failure(self):
+        app_dir = tempfile.mkdtemp()
+        try:
+            env = startup_benchmark.startup_environment(app_dir)
+        finally:
+            shutil.rmtree(app_dir)
+        with self.assertRaises(RuntimeError) as cm:
+            startup_benchmark.start_worker(env)
+        self.assertIn('app.yaml', str(cm.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
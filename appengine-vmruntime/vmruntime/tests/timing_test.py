@@ -0,0 +1,39 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from mock import patch
+from vmruntime.loadtest import timing
+
+
+class BestSecondsTestCase(unittest.TestCase):
+
+    def test_best_seconds(self):
+        calls = []
+        # Each call takes time.time() and time.clock() readings before and
+        # after the function runs.
+        times = iter([0.0, 3.0, 10.0, 11.0, 20.0, 22.0])
+        clocks = iter([0.0, 1.0, 5.0, 5.5, 6.0, 6.5])
+        with patch('time.time', side_effect=lambda: next(times)), \
+                patch('time.clock', side_effect=lambda: next(clocks)):
+            best = timing.best_seconds(
+                lambda: calls.append('call'), 3,
+                setup=lambda: calls.append('setup'))
+        self.assertEqual((1.0, 0.5), best)
+        self.assertEqual(['setup', 'call'] * 3, calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
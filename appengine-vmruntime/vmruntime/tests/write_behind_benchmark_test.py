@@ -0,0 +1,29 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from vmruntime.loadtest import write_behind_benchmark
+
+
+class WriteBehindBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = write_behind_benchmark.run(num_entities=5, repeat=1)
+        self.assertEqual([('direct', 10), ('write_behind', 1)],
+                         [(result[0], result[-1]) for result in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
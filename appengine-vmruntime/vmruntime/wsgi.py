@@ -23,12 +23,19 @@ WSGI app.
 import logging
 import os
 
-from google.appengine.ext.vmruntime import vmconfig
-from google.appengine.ext.vmruntime import vmstub
-from vmruntime import cloud_logging
-from vmruntime import dispatcher
-from vmruntime import middleware
-from vmruntime import wsgi_config
+# Start profiling before anything else is imported, if requested.
+from vmruntime import import_profiler
+_import_profiler, _import_report_limit = (
+    import_profiler.start_from_environment())
+
+# pylint: disable=g-import-not-at-top
+from google.appengine.ext.vmruntime import vmconfig  # noqa: E402,I100,I202
+from google.appengine.ext.vmruntime import vmstub  # noqa: E402
+from vmruntime import cloud_logging  # noqa: E402
+from vmruntime import dispatcher  # noqa: E402
+from vmruntime import middleware  # noqa: E402
+from vmruntime import wsgi_config  # noqa: E402
+# pylint: enable=g-import-not-at-top
 
 # Configure logging to output structured JSON to Cloud Logging.
 root_logger = logging.getLogger('')
@@ -145,3 +152,6 @@ meta_app = middleware.reset_environment_middleware(
 
 # Invoke a request-end callback as the request returns.
 meta_app = middleware.callback_middleware(meta_app)
+
+if _import_profiler:
+    import_profiler.stop_and_log(_import_profiler, _import_report_limit)
@@ -21,8 +21,8 @@ import threading
 import UserDict
 
 from google.appengine.api import appinfo
-from google.appengine.api import appinfo_includes
 from google.appengine.runtime import wsgi
+from vmruntime import appinfo_cache
 from vmruntime import static_files
 
 DEFAULT_STATIC_CONTENT_EXPIRATION = '10m'
@@ -43,9 +43,11 @@ def get_module_config_filename():
 
 
 def get_module_config(filename):
-    """Returns the parsed module config."""
-    with open(filename) as f:
-        return appinfo_includes.Parse(f)
+    """Returns the parsed module config, shared with other processes.
+
+    See appinfo_cache for how parsed configs are cached.
+    """
+    return appinfo_cache.load(filename)
 
 
 def app_for_script(script):